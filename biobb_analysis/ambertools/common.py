@@ -1,8 +1,25 @@
 """ Common functions for package biobb_analysis.ambertools """
 from pathlib import Path, PurePath
+from concurrent.futures import ThreadPoolExecutor
+import atexit
+import os
+import re
+import select
+import struct
+import subprocess
+import threading
+import time
+import uuid
 import zipfile
 import shutil
 from biobb_common.tools import file_utils as fu
+from biobb_common.command_wrapper import cmd_wrapper
+from biobb_analysis.cache.topology import extract_topology, release_topology
+from biobb_analysis.cache.results import hash_file
+from biobb_analysis.native.index import can_trim, load_frame_index, trim_trajectory
+from biobb_analysis.cache.structure import get_structure_key, get_cached_structure, new_structure
+from biobb_analysis.profiling.phases import profiled
+from biobb_analysis.profiling.resources import bind_accounting, get_accounting, read_process_usage, add_process_usage
 
 
 def check_top_path(path, out_log, classname):
@@ -16,10 +33,15 @@ def check_top_path(path, out_log, classname):
 		fu.log(classname + ': Format %s in topology input file is not compatible' % file_extension[1:], out_log)
 		raise SystemExit(classname + ': Format %s in topology input file is not compatible' % file_extension[1:])
 	if zipfile.is_zipfile(path):
-		top_file = fu.unzip_top(zip_file=path, out_log=out_log)
-		path = top_file
+		# extracted once per zip contents, released by release_top_path
+		path = extract_topology(path, out_log)
 	return path, orig_path
 
+def release_top_path(path, orig_path, remove_tmp, out_log):
+	""" Releases the topology extracted by check_top_path, if any """
+	if orig_path and zipfile.is_zipfile(orig_path):
+		release_topology(path, remove_tmp, out_log)
+
 def check_traj_path(path, out_log, classname):
 	""" Checks trajectory input file """
 	if not Path(path).exists():
@@ -31,6 +53,48 @@ def check_traj_path(path, out_log, classname):
 		raise SystemExit(classname + ': Format %s in trajectory input file is not compatible' % file_extension[1:])
 	return path
 
+def trim_traj_path(biobb, out_log):
+	""" Replaces the XTC, TRR, DCD or NetCDF3 trajectory of a block by a copy of its selected frames when frame_index is set, renumbering them; restored by release_traj_path """
+	biobb.input_traj_path_orig = None
+	path = biobb.io_dict["in"]["input_traj_path"]
+	if not biobb.frame_index:
+		return
+	if not can_trim(path):
+		fu.log('Only XTC, TRR, DCD without fixed atoms and NetCDF3 trajectories can be trimmed, %s not trimmed' % path, out_log)
+		return
+	params = biobb.in_parameters
+	keys = ('snapshot', 'snapshot') if 'snapshot' in params else ('start', 'end')
+	first, last = params.get(keys[0], get_default_value(keys[0])), params.get(keys[1], get_default_value(keys[1]))
+	if not isinstance(first, int) or not isinstance(last, int) or first < 1:
+		return
+	try:
+		index = load_frame_index(path)
+	except (ValueError, OSError, struct.error) as e:
+		fu.log('Trajectory %s can not be indexed, not trimmed: %s' % (path, e), out_log)
+		return
+	stop = len(index.time) if last == -1 else min(last, len(index.time))
+	if first > stop:
+		return
+	trim_path = str(PurePath(fu.create_unique_dir()).joinpath(PurePath(path).name))
+	trim_trajectory(path, first - 1, stop, trim_path, index)
+	fu.log('Frames %d to %d of %s copied to %s' % (first, stop, path, trim_path), out_log)
+	biobb.input_traj_path_orig = path
+	biobb.io_dict["in"]["input_traj_path"] = trim_path
+	if keys[0] == 'snapshot':
+		params['snapshot'] = 1
+	else:
+		params['start'], params['end'] = 1, -1
+
+def release_traj_path(biobb, out_log):
+	""" Restores the trajectory replaced by trim_traj_path, if any """
+	if not getattr(biobb, 'input_traj_path_orig', None):
+		return
+	trim_path = biobb.io_dict["in"]["input_traj_path"]
+	biobb.io_dict["in"]["input_traj_path"] = biobb.input_traj_path_orig
+	biobb.input_traj_path_orig = None
+	if biobb.remove_tmp:
+		shutil.rmtree(PurePath(trim_path).parent, ignore_errors=True)
+
 def check_out_path(path, out_log, classname):
 	""" Checks if output folder exists """
 	if PurePath(path).parent and not Path(PurePath(path).parent).exists():
@@ -82,6 +146,12 @@ def get_default_value(key):
 		"average": "MyAvg",
 		"instructions_file": "instructions.in",
 		"binary_path": "cpptraj",
+		"backend": "cpptraj",
+		"n_workers": 1,
+		"warm_pool": False,
+		"warm_timeout": 600,
+		"frame_index": False,
+		"incremental": False,
 		# default conf for Average
 		"Average": {
 			"in_parameters": {
@@ -229,6 +299,64 @@ def is_valid_trajectory(traj):
 	formats = 'mdcrd', 'crd', 'cdf', 'netcdf', 'nc', 'restart', 'ncrestart', 'restartnc', 'dcd', 'charmm', 'cor', 'pdb', 'mol2', 'trr', 'gro', 'binpos', 'xtc', 'cif', 'arc', 'sqm', 'sdf', 'conflib'
 	return traj in formats
 
+def is_valid_analysis(analysis):
+	""" Checks if analysis type is available in a multi-analysis session """
+	analyses = 'rms', 'rmsf', 'rgyr', 'bfactor', 'average'
+	return analysis in analyses
+
+def is_valid_backend(backend):
+	""" Checks if backend is correct """
+	backends = 'cpptraj', 'native'
+	return backend in backends
+
+def get_backend(properties, out_log, classname):
+	""" Gets backend """
+	backend = properties.get('backend', get_default_value('backend'))
+	if not is_valid_backend(backend):
+		fu.log(classname + ': Incorrect backend provided, exiting', out_log)
+		raise SystemExit(classname + ': Incorrect backend provided')
+	return backend
+
+def get_n_workers(properties, out_log, classname):
+	""" Gets the number of cpptraj processes among which the frames are split """
+	n_workers = properties.get('n_workers', get_default_value('n_workers'))
+	if not isinstance(n_workers, int) or isinstance(n_workers, bool) or n_workers < 1:
+		fu.log(classname + ': Incorrect n_workers provided, it must be a positive integer, exiting', out_log)
+		raise SystemExit(classname + ': Incorrect n_workers provided')
+	return n_workers
+
+def get_warm_pool(properties, out_log, classname):
+	""" Gets whether the instructions are run by a warm cpptraj process """
+	warm_pool = properties.get('warm_pool', get_default_value('warm_pool'))
+	if not isinstance(warm_pool, bool):
+		fu.log(classname + ': Incorrect warm_pool provided, it must be a boolean, exiting', out_log)
+		raise SystemExit(classname + ': Incorrect warm_pool provided')
+	return warm_pool
+
+def get_warm_timeout(properties, out_log, classname):
+	""" Gets the seconds a warm cpptraj process is given to run the instructions """
+	warm_timeout = properties.get('warm_timeout', get_default_value('warm_timeout'))
+	if not isinstance(warm_timeout, (int, float)) or isinstance(warm_timeout, bool) or warm_timeout <= 0:
+		fu.log(classname + ': Incorrect warm_timeout provided, it must be a positive number, exiting', out_log)
+		raise SystemExit(classname + ': Incorrect warm_timeout provided')
+	return warm_timeout
+
+def get_frame_index(properties, out_log, classname):
+	""" Gets whether XTC and TRR trajectories are trimmed to the selected frames through their frame index """
+	frame_index = properties.get('frame_index', get_default_value('frame_index'))
+	if not isinstance(frame_index, bool):
+		fu.log(classname + ': Incorrect frame_index provided, it must be a boolean, exiting', out_log)
+		raise SystemExit(classname + ': Incorrect frame_index provided')
+	return frame_index
+
+def get_incremental(properties, out_log, classname):
+	""" Gets whether only the frames added to the trajectory since the last launch are processed and appended to the output """
+	incremental = properties.get('incremental', get_default_value('incremental'))
+	if not isinstance(incremental, bool):
+		fu.log(classname + ': Incorrect incremental provided, it must be a boolean, exiting', out_log)
+		raise SystemExit(classname + ': Incorrect incremental provided')
+	return incremental
+
 def is_valid_reference(ref):
 	""" Checks if reference is correct """
 	references = 'first', 'average', 'experimental'
@@ -316,6 +444,22 @@ def setup_structure(out_log):
 
 	return instructions_list
 
+def get_setup_instructions(biobb, container_io_dict, out_log):
+	""" Loads the trajectory and sets up the structure, reading the set up trajectory from the cache or writing it there if cache_path is given """
+	in_params = get_in_parameters(biobb.in_parameters, out_log)
+	setup_list = setup_structure(out_log)
+	instructions_list = ['parm ' + container_io_dict["in"]["input_top_path"], 'trajin ' + container_io_dict["in"]["input_traj_path"] + ' ' + in_params]
+	if not getattr(biobb, 'cache_path', None) or biobb.container_path:
+		return instructions_list + setup_list
+	key = get_structure_key(biobb, in_params, setup_list)
+	cached = get_cached_structure(biobb, key, out_log)
+	if cached:
+		# frames of the cached trajectory are already in range and set up
+		return ['parm ' + cached[0], 'trajin ' + cached[1]]
+	top_path, traj_path = new_structure(biobb, key)
+	setup_list[-1] += ' parmout ' + top_path
+	return instructions_list + setup_list + ['outtraj ' + traj_path + ' netcdf']
+
 def get_negative_mask(key, out_log):
 	""" Gives the negative mask according to the given key """
 	atoms, msg = get_mask_atoms(key)
@@ -417,6 +561,58 @@ def get_reference_rms(ref, output_cpptraj_path, input_exp_path, mask, output, cl
 
 	return instructions_list
 
+def get_analysis_key(analysis, index):
+	""" Gives the io_dict key of the output of the given analysis """
+	return 'output_%s_%d_path' % (analysis.get('type'), index)
+
+def get_analysis_reference(analysis, out_log):
+	""" Gives the reference of the given analysis, or the default one if not valid """
+	ref = analysis.get('reference')
+	if not ref or ref == 'None':
+		ref = get_default_value('reference')
+		fu.log('No reference provided for analysis %s, assigned default value: %s' % (analysis['type'], get_default_value('reference')), out_log)
+	if not is_valid_reference(ref):
+		fu.log('Reference %s is not compatible, assigned default value: %s' % (ref, get_default_value('reference')), out_log)
+		ref = get_default_value('reference')
+	return ref
+
+def get_analysis_fit(ref, mask):
+	""" Gives the rms instruction fitting the coordinates to the given reference """
+	if ref == 'average':
+		return 'rms ref ' + get_default_value('average') + ' ' + mask
+	if ref == 'experimental':
+		return 'rms reference ' + mask
+	return 'rms first ' + mask
+
+def get_analysis_instructions(analysis, output_path, out_log):
+	""" Gives the cpptraj instructions of a single analysis of a multi-analysis session """
+	instructions_list = []
+	mask = get_mask(analysis.get('mask', get_default_value('mask')), out_log)
+
+	if analysis['type'] == 'rms':
+		flags = ['nomod']
+		if analysis.get('nofit', False):
+			flags.append('nofit')
+		if analysis.get('norotate', False):
+			flags.append('norotate')
+		instructions_list.append(get_analysis_fit(analysis['reference'], mask) + ' out ' + output_path + ' ' + ' '.join(flags))
+
+	if analysis['type'] == 'rgyr':
+		instructions_list.append('radgyr ' + mask + ' time 1 out ' + output_path)
+
+	if analysis['type'] == 'average':
+		out_params = get_out_parameters({ 'format': analysis.get('format', 'pdb') }, out_log)
+		instructions_list.append('average ' + output_path + ' ' + mask + ' ' + out_params)
+
+	if analysis['type'] in ('rmsf', 'bfactor'):
+		instructions_list.append(get_analysis_fit(analysis['reference'], mask))
+		atomicfluct = 'atomicfluct out ' + output_path + ' ' + mask + ' byres'
+		if analysis['type'] == 'bfactor':
+			atomicfluct += ' bfactor'
+		instructions_list.append(atomicfluct)
+
+	return instructions_list
+
 def get_out_parameters(list, out_log):
 	""" Return string with output parameters """
 	format = list['format']
@@ -438,9 +634,309 @@ def copy_instructions_file_to_container(instructions_file, unique_dir):
 def remove_tmp_files(list, remove_tmp, out_log, input_top_path_orig = None, input_top_path = None):
 	""" Removes temporal files generated by the wrapper """
 	tmp_files = list
-	if zipfile.is_zipfile(input_top_path_orig):
-		tmp_files.append(PurePath(input_top_path).parent)
+	release_top_path(input_top_path, input_top_path_orig, remove_tmp, out_log)
 
 	if remove_tmp:
 		removed_files = [f for f in tmp_files if fu.rm(f)]
-		fu.log('Removed: %s' % str(removed_files), out_log)
\ No newline at end of file
+		fu.log('Removed: %s' % str(removed_files), out_log)
+
+def get_trajectory_length(binary_path, input_top_path, input_traj_path, out_log):
+	""" Gives the number of frames of a trajectory, as printed by cpptraj -tl """
+	process = subprocess.run([binary_path, '-p', input_top_path, '-y', input_traj_path, '-tl'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+	match = re.search(r'Frames:\s*(\d+)', process.stdout.decode('utf-8', errors='replace'))
+	if process.returncode or not match:
+		fu.log('Number of frames of %s could not be read' % input_traj_path, out_log)
+		return None
+	return int(match.group(1))
+
+def get_frame_chunks(start, end, step, n_frames, n_workers):
+	""" Splits the 1-based start, end (-1 meaning last frame) and step range into at most n_workers contiguous (start, end) chunks """
+	last = n_frames if end == -1 else min(end, n_frames)
+	if start > last:
+		return []
+	n_selected = (last - start) // step + 1
+	n_chunks = min(n_workers, n_selected)
+	chunks = []
+	first = 0
+	for i in range(n_chunks):
+		size = n_selected // n_chunks + (1 if i < n_selected % n_chunks else 0)
+		chunks.append((start + first * step, start + (first + size - 1) * step))
+		first += size
+	return chunks
+
+def get_chunk_instructions(instructions_list, chunk, step, reference_frame, output_path, part_path, parmout=None):
+	""" Gives the instructions of a session processing a chunk of frames.
+
+	Sessions of later chunks first load the reference frame, so that actions referring to the first frame give the same results as a single session, the output of this frame is dropped when merging.
+	"""
+	chunk_list = []
+	strip_index = None
+	for line in instructions_list:
+		if line.startswith('trajin '):
+			traj = line.split()[1]
+			if reference_frame is not None:
+				chunk_list.append('trajin %s %d %d 1' % (traj, reference_frame, reference_frame))
+			chunk_list.append('trajin %s %d %d %d' % (traj, chunk[0], chunk[1], step))
+			continue
+		if line.startswith('strip '):
+			strip_index = len(chunk_list)
+		chunk_list.append(line.replace(output_path, part_path))
+	# the topology of the output trajectory is written once all the atoms are stripped
+	if parmout and strip_index is not None:
+		chunk_list[strip_index] += ' parmout ' + parmout
+	return chunk_list
+
+def merge_dat_files(part_paths, output_path):
+	""" Merges cpptraj data files of consecutive chunks in order, dropping the reference frame of later chunks and renumbering the frames """
+	frame = 0
+	with open(output_path, 'w') as out:
+		for i, part_path in enumerate(part_paths):
+			with open(part_path) as part:
+				lines = [line for line in part if line.strip()]
+			if i == 0:
+				out.write(lines[0])
+			for line in lines[1 if i == 0 else 2:]:
+				frame += 1
+				out.write('%8i' % frame + line[8:])
+
+def get_merge_instructions(input_top_path, part_paths, output_path, out_params):
+	""" Gives the instructions of a session concatenating the trajectories of consecutive chunks in order, dropping the reference frame of later chunks """
+	instructions_list = ['parm ' + input_top_path]
+	for i, part_path in enumerate(part_paths):
+		instructions_list.append('trajin ' + part_path + ('' if i == 0 else ' 2 last 1'))
+	instructions_list.append('trajout ' + output_path + ' ' + out_params)
+	return instructions_list
+
+def is_chunkable(biobb, out_log):
+	""" Checks if the frames of a block can be split among several cpptraj processes """
+	if biobb.n_workers <= 1:
+		return False
+	if biobb.container_path:
+		fu.log('n_workers is not available for container executions, running a single cpptraj process', out_log)
+		return False
+	with open(biobb.instructions_file) as instructions:
+		instructions_list = [line.strip() for line in instructions if line.strip()]
+	if 'run' in instructions_list:
+		fu.log('Instructions need all the frames at once, running a single cpptraj process', out_log)
+		return False
+	if any(line.startswith('outtraj ') for line in instructions_list):
+		fu.log('Set up trajectory is written to the cache, running a single cpptraj process', out_log)
+		return False
+	if not any(line.startswith('trajout ') for line in instructions_list) and PurePath(biobb.stage_io_dict["out"]["output_cpptraj_path"]).suffix != '.dat':
+		fu.log('Only dat outputs can be merged, running a single cpptraj process', out_log)
+		return False
+	return True
+
+@profiled('run_biobb')
+def run_frame_chunks(biobb, out_log, err_log):
+	""" Runs the instructions of a block in n_workers cpptraj processes, each one processing a contiguous chunk of frames, and merges their outputs in order """
+	with open(biobb.instructions_file) as instructions:
+		instructions_list = [line.strip() for line in instructions if line.strip()]
+	trajin = next(line for line in instructions_list if line.startswith('trajin ')).split()
+	start, end, step = (int(v) for v in trajin[2:5]) if len(trajin) >= 5 else (1, -1, 1)
+	input_top_path = next(line for line in instructions_list if line.startswith('parm ')).split(None, 1)[1]
+	n_frames = get_trajectory_length(biobb.binary_path, input_top_path, trajin[1], out_log)
+	chunks = get_frame_chunks(start, end, step, n_frames, biobb.n_workers) if n_frames else []
+	if len(chunks) < 2:
+		fu.log('Frames can not be split, running a single cpptraj process', out_log)
+		biobb.run_biobb()
+		return biobb.return_code
+	fu.log('Splitting %d frames in %d chunks of frames' % (n_frames, len(chunks)), out_log)
+
+	# one instructions file and one partial output per chunk
+	output_path = biobb.stage_io_dict["out"]["output_cpptraj_path"]
+	trajout = any(line.startswith('trajout ') for line in instructions_list)
+	unique_dir = PurePath(biobb.instructions_file).parent
+	parmout = str(unique_dir.joinpath('chunk.parm7'))
+	part_paths, cmds = [], []
+	for i, chunk in enumerate(chunks):
+		part_path = str(unique_dir.joinpath('chunk_%d%s' % (i, PurePath(output_path).suffix)))
+		chunk_list = get_chunk_instructions(instructions_list, chunk, step, None if i == 0 else start, output_path, part_path,
+		                                    parmout if trajout and i == 0 else None)
+		chunk_file = str(unique_dir.joinpath('chunk_%d.in' % i))
+		with open(chunk_file, 'w') as chunk_in:
+			for line in chunk_list:
+				chunk_in.write(line + '\n')
+		part_paths.append(part_path)
+		cmds.append([biobb.binary_path, '-i', chunk_file])
+
+	# every worker thread waits for its own cpptraj process, accounted to the block
+	with ThreadPoolExecutor(max_workers=len(cmds)) as executor:
+		return_codes = list(executor.map(bind_accounting(lambda cmd: cmd_wrapper.CmdWrapper(cmd, out_log=out_log, err_log=err_log).launch()), cmds))
+	if any(return_codes):
+		fu.log('cpptraj failed processing a chunk of frames, exit codes: %s' % return_codes, out_log)
+		return next(code for code in return_codes if code)
+
+	if not trajout:
+		merge_dat_files(part_paths, output_path)
+		return 0
+	out_params = next(line for line in instructions_list if line.startswith('trajout ')).split(None, 2)[2:]
+	merge_top_path = parmout if Path(parmout).exists() else input_top_path
+	merge_file = str(unique_dir.joinpath('merge.in'))
+	with open(merge_file, 'w') as merge_in:
+		for line in get_merge_instructions(merge_top_path, part_paths, output_path, ' '.join(out_params)):
+			merge_in.write(line.strip() + '\n')
+	return cmd_wrapper.CmdWrapper([biobb.binary_path, '-i', merge_file], out_log=out_log, err_log=err_log).launch()
+
+# commands resetting the state of a warm cpptraj process between blocks, keeping its topology
+WARM_RESET = ['clear trajin', 'clear trajout', 'clear ref', 'clear actions', 'clear analysis', 'clear datafile', 'clear dataset']
+# prompts printed by cpptraj in interactive mode before the output of every command
+WARM_PROMPT = re.compile(r'^(\s*>\s?)+')
+
+class CpptrajWorker:
+	""" Long-lived cpptraj process in interactive mode, with a topology loaded once and driven through its standard input """
+
+	def __init__(self, binary_path, input_top_path, timeout):
+		cmd = [binary_path, '--interactive']
+		# on a pipe the output of cpptraj is block-buffered, it is line-buffered through stdbuf where available
+		stdbuf = shutil.which('stdbuf')
+		if stdbuf:
+			cmd = [stdbuf, '-oL', '-eL'] + cmd
+		self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=0)
+		self.timeout = timeout
+		self.buffer = b''
+		try:
+			self.send(['noprogress', 'noexitonerror', 'parm ' + input_top_path])
+		except subprocess.TimeoutExpired:
+			self.kill()
+			raise
+
+	def alive(self):
+		""" Checks whether the cpptraj process is still running """
+		return self.process.poll() is None
+
+	def read_lines(self, deadline):
+		""" Gives the complete lines of output of the cpptraj process, without prompts, as they are printed until deadline; raises subprocess.TimeoutExpired once exceeded """
+		fd = self.process.stdout.fileno()
+		while True:
+			while b'\n' in self.buffer:
+				line, self.buffer = self.buffer.split(b'\n', 1)
+				yield WARM_PROMPT.sub('', line.decode('utf-8', errors='replace').rstrip('\r'))
+			remaining = deadline - time.monotonic()
+			if remaining <= 0:
+				raise subprocess.TimeoutExpired(self.process.args, self.timeout)
+			if not select.select([fd], [], [], remaining)[0]:
+				continue
+			chunk = os.read(fd, 65536)
+			if not chunk:
+				# the process exited, its last line may not be complete
+				if self.buffer:
+					line, self.buffer = self.buffer, b''
+					yield WARM_PROMPT.sub('', line.decode('utf-8', errors='replace'))
+				return
+			self.buffer += chunk
+
+	def send(self, instructions_list):
+		""" Runs the instructions, returns the cpptraj output and whether any error was reported; raises subprocess.TimeoutExpired if they are not done in timeout seconds """
+		# an unknown command is echoed back once all the previous ones are done
+		token = 'biobb_done_' + uuid.uuid4().hex
+		try:
+			self.process.stdin.write(''.join(line + '\n' for line in instructions_list + [token]).encode('utf-8'))
+			self.process.stdin.flush()
+		except OSError:
+			return [], True
+		output, error = [], False
+		for line in self.read_lines(time.monotonic() + self.timeout):
+			if token in line:
+				return output, error
+			output.append(line)
+			error = error or line.lstrip().startswith('Error')
+		return output, True
+
+	def kill(self):
+		""" Kills the cpptraj process """
+		self.process.kill()
+		self.process.wait()
+
+	def close(self):
+		""" Quits the cpptraj process """
+		if self.alive():
+			try:
+				self.process.communicate(b'quit\n', timeout=10)
+			except (subprocess.TimeoutExpired, OSError):
+				self.kill()
+
+# idle warm cpptraj processes, by binary and topology contents
+_warm_workers = {}
+_warm_lock = threading.Lock()
+
+@atexit.register
+def close_warm_workers():
+	""" Quits all the idle warm cpptraj processes """
+	with _warm_lock:
+		for workers in _warm_workers.values():
+			for worker in workers:
+				worker.close()
+		_warm_workers.clear()
+
+def is_warm_runnable(biobb, out_log):
+	""" Checks if the instructions of a block can be run by a warm cpptraj process """
+	if not getattr(biobb, 'warm_pool', False):
+		return False
+	if biobb.container_path:
+		fu.log('warm_pool is not available for container executions, running a new cpptraj process', out_log)
+		return False
+	with open(biobb.instructions_file) as instructions:
+		parms = [line for line in instructions if line.strip().startswith('parm ')]
+	if len(parms) != 1:
+		fu.log('Instructions do not load a single topology, running a new cpptraj process', out_log)
+		return False
+	return True
+
+@profiled('run_biobb')
+def run_warm_worker(biobb, out_log, err_log):
+	""" Runs the instructions of a block in an idle warm cpptraj process with the same topology, started if there is none; in a new cpptraj process if the warm one does not run them in warm_timeout seconds """
+	with open(biobb.instructions_file) as instructions:
+		instructions_list = [line.strip() for line in instructions if line.strip()]
+	input_top_path = next(line for line in instructions_list if line.startswith('parm ')).split(None, 1)[1]
+	key = (biobb.binary_path, hash_file(input_top_path))
+	timeout = getattr(biobb, 'warm_timeout', get_default_value('warm_timeout'))
+	with _warm_lock:
+		workers = _warm_workers.setdefault(key, [])
+		worker = workers.pop() if workers else None
+
+	# the topology is already loaded, cpptraj only runs explicitly in interactive mode
+	block = [line for line in instructions_list if not line.startswith('parm ')]
+	if 'run' not in block:
+		block.append('run')
+	try:
+		if worker is None or not worker.alive():
+			fu.log('Starting a warm cpptraj process for %s' % input_top_path, out_log)
+			worker = CpptrajWorker(biobb.binary_path, input_top_path, timeout)
+		else:
+			fu.log('Running the instructions in a warm cpptraj process', out_log)
+			worker.timeout = timeout
+		# the warm process is not reaped by the block, its usage is the one of the instructions
+		usage = read_process_usage(worker.process.pid) if get_accounting() else None
+		try:
+			output, error = worker.send(block)
+		except subprocess.TimeoutExpired:
+			worker.kill()
+			raise
+		if usage:
+			add_process_usage(usage, read_process_usage(worker.process.pid))
+	except subprocess.TimeoutExpired:
+		fu.log('Warm cpptraj process did not run the instructions in %s seconds, killed, running a new cpptraj process' % timeout, out_log)
+		biobb.run_biobb()
+		return biobb.return_code
+	for line in output:
+		fu.log(line, out_log)
+	if error or not worker.alive():
+		# the state of a failed process is unknown, it is not reused
+		worker.close()
+		fu.log('cpptraj reported errors running the instructions', out_log)
+		biobb.return_code = 1
+		return biobb.return_code
+
+	# the process is only reused if its state could be reset
+	try:
+		_, error = worker.send(WARM_RESET)
+	except subprocess.TimeoutExpired:
+		error = True
+	if error or not worker.alive():
+		worker.kill()
+	else:
+		with _warm_lock:
+			_warm_workers.setdefault(key, []).append(worker)
+	biobb.return_code = 0
+	return biobb.return_code
@@ -7,6 +7,12 @@ from biobb_common.configuration import  settings
 from biobb_common.tools import file_utils as fu
 from biobb_common.tools.file_utils import launchlogger
 from biobb_analysis.ambertools.common import *
+from biobb_analysis.cache.results import restore_cache, store_cache
+from biobb_analysis.cache.structure import store_structure
+from biobb_analysis.staging.files import stage_files, copy_to_host
+from biobb_analysis.container.session import run_biobb
+from biobb_analysis.profiling.phases import profile_launch
+from biobb_analysis.batch.runner import is_batch, run_batch
 
 
 class CpptrajAverage(BiobbObject):
@@ -25,15 +31,24 @@ class CpptrajAverage(BiobbObject):
             * **steps** (*int*) - (1) [1~100000|1] Step for slicing.
             * **mask** (*str*) - ("all-atoms") Mask definition. Values: c-alpha (All c-alpha atoms; protein only), backbone (Backbone atoms), all-atoms (All system atoms), heavy-atoms (System heavy atoms; not hydrogen), side-chain (All not backbone atoms), solute (All system atoms except solvent atoms), ions (All ion molecules), solvent (All solvent atoms), AnyAmberFromatMask (Amber atom selection syntax like `@*`).
             * **format** (*str*) - ("netcdf") Output trajectory format. Values: crd (AMBER trajectory format), cdf (Format used by netCDF software library for writing and reading chromatography-MS data files), netcdf (Format used by netCDF software library for writing and reading chromatography-MS data files), nc (Format used by netCDF software library for writing and reading chromatography-MS data files), restart (AMBER coordinate/restart file with 6 coordinates per line), ncrestart (AMBER coordinate/restart file with 6 coordinates per line), restartnc (AMBER coordinate/restart file with 6 coordinates per line), dcd (AMBER trajectory format), charmm (Format of CHARMM Residue Topology Files (RTF)), cor (Charmm COR), pdb (Protein Data Bank format), mol2 (Complete and portable representation of a SYBYL molecule), trr (Trajectory of a simulation experiment used by GROMACS), gro (GROMACS structure), binpos (Translation of the ASCII atom coordinate format to binary code), xtc (Portable binary format for trajectories produced by GROMACS package), cif (Entry format of PDB database in mmCIF format), arc (Tinker ARC), sqm (SQM Input), sdf (One of a family of chemical-data file formats developed by MDL Information Systems), conflib (LMOD Conflib).
+            * **warm_pool** (*bool*) - (False) Run the instructions in an idle long-lived cpptraj process in interactive mode that already loaded the same topology; started if there is none; instead of a new cpptraj process. Not for container executions.
+            * **warm_timeout** (*float*) - (600) [1~86400|1] Seconds a warm cpptraj process is given to run the instructions; it is killed and the instructions are run by a new cpptraj process once exceeded.
+            * **batch_workers** (*int*) - (4) [1~256|1] Number of inputs processed at the same time when a list or a glob pattern of trajectories is given.
             * **binary_path** (*str*) - ("cpptraj") Path to the cpptraj executable binary.
             * **remove_tmp** (*bool*) - (True) [WF property] Remove temporal files.
             * **restart** (*bool*) - (False) [WF property] Do not execute if output files exist.
+            * **cache_path** (*str*) - (None) [WF property] Path to the result cache directory; outputs already computed from the same input files; properties and software are restored from it instead of recomputed. The centered; imaged; fitted and stripped trajectory is kept there too; in single precision; and read by later analyses of the same trajectory and frames. Disabled if None.
+            * **cache_size** (*int*) - (1024) [1~1000000|1] [WF property] Maximum size in MB of the result cache; the least recently used results are evicted.
+            * **staging** (*str*) - ("copy") [WF property] How the files are staged into the temporary directory. Values: copy (Inputs and outputs are copied), link (Inputs are hard-linked; symlinked across file systems and bind-mounted read-only in docker or singularity executions; outputs are moved to their host paths and copied only across file systems).
+            * **profile_path** (*str*) - (None) [WF property] Path to the JSON lines file where a record of the launch is appended: the time and the bytes read and written of each of its phases (checks; staging; instructions; run; copy to host and removal of temporary files). Disabled if None.
+            * **prometheus_path** (*str*) - (None) [WF property] Path to the Prometheus textfile collector file (.prom) where the resource usage of the child processes of the launch (CPU user and system time; peak RSS; context switches and block I/O) is written; by block and step. Disabled if None.
             * **container_path** (*str*) - (None) Container path definition.
             * **container_image** (*str*) - ('afandiadib/ambertools:serial') Container image definition.
             * **container_volume_path** (*str*) - ('/tmp') Container volume path definition.
             * **container_working_dir** (*str*) - (None) Container working directory definition.
             * **container_user_id** (*str*) - (None) Container user_id definition.
             * **container_shell_path** (*str*) - ('/bin/bash') Path to default shell inside the container.
+            * **container_session** (*bool*) - (False) Run the command through exec in a long-lived container started once per container image; volume path and user id and reused by later blocks; instead of a new container. Only for docker and singularity.
 
     Examples:
         This is a use example of how to use the building block from Python::
@@ -84,7 +99,16 @@ class CpptrajAverage(BiobbObject):
         self.mask = properties.get('mask', 'all-atoms')
         self.format = properties.get('format', 'netcdf')
         self.properties = properties
+        self.cache_path = properties.get('cache_path')
+        self.cache_size = properties.get('cache_size', 1024)
+        self.staging = properties.get('staging', 'copy')
+        self.profile_path = properties.get('profile_path')
+        self.prometheus_path = properties.get('prometheus_path')
+        self.container_session = properties.get('container_session', False)
+        self.batch_workers = properties.get('batch_workers', 4)
         self.binary_path = get_binary_path(properties, 'binary_path')
+        self.warm_pool = properties.get('warm_pool', False)
+        self.warm_timeout = properties.get('warm_timeout', 600)
 
         # Check the properties
         self.check_properties(properties)
@@ -97,6 +121,8 @@ class CpptrajAverage(BiobbObject):
         self.io_dict["out"]["output_cpptraj_path"] = check_out_path(self.io_dict["out"]["output_cpptraj_path"], out_log, self.__class__.__name__)
         self.in_parameters = { 'start': self.start, 'end': self.end, 'step': self.steps, 'mask': self.mask }
         self.out_parameters = { 'format': self.format }
+        self.warm_pool = get_warm_pool(self.properties, out_log, self.__class__.__name__)
+        self.warm_timeout = get_warm_timeout(self.properties, out_log, self.__class__.__name__)
 
     def create_instructions_file(self, container_io_dict, out_log, err_log):
         """Creates an input file using the properties file settings"""
@@ -108,15 +134,8 @@ class CpptrajAverage(BiobbObject):
             self.instructions_file = str(PurePath(fu.create_unique_dir()).joinpath(self.instructions_file))
         fu.create_name(prefix=self.prefix, step=self.step, name=self.instructions_file)
 
-        # parm
-        instructions_list.append('parm ' + container_io_dict["in"]["input_top_path"])
-
-        # trajin
-        in_params = get_in_parameters(self.in_parameters, out_log)
-        instructions_list.append('trajin ' + container_io_dict["in"]["input_traj_path"] + ' ' + in_params)
-
-        # Set up
-        instructions_list += setup_structure(self)
+        # parm, trajin and set up, the set up trajectory being read from the cache if already there
+        instructions_list += get_setup_instructions(self, container_io_dict, out_log)
 
         # mask
         mask = self.in_parameters.get('mask', '')
@@ -136,46 +155,66 @@ class CpptrajAverage(BiobbObject):
         return self.instructions_file
 
     @launchlogger
+    @profile_launch
     def launch(self) -> int:
         """Execute the :class:`CpptrajAverage <ambertools.cpptraj_average.CpptrajAverage>` ambertools.cpptraj_average.CpptrajAverage object."""
 
         # check input/output paths and parameters
         self.check_data_params(self.out_log, self.err_log)
 
-        # Setup Biobb
-        if self.check_restart(): return 0
-        self.stage_files()
+        # the topology extracted from a zip is released whatever the outcome
+        try:
+            # Setup Biobb
+            if self.check_restart(): return 0
+            if restore_cache(self, self.out_log): return 0
+            stage_files(self, self.out_log)
 
-        # create instructions file
-        self.create_instructions_file(self.stage_io_dict, self.out_log, self.err_log) 
+            # create instructions file
+            self.create_instructions_file(self.stage_io_dict, self.out_log, self.err_log) 
 
-        # if container execution, copy intructions file to container
-        if self.container_path:
-            copy_instructions_file_to_container(self.instructions_file, self.stage_io_dict['unique_dir'])
+            # if container execution, copy intructions file to container
+            if self.container_path:
+                copy_instructions_file_to_container(self.instructions_file, self.stage_io_dict['unique_dir'])
 
-        # create cmd and launch execution
-        self.cmd = [self.binary_path, '-i', self.instructions_file]
+            # create cmd and launch execution
+            self.cmd = [self.binary_path, '-i', self.instructions_file]
 
-        # Run Biobb block
-        self.run_biobb()
+            # Run Biobb block, in a warm cpptraj process if possible
+            if is_warm_runnable(self, self.out_log):
+                run_warm_worker(self, self.out_log, self.err_log)
+            else:
+                run_biobb(self, self.out_log, self.err_log)
 
-        # Copy files to host
-        self.copy_to_host()
+            # Store the set up trajectory for later analyses of the same trajectory
+            store_structure(self, self.out_log)
 
-        # remove temporary folder(s)
-        self.tmp_files.extend([
-            self.stage_io_dict.get("unique_dir"),
-            PurePath(self.instructions_file).parent
-        ])
-        self.remove_tmp_files()
+            # Copy files to host
+            copy_to_host(self, self.out_log)
 
-        self.check_arguments(output_files_created=True, raise_exception=False)
+            # remove temporary folder(s)
+            self.tmp_files.extend([
+                self.stage_io_dict.get("unique_dir"),
+                PurePath(self.instructions_file).parent
+            ])
+            self.remove_tmp_files()
 
-        return self.return_code
+            self.check_arguments(output_files_created=True, raise_exception=False)
+
+            # Store the outputs in the result cache
+            store_cache(self, self.out_log)
+
+            return self.return_code
+        finally:
+            release_top_path(self.io_dict["in"]["input_top_path"], self.input_top_path_orig, self.remove_tmp, self.out_log)
 
 def cpptraj_average(input_top_path: str, input_traj_path: str, output_cpptraj_path: str, properties: dict = None, **kwargs) -> int:
     """Execute the :class:`CpptrajAverage <ambertools.cpptraj_average.CpptrajAverage>` class and
-    execute the :meth:`launch() <ambertools.cpptraj_average.CpptrajAverage.launch>` method."""
+    execute the :meth:`launch() <ambertools.cpptraj_average.CpptrajAverage.launch>` method.
+    input_traj_path can also be a list or a glob pattern of trajectories, each one processed by
+    :func:`run_batch() <batch.runner.run_batch>` with its own outputs."""
+
+    if is_batch(input_traj_path):
+        return run_batch(CpptrajAverage, 'input_traj_path', properties=properties, input_top_path=input_top_path, input_traj_path=input_traj_path, output_cpptraj_path=output_cpptraj_path, **kwargs)
 
     return CpptrajAverage(input_top_path=input_top_path, 
                     input_traj_path=input_traj_path, 
@@ -190,7 +229,9 @@ def main():
     # Specific args of each building block
     required_args = parser.add_argument_group('required arguments')
     required_args.add_argument('--input_top_path', required=True, help='Path to the input structure or topology file. Accepted formats: top, pdb, prmtop, parmtop, zip.')
-    required_args.add_argument('--input_traj_path', required=True, help='Path to the input trajectory to be processed. Accepted formats: crd, cdf, netcdf, restart, ncrestart, restartnc, dcd, charmm, cor, pdb, mol2, trr, gro, binpos, xtc, cif, arc, sqm, sdf, conflib.')
+    batch_args = required_args.add_mutually_exclusive_group(required=True)
+    batch_args.add_argument('--input_traj_path', help='Path to the input trajectory to be processed. Accepted formats: crd, cdf, netcdf, restart, ncrestart, restartnc, dcd, charmm, cor, pdb, mol2, trr, gro, binpos, xtc, cif, arc, sqm, sdf, conflib.')
+    batch_args.add_argument('--input_traj_glob', help='Glob pattern of the trajectories to be processed in batch; every one gets its own outputs; named after them; and a manifest.')
     required_args.add_argument('--output_cpptraj_path', required=True, help='Path to the output processed structure. Accepted formats: crd, netcdf, rst7, ncrst, dcd, pdb, mol2, binpos, trr, xtc, sqm.')
 
     args = parser.parse_args()
@@ -199,7 +240,7 @@ def main():
 
     # Specific call of each building block
     cpptraj_average(input_top_path=args.input_top_path, 
-                    input_traj_path=args.input_traj_path, 
+                    input_traj_path=args.input_traj_path or args.input_traj_glob, 
                     output_cpptraj_path=args.output_cpptraj_path, 
                     properties=properties)
 
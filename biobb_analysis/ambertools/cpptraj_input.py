@@ -7,6 +7,7 @@ from biobb_common.configuration import  settings
 from biobb_common.tools import file_utils as fu
 from biobb_common.tools.file_utils import launchlogger
 from biobb_analysis.ambertools.common import *
+from biobb_analysis.profiling.phases import profile_launch
 
 
 class CpptrajInput(BiobbObject):
@@ -21,6 +22,8 @@ class CpptrajInput(BiobbObject):
             * **binary_path** (*str*) - ("cpptraj") Path to the cpptraj executable binary.
             * **remove_tmp** (*bool*) - (True) [WF property] Remove temporal files.
             * **restart** (*bool*) - (False) [WF property] Do not execute if output files exist.
+            * **profile_path** (*str*) - (None) [WF property] Path to the JSON lines file where a record of the launch is appended: the time and the bytes read and written of each of its phases (checks; staging; instructions; run; copy to host and removal of temporary files). Disabled if None.
+            * **prometheus_path** (*str*) - (None) [WF property] Path to the Prometheus textfile collector file (.prom) where the resource usage of the child processes of the launch (CPU user and system time; peak RSS; context switches and block I/O) is written; by block and step. Disabled if None.
 
     Examples:
         This is a use example of how to use the building block from Python::
@@ -55,6 +58,8 @@ class CpptrajInput(BiobbObject):
         self.output_cpptraj_path = kwargs.get('output_cpptraj_path')
         self.properties = properties
         self.binary_path = properties.get('binary_path', 'cpptraj')
+        self.profile_path = properties.get('profile_path')
+        self.prometheus_path = properties.get('prometheus_path')
 
         # Check the properties
         self.check_properties(properties)
@@ -75,6 +80,7 @@ class CpptrajInput(BiobbObject):
         return output_instructions_path
 
     @launchlogger
+    @profile_launch
     def launch(self) -> int:
         """Execute the :class:`CpptrajInput <ambertools.cpptraj_input.CpptrajInput>` ambertools.cpptraj_input.CpptrajInput object."""
         
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+
+"""Module containing the Cpptraj Multi class and the command line interface."""
+import argparse
+from biobb_common.generic.biobb_object import BiobbObject
+from biobb_common.configuration import  settings
+from biobb_common.tools import file_utils as fu
+from biobb_common.tools.file_utils import launchlogger
+from biobb_analysis.ambertools.common import *
+from biobb_analysis.cache.results import restore_cache, store_cache
+from biobb_analysis.staging.files import stage_files, copy_to_host
+from biobb_analysis.container.session import run_biobb
+from biobb_analysis.profiling.phases import profile_launch
+
+
+class CpptrajMulti(BiobbObject):
+    """
+    | biobb_analysis CpptrajMulti
+    | Wrapper of the Ambertools Cpptraj module for performing several analyses (RMSd, RMSf, Rgyr, B-factor and average structure) of a given cpptraj compatible trajectory in a single session.
+    | Cpptraj (the successor to ptraj) is the main program in Ambertools for processing coordinate trajectories and data files. All the analyses share the same topology, trajectory and setup (center, autoimage, fit and solvent strip), so the trajectory is read only once (twice if any analysis uses the average reference). The parameter names and defaults are the same as the ones in the official `Cpptraj manual <https://amber-md.github.io/cpptraj/CPPTRAJ.xhtml>`_.
+
+    Args:
+        input_top_path (str): Path to the input structure or topology file. File type: input. `Sample file <https://github.com/bioexcel/biobb_analysis/raw/master/biobb_analysis/test/data/ambertools/cpptraj.parm.top>`_. Accepted formats: top (edam:format_3881), pdb (edam:format_1476), prmtop (edam:format_3881), parmtop (edam:format_3881), zip (edam:format_3987).
+        input_traj_path (str): Path to the input trajectory to be processed. File type: input. `Sample file <https://github.com/bioexcel/biobb_analysis/raw/master/biobb_analysis/test/data/ambertools/cpptraj.traj.dcd>`_. Accepted formats: mdcrd (edam:format_3878), crd (edam:format_3878), cdf (edam:format_3650), netcdf (edam:format_3650), nc (edam:format_3650), restart (edam:format_3886), ncrestart (edam:format_3886), restartnc (edam:format_3886), dcd (edam:format_3878), charmm (edam:format_3887), cor (edam:format_2033), pdb (edam:format_1476), mol2 (edam:format_3816), trr (edam:format_3910), gro (edam:format_2033), binpos (edam:format_3885), xtc (edam:format_3875), cif (edam:format_1477), arc (edam:format_2333), sqm (edam:format_2033), sdf (edam:format_3814), conflib (edam:format_2033).
+        input_exp_path (str) (Optional): Path to the experimental reference file (required if any analysis uses reference = experimental). File type: input. `Sample file <https://github.com/bioexcel/biobb_analysis/raw/master/biobb_analysis/test/data/ambertools/experimental.1e5t.pdb>`_. Accepted formats: pdb (edam:format_1476).
+        properties (dic - Python dictionary object containing the tool parameters, not input/output files):
+            * **start** (*int*) - (1) [1~100000|1] Starting frame for slicing
+            * **end** (*int*) - (-1) [-1~100000|1] Ending frame for slicing
+            * **steps** (*int*) - (1) [1~100000|1] Step for slicing
+            * **analyses** (*list*) - ([]) List of analyses to perform. Each analysis is a dictionary with the keys: **type** (rms, rmsf, rgyr, bfactor or average), **output** (path to the output file of the analysis; dat, agr, xmgr or gnu for rms, rmsf, rgyr and bfactor, any cpptraj output format for average), **mask** (same values as the **mask** property of the single analysis blocks, default all-atoms), **reference** (first, average or experimental; rms, rmsf and bfactor only, default first), **nofit** and **norotate** (rms only, default False) and **format** (average only, default pdb).
+            * **warm_pool** (*bool*) - (False) Run the instructions in an idle long-lived cpptraj process in interactive mode that already loaded the same topology; started if there is none; instead of a new cpptraj process. Not for container executions.
+            * **warm_timeout** (*float*) - (600) [1~86400|1] Seconds a warm cpptraj process is given to run the instructions; it is killed and the instructions are run by a new cpptraj process once exceeded.
+            * **binary_path** (*str*) - ("cpptraj") Path to the cpptraj executable binary.
+            * **remove_tmp** (*bool*) - (True) [WF property] Remove temporal files.
+            * **restart** (*bool*) - (False) [WF property] Do not execute if output files exist.
+            * **cache_path** (*str*) - (None) [WF property] Path to the result cache directory; outputs already computed from the same input files; properties and software are restored from it instead of recomputed. Disabled if None.
+            * **cache_size** (*int*) - (1024) [1~1000000|1] [WF property] Maximum size in MB of the result cache; the least recently used results are evicted.
+            * **staging** (*str*) - ("copy") [WF property] How the files are staged into the temporary directory. Values: copy (Inputs and outputs are copied), link (Inputs are hard-linked; symlinked across file systems and bind-mounted read-only in docker or singularity executions; outputs are moved to their host paths and copied only across file systems).
+            * **profile_path** (*str*) - (None) [WF property] Path to the JSON lines file where a record of the launch is appended: the time and the bytes read and written of each of its phases (checks; staging; instructions; run; copy to host and removal of temporary files). Disabled if None.
+            * **prometheus_path** (*str*) - (None) [WF property] Path to the Prometheus textfile collector file (.prom) where the resource usage of the child processes of the launch (CPU user and system time; peak RSS; context switches and block I/O) is written; by block and step. Disabled if None.
+            * **container_path** (*str*) - (None) Container path definition.
+            * **container_image** (*str*) - ('afandiadib/ambertools:serial') Container image definition.
+            * **container_volume_path** (*str*) - ('/tmp') Container volume path definition.
+            * **container_working_dir** (*str*) - (None) Container working directory definition.
+            * **container_user_id** (*str*) - (None) Container user_id definition.
+            * **container_shell_path** (*str*) - ('/bin/bash') Path to default shell inside the container.
+            * **container_session** (*bool*) - (False) Run the command through exec in a long-lived container started once per container image; volume path and user id and reused by later blocks; instead of a new container. Only for docker and singularity.
+
+    Examples:
+        This is a use example of how to use the building block from Python::
+
+            from biobb_analysis.ambertools.cpptraj_multi import cpptraj_multi
+            prop = {
+                'start': 1,
+                'end': -1,
+                'steps': 1,
+                'analyses': [
+                    { 'type': 'rms', 'mask': 'c-alpha', 'reference': 'first', 'output': '/path/to/newRms.dat' },
+                    { 'type': 'rmsf', 'mask': 'backbone', 'reference': 'average', 'output': '/path/to/newRmsf.dat' },
+                    { 'type': 'rgyr', 'mask': 'c-alpha', 'output': '/path/to/newRgyr.dat' },
+                    { 'type': 'average', 'mask': 'solute', 'format': 'pdb', 'output': '/path/to/newAverage.pdb' }
+                ]
+            }
+            cpptraj_multi(input_top_path='/path/to/myTopology.top',
+                        input_traj_path='/path/to/myTrajectory.dcd',
+                        input_exp_path= '/path/to/myExpStructure.pdb',
+                        properties=prop)
+
+    Info:
+        * wrapped_software:
+            * name: Ambertools Cpptraj
+            * version: >=20.0
+            * license: GNU
+        * ontology:
+            * name: EDAM
+            * schema: http://edamontology.org/EDAM.owl
+
+    """
+
+    def __init__(self, input_top_path, input_traj_path,
+                input_exp_path = None, properties=None, **kwargs) -> None:
+        properties = properties or {}
+
+        # Call parent class constructor
+        super().__init__(properties)
+        self.locals_var_dict = locals().copy()
+
+        # Input/Output files
+        self.io_dict = {
+            "in": { "input_top_path": input_top_path, "input_traj_path": input_traj_path, "input_exp_path": input_exp_path },
+            "out": { }
+        }
+
+        # Properties specific for BB
+        self.instructions_file = get_default_value('instructions_file')
+        self.start = properties.get('start', 1)
+        self.end = properties.get('end', -1)
+        self.steps =  properties.get('steps', 1)
+        self.analyses = properties.get('analyses', [])
+        self.properties = properties
+        self.cache_path = properties.get('cache_path')
+        self.cache_size = properties.get('cache_size', 1024)
+        self.staging = properties.get('staging', 'copy')
+        self.profile_path = properties.get('profile_path')
+        self.prometheus_path = properties.get('prometheus_path')
+        self.container_session = properties.get('container_session', False)
+        self.binary_path = get_binary_path(properties, 'binary_path')
+        self.warm_pool = properties.get('warm_pool', False)
+        self.warm_timeout = properties.get('warm_timeout', 600)
+
+        # every analysis output is an output file of the block
+        for index, analysis in enumerate(self.analyses):
+            if isinstance(analysis, dict) and analysis.get('output'):
+                self.io_dict["out"][get_analysis_key(analysis, index)] = analysis['output']
+
+        # Check the properties
+        self.check_properties(properties)
+        self.check_arguments()
+
+    def check_data_params(self, out_log, err_log):
+        """ Checks all the input/output paths and parameters """
+        self.io_dict["in"]["input_top_path"], self.input_top_path_orig = check_top_path(self.io_dict["in"]["input_top_path"], out_log, self.__class__.__name__)
+        self.io_dict["in"]["input_traj_path"] = check_traj_path(self.io_dict["in"]["input_traj_path"], out_log, self.__class__.__name__)
+        self.in_parameters = { 'start': self.start, 'end': self.end, 'step': self.steps }
+
+        if not self.analyses or not isinstance(self.analyses, list):
+            fu.log(self.__class__.__name__ + ': No analyses provided or incorrect format, exiting', out_log)
+            raise SystemExit(self.__class__.__name__ + ': No analyses provided or incorrect format')
+
+        output_names = []
+        analyses = []
+        for index, analysis in enumerate(self.analyses):
+            if not isinstance(analysis, dict) or not is_valid_analysis(analysis.get('type')):
+                fu.log(self.__class__.__name__ + ': Incorrect analysis provided in position %d, exiting' % index, out_log)
+                raise SystemExit(self.__class__.__name__ + ': Incorrect analysis provided in position %d' % index)
+            if not analysis.get('output'):
+                fu.log(self.__class__.__name__ + ': No output provided for analysis %s in position %d, exiting' % (analysis['type'], index), out_log)
+                raise SystemExit(self.__class__.__name__ + ': No output provided for analysis %s in position %d' % (analysis['type'], index))
+            key = get_analysis_key(analysis, index)
+            self.io_dict["out"][key] = check_out_path(self.io_dict["out"][key], out_log, self.__class__.__name__)
+            # all the outputs are written in the same folder when staged
+            output_name = PurePath(analysis['output']).name
+            if output_name in output_names:
+                fu.log(self.__class__.__name__ + ': Output file name %s is repeated, exiting' % output_name, out_log)
+                raise SystemExit(self.__class__.__name__ + ': Output file name %s is repeated' % output_name)
+            output_names.append(output_name)
+            # copy of the analysis with a valid reference
+            analysis = dict(analysis)
+            if analysis['type'] in ('rms', 'rmsf', 'bfactor'):
+                analysis['reference'] = get_analysis_reference(analysis, out_log)
+            analyses.append(analysis)
+        self.analyses = analyses
+        self.warm_pool = get_warm_pool(self.properties, out_log, self.__class__.__name__)
+        self.warm_timeout = get_warm_timeout(self.properties, out_log, self.__class__.__name__)
+
+    def create_instructions_file(self, container_io_dict, out_log, err_log):
+        """Creates an input file using the properties file settings"""
+        instructions_list = []
+        # different path if container execution or not
+        if self.container_path:
+            self.instructions_file = str(PurePath(self.container_volume_path).joinpath(self.instructions_file))
+        else:
+            self.instructions_file = str(PurePath(fu.create_unique_dir()).joinpath(self.instructions_file))
+        fu.create_name(prefix=self.prefix, step=self.step, name=self.instructions_file)
+
+        # parm
+        instructions_list.append('parm ' + container_io_dict["in"]["input_top_path"])
+
+        # trajin
+        in_params = get_in_parameters(self.in_parameters, out_log)
+        instructions_list.append('trajin ' + container_io_dict["in"]["input_traj_path"] + ' ' + in_params)
+
+        references = [analysis.get('reference') for analysis in self.analyses]
+
+        # experimental reference, loaded once for all the analyses
+        if 'experimental' in references:
+            inp_exp_pth = container_io_dict["in"].get("input_exp_path")
+            if not inp_exp_pth:
+                fu.log('No experimental structure provided, exiting', out_log)
+                raise SystemExit(self.__class__.__name__ + ': input_exp_path is mandatory')
+            instructions_list.append('parm ' + inp_exp_pth + ' noconect [exp]')
+            solute = get_mask('solute', out_log)
+            instructions_list.append('reference ' + inp_exp_pth + ' ' + solute + ' parm [exp]')
+
+        # average reference, computed once for all the analyses in a previous pass
+        if 'average' in references:
+            instructions_list += setup_structure(out_log)
+            instructions_list.append('average crdset ' + get_default_value('average'))
+            instructions_list.append('run')
+
+        # Set up
+        instructions_list += setup_structure(out_log)
+
+        # analyses that do not modify the coordinates go first, so all of them see the same frames
+        for index, analysis in enumerate(self.analyses):
+            if analysis['type'] not in ('rmsf', 'bfactor'):
+                instructions_list += get_analysis_instructions(analysis, container_io_dict["out"][get_analysis_key(analysis, index)], out_log)
+
+        # RMSf and B-factor fit the coordinates to their own reference right before the fluctuations are computed
+        for index, analysis in enumerate(self.analyses):
+            if analysis['type'] in ('rmsf', 'bfactor'):
+                instructions_list += get_analysis_instructions(analysis, container_io_dict["out"][get_analysis_key(analysis, index)], out_log)
+
+        # create .in file
+        with open(self.instructions_file, 'w') as mdp:
+            for line in instructions_list:
+                mdp.write(line.strip() + '\n')
+
+        return self.instructions_file
+
+    @launchlogger
+    @profile_launch
+    def launch(self) -> int:
+        """Execute the :class:`CpptrajMulti <ambertools.cpptraj_multi.CpptrajMulti>` ambertools.cpptraj_multi.CpptrajMulti object."""
+
+        # check input/output paths and parameters
+        self.check_data_params(self.out_log, self.err_log)
+
+        # the topology extracted from a zip is released whatever the outcome
+        try:
+            # Setup Biobb
+            if self.check_restart(): return 0
+            if restore_cache(self, self.out_log): return 0
+            stage_files(self, self.out_log)
+
+            # create instructions file
+            self.create_instructions_file(self.stage_io_dict, self.out_log, self.err_log)
+
+            # if container execution, copy intructions file to container
+            if self.container_path:
+                copy_instructions_file_to_container(self.instructions_file, self.stage_io_dict['unique_dir'])
+
+            # create cmd and launch execution
+            self.cmd = [self.binary_path, '-i', self.instructions_file]
+
+            # Run Biobb block, in a warm cpptraj process if possible
+            if is_warm_runnable(self, self.out_log):
+                run_warm_worker(self, self.out_log, self.err_log)
+            else:
+                run_biobb(self, self.out_log, self.err_log)
+
+            # Copy files to host
+            copy_to_host(self, self.out_log)
+
+            # remove temporary folder(s)
+            self.tmp_files.extend([
+                self.stage_io_dict.get("unique_dir"),
+                PurePath(self.instructions_file).parent
+            ])
+            self.remove_tmp_files()
+
+            self.check_arguments(output_files_created=True, raise_exception=False)
+
+            # Store the outputs in the result cache
+            store_cache(self, self.out_log)
+
+            return self.return_code
+        finally:
+            release_top_path(self.io_dict["in"]["input_top_path"], self.input_top_path_orig, self.remove_tmp, self.out_log)
+
+def cpptraj_multi(input_top_path: str, input_traj_path: str, input_exp_path: str = None, properties: dict = None, **kwargs) -> int:
+    """Execute the :class:`CpptrajMulti <ambertools.cpptraj_multi.CpptrajMulti>` class and
+    execute the :meth:`launch() <ambertools.cpptraj_multi.CpptrajMulti.launch>` method."""
+
+    return CpptrajMulti(input_top_path=input_top_path,
+                    input_traj_path=input_traj_path,
+                    input_exp_path=input_exp_path,
+                    properties=properties, **kwargs).launch()
+
+def main():
+    """Command line execution of this building block. Please check the command line documentation."""
+    parser = argparse.ArgumentParser(description="Performs several analyses (RMSd, RMSf, Rgyr, B-factor and average structure) of a given cpptraj compatible trajectory in a single session.", formatter_class=lambda prog: argparse.RawTextHelpFormatter(prog, width=99999))
+    parser.add_argument('--config', required=True, help='Configuration file. The analyses to perform and their outputs are defined in the analyses property.')
+
+    # Specific args of each building block
+    required_args = parser.add_argument_group('required arguments')
+    required_args.add_argument('--input_top_path', required=True, help='Path to the input structure or topology file. Accepted formats: top, pdb, prmtop, parmtop, zip.')
+    required_args.add_argument('--input_traj_path', required=True, help='Path to the input trajectory to be processed. Accepted formats: crd, cdf, netcdf, restart, ncrestart, restartnc, dcd, charmm, cor, pdb, mol2, trr, gro, binpos, xtc, cif, arc, sqm, sdf, conflib.')
+    parser.add_argument('--input_exp_path', required=False, help='Path to the experimental reference file (required if any analysis uses reference = experimental).')
+
+    args = parser.parse_args()
+    properties = settings.ConfReader(config=args.config).get_prop_dic()
+
+    # Specific call of each building block
+    cpptraj_multi(input_top_path=args.input_top_path,
+                input_traj_path=args.input_traj_path,
+                input_exp_path=args.input_exp_path,
+                properties=properties)
+
+if __name__ == '__main__':
+    main()
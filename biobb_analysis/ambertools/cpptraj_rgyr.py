@@ -7,6 +7,16 @@ from biobb_common.configuration import  settings
 from biobb_common.tools import file_utils as fu
 from biobb_common.tools.file_utils import launchlogger
 from biobb_analysis.ambertools.common import *
+from biobb_analysis.cache.results import restore_cache, store_cache
+from biobb_analysis.native.rgyr import compute_cpptraj_rgyr
+from biobb_analysis.native.columnar import begin_columnar_output, end_columnar_output
+from biobb_analysis.native.incremental import check_incremental
+from biobb_analysis.cache.structure import store_structure
+from biobb_analysis.staging.files import stage_files, copy_to_host
+from biobb_analysis.container.session import run_biobb
+from biobb_analysis.profiling.phases import profile_launch
+from biobb_analysis.batch.runner import is_batch, run_batch
+from biobb_analysis.batch.segments import run_segments
 
 
 class CpptrajRgyr(BiobbObject):
@@ -18,21 +28,35 @@ class CpptrajRgyr(BiobbObject):
     Args:
         input_top_path (str): Path to the input structure or topology file. File type: input. `Sample file <https://github.com/bioexcel/biobb_analysis/raw/master/biobb_analysis/test/data/ambertools/cpptraj.parm.top>`_. Accepted formats: top (edam:format_3881), pdb (edam:format_1476), prmtop (edam:format_3881), parmtop (edam:format_3881), zip (edam:format_3987).
         input_traj_path (str): Path to the input trajectory to be processed.  File type: input. `Sample file <https://github.com/bioexcel/biobb_analysis/raw/master/biobb_analysis/test/data/ambertools/cpptraj.traj.dcd>`_. Accepted formats: mdcrd (edam:format_3878), crd (edam:format_3878), cdf (edam:format_3650), netcdf (edam:format_3650), nc (edam:format_3650), restart (edam:format_3886), ncrestart (edam:format_3886), restartnc (edam:format_3886), dcd (edam:format_3878), charmm (edam:format_3887), cor (edam:format_2033), pdb (edam:format_1476), mol2 (edam:format_3816), trr (edam:format_3910), gro (edam:format_2033), binpos (edam:format_3885), xtc (edam:format_3875), cif (edam:format_1477), arc (edam:format_2333), sqm (edam:format_2033), sdf (edam:format_3814), conflib (edam:format_2033).
-        output_cpptraj_path (str): Path to the output analysis. File type: output. `Sample file <https://github.com/bioexcel/biobb_analysis/raw/master/biobb_analysis/test/reference/ambertools/ref_cpptraj.rgyr.dat>`_. Accepted formats: dat (edam:format_1637), agr (edam:format_2033), xmgr (edam:format_2033), gnu (edam:format_2033).
+        output_cpptraj_path (str): Path to the output analysis. File type: output. `Sample file <https://github.com/bioexcel/biobb_analysis/raw/master/biobb_analysis/test/reference/ambertools/ref_cpptraj.rgyr.dat>`_. Accepted formats: dat (edam:format_1637), agr (edam:format_2033), xmgr (edam:format_2033), gnu (edam:format_2033), npy (edam:format_2333), npz (edam:format_2333), parquet (edam:format_2333), hdf5 (edam:format_3590).
         properties (dic - Python dictionary object containing the tool parameters, not input/output files):
             * **start** (*int*) - (1) [1~100000|1] Starting frame for slicing.
             * **end** (*int*) - (-1) [-1~100000|1] Ending frame for slicing.
             * **steps** (*int*) - (1) [1~100000|1] Step for slicing.
             * **mask** (*str*) - ("all-atoms") Mask definition. Values: c-alpha (All c-alpha atoms; protein only), backbone (Backbone atoms), all-atoms (All system atoms), heavy-atoms (System heavy atoms; not hydrogen), side-chain (All not backbone atoms), solute (All system atoms except solvent atoms), ions (All ion molecules), solvent (All solvent atoms), AnyAmberFromatMask (Amber atom selection syntax like `@*`).
+            * **backend** (*str*) - ("cpptraj") Engine used to compute the Rgyr. Values: cpptraj (Run the cpptraj executable binary), native (Compute the Rgyr in-process with NumPy; only for prmtop; parmtop or pdb topologies; mdcrd; crd; pdb; gro; dcd; xtc; trr or netcdf trajectories and dat outputs; autoimage is not applied).
+            * **n_workers** (*int*) - (1) [1~256|1] Number of cpptraj processes among which the frames are split in contiguous chunks; the per-frame dat outputs are merged in order. Only for dat outputs; not for container executions.
+            * **warm_pool** (*bool*) - (False) Run the instructions in an idle long-lived cpptraj process in interactive mode that already loaded the same topology; started if there is none; instead of a new cpptraj process. Not for container executions.
+            * **warm_timeout** (*float*) - (600) [1~86400|1] Seconds a warm cpptraj process is given to run the instructions; it is killed and the instructions are run by a new cpptraj process once exceeded.
+            * **incremental** (*bool*) - (False) Process only the frames added to the trajectory since the last launch and append their rows to the output; the state being kept next to it (its path with an extra .state.npz suffix). A list or a glob pattern of trajectories is taken as the consecutive segments of a single simulation. Only for the native backend and dat outputs; with the default start; end and steps.
+            * **batch_workers** (*int*) - (4) [1~256|1] Number of inputs processed at the same time when a list or a glob pattern of trajectories is given.
+            * **watch_interval** (*float*) - (0) [0~86400|1] [WF property] Seconds between polls of the glob pattern of segments for new or growing segments in incremental mode. 0 processes them once.
+            * **watch_timeout** (*float*) - (3600) [0~1000000|1] [WF property] Seconds without new or growing segments after which the watch ends.
             * **binary_path** (*str*) - ("cpptraj") Path to the cpptraj executable binary.
             * **remove_tmp** (*bool*) - (True) [WF property] Remove temporal files.
             * **restart** (*bool*) - (False) [WF property] Do not execute if output files exist.
+            * **cache_path** (*str*) - (None) [WF property] Path to the result cache directory; outputs already computed from the same input files; properties and software are restored from it instead of recomputed. The centered; imaged; fitted and stripped trajectory is kept there too; in single precision; and read by later analyses of the same trajectory and frames. Disabled if None.
+            * **cache_size** (*int*) - (1024) [1~1000000|1] [WF property] Maximum size in MB of the result cache; the least recently used results are evicted.
+            * **staging** (*str*) - ("copy") [WF property] How the files are staged into the temporary directory. Values: copy (Inputs and outputs are copied), link (Inputs are hard-linked; symlinked across file systems and bind-mounted read-only in docker or singularity executions; outputs are moved to their host paths and copied only across file systems).
+            * **profile_path** (*str*) - (None) [WF property] Path to the JSON lines file where a record of the launch is appended: the time and the bytes read and written of each of its phases (checks; staging; instructions; run; copy to host and removal of temporary files). Disabled if None.
+            * **prometheus_path** (*str*) - (None) [WF property] Path to the Prometheus textfile collector file (.prom) where the resource usage of the child processes of the launch (CPU user and system time; peak RSS; context switches and block I/O) is written; by block and step. Disabled if None.
             * **container_path** (*str*) - (None) Container path definition.
             * **container_image** (*str*) - ('afandiadib/ambertools:serial') Container image definition.
             * **container_volume_path** (*str*) - ('/tmp') Container volume path definition.
             * **container_working_dir** (*str*) - (None) Container working directory definition.
             * **container_user_id** (*str*) - (None) Container user_id definition.
             * **container_shell_path** (*str*) - ('/bin/bash') Path to default shell inside the container.
+            * **container_session** (*bool*) - (False) Run the command through exec in a long-lived container started once per container image; volume path and user id and reused by later blocks; instead of a new container. Only for docker and singularity.
 
     Examples:
         This is a use example of how to use the building block from Python::
@@ -80,8 +104,22 @@ class CpptrajRgyr(BiobbObject):
         self.end = properties.get('end', -1)
         self.steps =  properties.get('steps', 1)
         self.mask = properties.get('mask', 'all-atoms')
+        self.backend = properties.get('backend', 'cpptraj')
         self.properties = properties
+        self.cache_path = properties.get('cache_path')
+        self.cache_size = properties.get('cache_size', 1024)
+        self.staging = properties.get('staging', 'copy')
+        self.profile_path = properties.get('profile_path')
+        self.prometheus_path = properties.get('prometheus_path')
+        self.container_session = properties.get('container_session', False)
+        self.batch_workers = properties.get('batch_workers', 4)
+        self.incremental = properties.get('incremental', False)
+        self.watch_interval = properties.get('watch_interval', 0)
+        self.watch_timeout = properties.get('watch_timeout', 3600)
         self.binary_path = get_binary_path(properties, 'binary_path')
+        self.n_workers = properties.get('n_workers', 1)
+        self.warm_pool = properties.get('warm_pool', False)
+        self.warm_timeout = properties.get('warm_timeout', 600)
 
         # Check the properties
         self.check_properties(properties)
@@ -93,7 +131,20 @@ class CpptrajRgyr(BiobbObject):
         self.io_dict["in"]["input_traj_path"] = check_traj_path(self.io_dict["in"]["input_traj_path"], out_log, self.__class__.__name__)
         self.io_dict["out"]["output_cpptraj_path"] = check_out_path(self.io_dict["out"]["output_cpptraj_path"], out_log, self.__class__.__name__)
         self.in_parameters = { 'start': self.start, 'end': self.end, 'step': self.steps, 'mask': self.mask }
-        
+        self.backend = get_backend(self.properties, out_log, self.__class__.__name__)
+        self.n_workers = get_n_workers(self.properties, out_log, self.__class__.__name__)
+        self.warm_pool = get_warm_pool(self.properties, out_log, self.__class__.__name__)
+        self.warm_timeout = get_warm_timeout(self.properties, out_log, self.__class__.__name__)
+        self.incremental = get_incremental(self.properties, out_log, self.__class__.__name__)
+        check_incremental(self, "output_cpptraj_path", out_log)
+
+    def compute_native(self, out_log, err_log):
+        """ Computes the Rgyr in-process, without staging files nor running cpptraj """
+        start, end, step = get_in_parameters(self.in_parameters, out_log).split()
+        return compute_cpptraj_rgyr(self.io_dict["in"]["input_top_path"], self.io_dict["in"]["input_traj_path"],
+                                    self.io_dict["out"]["output_cpptraj_path"], get_mask(self.mask, out_log),
+                                    int(start), int(end), int(step), out_log, self.__class__.__name__, self.incremental)
+
     def create_instructions_file(self, container_io_dict, out_log, err_log):
         """Creates an input file using the properties file settings"""
         instructions_list = []
@@ -104,15 +155,8 @@ class CpptrajRgyr(BiobbObject):
             self.instructions_file = str(PurePath(fu.create_unique_dir()).joinpath(self.instructions_file))
         fu.create_name(prefix=self.prefix, step=self.step, name=self.instructions_file)
 
-        # parm
-        instructions_list.append('parm ' + container_io_dict["in"]["input_top_path"])
-
-        # trajin
-        in_params = get_in_parameters(self.in_parameters, out_log)
-        instructions_list.append('trajin ' + container_io_dict["in"]["input_traj_path"] + ' ' + in_params)
-
-        # Set up
-        instructions_list += setup_structure(self)
+        # parm, trajin and set up, the set up trajectory being read from the cache if already there
+        instructions_list += get_setup_instructions(self, container_io_dict, out_log)
 
         # mask
         mask = self.in_parameters.get('mask', '')
@@ -131,46 +175,86 @@ class CpptrajRgyr(BiobbObject):
         return self.instructions_file
 
     @launchlogger
+    @profile_launch
     def launch(self) -> int:
         """Execute the :class:`CpptrajRgyr <ambertools.cpptraj_rgyr.CpptrajRgyr>` ambertools.cpptraj_rgyr.CpptrajRgyr object."""
         
         # check input/output paths and parameters
         self.check_data_params(self.out_log, self.err_log)
 
-        # Setup Biobb
-        if self.check_restart(): return 0
-        self.stage_files()
+        # the topology extracted from a zip is released whatever the outcome
+        try:
+            # Setup Biobb
+            if self.check_restart(): return 0
+            if restore_cache(self, self.out_log): return 0
 
-        # create instructions file
-        self.create_instructions_file(self.stage_io_dict, self.out_log, self.err_log) 
+            # binary columnar output: written by the native backend, or the text output of the executable converted
+            begin_columnar_output(self, "output_cpptraj_path", 'dat', self.out_log)
 
-        # if container execution, copy intructions file to container
-        if self.container_path:
-            copy_instructions_file_to_container(self.instructions_file, self.stage_io_dict['unique_dir'])
+            # native backend: no staging, no instructions file, no binary
+            if self.backend == 'native':
+                self.return_code = self.compute_native(self.out_log, self.err_log)
+                end_columnar_output(self, self.out_log, {None: 'Å'})
+                self.check_arguments(output_files_created=True, raise_exception=False)
+                store_cache(self, self.out_log)
+                return self.return_code
+
+            stage_files(self, self.out_log)
 
-        # create cmd and launch execution
-        self.cmd = [self.binary_path, '-i', self.instructions_file]
+            # create instructions file
+            self.create_instructions_file(self.stage_io_dict, self.out_log, self.err_log) 
 
-        # Run Biobb block
-        self.run_biobb()
+            # if container execution, copy intructions file to container
+            if self.container_path:
+                copy_instructions_file_to_container(self.instructions_file, self.stage_io_dict['unique_dir'])
 
-        # Copy files to host
-        self.copy_to_host()
+            # create cmd and launch execution
+            self.cmd = [self.binary_path, '-i', self.instructions_file]
 
-        # remove temporary folder(s)
-        self.tmp_files.extend([
-            self.stage_io_dict.get("unique_dir"),
-            PurePath(self.instructions_file).parent
-        ])
-        self.remove_tmp_files()
+            # Run Biobb block, splitting the frames among n_workers cpptraj processes or in a warm cpptraj process if possible
+            if is_chunkable(self, self.out_log):
+                self.return_code = run_frame_chunks(self, self.out_log, self.err_log)
+            elif is_warm_runnable(self, self.out_log):
+                run_warm_worker(self, self.out_log, self.err_log)
+            else:
+                run_biobb(self, self.out_log, self.err_log)
 
-        self.check_arguments(output_files_created=True, raise_exception=False)
+            # Store the set up trajectory for later analyses of the same trajectory
+            store_structure(self, self.out_log)
 
-        return self.return_code
+            # Copy files to host
+            copy_to_host(self, self.out_log)
+
+            # Convert the text output into the binary columnar one
+            end_columnar_output(self, self.out_log, {None: 'Å'})
+
+            # remove temporary folder(s)
+            self.tmp_files.extend([
+                self.stage_io_dict.get("unique_dir"),
+                PurePath(self.instructions_file).parent
+            ])
+            self.remove_tmp_files()
+
+            self.check_arguments(output_files_created=True, raise_exception=False)
+
+            # Store the outputs in the result cache
+            store_cache(self, self.out_log)
+
+            return self.return_code
+        finally:
+            release_top_path(self.io_dict["in"]["input_top_path"], self.input_top_path_orig, self.remove_tmp, self.out_log)
 
 def cpptraj_rgyr(input_top_path: str, input_traj_path: str, output_cpptraj_path: str, properties: dict = None, **kwargs) -> int:
     """Execute the :class:`CpptrajRgyr <ambertools.cpptraj_rgyr.CpptrajRgyr>` class and
-    execute the :meth:`launch() <ambertools.cpptraj_rgyr.CpptrajRgyr.launch>` method."""
+    execute the :meth:`launch() <ambertools.cpptraj_rgyr.CpptrajRgyr.launch>` method.
+    input_traj_path can also be a list or a glob pattern of trajectories, each one processed by
+    :func:`run_batch() <batch.runner.run_batch>` with its own outputs, or the segments of a single simulation
+    processed in order by :func:`run_segments() <batch.segments.run_segments>` in incremental mode."""
+
+    if is_batch(input_traj_path):
+        if (properties or {}).get('incremental'):
+            return run_segments(CpptrajRgyr, 'input_traj_path', properties=properties, input_top_path=input_top_path, input_traj_path=input_traj_path, output_cpptraj_path=output_cpptraj_path, **kwargs)
+        return run_batch(CpptrajRgyr, 'input_traj_path', properties=properties, input_top_path=input_top_path, input_traj_path=input_traj_path, output_cpptraj_path=output_cpptraj_path, **kwargs)
 
     return CpptrajRgyr(input_top_path=input_top_path, 
                     input_traj_path=input_traj_path, 
@@ -185,7 +269,9 @@ def main():
     # Specific args of each building block
     required_args = parser.add_argument_group('required arguments')
     required_args.add_argument('--input_top_path', required=True, help='Path to the input structure or topology file. Accepted formats: top, pdb, prmtop, parmtop, zip.')
-    required_args.add_argument('--input_traj_path', required=True, help='Path to the input trajectory to be processed. Accepted formats: crd, cdf, netcdf, restart, ncrestart, restartnc, dcd, charmm, cor, pdb, mol2, trr, gro, binpos, xtc, cif, arc, sqm, sdf, conflib.')
+    batch_args = required_args.add_mutually_exclusive_group(required=True)
+    batch_args.add_argument('--input_traj_path', help='Path to the input trajectory to be processed. Accepted formats: crd, cdf, netcdf, restart, ncrestart, restartnc, dcd, charmm, cor, pdb, mol2, trr, gro, binpos, xtc, cif, arc, sqm, sdf, conflib.')
+    batch_args.add_argument('--input_traj_glob', help='Glob pattern of the trajectories to be processed in batch; every one gets its own outputs; named after them; and a manifest.')
     required_args.add_argument('--output_cpptraj_path', required=True, help='Path to the output analysis.')
 
     args = parser.parse_args()
@@ -194,7 +280,7 @@ def main():
 
     # Specific call of each building block
     cpptraj_rgyr(input_top_path=args.input_top_path, 
-                input_traj_path=args.input_traj_path, 
+                input_traj_path=args.input_traj_path or args.input_traj_glob, 
                 output_cpptraj_path=args.output_cpptraj_path, 
                 properties=properties)
 
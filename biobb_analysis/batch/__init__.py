@@ -0,0 +1,2 @@
+name = "batch"
+__all__ = ["runner", "segments"]
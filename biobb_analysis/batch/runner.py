@@ -0,0 +1,165 @@
+""" Batch execution of a block over many inputs for package biobb_analysis.batch
+
+A block given a list or a glob pattern of inputs instead of a single path runs once per input, on a bounded
+pool of threads. Every input gets its own outputs, named after the outputs of the block and the input, and a
+manifest describing every run is written next to the first output.
+
+The inputs shared by all the runs are staged once: a zipped topology is extracted once, and the shared inputs are
+copied once into a batch directory, unless staging is link, the runs linking them instead of copying them again.
+The native engines parse a shared topology once (see :func:`load_topology() <native.topology.load_topology>`).
+
+The runs share the process: every run gets its own prefix, so that its logs and temporary files are its own, and
+the resource usage of the child processes is accounted by thread. chdir_sandbox changes the working directory of
+the whole process, so runs with it are launched one at a time.
+"""
+import glob
+import json
+import shutil
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePath
+from biobb_common.tools import file_utils as fu
+from biobb_analysis.cache.topology import extract_topology, release_topology
+
+# default number of inputs processed at the same time
+DEFAULT_BATCH_WORKERS = 4
+
+
+def is_batch(path):
+    """ Checks if an input path is a list of paths or a glob pattern of paths """
+    if isinstance(path, (list, tuple)):
+        return True
+    return isinstance(path, str) and glob.has_magic(path) and not Path(path).exists()
+
+
+def expand_batch(path):
+    """ Gives the paths of a list or a glob pattern of paths """
+    if isinstance(path, (list, tuple)):
+        return [str(p) for p in path]
+    return sorted(glob.glob(path))
+
+
+def get_batch_workers(properties, classname):
+    """ Gets the number of inputs processed at the same time """
+    batch_workers = properties.get('batch_workers', DEFAULT_BATCH_WORKERS)
+    if not isinstance(batch_workers, int) or isinstance(batch_workers, bool) or batch_workers < 1:
+        fu.log(classname + ': Incorrect batch_workers provided, it must be a positive integer, exiting', None, properties.get('global_log'))
+        raise SystemExit(classname + ': Incorrect batch_workers provided')
+    return batch_workers
+
+
+def get_batch_names(inputs):
+    """ Gives the name of every input, followed by its index if names repeat """
+    names = [PurePath(path).stem for path in inputs]
+    if len(set(names)) != len(names):
+        names = ['%s_%0*d' % (name, len(str(len(inputs))), i) for i, name in enumerate(names)]
+    return names
+
+
+def get_batch_outputs(paths, inputs):
+    """ Gives the output paths of every input, the name of the input (or its index if names repeat) being added to every output name """
+    outputs = []
+    for name in get_batch_names(inputs):
+        outputs.append({key: str(PurePath(path).with_name('%s.%s%s' % (PurePath(path).stem, name, PurePath(path).suffix)))
+                        for key, path in paths.items() if key.startswith('output_') and path})
+    return outputs
+
+
+def get_manifest_path(paths):
+    """ Gives the path of the manifest, next to the first output of the block """
+    output = PurePath(next(path for key, path in paths.items() if key.startswith('output_') and path))
+    return str(output.with_name(output.stem + '.manifest.json'))
+
+
+def stage_shared_inputs(paths, batch_key, properties):
+    """ Stages the inputs shared by all the runs once, gives their staged paths, the properties of the runs and the function releasing them """
+    properties = dict(properties)
+    if properties.get('disable_sandbox'):
+        return dict(paths), properties, lambda: None
+    remove_tmp = properties.get('remove_tmp', True)
+    global_log = properties.get('global_log')
+    shared = dict(paths)
+    batch_dir, topologies = None, []
+    for key, path in paths.items():
+        if key == batch_key or not key.startswith('input_') or not isinstance(path, str) or not Path(path).is_file():
+            continue
+        if key == 'input_top_path' and zipfile.is_zipfile(path):
+            shared[key] = extract_topology(path, None)
+            topologies.append(shared[key])
+            fu.log('Batch: %s extracted once to %s' % (path, shared[key]), None, global_log)
+        elif properties.get('staging', 'copy') == 'copy':
+            batch_dir = batch_dir or fu.create_unique_dir()
+            shared[key] = str(Path(batch_dir).joinpath(Path(path).name))
+            shutil.copy2(path, shared[key])
+            fu.log('Batch: %s copied once to %s' % (path, batch_dir), None, global_log)
+    # the runs link the inputs staged once instead of copying them
+    properties['staging'] = 'link'
+
+    def release():
+        for top_path in topologies:
+            release_topology(top_path, remove_tmp, None)
+        if batch_dir and remove_tmp:
+            shutil.rmtree(batch_dir, ignore_errors=True)
+    return shared, properties, release
+
+
+def _launch(block_class, properties, paths):
+    """ Launches the block on a single input, gives its return code, its error if any and the resource usage of its child processes, None if not accounted """
+    block = None
+    try:
+        block = block_class(properties=dict(properties), **paths)
+        return block.launch() or 0, None, block.child_usage
+    except SystemExit as e:
+        return 1, str(e), getattr(block, 'child_usage', None)
+    except Exception as e:
+        return 1, '%s: %s' % (type(e).__name__, e), getattr(block, 'child_usage', None)
+
+
+def run_batch(block_class, batch_key, properties=None, **paths):
+    """ Launches a block once per input of the list or glob pattern of paths[batch_key], batch_workers inputs at the same time.
+
+    Args:
+        block_class (class): Class of the block.
+        batch_key (str): Name of the input path holding the list or glob pattern of paths.
+        properties (dict): Properties of the block, shared by all the runs.
+        **paths: Input and output paths of the block, the outputs being renamed for every input.
+
+    Returns:
+        int: 0 if all the runs succeeded, the return code of the first failed one otherwise.
+    """
+    properties = properties or {}
+    classname = block_class.__name__
+    global_log = properties.get('global_log')
+    inputs = expand_batch(paths[batch_key])
+    if not inputs:
+        fu.log(classname + ': No input files found in %s, exiting' % paths[batch_key], None, global_log)
+        raise SystemExit(classname + ': No input files found in %s' % paths[batch_key])
+    batch_workers = get_batch_workers(properties, classname)
+    if properties.get('chdir_sandbox') and batch_workers > 1:
+        fu.log('%s: chdir_sandbox changes the working directory of the whole process, running one input at a time' % classname, None, global_log)
+        batch_workers = 1
+
+    shared, run_properties, release = stage_shared_inputs(paths, batch_key, properties)
+    runs, runs_properties = [], []
+    for path, name, outputs in zip(inputs, get_batch_names(inputs), get_batch_outputs(paths, inputs)):
+        runs.append(dict(shared, **outputs, **{batch_key: path}))
+        # logs and temporary files of every run named after its input
+        runs_properties.append(dict(run_properties, prefix='_'.join(p for p in (properties.get('prefix'), name) if p)))
+    fu.log('%s: running %d inputs, %d at the same time' % (classname, len(runs), batch_workers), None, global_log)
+    try:
+        with ThreadPoolExecutor(max_workers=min(batch_workers, len(runs))) as executor:
+            results = list(executor.map(lambda run: _launch(block_class, *run), zip(runs_properties, runs)))
+    finally:
+        release()
+
+    manifest = {'block': classname, 'batch_key': batch_key, 'runs': []}
+    for run, (return_code, error, child_usage) in zip(runs, results):
+        manifest['runs'].append({'input': run[batch_key], 'return_code': return_code, 'error': error,
+                                 'outputs': {key: path for key, path in run.items() if key.startswith('output_') and path},
+                                 'child_usage': child_usage})
+    manifest_path = get_manifest_path(paths)
+    with open(manifest_path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=4)
+    failed = [code for code, _, _ in results if code]
+    fu.log('%s: %d of %d inputs succeeded, manifest written to %s' % (classname, len(runs) - len(failed), len(runs), manifest_path), None, global_log)
+    return failed[0] if failed else 0
@@ -0,0 +1,82 @@
+""" Incremental processing of the segments of a simulation for package biobb_analysis.batch
+
+A block in incremental mode given a list or a glob pattern of trajectories takes them as the consecutive segments of a
+single simulation: they are processed one after the other, in order, every one appending its rows to the same outputs
+(see :mod:`biobb_analysis.native.incremental`). With a watch_interval, the glob pattern is polled for new segments and
+for the last segment growing, which are processed as they appear, until nothing changes for watch_timeout seconds.
+"""
+import os
+import time
+from biobb_common.tools import file_utils as fu
+from biobb_analysis.batch.runner import expand_batch, _launch
+
+# default seconds without new frames after which a watch ends
+DEFAULT_WATCH_TIMEOUT = 3600
+
+
+def get_watch(properties, classname):
+    """ Gets the seconds between polls of the segments, 0 meaning they are processed once, and the seconds without changes ending the watch """
+    watch = []
+    for key, default in (('watch_interval', 0), ('watch_timeout', DEFAULT_WATCH_TIMEOUT)):
+        value = properties.get(key, default)
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+            fu.log(classname + ': Incorrect %s provided, it must be a non-negative number of seconds, exiting' % key, None, properties.get('global_log'))
+            raise SystemExit(classname + ': Incorrect %s provided' % key)
+        watch.append(value)
+    return tuple(watch)
+
+
+def get_stamp(path):
+    """ Gives the size and modification time of a segment, which change when frames are added to it """
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def run_segments(block_class, segment_key, properties=None, **paths):
+    """ Launches a block in incremental mode once per segment of the list or glob pattern of paths[segment_key], in order, on the same outputs.
+
+    Args:
+        block_class (class): Class of the block.
+        segment_key (str): Name of the input path holding the list or glob pattern of segments.
+        properties (dict): Properties of the block, shared by all the runs.
+        **paths: Input and output paths of the block.
+
+    Returns:
+        int: 0 if all the runs succeeded, the return code of the failed one otherwise.
+    """
+    properties = properties or {}
+    classname = block_class.__name__
+    global_log = properties.get('global_log')
+    interval, timeout = get_watch(properties, classname)
+
+    # the segments before the last one launched are not read again, the last one being launched again whenever it grows
+    stamps, last = {}, None
+    idle_since = time.monotonic()
+    while True:
+        segments = expand_batch(paths[segment_key])
+        if last in segments:
+            segments = segments[segments.index(last):]
+        elif not segments and not interval:
+            fu.log(classname + ': No input files found in %s, exiting' % paths[segment_key], None, global_log)
+            raise SystemExit(classname + ': No input files found in %s' % paths[segment_key])
+
+        changed = False
+        for path in segments:
+            stamp = get_stamp(path)
+            if stamps.get(path) == stamp:
+                continue
+            fu.log('%s: processing segment %s' % (classname, path), None, global_log)
+            return_code, error, _ = _launch(block_class, properties, dict(paths, **{segment_key: path}))
+            if return_code:
+                fu.log('%s: segment %s failed: %s' % (classname, path, error), None, global_log)
+                return return_code
+            stamps[path], last, changed = stamp, path, True
+
+        if not interval:
+            return 0
+        if changed:
+            idle_since = time.monotonic()
+        elif time.monotonic() - idle_since >= timeout:
+            fu.log('%s: no new frames in %s for %g seconds, watch ended' % (classname, paths[segment_key], timeout), None, global_log)
+            return 0
+        time.sleep(interval)
@@ -0,0 +1,2 @@
+name = "benchmark"
+__all__ = ["cases", "measure", "worker", "suite"]
@@ -0,0 +1,78 @@
+""" Benchmark cases for package biobb_analysis.benchmark
+
+A case is a block launched with one of its backends on the input files of a synthetic system: the cpptraj blocks on a
+PDB structure and a DCD trajectory, the GROMACS blocks on a GRO structure, a TRR trajectory, an index file and an
+EDR file. A case runs only if the executable of its backend is found, the native backend needing none.
+"""
+from collections import namedtuple
+
+# block, backend, module of the block, input path arguments and their synthetic input files, output path arguments and their file names, properties
+Case = namedtuple('Case', ['block', 'backend', 'module', 'inputs', 'outputs', 'properties'])
+
+# executable needed by every backend
+BACKEND_BINARIES = {'cpptraj': 'cpptraj', 'gromacs': 'gmx', 'native': None}
+
+# synthetic input files
+AMBER_INPUTS = {'input_top_path': 'system.pdb', 'input_traj_path': 'trajectory.dcd'}
+GROMACS_INPUTS = {'input_structure_path': 'system.gro', 'input_traj_path': 'trajectory.trr', 'input_index_path': 'index.ndx'}
+GROMACS_TRAJ_INPUTS = {'input_traj_path': 'trajectory.trr', 'input_top_path': 'system.gro', 'input_index_path': 'index.ndx'}
+# cpptraj instructions file, written for every run with the paths of the other synthetic inputs
+INSTRUCTIONS = 'cpptraj.in'
+
+# block: backends, input files, output path argument and file name, properties
+BLOCKS = {
+    'cpptraj_average': (['cpptraj'], AMBER_INPUTS, ('output_cpptraj_path', 'average.pdb'), {'format': 'pdb'}),
+    'cpptraj_bfactor': (['cpptraj', 'native'], AMBER_INPUTS, ('output_cpptraj_path', 'bfactor.dat'), {}),
+    'cpptraj_convert': (['cpptraj'], AMBER_INPUTS, ('output_cpptraj_path', 'convert.netcdf'), {}),
+    'cpptraj_dry': (['cpptraj'], AMBER_INPUTS, ('output_cpptraj_path', 'dry.netcdf'), {}),
+    'cpptraj_image': (['cpptraj'], AMBER_INPUTS, ('output_cpptraj_path', 'image.netcdf'), {}),
+    'cpptraj_input': (['cpptraj'], {'input_instructions_path': INSTRUCTIONS}, None, {}),
+    'cpptraj_mask': (['cpptraj'], AMBER_INPUTS, ('output_cpptraj_path', 'mask.netcdf'), {'mask': 'c-alpha'}),
+    'cpptraj_multi': (['cpptraj'], AMBER_INPUTS, None, {'analyses': [{'type': 'rms', 'output': 'multi.rms.dat'},
+                                                                     {'type': 'rmsf', 'output': 'multi.rmsf.dat'},
+                                                                     {'type': 'rgyr', 'output': 'multi.rgyr.dat'}]}),
+    'cpptraj_rgyr': (['cpptraj', 'native'], AMBER_INPUTS, ('output_cpptraj_path', 'rgyr.dat'), {}),
+    'cpptraj_rms': (['cpptraj', 'native'], AMBER_INPUTS, ('output_cpptraj_path', 'rms.dat'), {}),
+    'cpptraj_rmsf': (['cpptraj', 'native'], AMBER_INPUTS, ('output_cpptraj_path', 'rmsf.dat'), {}),
+    'cpptraj_slice': (['cpptraj'], AMBER_INPUTS, ('output_cpptraj_path', 'slice.netcdf'), {'steps': 2}),
+    'cpptraj_snapshot': (['cpptraj'], AMBER_INPUTS, ('output_cpptraj_path', 'snapshot.pdb'), {'snapshot': 1, 'format': 'pdb'}),
+    'cpptraj_strip': (['cpptraj'], AMBER_INPUTS, ('output_cpptraj_path', 'strip.netcdf'), {'mask': 'solute'}),
+    'gmx_cluster': (['gromacs', 'native'], GROMACS_INPUTS, ('output_pdb_path', 'cluster.pdb'), {'fit_selection': 'C-alpha'}),
+    'gmx_energy': (['gromacs', 'native'], {'input_energy_path': 'energy.edr'}, ('output_xvg_path', 'energy.xvg'), {'terms': ['Potential', 'Pressure']}),
+    'gmx_image': (['gromacs'], GROMACS_TRAJ_INPUTS, ('output_traj_path', 'image.xtc'), {}),
+    'gmx_rgyr': (['gromacs', 'native'], GROMACS_INPUTS, ('output_xvg_path', 'rgyr.xvg'), {}),
+    'gmx_rms': (['gromacs', 'native'], GROMACS_INPUTS, ('output_xvg_path', 'rms.xvg'), {}),
+    'gmx_trjconv_str': (['gromacs'], {'input_structure_path': 'system.gro', 'input_top_path': 'system.gro', 'input_index_path': 'index.ndx'},
+                        ('output_str_path', 'str.pdb'), {}),
+    'gmx_trjconv_str_ens': (['gromacs'], GROMACS_TRAJ_INPUTS, ('output_str_ens_path', 'str_ens.zip'), {'dt': 10}),
+    'gmx_trjconv_trj': (['gromacs'], GROMACS_TRAJ_INPUTS, ('output_traj_path', 'trj.xtc'), {})
+}
+
+
+def get_module(block):
+    """ Gives the module of a block """
+    return 'biobb_analysis.%s.%s' % ('ambertools' if block.startswith('cpptraj') else 'gromacs', block)
+
+
+def get_cases(blocks=None, backends=None):
+    """ Gives the cases of the given blocks and backends, all of them if None """
+    unknown = set(blocks or []) - set(BLOCKS)
+    if unknown:
+        raise ValueError('Unknown blocks: %s' % ', '.join(sorted(unknown)))
+    cases = []
+    for block, (block_backends, inputs, output, properties) in BLOCKS.items():
+        if blocks and block not in blocks:
+            continue
+        for backend in block_backends:
+            if backends and backend not in backends:
+                continue
+            case_properties = dict(properties)
+            if backend == 'native':
+                case_properties['backend'] = 'native'
+            cases.append(Case(block, backend, get_module(block), dict(inputs), dict([output]) if output else {}, case_properties))
+    return cases
+
+
+def get_input_files(cases):
+    """ Gives the synthetic input files needed by the given cases """
+    return sorted(set(name for case in cases for name in case.inputs.values()))
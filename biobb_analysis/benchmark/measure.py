@@ -0,0 +1,74 @@
+""" Resource measurement of a launch for package biobb_analysis.benchmark
+
+A launch is measured from within the process running it, which runs nothing else: wall and CPU time, peak resident
+memory of the process and of its largest child, bytes read and written by the process and its children through
+read/write system calls (/proc/self/io, counting the children once they are waited for; memory-mapped reads are not
+counted) and number of subprocesses started (executables and forked workers).
+"""
+import os
+import resource
+import subprocess
+import time
+from biobb_analysis.profiling.phases import read_io
+
+
+class LaunchCounter:
+    """ Counts the subprocesses and forked workers started by this process once installed """
+
+    def __init__(self):
+        self.count = 0
+        self.installed = False
+
+    def install(self):
+        """ Wraps the creation of subprocesses and registers a fork hook; installed once per process """
+        if self.installed:
+            return
+        counter, popen_init = self, subprocess.Popen.__init__
+
+        def counted_init(popen, *args, **kwargs):
+            counter.count += 1
+            popen_init(popen, *args, **kwargs)
+
+        subprocess.Popen.__init__ = counted_init
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_parent=self._forked)
+        self.installed = True
+
+    def _forked(self):
+        """ Counts a fork of this process """
+        self.count += 1
+
+
+LAUNCH_COUNTER = LaunchCounter()
+
+
+def get_rusage():
+    """ Gives the resource usage of this process and of its waited children """
+    return resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+
+
+def measure(func, *args, **kwargs):
+    """ Launches func(*args, **kwargs), gives its result and metrics: wall_time and cpu_time (s), peak_rss (bytes), read_bytes, write_bytes and subprocesses """
+    LAUNCH_COUNTER.install()
+    launches = LAUNCH_COUNTER.count
+    io_before = read_io()
+    self_before, children_before = get_rusage()
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        wall_time = time.perf_counter() - start
+        self_after, children_after = get_rusage()
+        io_after = read_io()
+    cpu_time = sum(getattr(after, field) - getattr(before, field) for before, after in ((self_before, self_after), (children_before, children_after))
+                   for field in ('ru_utime', 'ru_stime'))
+    metrics = {
+        'wall_time': wall_time,
+        'cpu_time': cpu_time,
+        # kilobytes on Linux
+        'peak_rss': max(self_after.ru_maxrss, children_after.ru_maxrss) * 1024,
+        'read_bytes': None if io_before is None else io_after[0] - io_before[0],
+        'write_bytes': None if io_before is None else io_after[1] - io_before[1],
+        'subprocesses': LAUNCH_COUNTER.count - launches
+    }
+    return result, metrics
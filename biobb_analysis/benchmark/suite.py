@@ -0,0 +1,265 @@
+""" Benchmark suite of the blocks for package biobb_analysis.benchmark
+
+Every case (see :mod:`biobb_analysis.benchmark.cases`) is launched on synthetic systems of every given number of atoms
+and frames (see :mod:`biobb_analysis.synthetic`), each launch in a fresh worker process, and its metrics are appended
+as a JSON line to the history file together with the commit of the tree, so that the metrics of two commits can be
+compared. The synthetic inputs are generated once per size in the data directory and reused by the next suites run on it.
+
+Usage:
+    python -m biobb_analysis.benchmark.suite --atoms 10000 100000 --frames 1000 --backends native
+    python -m biobb_analysis.benchmark.suite --compare <base commit> [<commit>]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path, PurePath
+from biobb_analysis.benchmark.cases import BACKEND_BINARIES, INSTRUCTIONS, get_cases, get_input_files
+from biobb_analysis.synthetic.system import build_system
+from biobb_analysis.synthetic.writers import STRUCTURE_WRITERS, TRAJECTORY_WRITERS, write_structure, write_trajectory, write_ndx, write_edr
+
+DEFAULT_ATOMS = [10000, 100000, 1000000]
+DEFAULT_FRAMES = [1000, 10000, 100000]
+DEFAULT_HISTORY = 'benchmark_history.jsonl'
+# largest synthetic trajectory generated, in GB
+DEFAULT_MAX_GB = 16.0
+# relative increase of a metric reported as a regression
+DEFAULT_THRESHOLD = 0.1
+METRICS = ['wall_time', 'cpu_time', 'peak_rss', 'read_bytes', 'write_bytes', 'subprocesses']
+
+
+def get_worker_env():
+    """ Gives the environment of the worker processes, which run in the directory of their case: the import path of this process, made absolute at its start, instead of a PYTHONPATH maybe relative """
+    paths = [str(Path(__file__).resolve().parents[2])] + [path for path in sys.path if path]
+    return dict(os.environ, PYTHONPATH=os.pathsep.join(paths))
+
+
+def get_commit():
+    """ Gives the commit of the tree of the package and if it has uncommitted changes, None if it is not a git repository """
+    root = str(Path(__file__).resolve().parents[2])
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root, capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+    return commit, dirty
+
+
+def can_generate(name):
+    """ Checks if a synthetic input file can be generated """
+    ext = PurePath(name).suffix[1:].lower()
+    return name == INSTRUCTIONS or ext in ('ndx', 'edr') or ext in STRUCTURE_WRITERS or ext in TRAJECTORY_WRITERS
+
+
+def get_trajectory_gb(n_atoms, n_frames):
+    """ Gives the size in GB of a single precision trajectory """
+    return n_atoms * n_frames * 3 * 4 / 1024 ** 3
+
+
+def prepare_inputs(data_dir, n_atoms, n_frames, names, seed=0):
+    """ Generates the synthetic input files of a size missing in the data directory, gives their paths; the structures are shared by all the numbers of frames """
+    systems, paths = {}, {}
+    for name in names:
+        ext = PurePath(name).suffix[1:].lower()
+        directory = Path(data_dir).joinpath('%d_atoms' % n_atoms)
+        if ext in TRAJECTORY_WRITERS or ext == 'edr':
+            directory = directory.joinpath('%d_frames' % n_frames)
+        path = directory.joinpath(name)
+        paths[name] = str(path)
+        if name == INSTRUCTIONS or path.exists():
+            continue
+        directory.mkdir(parents=True, exist_ok=True)
+        # Amber topologies name the solvent as in Amber, the same atoms otherwise
+        naming = 'amber' if STRUCTURE_WRITERS.get(ext) is STRUCTURE_WRITERS['prmtop'] else 'gromacs'
+        if naming not in systems:
+            systems[naming] = build_system(n_atoms, naming=naming, seed=seed)
+        system = systems[naming]
+        # generated under a temporary name, so an interrupted generation is not reused
+        tmp = str(directory.joinpath('tmp.' + name))
+        if ext == 'ndx':
+            write_ndx(tmp, system)
+        elif ext == 'edr':
+            write_edr(tmp, system, n_frames, seed=seed)
+        elif ext in STRUCTURE_WRITERS:
+            write_structure(tmp, system)
+        else:
+            write_trajectory(tmp, system, n_frames, seed=seed)
+        os.replace(tmp, path)
+    return paths
+
+
+def write_instructions(path, inputs):
+    """ Writes the cpptraj instructions of the cpptraj_input case, a RMSd of the synthetic trajectory """
+    with open(path, 'w') as instructions:
+        instructions.write('parm %s\ntrajin %s\nrms first out %s\nrun\n' % (inputs['system.pdb'], inputs['trajectory.dcd'],
+                                                                            str(PurePath(path).with_name('input.rms.dat'))))
+
+
+def run_case(case, inputs, run_dir, timeout=None):
+    """ Launches a case in a worker process in run_dir, gives its result """
+    run_dir = Path(run_dir)
+    run_dir.mkdir(parents=True, exist_ok=True)
+    paths = {key: inputs[name] for key, name in case.inputs.items()}
+    if INSTRUCTIONS in case.inputs.values():
+        write_instructions(str(run_dir.joinpath(INSTRUCTIONS)), inputs)
+        paths.update({key: str(run_dir.joinpath(INSTRUCTIONS)) for key, name in case.inputs.items() if name == INSTRUCTIONS})
+    paths.update({key: str(run_dir.joinpath(name)) for key, name in case.outputs.items()})
+    spec = {'module': case.module, 'block': case.block, 'paths': paths, 'properties': case.properties,
+            'result_path': str(run_dir.joinpath('result.json'))}
+    spec_path = run_dir.joinpath('case.json')
+    spec_path.write_text(json.dumps(spec))
+    with open(run_dir.joinpath('worker.log'), 'w') as log:
+        try:
+            subprocess.run([sys.executable, '-m', 'biobb_analysis.benchmark.worker', str(spec_path)], cwd=str(run_dir),
+                           env=get_worker_env(), stdout=log, stderr=subprocess.STDOUT, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return {'return_code': 1, 'error': 'Timeout after %g seconds' % timeout, 'metrics': {}}
+    if not Path(spec['result_path']).exists():
+        return {'return_code': 1, 'error': 'The worker ended without a result, see %s' % run_dir.joinpath('worker.log'), 'metrics': {}}
+    return json.loads(Path(spec['result_path']).read_text())
+
+
+def append_history(history_path, record):
+    """ Appends a record to the history file """
+    with open(history_path, 'a') as history:
+        history.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+def read_history(history_path):
+    """ Gives the records of the history file """
+    if not Path(history_path).exists():
+        return []
+    with open(history_path) as history:
+        return [json.loads(line) for line in history if line.strip()]
+
+
+def run_suite(atoms=None, frames=None, blocks=None, backends=None, history_path=DEFAULT_HISTORY, data_dir=None,
+              max_gb=DEFAULT_MAX_GB, timeout=None, seed=0, keep_runs=False):
+    """ Launches every case on every size, appends their records to the history file and gives them """
+    commit, dirty = get_commit()
+    cases = get_cases(blocks, backends)
+    runnable = []
+    for case in cases:
+        binary = BACKEND_BINARIES[case.backend]
+        missing = [name for name in case.inputs.values() if not can_generate(name)]
+        if binary and not shutil.which(binary):
+            print('Skipping %s (%s): %s executable not found' % (case.block, case.backend, binary))
+        elif missing:
+            print('Skipping %s (%s): %s can not be generated' % (case.block, case.backend, ', '.join(missing)))
+        else:
+            runnable.append(case)
+
+    work_dir = tempfile.mkdtemp(prefix='biobb_benchmark_')
+    # the workers run in the directory of their case
+    data_dir = str(Path(data_dir).resolve()) if data_dir else str(Path(work_dir).joinpath('data'))
+    records = []
+    try:
+        for n_atoms in atoms or DEFAULT_ATOMS:
+            for n_frames in frames or DEFAULT_FRAMES:
+                if get_trajectory_gb(n_atoms, n_frames) > max_gb:
+                    print('Skipping %d atoms and %d frames: trajectory larger than %g GB' % (n_atoms, n_frames, max_gb))
+                    continue
+                inputs = prepare_inputs(data_dir, n_atoms, n_frames, get_input_files(runnable), seed)
+                for case in runnable:
+                    run_dir = Path(work_dir).joinpath('runs', '%s_%s_%d_%d' % (case.block, case.backend, n_atoms, n_frames))
+                    result = run_case(case, inputs, run_dir, timeout)
+                    record = {'commit': commit, 'dirty': dirty, 'timestamp': datetime.datetime.utcnow().isoformat() + 'Z',
+                              'host': platform.node(), 'python': platform.python_version(), 'block': case.block, 'backend': case.backend,
+                              'atoms': n_atoms, 'frames': n_frames, 'return_code': result['return_code'], 'error': result['error']}
+                    record.update(result['metrics'])
+                    append_history(history_path, record)
+                    records.append(record)
+                    print(format_record(record))
+                    if not keep_runs:
+                        shutil.rmtree(run_dir, ignore_errors=True)
+    finally:
+        # the synthetic inputs are kept only in a given data directory
+        if keep_runs:
+            print('Working directories of the cases kept in %s' % work_dir)
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return records
+
+
+def format_record(record):
+    """ Gives a line describing a record """
+    case = '%-20s %-8s %8d atoms %7d frames' % (record['block'], record['backend'], record['atoms'], record['frames'])
+    if record['return_code']:
+        return '%s  FAILED: %s' % (case, record['error'])
+    return '%s  %9.3f s  %9.1f MB RSS  %10.1f MB read  %10.1f MB written  %3d subprocesses' % (
+        case, record['wall_time'], record['peak_rss'] / 1024 ** 2, (record['read_bytes'] or 0) / 1024 ** 2,
+        (record['write_bytes'] or 0) / 1024 ** 2, record['subprocesses'])
+
+
+def get_case_key(record):
+    """ Gives the key identifying the case and size of a record """
+    return record['block'], record['backend'], record['atoms'], record['frames']
+
+
+def latest_records(records, commit):
+    """ Gives the latest successful record of every case and size of a commit, given by any prefix of its hash """
+    latest = {}
+    for record in records:
+        if record.get('commit') and record['commit'].startswith(commit) and not record['return_code']:
+            latest[get_case_key(record)] = record
+    return latest
+
+
+def compare(history_path, base, head=None, threshold=DEFAULT_THRESHOLD):
+    """ Prints the metrics of the cases of a commit (the current one if None) relative to a base commit, gives the regressions """
+    records = read_history(history_path)
+    head = head or get_commit()[0]
+    base_records, head_records = latest_records(records, base), latest_records(records, head)
+    regressions = []
+    for key in sorted(set(base_records) & set(head_records)):
+        ratios = []
+        for metric in METRICS:
+            before, after = base_records[key].get(metric), head_records[key].get(metric)
+            if before is None or after is None:
+                ratios.append('%s n/a' % metric)
+                continue
+            ratio = after / before if before else (1.0 if after == before else float('inf'))
+            ratios.append('%s x%.2f' % (metric, ratio))
+            # the cpu time is reported but not checked, it depends on the load of the machine
+            if metric != 'cpu_time' and ratio > 1.0 + threshold and after - before > (0 if metric == 'subprocesses' else 1e-3):
+                regressions.append((key, metric, before, after))
+        print('%-20s %-8s %8d atoms %7d frames  ' % key + '  '.join(ratios))
+    for key, metric, before, after in regressions:
+        print('Regression in %s (%s) %d atoms %d frames: %s %g -> %g' % (key + (metric, before, after)))
+    if not set(base_records) & set(head_records):
+        print('No cases of %s and %s in %s' % (base, head, history_path))
+    return regressions
+
+
+def main():
+    """Command line execution of the benchmark suite."""
+    parser = argparse.ArgumentParser(description="Benchmark suite of the biobb_analysis blocks on synthetic systems.", formatter_class=lambda prog: argparse.RawTextHelpFormatter(prog, width=99999))
+    parser.add_argument('--atoms', type=int, nargs='+', default=DEFAULT_ATOMS, help='Numbers of atoms of the synthetic systems.')
+    parser.add_argument('--frames', type=int, nargs='+', default=DEFAULT_FRAMES, help='Numbers of frames of the synthetic trajectories.')
+    parser.add_argument('--blocks', nargs='+', help='Blocks to benchmark, all of them by default.')
+    parser.add_argument('--backends', nargs='+', choices=sorted(BACKEND_BINARIES), help='Backends to benchmark, all of them by default.')
+    parser.add_argument('--history', default=DEFAULT_HISTORY, help='Path to the history file the records are appended to.')
+    parser.add_argument('--data_dir', help='Directory of the synthetic inputs, kept to be reused; a temporary one by default.')
+    parser.add_argument('--max_gb', type=float, default=DEFAULT_MAX_GB, help='Largest synthetic trajectory generated, in GB.')
+    parser.add_argument('--timeout', type=float, help='Seconds after which a case is stopped.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic systems.')
+    parser.add_argument('--keep_runs', action='store_true', help='Keep the working directories of the cases.')
+    parser.add_argument('--compare', nargs='+', metavar='COMMIT', help='Compare the records of a commit (the current one by default) to the ones of a base commit instead of running the suite.')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='Relative increase of a metric reported as a regression.')
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(args.history, args.compare[0], args.compare[1] if len(args.compare) > 1 else None, args.threshold)
+        sys.exit(1 if regressions else 0)
+    records = run_suite(args.atoms, args.frames, args.blocks, args.backends, args.history, args.data_dir,
+                        args.max_gb, args.timeout, args.seed, args.keep_runs)
+    sys.exit(1 if any(record['return_code'] for record in records) else 0)
+
+
+if __name__ == '__main__':
+    main()
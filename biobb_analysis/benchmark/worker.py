@@ -0,0 +1,43 @@
+""" Benchmark worker for package biobb_analysis.benchmark
+
+Launches a single case in a fresh process, so that its peak memory and its subprocesses are its own, and writes its
+return code, error and metrics (see :mod:`biobb_analysis.benchmark.measure`) as JSON.
+
+Usage: python -m biobb_analysis.benchmark.worker case.json, case.json holding the module and block of the case, its
+paths and properties and the path of the result file.
+"""
+import importlib
+import json
+import sys
+from biobb_analysis.benchmark.measure import measure
+
+
+def launch(block, paths, properties):
+    """ Launches a block, gives its return code and error if any """
+    try:
+        return_code = block(properties=properties, **paths)
+        return (return_code or 0), None
+    except SystemExit as e:
+        return (e.code if isinstance(e.code, int) and e.code else 1), str(e)
+    except Exception as e:
+        return 1, '%s: %s' % (e.__class__.__name__, e)
+
+
+def run_case(spec):
+    """ Launches and measures the case described by spec, gives its result """
+    block = getattr(importlib.import_module(spec['module']), spec['block'])
+    (return_code, error), metrics = measure(launch, block, spec['paths'], spec['properties'])
+    return {'return_code': return_code, 'error': error, 'metrics': metrics}
+
+
+def main():
+    """Command line execution of a benchmark case."""
+    with open(sys.argv[1]) as case:
+        spec = json.load(case)
+    result = run_case(spec)
+    with open(spec['result_path'], 'w') as result_file:
+        json.dump(result, result_file)
+
+
+if __name__ == '__main__':
+    main()
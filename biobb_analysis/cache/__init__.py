@@ -0,0 +1,2 @@
+name = "cache"
+__all__ = ["results", "structure", "topology"]
@@ -0,0 +1,185 @@
+""" Content-addressed result cache for package biobb_analysis.cache
+
+The outputs of a successful run are stored under a key built from the hash of the contents of the input
+files, the properties that change the result, the wrapper class and the version of the executed software.
+A later run with the same key restores the outputs, hard-linking them when possible, instead of recomputing
+them. Restored outputs share their contents with the cache, so they must be replaced rather than modified in
+place. The least recently used results are evicted once the cache grows beyond its maximum size.
+"""
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from biobb_common.tools import file_utils as fu
+
+# default maximum size of the cache in MB
+DEFAULT_CACHE_SIZE = 1024
+# properties that do not change the outputs of a block
+IGNORED_PROPERTIES = {'cache_path', 'cache_size', 'remove_tmp', 'restart', 'global_log', 'prefix', 'step', 'path',
+                      'can_write_console_log', 'n_workers', 'warm_pool', 'batch_workers', 'staging', 'container_session', 'disable_sandbox', 'chdir_sandbox', 'dev',
+                      'check_extensions', 'check_var_typing', 'working_dir_path', 'system', 'frame_index'}
+# size of the blocks read when hashing the input files
+HASH_BLOCK_SIZE = 16 * 1024 * 1024
+# hashes of the files read by this process, by path, size and modification time
+_hashes = {}
+
+
+def hash_file(path, cache_path=None):
+    """ Gives the hash of the contents of a file, memoized by path, size and modification time in the cache if given, else in the process """
+    stat = os.stat(path)
+    stamp = '%s:%d:%d' % (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+    memo = Path(cache_path).joinpath('inputs', hashlib.blake2b(stamp.encode(), digest_size=16).hexdigest()) if cache_path else None
+    if memo is None and stamp in _hashes:
+        return _hashes[stamp]
+    if memo is not None and memo.exists():
+        return memo.read_text()
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    if memo is None:
+        _hashes[stamp] = digest.hexdigest()
+    else:
+        memo.parent.mkdir(parents=True, exist_ok=True)
+        memo.write_text(digest.hexdigest())
+    return digest.hexdigest()
+
+
+def get_software_version(biobb):
+    """ Gives a fingerprint of the software run by the block: container image, package version or executable binary """
+    if biobb.container_path:
+        return 'container:%s:%s' % (biobb.container_path, biobb.container_image)
+    version = getattr(importlib.import_module(biobb.__module__.split('.')[0]), '__version__', '')
+    if getattr(biobb, 'backend', '') == 'native':
+        return 'native:%s' % version
+    binary = shutil.which(str(biobb.binary_path)) or str(biobb.binary_path)
+    if Path(binary).exists():
+        stat = os.stat(binary)
+        return 'binary:%s:%s:%d:%d' % (version, os.path.realpath(binary), stat.st_size, stat.st_mtime_ns)
+    return 'binary:%s:%s' % (version, binary)
+
+
+def strip_output_paths(value):
+    """ Replaces the output paths nested in a property (the output of every cpptraj_multi analysis) by their extension, as the top-level ones """
+    if isinstance(value, dict):
+        return {key: Path(str(item)).suffix if key == 'output' or (key.startswith('output_') and key.endswith('_path')) else strip_output_paths(item)
+                for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [strip_output_paths(item) for item in value]
+    return value
+
+
+def normalize_properties(biobb):
+    """ Gives the properties that change the outputs of a block as strings, dropping those set to their documented default """
+    properties = {}
+    for key, value in biobb.properties.items():
+        if key in IGNORED_PROPERTIES:
+            continue
+        default = (biobb.doc_properties_dict or {}).get(key, {}).get('default_value')
+        if default is not None and default.strip('\'"') == str(value):
+            continue
+        properties[key] = json.dumps(strip_output_paths(value), sort_keys=True, default=str)
+    return properties
+
+
+def get_cache_key(biobb):
+    """ Gives the key of the outputs of a block: hash of its inputs, properties, wrapper class and software """
+    inputs = {}
+    for key, path in biobb.io_dict["in"].items():
+        if key != 'stdin_file_path' and path and Path(path).is_file():
+            inputs[key] = hash_file(path, biobb.cache_path)
+    outputs = {key: Path(path).suffix for key, path in biobb.io_dict["out"].items() if path}
+    description = json.dumps({'class': '%s.%s' % (biobb.__module__, biobb.__class__.__name__),
+                              'software': get_software_version(biobb), 'inputs': inputs,
+                              'properties': normalize_properties(biobb), 'outputs': outputs}, sort_keys=True, default=str)
+    return hashlib.blake2b(description.encode(), digest_size=20).hexdigest()
+
+
+def link_or_copy(src, dst):
+    """ Hard-links src into dst, copies it if both are not in the same file system """
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def restore_cache(biobb, out_log):
+    """ Restores the outputs of a block from the cache if they were already computed, returns True if so """
+    if not getattr(biobb, 'cache_path', None):
+        return False
+    biobb.cache_key = get_cache_key(biobb)
+    entry = Path(biobb.cache_path).joinpath('results', biobb.cache_key)
+    if not entry.is_dir():
+        # outputs restored by a previous hit are unlinked, so that the new run does not write into the cache
+        for path in biobb.io_dict["out"].values():
+            if path and Path(path).is_file() and os.stat(path).st_nlink > 1:
+                os.remove(path)
+        fu.log('Result cache miss: %s' % biobb.cache_key, out_log)
+        return False
+    for key, path in biobb.io_dict["out"].items():
+        if path:
+            link_or_copy(str(entry.joinpath(key)), path)
+    # the modification time of an entry is its last use
+    os.utime(entry)
+    fu.log('Result cache hit: %s, outputs restored from %s' % (biobb.cache_key, entry), out_log)
+    return True
+
+
+def store_cache(biobb, out_log):
+    """ Stores the outputs of a successful run of a block in the cache and evicts the least recently used results """
+    if not getattr(biobb, 'cache_path', None) or biobb.return_code:
+        return
+    outputs = {key: path for key, path in biobb.io_dict["out"].items() if path}
+    if not fu.check_complete_files(outputs.values()):
+        return
+    key = getattr(biobb, 'cache_key', None) or get_cache_key(biobb)
+    results = Path(biobb.cache_path).joinpath('results')
+    entry = results.joinpath(key)
+    tmp = results.joinpath('.%s.%d' % (key, os.getpid()))
+    tmp.mkdir(parents=True, exist_ok=True)
+    for name, path in outputs.items():
+        shutil.copy2(path, str(tmp.joinpath(name)))
+    # the entry appears at once, another process may have stored it meanwhile
+    try:
+        os.rename(tmp, entry)
+        fu.log('Result cache: outputs stored in %s' % entry, out_log)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+    evict_cache(results, get_cache_size(biobb, out_log))
+
+
+def get_cache_size(biobb, out_log):
+    """ Gives the maximum size of the cache in MB """
+    size = getattr(biobb, 'cache_size', DEFAULT_CACHE_SIZE)
+    if not isinstance(size, int) or size < 1:
+        fu.log('Cache size %s is not valid, assigned default value: %d' % (size, DEFAULT_CACHE_SIZE), out_log)
+        return DEFAULT_CACHE_SIZE
+    return size
+
+
+def evict_cache(results, cache_size):
+    """ Removes the least recently used results until the cache fits in cache_size MB """
+    entries = []
+    for entry in results.iterdir():
+        if entry.name.startswith('.'):
+            # stale temporary entries of dead processes
+            if time.time() - entry.stat().st_mtime > 24 * 3600:
+                shutil.rmtree(entry, ignore_errors=True)
+            continue
+        try:
+            size = sum(f.stat().st_size for f in entry.iterdir())
+            entries.append((entry.stat().st_mtime, size, entry))
+        except FileNotFoundError:
+            # evicted meanwhile by another process
+            continue
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total <= cache_size * 1024 * 1024:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
@@ -0,0 +1,75 @@
+""" Cache of the set up trajectories for package biobb_analysis.cache
+
+The cpptraj analyses of a trajectory first center, image, fit and strip the solvent and ions of every frame.
+The first block doing it for a trajectory, topology and range of frames writes the resulting dry trajectory and
+topology into the cache, under a key built from the hash of the contents of its inputs, the range of frames,
+the set up instructions and the version of cpptraj. Later blocks with the same key read the dry trajectory
+instead of setting up the structure again. The least recently used trajectories are evicted once the cache
+grows beyond its maximum size.
+
+The dry trajectory is an Amber NetCDF trajectory, which stores the coordinates in single precision, as do the DCD and
+NetCDF inputs, whereas cpptraj sets up the structure in double precision. The analyses of a cached trajectory may thus
+differ from the uncached ones by rounding, far below the 4 decimals (Å) written by cpptraj for RMSd, but not always
+bit for bit.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from biobb_common.tools import file_utils as fu
+from biobb_analysis.cache.results import hash_file, get_software_version, get_cache_size, evict_cache
+
+# names of the topology and trajectory of every entry of the cache
+STRUCTURE_TOP = 'topology.parm7'
+STRUCTURE_TRAJ = 'trajectory.nc'
+
+
+def get_structure_key(biobb, in_params, setup_list):
+    """ Gives the key of the set up trajectory of a block: hash of its inputs, range of frames, set up instructions and software """
+    description = json.dumps({'software': get_software_version(biobb),
+                              'topology': hash_file(biobb.io_dict["in"]["input_top_path"], biobb.cache_path),
+                              'trajectory': hash_file(biobb.io_dict["in"]["input_traj_path"], biobb.cache_path),
+                              'range': in_params.split(), 'setup': setup_list}, sort_keys=True)
+    return hashlib.blake2b(description.encode(), digest_size=20).hexdigest()
+
+
+def get_cached_structure(biobb, key, out_log):
+    """ Gives the topology and trajectory paths of a set up trajectory if it is in the cache, None otherwise """
+    entry = Path(biobb.cache_path).resolve().joinpath('structures', key)
+    if not entry.is_dir():
+        fu.log('Structure cache miss: %s' % key, out_log)
+        return None
+    # the modification time of an entry is its last use
+    os.utime(entry)
+    fu.log('Structure cache hit: %s, set up trajectory read from %s' % (key, entry), out_log)
+    return str(entry.joinpath(STRUCTURE_TOP)), str(entry.joinpath(STRUCTURE_TRAJ))
+
+
+def new_structure(biobb, key):
+    """ Gives the topology and trajectory paths where a block writes its set up trajectory, stored in the cache by store_structure """
+    tmp = Path(biobb.cache_path).resolve().joinpath('structures', '.%s.%d.%d' % (key, os.getpid(), threading.get_ident()))
+    tmp.mkdir(parents=True, exist_ok=True)
+    biobb.structure_key = key
+    return str(tmp.joinpath(STRUCTURE_TOP)), str(tmp.joinpath(STRUCTURE_TRAJ))
+
+
+def store_structure(biobb, out_log):
+    """ Stores the set up trajectory written by a successful run of a block in the cache and evicts the least recently used ones """
+    key = getattr(biobb, 'structure_key', None)
+    if not key:
+        return
+    biobb.structure_key = None
+    structures = Path(biobb.cache_path).resolve().joinpath('structures')
+    tmp = structures.joinpath('.%s.%d.%d' % (key, os.getpid(), threading.get_ident()))
+    if biobb.return_code or not fu.check_complete_files([str(tmp.joinpath(STRUCTURE_TOP)), str(tmp.joinpath(STRUCTURE_TRAJ))]):
+        shutil.rmtree(tmp, ignore_errors=True)
+        return
+    # the entry appears at once, another process may have stored it meanwhile
+    try:
+        os.rename(tmp, structures.joinpath(key))
+        fu.log('Structure cache: set up trajectory stored in %s' % structures.joinpath(key), out_log)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+    evict_cache(structures, get_cache_size(biobb, out_log))
@@ -0,0 +1,145 @@
+""" Cache of the topologies extracted from zip files for package biobb_analysis.cache
+
+Zipped topologies are extracted once per zip contents into a directory shared by all the processes, instead of
+once per launch. Every process holding an extraction leaves a reference file in its directory and counts the
+blocks using it. The blocks release their topology when removing their temporary files; once no block of the
+process uses it, the extraction is removed unless other live processes still reference it or a block asked to keep
+its temporary files. The extractions of the blocks that did not release theirs are removed when the process exits.
+The extractions and removals of all the processes are serialized by a lock file in the cache directory.
+"""
+import atexit
+import fcntl
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from biobb_common.tools import file_utils as fu
+from biobb_analysis.cache.results import hash_file
+
+# directory where the topologies are extracted, one subdirectory per zip contents hash
+TOPOLOGY_CACHE_DIR = Path(tempfile.gettempdir()).joinpath('biobb_analysis', 'topologies')
+# name of the file holding the name of the extracted topology, written once the extraction is complete
+COMPLETE_FILE = '.complete'
+# lock file of the cache directory
+LOCK_FILE = '.lock'
+
+# blocks of this process using every extraction, by zip contents hash
+_references = {}
+# zip contents hash of every extracted topology path handed to this process
+_topologies = {}
+# extractions that must not be removed when the process exits
+_kept = set()
+_lock = threading.Lock()
+
+
+def _is_alive(pid):
+    """ Checks whether a process is still running """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _unlink(path):
+    """ Removes a file if it exists """
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+@contextmanager
+def _locked():
+    """ Serializes the extractions and removals of the threads of this process and of the other processes """
+    TOPOLOGY_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with _lock, open(str(TOPOLOGY_CACHE_DIR.joinpath(LOCK_FILE)), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _reference_file(directory):
+    """ Gives the reference file of this process in an extraction directory """
+    return directory.joinpath('.ref.%d' % os.getpid())
+
+
+def _other_references(directory):
+    """ Gives the reference files of other live processes, removing those of dead ones """
+    references = []
+    for ref in directory.glob('.ref.*'):
+        pid = int(ref.name.rsplit('.', 1)[1])
+        if pid == os.getpid():
+            continue
+        if _is_alive(pid):
+            references.append(ref)
+        else:
+            _unlink(ref)
+    return references
+
+
+def _remove(key):
+    """ Removes the reference of this process to an extraction and the extraction if no other live process uses it nor must be kept; the lock must be held """
+    directory = TOPOLOGY_CACHE_DIR.joinpath(key)
+    _references.pop(key, None)
+    if not directory.exists():
+        return False
+    _unlink(_reference_file(directory))
+    if key in _kept or _other_references(directory):
+        return False
+    shutil.rmtree(directory, ignore_errors=True)
+    return True
+
+
+def extract_topology(zip_path, out_log):
+    """ Gives the path of the topology extracted from a zip file, extracting it only if no process did it before """
+    key = hash_file(zip_path)
+    directory = TOPOLOGY_CACHE_DIR.joinpath(key)
+    complete = directory.joinpath(COMPLETE_FILE)
+    # no other process removes the extraction until this one references it
+    with _locked():
+        if complete.exists():
+            fu.log('Topology cache hit: %s already extracted in %s' % (zip_path, directory), out_log)
+        else:
+            shutil.rmtree(directory, ignore_errors=True)
+            tmp = TOPOLOGY_CACHE_DIR.joinpath('.%s.%d' % (key, os.getpid()))
+            tmp.mkdir(parents=True, exist_ok=True)
+            top_file = fu.unzip_top(zip_file=zip_path, out_log=out_log, unique_dir=str(tmp))
+            tmp.joinpath(COMPLETE_FILE).write_text(str(Path(top_file).relative_to(tmp)))
+            os.rename(str(tmp), str(directory))
+        if not _references.get(key):
+            _reference_file(directory).touch()
+        _references[key] = _references.get(key, 0) + 1
+        top_path = str(directory.joinpath(complete.read_text()))
+        _topologies[top_path] = key
+    return top_path
+
+
+def release_topology(top_path, remove_tmp, out_log):
+    """ Releases a topology given by extract_topology, its extraction is removed once no block of the process uses it unless remove_tmp is False """
+    with _locked():
+        key = _topologies.get(str(top_path))
+        if key is None or not _references.get(key):
+            return
+        _references[key] -= 1
+        if not remove_tmp:
+            _kept.add(key)
+        if _references[key]:
+            fu.log('Topology cache: %s released, %d blocks of this process still use it' % (top_path, _references[key]), out_log)
+            return
+        del _topologies[str(top_path)]
+        if _remove(key):
+            fu.log('Topology cache: %s released and removed' % top_path, out_log)
+        else:
+            fu.log('Topology cache: %s released, kept for other processes or kept temporary files' % top_path, out_log)
+
+
+@atexit.register
+def remove_topologies():
+    """ Removes the extractions of this process that no other process uses, blocks that did not release theirs have ended too """
+    with _locked():
+        for key in list(_references):
+            _remove(key)
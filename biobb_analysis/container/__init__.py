@@ -0,0 +1,2 @@
+name = "container"
+__all__ = ["session"]
@@ -0,0 +1,189 @@
+""" Container sessions reused across blocks for package biobb_analysis.container
+
+Instead of starting a docker container or a singularity instance for every command, blocks with container_session
+run their command through exec in a long-lived container started once per image, volume path and user id. Every
+session mounts its own session directory in the container volume path and runs a single block at a time: the
+staged files of the block are hard-linked into the session directory before the command and the files it writes
+are moved back to the temporary directory of the block afterwards, so that the paths seen by the command are the
+same as in a new container. A new session is started when all the sessions of a key are busy. Sessions are
+stopped at interpreter exit or by close_sessions.
+"""
+import atexit
+import os
+import shutil
+import subprocess
+import threading
+import uuid
+from pathlib import Path
+from biobb_common.tools import file_utils as fu
+from biobb_common.command_wrapper import cmd_wrapper
+from biobb_analysis.staging.files import link_file
+from biobb_analysis.profiling.phases import profiled
+
+# container engines able to run commands in a long-lived container
+SESSION_ENGINES = ('docker', 'singularity')
+
+
+def get_engine(container_path):
+    """ Gives the container engine of a container executable, None if it can not hold sessions """
+    engine = Path(str(container_path)).name
+    return next((name for name in SESSION_ENGINES if engine.endswith(name)), None)
+
+
+def clear_dir(directory):
+    """ Removes the contents of a directory """
+    for entry in directory.iterdir():
+        if entry.is_dir() and not entry.is_symlink():
+            shutil.rmtree(entry, ignore_errors=True)
+        else:
+            entry.unlink()
+
+
+class ContainerSession:
+    """ Long-lived docker container or singularity instance with a session directory mounted in its volume path """
+
+    def __init__(self, container_path, container_image, container_volume_path, container_user_id, parent_dir):
+        self.container_path = container_path
+        self.engine = get_engine(container_path)
+        self.name = 'biobb_session_' + uuid.uuid4().hex[:12]
+        # next to the temporary directories of the blocks, so that their files are hard-linked and not copied
+        self.session_dir = Path(parent_dir).joinpath('.' + self.name)
+        self.session_dir.mkdir(parents=True)
+        volume = '%s:%s' % (self.session_dir, container_volume_path)
+        if self.engine == 'docker':
+            cmd = [container_path, 'run', '-d', '--rm', '--name', self.name]
+            if container_user_id:
+                cmd += ['--user', container_user_id]
+            cmd += ['-v', volume, '--entrypoint', 'sleep', container_image, 'infinity']
+        else:
+            cmd = [container_path, 'instance', 'start', '--bind', volume, container_image, self.name]
+        try:
+            subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+        except (OSError, subprocess.CalledProcessError):
+            shutil.rmtree(self.session_dir, ignore_errors=True)
+            raise
+
+    def exec_command(self, biobb, cmd):
+        """ Gives the command line running cmd in the session, with the environment, working directory and user of the block """
+        if self.engine == 'docker':
+            exec_cmd = [self.container_path, 'exec']
+            for env_var_name, env_var_value in biobb.env_vars_dict.items():
+                exec_cmd += ['-e', f"{env_var_name}='{env_var_value}'"]
+            if biobb.container_working_dir:
+                exec_cmd += ['-w', biobb.container_working_dir]
+            if biobb.container_user_id:
+                exec_cmd += ['--user', biobb.container_user_id]
+            exec_cmd.append(self.name)
+        else:
+            exec_cmd = [self.container_path, 'exec', '-e']
+            if biobb.env_vars_dict:
+                exec_cmd += ['--env', ','.join(f"{env_var_name}='{env_var_value}'" for env_var_name, env_var_value in biobb.env_vars_dict.items())]
+            exec_cmd.append('instance://' + self.name)
+        return exec_cmd + [biobb.container_shell_path, '"' + ' '.join(cmd) + '"']
+
+    def load(self, unique_dir):
+        """ Hard-links the staged files of a block into the session directory """
+        clear_dir(self.session_dir)
+        for entry in Path(unique_dir).iterdir():
+            if entry.is_dir():
+                shutil.copytree(entry, self.session_dir.joinpath(entry.name), copy_function=lambda src, dst: link_file(src, dst, symlink=False))
+            else:
+                link_file(str(entry), str(self.session_dir.joinpath(entry.name)), symlink=False)
+
+    def unload(self, unique_dir):
+        """ Moves the files written by the command of a block back to its temporary directory """
+        for entry in self.session_dir.iterdir():
+            target = Path(unique_dir).joinpath(entry.name)
+            if target.exists() and target.samefile(entry):
+                continue
+            if target.is_dir():
+                shutil.rmtree(target, ignore_errors=True)
+            os.replace(entry, target)
+        clear_dir(self.session_dir)
+
+    def close(self):
+        """ Stops the container and removes the session directory """
+        if self.engine == 'docker':
+            cmd = [self.container_path, 'stop', '-t', '0', self.name]
+        else:
+            cmd = [self.container_path, 'instance', 'stop', self.name]
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        shutil.rmtree(self.session_dir, ignore_errors=True)
+
+
+# idle sessions, by container executable, image, volume path, user id and parent directory
+_sessions = {}
+# every session started by this process
+_started = []
+_sessions_lock = threading.Lock()
+
+
+def get_session_key(biobb, parent_dir):
+    """ Gives the key of the sessions able to run the command of a block """
+    return (biobb.container_path, biobb.container_image, biobb.container_volume_path, biobb.container_user_id, str(Path(parent_dir).resolve()))
+
+
+def is_session_runnable(biobb, out_log):
+    """ Checks if the command of a block can be run in a container session """
+    container_session = getattr(biobb, 'container_session', False)
+    if not isinstance(container_session, bool):
+        fu.log(biobb.__class__.__name__ + ': Incorrect container_session provided, it must be a boolean, exiting', out_log)
+        raise SystemExit(biobb.__class__.__name__ + ': Incorrect container_session provided')
+    if not container_session or not biobb.container_path:
+        return False
+    if not get_engine(biobb.container_path):
+        fu.log('container_session is only available for docker and singularity, running a new container', out_log)
+        return False
+    if biobb.disable_sandbox:
+        fu.log('container_session is not available without sandbox, running a new container', out_log)
+        return False
+    return True
+
+
+@profiled('run_biobb')
+def run_biobb(biobb, out_log, err_log):
+    """ Runs the command of a block in an idle container session if container_session is set, in a new container or locally otherwise """
+    if not is_session_runnable(biobb, out_log):
+        biobb.run_biobb()
+        return biobb.return_code
+
+    unique_dir = biobb.stage_io_dict["unique_dir"]
+    key = get_session_key(biobb, Path(unique_dir).parent)
+    with _sessions_lock:
+        sessions = _sessions.setdefault(key, [])
+        session = sessions.pop() if sessions else None
+    if session is None:
+        fu.log('Starting a %s container session for %s' % (get_engine(biobb.container_path), biobb.container_image), out_log)
+        try:
+            session = ContainerSession(biobb.container_path, biobb.container_image, biobb.container_volume_path,
+                                       biobb.container_user_id, Path(unique_dir).parent)
+        except (OSError, subprocess.CalledProcessError) as e:
+            fu.log('Container session could not be started (%s), running a new container' % e, out_log)
+            biobb.run_biobb()
+            return biobb.return_code
+        with _sessions_lock:
+            _started.append(session)
+
+    try:
+        session.load(unique_dir)
+        if biobb.dev:
+            fu.log(f"Adding development options: {biobb.dev}", out_log, biobb.global_log)
+        biobb.cmd = session.exec_command(biobb, biobb.cmd + (biobb.dev.split() if biobb.dev else []))
+        fu.log('Running in container session %s' % session.name, out_log)
+        biobb.return_code = cmd_wrapper.CmdWrapper(biobb.cmd, biobb.shell_path, out_log, err_log, biobb.global_log).launch()
+        session.unload(unique_dir)
+    finally:
+        with _sessions_lock:
+            _sessions.setdefault(key, []).append(session)
+    return biobb.return_code
+
+
+@atexit.register
+def close_sessions():
+    """ Stops all the container sessions started by this process """
+    with _sessions_lock:
+        sessions = list(_started)
+        _started.clear()
+        _sessions.clear()
+    for session in sessions:
+        session.close()
@@ -1,8 +1,15 @@
 """ Common functions for package biobb_analysis.gromacs """
 from pathlib import Path, PurePath
+import os
 import re, sys
 import shutil
+import struct
+import threading
+import zipfile
 from biobb_common.tools import file_utils as fu
+from biobb_analysis.native.columnar import is_columnar
+from biobb_analysis.native.index import can_trim, load_frame_index, get_time_range, trim_trajectory
+from biobb_analysis.profiling.phases import profiled
 
 
 def check_energy_path(path, out_log, classname):
@@ -60,13 +67,48 @@ def check_traj_path(path, out_log, classname):
 		path = str(PurePath(Path.cwd()).joinpath(path))
 	return path
 
+def trim_traj_path(biobb, out_log):
+	""" Replaces the XTC, TRR, DCD or NetCDF3 trajectory of a block by a copy of the frames between its start and end times when frame_index is set; restored by release_traj_path.
+	One more frame is kept at every side, so that trjconv applies -b, -e, -dt and -skip to the same frames """
+	biobb.input_traj_path_orig = None
+	path = biobb.io_dict["in"]["input_traj_path"]
+	if not biobb.frame_index:
+		return
+	if not can_trim(path):
+		fu.log('Only XTC, TRR, DCD without fixed atoms and NetCDF3 trajectories can be trimmed, %s not trimmed' % path, out_log)
+		return
+	try:
+		index = load_frame_index(path)
+	except (ValueError, OSError, struct.error) as e:
+		fu.log('Trajectory %s can not be indexed, not trimmed: %s' % (path, e), out_log)
+		return
+	# end 0 means the last frame
+	first, stop = get_time_range(index, float(biobb.start), float(biobb.end) if float(biobb.end) else None)
+	if first == 0 and stop == len(index.time):
+		return
+	trim_path = str(PurePath(fu.create_unique_dir()).joinpath(PurePath(path).name))
+	trim_trajectory(path, first, stop, trim_path, index)
+	fu.log('Frames %d to %d of %s copied to %s' % (first + 1, stop, path, trim_path), out_log)
+	biobb.input_traj_path_orig = path
+	biobb.io_dict["in"]["input_traj_path"] = trim_path
+
+def release_traj_path(biobb, out_log):
+	""" Restores the trajectory replaced by trim_traj_path, if any """
+	if not getattr(biobb, 'input_traj_path_orig', None):
+		return
+	trim_path = biobb.io_dict["in"]["input_traj_path"]
+	biobb.io_dict["in"]["input_traj_path"] = biobb.input_traj_path_orig
+	biobb.input_traj_path_orig = None
+	if biobb.remove_tmp:
+		shutil.rmtree(PurePath(trim_path).parent, ignore_errors=True)
+
 def check_out_xvg_path(path, out_log, classname):
-	""" Checks if output folder exists and format is xvg """
+	""" Checks if output folder exists and format is xvg or a binary columnar one """
 	if PurePath(path).parent and not Path(PurePath(path).parent).exists():
 		fu.log(classname + ': Unexisting output folder, exiting', out_log)
 		raise SystemExit(classname + ': Unexisting output folder')
 	file_extension = PurePath(path).suffix
-	if not is_valid_xvg(file_extension[1:]):
+	if not is_valid_xvg(file_extension[1:]) and not is_columnar(file_extension[1:]):
 		fu.log(classname + ': Format %s in output file is not compatible' % file_extension[1:], out_log)
 		raise SystemExit(classname + ': Format %s in output file is not compatible' % file_extension[1:])
 	return path
@@ -110,6 +152,8 @@ def get_default_value(key):
 	default_values = {
 		"instructions_file": "instructions.in",
 		"binary_path": "gmx",
+		"backend": "gromacs",
+		"n_workers": 1,
 		"terms": ["Potential"],
 		"selection": "System",
 		"xvg": "none",
@@ -128,7 +172,12 @@ def get_default_value(key):
 		"start": 0,
 		"end": 0,
 		"dt": 0,
-		"ot_str_ens": "pdb"
+		"ot_str_ens": "pdb",
+		"streaming": False,
+		"frame_index": False,
+		"incremental": False,
+		"compression": "stored",
+		"compression_level": 6
 	}
 
 	return default_values[key]
@@ -137,13 +186,13 @@ def get_binary_path(properties, type):
 	""" Gets binary path """
 	return properties.get(type, get_default_value(type))
 
-def get_terms(properties, out_log, classname):
-	""" Gets energy terms """
+def get_terms(properties, out_log, classname, native = False):
+	""" Gets energy terms, the terms for the native backend being checked against the terms of the energy file when read """
 	terms = properties.get('terms', dict())
 	if not terms or not isinstance(terms, list):
 		fu.log(classname + ': No terms provided or incorrect format, exiting', out_log)
 		raise SystemExit(classname + ': No terms provided or incorrect format')
-	if not is_valid_term(terms):
+	if not native and not is_valid_term(terms):
 		fu.log(classname + ': Incorrect terms provided, exiting', out_log)
 		raise SystemExit(classname + ': Incorrect terms provided')
 	return properties.get('terms', '')
@@ -255,6 +304,46 @@ def get_ot_str_ens(properties, out_log, classname):
 		raise SystemExit(classname + ': Incorrect output_type provided')
 	return str(output_type)
 
+def get_streaming(properties, out_log, classname):
+	""" Gets streaming """
+	streaming = properties.get('streaming', get_default_value('streaming'))
+	if not is_valid_boolean(streaming):
+		fu.log(classname + ': Incorrect streaming provided, exiting', out_log)
+		raise SystemExit(classname + ': Incorrect streaming provided')
+	return streaming
+
+def get_frame_index(properties, out_log, classname):
+	""" Gets frame_index """
+	frame_index = properties.get('frame_index', get_default_value('frame_index'))
+	if not is_valid_boolean(frame_index):
+		fu.log(classname + ': Incorrect frame_index provided, exiting', out_log)
+		raise SystemExit(classname + ': Incorrect frame_index provided')
+	return frame_index
+
+def get_incremental(properties, out_log, classname):
+	""" Gets incremental """
+	incremental = properties.get('incremental', get_default_value('incremental'))
+	if not is_valid_boolean(incremental):
+		fu.log(classname + ': Incorrect incremental provided, exiting', out_log)
+		raise SystemExit(classname + ': Incorrect incremental provided')
+	return incremental
+
+def get_compression(properties, out_log, classname):
+	""" Gets compression """
+	compression = properties.get('compression', get_default_value('compression'))
+	if not is_valid_compression(compression):
+		fu.log(classname + ': Incorrect compression provided, exiting', out_log)
+		raise SystemExit(classname + ': Incorrect compression provided')
+	return compression
+
+def get_compression_level(properties, out_log, classname):
+	""" Gets compression level """
+	compression_level = properties.get('compression_level', get_default_value('compression_level'))
+	if not isinstance(compression_level, int) or isinstance(compression_level, bool) or not 0 <= compression_level <= 9:
+		fu.log(classname + ': Incorrect compression_level provided, exiting', out_log)
+		raise SystemExit(classname + ': Incorrect compression_level provided')
+	return compression_level
+
 def get_xvg(properties, out_log, classname):
 	""" Gets xvg """
 	xvg = properties.get('xvg', get_default_value('xvg'))
@@ -263,6 +352,22 @@ def get_xvg(properties, out_log, classname):
 		raise SystemExit(classname + ': Incorrect xvg provided')
 	return xvg
 
+def get_backend(properties, out_log, classname):
+	""" Gets backend """
+	backend = properties.get('backend', get_default_value('backend'))
+	if not is_valid_backend(backend):
+		fu.log(classname + ': Incorrect backend provided, exiting', out_log)
+		raise SystemExit(classname + ': Incorrect backend provided')
+	return backend
+
+def get_n_workers(properties, out_log, classname):
+	""" Gets n_workers """
+	n_workers = properties.get('n_workers', get_default_value('n_workers'))
+	if not is_valid_int(n_workers) or int(n_workers) < 1:
+		fu.log(classname + ': Incorrect n_workers provided, exiting', out_log)
+		raise SystemExit(classname + ': Incorrect n_workers provided')
+	return int(n_workers)
+
 def get_dista(properties, out_log, classname):
 	""" Gets dista """
 	dista = properties.get('dista', get_default_value('dista'))
@@ -287,6 +392,11 @@ def get_cutoff(properties, out_log, classname):
 		raise SystemExit(classname + ': Incorrect cutoff provided')
 	return str(cutoff)
 
+@profiled('instructions')
+def create_stdin_file(biobb, text):
+	""" Creates the standard input file of a block """
+	return fu.create_stdin_file(text)
+
 def is_valid_boolean(val):
 	""" Checks if given value is boolean """
 	values = [True, False]
@@ -354,6 +464,16 @@ def is_valid_ot_str_ens(ext):
 	formats = ['gro', 'g96', 'pdb']
 	return ext in formats
 
+def is_valid_compression(compression):
+	""" Checks if compression of the ensemble zip is correct """
+	compressions = ['stored', 'deflated']
+	return compression in compressions
+
+def is_valid_backend(backend):
+	""" Checks if backend is compatible """
+	backends = ['gromacs', 'native']
+	return backend in backends
+
 def is_valid_pbc(pbc):
 	""" Checks pbc parameter """
 	values = ['none', 'mol', 'res', 'atom', 'nojump', 'cluster', 'whole']
@@ -389,14 +509,86 @@ def remove_tmp_files(list, remove_tmp, out_log):
 		removed_files = [f for f in tmp_files if fu.rm(f)]
 		fu.log('Removed: %s' % str(removed_files), out_log)
 
-def process_output_trjconv_str_ens(tmp_folder, output_file, output_dir, glob_pattern, out_log):
+def process_output_trjconv_str_ens(tmp_folder, output_file, output_dir, glob_pattern, out_log, compression = "stored", compression_level = 6):
 	tmp_fl = list(Path(tmp_folder).glob(glob_pattern))
 	files_list = []
 	for file_name in tmp_fl:
 		files_list.append(file_name)
 
 	# adding files from temporary folder to zip
-	fu.zip_list(output_file, files_list, out_log)
+	if compression == 'stored':
+		fu.zip_list(output_file, files_list, out_log)
+	else:
+		with open_ensemble_zip(output_file, compression, compression_level) as zip_f:
+			for file_name in sorted(files_list):
+				zip_f.write(file_name, arcname=Path(file_name).name)
+		fu.log('Adding %d files to: %s' % (len(files_list), output_file), out_log)
 
 	shutil.copy2(output_file, output_dir)
 
+def open_ensemble_zip(output_file, compression, compression_level):
+	""" Opens a zip file for writing with the given compression, stored or deflated with compression_level """
+	if compression == 'stored':
+		return zipfile.ZipFile(output_file, 'w', compression=zipfile.ZIP_STORED, allowZip64=True)
+	return zipfile.ZipFile(output_file, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=compression_level, allowZip64=True)
+
+class EnsembleArchiver(threading.Thread):
+	""" Archives the frames written by trjconv -sep into a zip while trjconv runs.
+
+	trjconv -sep writes the frames one after the other as <name><number>.<type>, closing every frame before opening the
+	next one, so a frame is complete as soon as the next one appears. Every complete frame is added to the zip and
+	deleted, so that the frames and the zip never take much more scratch space than the zip itself. The zip is written
+	next to output_file and renamed to it once all the frames are archived.
+	"""
+
+	def __init__(self, frames_dir, output_name, output_type, output_file, compression, compression_level, out_log, interval = 0.2):
+		super().__init__(daemon=True)
+		self.frames_dir = Path(frames_dir)
+		self.output_name = output_name
+		self.output_type = output_type
+		self.output_file = output_file
+		self.partial_file = str(output_file) + '.part'
+		self.out_log = out_log
+		self.interval = interval
+		self.n_frames = 0
+		self.error = None
+		self.finished = threading.Event()
+		self.zip_f = open_ensemble_zip(self.partial_file, compression, compression_level)
+
+	def frame_path(self, index):
+		""" Gives the path of a frame written by trjconv -sep """
+		return self.frames_dir.joinpath('%s%d.%s' % (self.output_name, index, self.output_type))
+
+	def archive(self, path):
+		""" Adds a frame to the zip and deletes it """
+		self.zip_f.write(path, arcname=path.name)
+		path.unlink()
+
+	def run(self):
+		try:
+			while not self.finished.wait(self.interval):
+				while self.frame_path(self.n_frames + 1).exists():
+					self.archive(self.frame_path(self.n_frames))
+					self.n_frames += 1
+			# trjconv is over: the remaining frames are complete
+			while self.frame_path(self.n_frames).exists():
+				self.archive(self.frame_path(self.n_frames))
+				self.n_frames += 1
+		except (OSError, zipfile.BadZipFile) as e:
+			self.error = e
+		finally:
+			self.zip_f.close()
+
+	def finish(self, return_code):
+		""" Archives the last frames once trjconv is over and moves the zip to output_file if trjconv succeeded, gives the number of frames """
+		self.finished.set()
+		self.join()
+		if self.error or return_code:
+			os.remove(self.partial_file)
+			if self.error:
+				raise self.error
+			return self.n_frames
+		os.replace(self.partial_file, self.output_file)
+		fu.log('Streamed %d frames to: %s' % (self.n_frames, self.output_file), self.out_log)
+		return self.n_frames
+
@@ -7,6 +7,12 @@ from biobb_common.configuration import  settings
 from biobb_common.tools import file_utils as fu
 from biobb_common.tools.file_utils import launchlogger
 from biobb_analysis.gromacs.common import *
+from biobb_analysis.cache.results import restore_cache, store_cache
+from biobb_analysis.staging.files import stage_files, copy_to_host
+from biobb_analysis.container.session import run_biobb
+from biobb_analysis.profiling.phases import profile_launch, profile_phase
+from biobb_analysis.batch.runner import is_batch, run_batch
+from biobb_analysis.native.cluster import compute_gmx_cluster
 
 
 class GMXCluster(BiobbObject):
@@ -26,15 +32,24 @@ class GMXCluster(BiobbObject):
             * **dista** (*bool*) - (False) Use RMSD of distances instead of RMS deviation.
             * **method** (*str*) - ("linkage") Method for cluster determination. Values: linkage (Add a structure to a cluster when its distance to any element of the cluster is less than cutoff), jarvis-patrick (Add a structure to a cluster when this structure and a structure in the cluster have each other as neighbors and they have a least P neighbors in common), monte-carlo (Reorder the RMSD matrix using Monte Carlo such that the order of the frames is using the smallest possible increments), diagonalization (Diagonalize the RMSD matrix), gromos (Count number of neighbors using cut-off and take structure with largest number of neighbors with all its neighbors as cluster and eliminate it from the pool of clusters).
             * **cutoff** (*float*) - (0.1) [0~10|0.1] RMSD cut-off (nm) for two structures to be neighbor.
+            * **backend** (*str*) - ("gromacs") Engine used to cluster the structures. Values: gromacs (Run the GROMACS executable binary), native (Compute the RMSD matrix in-process with NumPy in tiles written to a disk-backed matrix; only for the linkage; gromos and jarvis-patrick methods; gro or pdb structures; gro; pdb; xtc or trr trajectories and pdb outputs).
+            * **n_workers** (*int*) - (1) [1~256|1] Number of processes computing the tiles of the RMSD matrix with the native backend.
+            * **batch_workers** (*int*) - (4) [1~256|1] Number of inputs processed at the same time when a list or a glob pattern of trajectories is given.
             * **binary_path** (*str*) - ("gmx") Path to the GROMACS executable binary.
             * **remove_tmp** (*bool*) - (True) [WF property] Remove temporal files.
             * **restart** (*bool*) - (False) [WF property] Do not execute if output files exist.
+            * **cache_path** (*str*) - (None) [WF property] Path to the result cache directory; outputs already computed from the same input files; properties and software are restored from it instead of recomputed. Disabled if None.
+            * **cache_size** (*int*) - (1024) [1~1000000|1] [WF property] Maximum size in MB of the result cache; the least recently used results are evicted.
+            * **staging** (*str*) - ("copy") [WF property] How the files are staged into the temporary directory. Values: copy (Inputs and outputs are copied), link (Inputs are hard-linked; symlinked across file systems and bind-mounted read-only in docker or singularity executions; outputs are moved to their host paths and copied only across file systems).
+            * **profile_path** (*str*) - (None) [WF property] Path to the JSON lines file where a record of the launch is appended: the time and the bytes read and written of each of its phases (checks; staging; instructions; run; copy to host and removal of temporary files). Disabled if None.
+            * **prometheus_path** (*str*) - (None) [WF property] Path to the Prometheus textfile collector file (.prom) where the resource usage of the child processes of the launch (CPU user and system time; peak RSS; context switches and block I/O) is written; by block and step. Disabled if None.
             * **container_path** (*str*) - (None) Container path definition.
             * **container_image** (*str*) - ('gromacs/gromacs:2022.2') Container image definition.
             * **container_volume_path** (*str*) - ('/tmp') Container volume path definition.
             * **container_working_dir** (*str*) - (None) Container working directory definition.
             * **container_user_id** (*str*) - (None) Container user_id definition.
             * **container_shell_path** (*str*) - ('/bin/bash') Path to default shell inside the container.
+            * **container_session** (*bool*) - (False) Run the command through exec in a long-lived container started once per container image; volume path and user id and reused by later blocks; instead of a new container. Only for docker and singularity.
 
     Examples:
         This is a use example of how to use the building block from Python::
@@ -82,7 +97,16 @@ class GMXCluster(BiobbObject):
         self.method = properties.get('method', "linkage")
         self.dista = properties.get('dista', False)
         self.cutoff = properties.get('cutoff', 0.1)
+        self.backend = properties.get('backend', "gromacs")
+        self.n_workers = properties.get('n_workers', 1)
         self.properties = properties
+        self.cache_path = properties.get('cache_path')
+        self.cache_size = properties.get('cache_size', 1024)
+        self.staging = properties.get('staging', 'copy')
+        self.profile_path = properties.get('profile_path')
+        self.prometheus_path = properties.get('prometheus_path')
+        self.container_session = properties.get('container_session', False)
+        self.batch_workers = properties.get('batch_workers', 4)
 
         # Properties common in all GROMACS BB
         self.binary_path = get_binary_path(properties, 'binary_path')
@@ -111,20 +135,38 @@ class GMXCluster(BiobbObject):
         self.dista = get_dista(self.properties, out_log, self.__class__.__name__)
         self.method = get_method(self.properties, out_log, self.__class__.__name__)
         self.cutoff = get_cutoff(self.properties, out_log, self.__class__.__name__)
+        self.backend = get_backend(self.properties, out_log, self.__class__.__name__)
+        self.n_workers = get_n_workers(self.properties, out_log, self.__class__.__name__)
 
     @launchlogger
+    @profile_launch
     def launch(self) -> int:
         """Execute the :class:`GMXCluster <gromacs.gmx_cluster.GMXCluster>` gromacs.gmx_cluster.GMXCluster object."""
 
         # standard input
-        self.io_dict['in']['stdin_file_path'] = fu.create_stdin_file(f'{self.fit_selection} {self.output_selection}')
+        self.io_dict['in']['stdin_file_path'] = create_stdin_file(self, f'{self.fit_selection} {self.output_selection}')
 
         # check input/output paths and parameters
         self.check_data_params(self.out_log, self.err_log)
 
         # Setup Biobb
         if self.check_restart(): return 0
-        self.stage_files()
+        if restore_cache(self, self.out_log): return 0
+
+        # native backend: no staging, no binary
+        if self.backend == 'native':
+            with profile_phase(self, 'compute_native'):
+                self.return_code = compute_gmx_cluster(self.io_dict["in"]["input_structure_path"], self.io_dict["in"]["input_traj_path"],
+                                                       self.io_dict["out"]["output_pdb_path"], self.io_dict["in"]["input_index_path"],
+                                                       self.fit_selection, self.output_selection, self.method, self.cutoff, self.dista,
+                                                       self.n_workers, self.remove_tmp, self.out_log, self.__class__.__name__)
+            self.tmp_files.append(self.io_dict['in'].get("stdin_file_path"))
+            self.remove_tmp_files()
+            self.check_arguments(output_files_created=True, raise_exception=False)
+            store_cache(self, self.out_log)
+            return self.return_code
+
+        stage_files(self, self.out_log)
 
         # if container execution, add container_volume_path to log, xvg & xpm (because docker doesn't allow to write teses files out of the /tmp folder)
         if self.container_path:
@@ -153,10 +195,10 @@ class GMXCluster(BiobbObject):
         self.cmd.append(self.stage_io_dict["in"]["stdin_file_path"])
 
         # Run Biobb block
-        self.run_biobb()
+        run_biobb(self, self.out_log, self.err_log)
 
         # Copy files to host
-        self.copy_to_host()
+        copy_to_host(self, self.out_log)
 
         self.tmp_files.extend([
             self.stage_io_dict.get("unique_dir"),
@@ -169,11 +211,19 @@ class GMXCluster(BiobbObject):
 
         self.check_arguments(output_files_created=True, raise_exception=False)
 
+        # Store the outputs in the result cache
+        store_cache(self, self.out_log)
+
         return self.return_code
 
 def gmx_cluster(input_structure_path: str, input_traj_path: str, output_pdb_path: str, input_index_path: str = None, properties: dict = None, **kwargs) -> int:
     """Execute the :class:`GMXCluster <gromacs.gmx_cluster.GMXCluster>` class and
-    execute the :meth:`launch() <gromacs.gmx_cluster.GMXCluster.launch>` method."""
+    execute the :meth:`launch() <gromacs.gmx_cluster.GMXCluster.launch>` method.
+    input_traj_path can also be a list or a glob pattern of trajectories, each one processed by
+    :func:`run_batch() <batch.runner.run_batch>` with its own outputs."""
+
+    if is_batch(input_traj_path):
+        return run_batch(GMXCluster, 'input_traj_path', properties=properties, input_structure_path=input_structure_path, input_traj_path=input_traj_path, output_pdb_path=output_pdb_path, input_index_path=input_index_path, **kwargs)
 
     return GMXCluster(input_structure_path=input_structure_path, 
                     input_traj_path=input_traj_path, 
@@ -189,7 +239,9 @@ def main():
     #Specific args of each building block
     required_args = parser.add_argument_group('required arguments')
     required_args.add_argument('--input_structure_path', required=True, help='Path to the input structure file. Accepted formats: tpr, gro, g96, pdb, brk, ent.')
-    required_args.add_argument('--input_traj_path', required=True, help='Path to the GROMACS trajectory file. Accepted formats: xtc, trr, cpt, gro, g96, pdb, tng.')
+    batch_args = required_args.add_mutually_exclusive_group(required=True)
+    batch_args.add_argument('--input_traj_path', help='Path to the GROMACS trajectory file. Accepted formats: xtc, trr, cpt, gro, g96, pdb, tng.')
+    batch_args.add_argument('--input_traj_glob', help='Glob pattern of the trajectories to be processed in batch; every one gets its own outputs; named after them; and a manifest.')
     parser.add_argument('--input_index_path', required=False, help="Path to the GROMACS index file. Accepted formats: ndx.")
     required_args.add_argument('--output_pdb_path', required=True, help='Path to the output cluster file. Accepted formats: xtc, trr, cpt, gro, g96, pdb, tng.')
 
@@ -199,7 +251,7 @@ def main():
 
     #Specific call of each building block
     gmx_cluster(input_structure_path=args.input_structure_path, 
-                input_traj_path=args.input_traj_path, 
+                input_traj_path=args.input_traj_path or args.input_traj_glob, 
                 output_pdb_path=args.output_pdb_path, 
                 input_index_path=args.input_index_path, 
                 properties=properties)
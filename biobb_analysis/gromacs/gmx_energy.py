@@ -7,6 +7,15 @@ from biobb_common.configuration import  settings
 from biobb_common.tools import file_utils as fu
 from biobb_common.tools.file_utils import launchlogger
 from biobb_analysis.gromacs.common import *
+from biobb_analysis.native.energy import compute_gmx_energy, get_term_units
+from biobb_analysis.cache.results import restore_cache, store_cache
+from biobb_analysis.native.columnar import begin_columnar_output, end_columnar_output
+from biobb_analysis.native.incremental import check_incremental
+from biobb_analysis.staging.files import stage_files, copy_to_host
+from biobb_analysis.container.session import run_biobb
+from biobb_analysis.profiling.phases import profile_launch, profile_phase
+from biobb_analysis.batch.runner import is_batch, run_batch
+from biobb_analysis.batch.segments import run_segments
 
 
 class GMXEnergy(BiobbObject):
@@ -17,19 +26,32 @@ class GMXEnergy(BiobbObject):
 
     Args:
         input_energy_path (str): Path to the input EDR file. File type: input. `Sample file <https://github.com/bioexcel/biobb_analysis/raw/master/biobb_analysis/test/data/gromacs/energy.edr>`_. Accepted formats: edr (edam:format_2330).
-        output_xvg_path (str): Path to the XVG output file. File type: output. `Sample file <https://github.com/bioexcel/biobb_analysis/raw/master/biobb_analysis/test/reference/gromacs/ref_energy.xvg>`_. Accepted formats: xvg (edam:format_2030).
+        output_xvg_path (str): Path to the XVG output file. File type: output. `Sample file <https://github.com/bioexcel/biobb_analysis/raw/master/biobb_analysis/test/reference/gromacs/ref_energy.xvg>`_. Accepted formats: xvg (edam:format_2030), npy (edam:format_2333), npz (edam:format_2333), parquet (edam:format_2333), hdf5 (edam:format_3590).
         properties (dic - Python dictionary object containing the tool parameters, not input/output files):
             * **xvg** (*str*) - ("none") XVG plot formatting. Values: xmgrace, xmgr, none.
-            * **terms** (*list*) - (["Potential"]) Energy terms. Values: Angle, Proper-Dih., Improper-Dih., LJ-14, Coulomb-14, LJ-\(SR\), Coulomb-\(SR\), Coul.-recip., Position-Rest., Potential, Kinetic-En., Total-Energy, Temperature, Pressure,  Constr.-rmsd, Box-X, Box-Y,  Box-Z, Volume, Density, pV, Enthalpy, Vir-XX, Vir-XY, Vir-XZ, Vir-YX, Vir-YY, Vir-YZ, Vir-ZX, Vir-ZY, Vir-ZZ, Pres-XX, Pres-XY, Pres-XZ, Pres-YX, Pres-YY,  Pres-YZ, Pres-ZX, Pres-ZY, Pres-ZZ, #Surf*SurfTen, Box-Vel-XX, Box-Vel-YY, Box-Vel-ZZ, Mu-X, Mu-Y, Mu-Z, T-Protein, T-non-Protein, Lamb-Protein, Lamb-non-Protein.
+            * **terms** (*list*) - (["Potential"]) Energy terms. Values: Angle, Proper-Dih., Improper-Dih., LJ-14, Coulomb-14, LJ-\(SR\), Coulomb-\(SR\), Coul.-recip., Position-Rest., Potential, Kinetic-En., Total-Energy, Temperature, Pressure,  Constr.-rmsd, Box-X, Box-Y,  Box-Z, Volume, Density, pV, Enthalpy, Vir-XX, Vir-XY, Vir-XZ, Vir-YX, Vir-YY, Vir-YZ, Vir-ZX, Vir-ZY, Vir-ZZ, Pres-XX, Pres-XY, Pres-XZ, Pres-YX, Pres-YY,  Pres-YZ, Pres-ZX, Pres-ZY, Pres-ZZ, #Surf*SurfTen, Box-Vel-XX, Box-Vel-YY, Box-Vel-ZZ, Mu-X, Mu-Y, Mu-Z, T-Protein, T-non-Protein, Lamb-Protein, Lamb-non-Protein. With the native backend; any term of the energy file.
+            * **start** (*int*) - (0) [0~10000|1] Time of first frame to read from the energy file (default unit ps).
+            * **end** (*int*) - (0) [0~10000|1] Time of last frame to read from the energy file (default unit ps). 0 reads up to the last frame.
+            * **backend** (*str*) - ("gromacs") Engine used to extract the energy terms. Values: gromacs (Run the GROMACS executable binary), native (Read the EDR file in-process with NumPy; all the terms in a single pass; only the frames between start and end are read).
+            * **incremental** (*bool*) - (False) Process only the frames added to the energy file since the last launch; and after the last time written; and append their rows to the output; the state being kept next to it (its path with an extra .state.npz suffix). A list or a glob pattern of energy files is taken as the consecutive segments of a single simulation. Only for the native backend and xvg outputs.
+            * **batch_workers** (*int*) - (4) [1~256|1] Number of inputs processed at the same time when a list or a glob pattern of energy files is given.
+            * **watch_interval** (*float*) - (0) [0~86400|1] [WF property] Seconds between polls of the glob pattern of segments for new or growing segments in incremental mode. 0 processes them once.
+            * **watch_timeout** (*float*) - (3600) [0~1000000|1] [WF property] Seconds without new or growing segments after which the watch ends.
             * **binary_path** (*str*) - ("gmx") Path to the GROMACS executable binary.
             * **remove_tmp** (*bool*) - (True) [WF property] Remove temporal files.
             * **restart** (*bool*) - (False) [WF property] Do not execute if output files exist.
+            * **cache_path** (*str*) - (None) [WF property] Path to the result cache directory; outputs already computed from the same input files; properties and software are restored from it instead of recomputed. Disabled if None.
+            * **cache_size** (*int*) - (1024) [1~1000000|1] [WF property] Maximum size in MB of the result cache; the least recently used results are evicted.
+            * **staging** (*str*) - ("copy") [WF property] How the files are staged into the temporary directory. Values: copy (Inputs and outputs are copied), link (Inputs are hard-linked; symlinked across file systems and bind-mounted read-only in docker or singularity executions; outputs are moved to their host paths and copied only across file systems).
+            * **profile_path** (*str*) - (None) [WF property] Path to the JSON lines file where a record of the launch is appended: the time and the bytes read and written of each of its phases (checks; staging; instructions; run; copy to host and removal of temporary files). Disabled if None.
+            * **prometheus_path** (*str*) - (None) [WF property] Path to the Prometheus textfile collector file (.prom) where the resource usage of the child processes of the launch (CPU user and system time; peak RSS; context switches and block I/O) is written; by block and step. Disabled if None.
             * **container_path** (*str*) - (None) Container path definition.
             * **container_image** (*str*) - ('gromacs/gromacs:2022.2') Container image definition.
             * **container_volume_path** (*str*) - ('/tmp') Container volume path definition.
             * **container_working_dir** (*str*) - (None) Container working directory definition.
             * **container_user_id** (*str*) - (None) Container user_id definition.
             * **container_shell_path** (*str*) - ('/bin/bash') Path to default shell inside the container.
+            * **container_session** (*bool*) - (False) Run the command through exec in a long-lived container started once per container image; volume path and user id and reused by later blocks; instead of a new container. Only for docker and singularity.
     
     Examples:
         This is a use example of how to use the building block from Python::
@@ -71,8 +93,21 @@ class GMXEnergy(BiobbObject):
         # Properties specific for BB
         self.xvg = properties.get('xvg', "none")
         self.terms = properties.get('terms', ["Potential"])
+        self.start = properties.get('start', 0)
+        self.end = properties.get('end', 0)
+        self.backend = properties.get('backend', "gromacs")
         self.instructions_file = get_default_value('instructions_file')
         self.properties = properties
+        self.cache_path = properties.get('cache_path')
+        self.cache_size = properties.get('cache_size', 1024)
+        self.staging = properties.get('staging', 'copy')
+        self.profile_path = properties.get('profile_path')
+        self.prometheus_path = properties.get('prometheus_path')
+        self.container_session = properties.get('container_session', False)
+        self.batch_workers = properties.get('batch_workers', 4)
+        self.incremental = properties.get('incremental', False)
+        self.watch_interval = properties.get('watch_interval', 0)
+        self.watch_timeout = properties.get('watch_timeout', 3600)
 
         # Properties common in all GROMACS BB
         self.binary_path = get_binary_path(properties, 'binary_path')
@@ -86,7 +121,12 @@ class GMXEnergy(BiobbObject):
         self.io_dict["in"]["input_energy_path"] = check_energy_path(self.io_dict["in"]["input_energy_path"], out_log, self.__class__.__name__)
         self.io_dict["out"]["output_xvg_path"] = check_out_xvg_path(self.io_dict["out"]["output_xvg_path"], out_log, self.__class__.__name__)
         self.xvg = get_xvg(self.properties, out_log, self.__class__.__name__)
-        self.terms = get_terms(self.properties, out_log, self.__class__.__name__)
+        self.backend = get_backend(self.properties, out_log, self.__class__.__name__)
+        self.terms = get_terms(self.properties, out_log, self.__class__.__name__, self.backend == 'native')
+        self.start = get_start(self.properties, out_log, self.__class__.__name__)
+        self.end = get_end(self.properties, out_log, self.__class__.__name__)
+        self.incremental = get_incremental(self.properties, out_log, self.__class__.__name__)
+        check_incremental(self, "output_xvg_path", out_log)
 
     def create_instructions_file(self):
         """Creates an input file using the properties file settings"""
@@ -110,6 +150,7 @@ class GMXEnergy(BiobbObject):
         return self.instructions_file
 
     @launchlogger
+    @profile_launch
     def launch(self) -> int:
         """Execute the :class:`GMXEnergy <gromacs.gmx_energy.GMXEnergy>` gromacs.gmx_energy.GMXEnergy object."""
 
@@ -118,7 +159,23 @@ class GMXEnergy(BiobbObject):
 
         # Setup Biobb
         if self.check_restart(): return 0
-        self.stage_files()
+        if restore_cache(self, self.out_log): return 0
+
+        # binary columnar output: written by the native backend, or the text output of the executable converted
+        begin_columnar_output(self, "output_xvg_path", 'xvg', self.out_log)
+        units = get_term_units(self.io_dict["in"]["input_energy_path"]) if self.columnar_output else None
+
+        # native backend: no staging, no instructions file, no binary
+        if self.backend == 'native':
+            with profile_phase(self, 'compute_native'):
+                self.return_code = compute_gmx_energy(self.io_dict["in"]["input_energy_path"], self.io_dict["out"]["output_xvg_path"],
+                                                      self.terms, self.start, self.end, self.xvg, self.out_log, self.__class__.__name__, self.incremental)
+            end_columnar_output(self, self.out_log, units)
+            self.check_arguments(output_files_created=True, raise_exception=False)
+            store_cache(self, self.out_log)
+            return self.return_code
+
+        stage_files(self, self.out_log)
 
         # create instructions file
         self.create_instructions_file()
@@ -130,14 +187,25 @@ class GMXEnergy(BiobbObject):
         self.cmd = [self.binary_path, 'energy',
                '-f', self.stage_io_dict["in"]["input_energy_path"],
                '-o', self.stage_io_dict["out"]["output_xvg_path"],
-               '-xvg', self.xvg,
-               '<', self.instructions_file]
+               '-xvg', self.xvg]
+
+        # time window, the whole file by default
+        if not str(self.start) == "0":
+            self.cmd.extend(['-b', self.start])
+        if not str(self.end) == "0":
+            self.cmd.extend(['-e', self.end])
+
+        # Add stdin input file
+        self.cmd.extend(['<', self.instructions_file])
 
         # Run Biobb block
-        self.run_biobb()
+        run_biobb(self, self.out_log, self.err_log)
 
         # Copy files to host
-        self.copy_to_host()
+        copy_to_host(self, self.out_log)
+
+        # Convert the text output into the binary columnar one
+        end_columnar_output(self, self.out_log, units)
 
         self.tmp_files.extend([
             self.stage_io_dict.get("unique_dir"),
@@ -147,11 +215,22 @@ class GMXEnergy(BiobbObject):
 
         self.check_arguments(output_files_created=True, raise_exception=False)
 
+        # Store the outputs in the result cache
+        store_cache(self, self.out_log)
+
         return self.return_code
 
 def gmx_energy(input_energy_path: str, output_xvg_path: str, properties: dict = None, **kwargs) -> int:
     """Execute the :class:`GMXEnergy <gromacs.gmx_energy.GMXEnergy>` class and
-    execute the :meth:`launch() <gromacs.gmx_energy.GMXEnergy.launch>` method."""
+    execute the :meth:`launch() <gromacs.gmx_energy.GMXEnergy.launch>` method.
+    input_energy_path can also be a list or a glob pattern of energy files, each one processed by
+    :func:`run_batch() <batch.runner.run_batch>` with its own outputs, or the segments of a single simulation
+    processed in order by :func:`run_segments() <batch.segments.run_segments>` in incremental mode."""
+
+    if is_batch(input_energy_path):
+        if (properties or {}).get('incremental'):
+            return run_segments(GMXEnergy, 'input_energy_path', properties=properties, input_energy_path=input_energy_path, output_xvg_path=output_xvg_path, **kwargs)
+        return run_batch(GMXEnergy, 'input_energy_path', properties=properties, input_energy_path=input_energy_path, output_xvg_path=output_xvg_path, **kwargs)
 
     return GMXEnergy(input_energy_path=input_energy_path, 
                     output_xvg_path=output_xvg_path,
@@ -164,15 +243,17 @@ def main():
 
     #Specific args of each building block
     required_args = parser.add_argument_group('required arguments')
-    required_args.add_argument('--input_energy_path', required=True, help='Path to the input EDR file. Accepted formats: edr.')
-    required_args.add_argument('--output_xvg_path', required=True, help='Path to the XVG output file. Accepted formats: xvg.')
+    batch_args = required_args.add_mutually_exclusive_group(required=True)
+    batch_args.add_argument('--input_energy_path', help='Path to the input EDR file. Accepted formats: edr.')
+    batch_args.add_argument('--input_energy_glob', help='Glob pattern of the energy files to be processed in batch; every one gets its own outputs; named after them; and a manifest.')
+    required_args.add_argument('--output_xvg_path', required=True, help='Path to the XVG output file. Accepted formats: xvg, npy, npz, parquet, hdf5.')
 
     args = parser.parse_args()
     args.config = args.config or "{}"
     properties = settings.ConfReader(config=args.config).get_prop_dic()
 
     #Specific call of each building block
-    gmx_energy(input_energy_path=args.input_energy_path, 
+    gmx_energy(input_energy_path=args.input_energy_path or args.input_energy_glob, 
                 output_xvg_path=args.output_xvg_path, 
                 properties=properties)
 
@@ -6,6 +6,11 @@ from biobb_common.generic.biobb_object import BiobbObject
 from biobb_common.configuration import  settings
 from biobb_common.tools.file_utils import launchlogger
 from biobb_analysis.gromacs.common import *
+from biobb_analysis.cache.results import restore_cache, store_cache
+from biobb_analysis.staging.files import stage_files, copy_to_host
+from biobb_analysis.container.session import run_biobb
+from biobb_analysis.profiling.phases import profile_launch
+from biobb_analysis.batch.runner import is_batch, run_batch
 
 
 class GMXImage(BiobbObject):
@@ -28,15 +33,22 @@ class GMXImage(BiobbObject):
             * **center** (*bool*) - (True) Center atoms in box.
             * **ur** (*str*) - ("compact") Unit-cell representation. Values: rect (It's the ordinary brick shape), tric (It's the triclinic unit cell), compact (Puts all atoms at the closest distance from the center of the box).
             * **fit** (*str*) - ("none") Fit molecule to ref structure in the structure file. Values: none, rot+trans, rotxy+transxy, translation, transxy, progressive.
+            * **batch_workers** (*int*) - (4) [1~256|1] Number of inputs processed at the same time when a list or a glob pattern of trajectories is given.
             * **binary_path** (*str*) - ("gmx") Path to the GROMACS executable binary.
             * **remove_tmp** (*bool*) - (True) [WF property] Remove temporal files.
             * **restart** (*bool*) - (False) [WF property] Do not execute if output files exist.
+            * **cache_path** (*str*) - (None) [WF property] Path to the result cache directory; outputs already computed from the same input files; properties and software are restored from it instead of recomputed. Disabled if None.
+            * **cache_size** (*int*) - (1024) [1~1000000|1] [WF property] Maximum size in MB of the result cache; the least recently used results are evicted.
+            * **staging** (*str*) - ("copy") [WF property] How the files are staged into the temporary directory. Values: copy (Inputs and outputs are copied), link (Inputs are hard-linked; symlinked across file systems and bind-mounted read-only in docker or singularity executions; outputs are moved to their host paths and copied only across file systems).
+            * **profile_path** (*str*) - (None) [WF property] Path to the JSON lines file where a record of the launch is appended: the time and the bytes read and written of each of its phases (checks; staging; instructions; run; copy to host and removal of temporary files). Disabled if None.
+            * **prometheus_path** (*str*) - (None) [WF property] Path to the Prometheus textfile collector file (.prom) where the resource usage of the child processes of the launch (CPU user and system time; peak RSS; context switches and block I/O) is written; by block and step. Disabled if None.
             * **container_path** (*str*) - (None) Container path definition.
             * **container_image** (*str*) - ('gromacs/gromacs:2022.2') Container image definition.
             * **container_volume_path** (*str*) - ('/tmp') Container volume path definition.
             * **container_working_dir** (*str*) - (None) Container working directory definition.
             * **container_user_id** (*str*) - (None) Container user_id definition.
             * **container_shell_path** (*str*) - ('/bin/bash') Path to default shell inside the container.
+            * **container_session** (*bool*) - (False) Run the command through exec in a long-lived container started once per container image; volume path and user id and reused by later blocks; instead of a new container. Only for docker and singularity.
 
     Examples:
         This is a use example of how to use the building block from Python::
@@ -89,6 +101,13 @@ class GMXImage(BiobbObject):
         self.ur = properties.get('ur', "compact")
         self.fit = properties.get('fit', "none")
         self.properties = properties
+        self.cache_path = properties.get('cache_path')
+        self.cache_size = properties.get('cache_size', 1024)
+        self.staging = properties.get('staging', 'copy')
+        self.profile_path = properties.get('profile_path')
+        self.prometheus_path = properties.get('prometheus_path')
+        self.container_session = properties.get('container_session', False)
+        self.batch_workers = properties.get('batch_workers', 4)
 
         # Properties common in all GROMACS BB
         self.binary_path = get_binary_path(properties, 'binary_path')
@@ -119,6 +138,7 @@ class GMXImage(BiobbObject):
         self.fit = get_fit(self.properties, out_log, self.__class__.__name__)
 
     @launchlogger
+    @profile_launch
     def launch(self) -> int:
         """Execute the :class:`GMXImage <gromacs.gmx_image.GMXImage>` gromacs.gmx_image.GMXImage object."""
 
@@ -137,14 +157,15 @@ class GMXImage(BiobbObject):
                 selections = self.fit_selection + ' ' + self.output_selection 
 
         # standard input
-        self.io_dict['in']['stdin_file_path'] = fu.create_stdin_file(f'{selections}')
+        self.io_dict['in']['stdin_file_path'] = create_stdin_file(self, f'{selections}')
 
         # check input/output paths and parameters
         self.check_data_params(self.out_log, self.err_log)
 
         # Setup Biobb
         if self.check_restart(): return 0
-        self.stage_files()
+        if restore_cache(self, self.out_log): return 0
+        stage_files(self, self.out_log)
 
         self.cmd = [self.binary_path, 'trjconv',
                '-f', self.stage_io_dict["in"]["input_traj_path"],
@@ -169,10 +190,10 @@ class GMXImage(BiobbObject):
         self.cmd.append(self.stage_io_dict["in"]["stdin_file_path"])
 
         # Run Biobb block
-        self.run_biobb()
+        run_biobb(self, self.out_log, self.err_log)
 
         # Copy files to host
-        self.copy_to_host()
+        copy_to_host(self, self.out_log)
 
         self.tmp_files.extend([
             self.stage_io_dict.get("unique_dir"),
@@ -182,11 +203,19 @@ class GMXImage(BiobbObject):
 
         self.check_arguments(output_files_created=True, raise_exception=False)
 
+        # Store the outputs in the result cache
+        store_cache(self, self.out_log)
+
         return self.return_code
 
 def gmx_image(input_traj_path: str, input_top_path: str, output_traj_path: str, input_index_path: str = None, properties: dict = None, **kwargs) -> int:
     """Execute the :class:`GMXImage <gromacs.gmx_image.GMXImage>` class and
-    execute the :meth:`launch() <gromacs.gmx_image.GMXImage.launch>` method."""
+    execute the :meth:`launch() <gromacs.gmx_image.GMXImage.launch>` method.
+    input_traj_path can also be a list or a glob pattern of trajectories, each one processed by
+    :func:`run_batch() <batch.runner.run_batch>` with its own outputs."""
+
+    if is_batch(input_traj_path):
+        return run_batch(GMXImage, 'input_traj_path', properties=properties, input_traj_path=input_traj_path, input_top_path=input_top_path, output_traj_path=output_traj_path, input_index_path=input_index_path, **kwargs)
 
     return GMXImage(input_traj_path=input_traj_path, 
                     input_top_path = input_top_path,
@@ -201,7 +230,9 @@ def main():
 
     #Specific args of each building block
     required_args = parser.add_argument_group('required arguments')
-    required_args.add_argument('--input_traj_path', required=True, help='Path to the GROMACS trajectory file. Accepted formats: xtc, trr, cpt, gro, g96, pdb, tng.')
+    batch_args = required_args.add_mutually_exclusive_group(required=True)
+    batch_args.add_argument('--input_traj_path', help='Path to the GROMACS trajectory file. Accepted formats: xtc, trr, cpt, gro, g96, pdb, tng.')
+    batch_args.add_argument('--input_traj_glob', help='Glob pattern of the trajectories to be processed in batch; every one gets its own outputs; named after them; and a manifest.')
     required_args.add_argument('--input_top_path', required=True, help='Path to the GROMACS input topology file. Accepted formats: tpr, gro, g96, pdb, brk, ent.')
     parser.add_argument('--input_index_path', required=False, help="Path to the GROMACS index file. Accepted formats: ndx.")
     required_args.add_argument('--output_traj_path', required=True, help='Path to the output file. Accepted formats: xtc, trr, gro, g96, pdb, tng.')
@@ -211,7 +242,7 @@ def main():
     properties = settings.ConfReader(config=args.config).get_prop_dic()
 
     #Specific call of each building block
-    gmx_image(input_traj_path=args.input_traj_path, 
+    gmx_image(input_traj_path=args.input_traj_path or args.input_traj_glob, 
             input_top_path=args.input_top_path, 
             output_traj_path=args.output_traj_path, 
             input_index_path=args.input_index_path, 
@@ -6,6 +6,13 @@ from biobb_common.generic.biobb_object import BiobbObject
 from biobb_common.configuration import  settings
 from biobb_common.tools.file_utils import launchlogger
 from biobb_analysis.gromacs.common import *
+from biobb_analysis.native.rgyr import compute_gmx_rgyr
+from biobb_analysis.cache.results import restore_cache, store_cache
+from biobb_analysis.native.columnar import begin_columnar_output, end_columnar_output
+from biobb_analysis.staging.files import stage_files, copy_to_host
+from biobb_analysis.container.session import run_biobb
+from biobb_analysis.profiling.phases import profile_launch, profile_phase
+from biobb_analysis.batch.runner import is_batch, run_batch
 
 
 class GMXRgyr(BiobbObject):
@@ -18,19 +25,27 @@ class GMXRgyr(BiobbObject):
         input_structure_path (str): Path to the input structure file. File type: input. `Sample file <https://github.com/bioexcel/biobb_analysis/raw/master/biobb_analysis/test/data/gromacs/topology.tpr>`_. Accepted formats: tpr (edam:format_2333), gro (edam:format_2033), g96 (edam:format_2033), pdb (edam:format_1476), brk (edam:format_2033), ent (edam:format_1476).
         input_traj_path (str): Path to the GROMACS trajectory file. File type: input. `Sample file <https://github.com/bioexcel/biobb_analysis/raw/master/biobb_analysis/test/data/gromacs/trajectory.trr>`_. Accepted formats: xtc (edam:format_3875), trr (edam:format_3910), cpt (edam:format_2333), gro (edam:format_2033), g96 (edam:format_2033), pdb (edam:format_1476), tng (edam:format_3876).
         input_index_path (str) (Optional): Path to the GROMACS index file. File type: input. `Sample file <https://github.com/bioexcel/biobb_analysis/raw/master/biobb_analysis/test/data/gromacs/index.ndx>`_. Accepted formats: ndx (edam:format_2033).
-        output_xvg_path (str): Path to the XVG output file. File type: output. `Sample file <https://github.com/bioexcel/biobb_analysis/raw/master/biobb_analysis/test/reference/gromacs/ref_rgyr.xvg>`_. Accepted formats: xvg (edam:format_2030).
+        output_xvg_path (str): Path to the XVG output file. File type: output. `Sample file <https://github.com/bioexcel/biobb_analysis/raw/master/biobb_analysis/test/reference/gromacs/ref_rgyr.xvg>`_. Accepted formats: xvg (edam:format_2030), npy (edam:format_2333), npz (edam:format_2333), parquet (edam:format_2333), hdf5 (edam:format_3590).
         properties (dic - Python dictionary object containing the tool parameters, not input/output files):
             * **xvg** (*str*) - ("none") XVG plot formatting. Values: xmgrace, xmgr, none.
             * **selection** (*str*) - ("System") Group where the rgyr will be performed. If **input_index_path** provided, check the file for the accepted values. Values: System (all atoms in the system), Protein (all protein atoms), Protein-H (protein atoms excluding hydrogens), C-alpha (C-alpha atoms), Backbone (protein backbone atoms: N; C-alpha and C), MainChain (protein main chain atoms: N; C-alpha; C and O; including oxygens in C-terminus), MainChain+Cb (protein main chain atoms including C-beta), MainChain+H (protein main chain atoms including backbone amide hydrogens and hydrogens on the N-terminus), SideChain (protein side chain atoms: that is all atoms except N; C-alpha; C; O; backbone amide hydrogens and oxygens in C-terminus and hydrogens on the N-terminus), SideChain-H (protein side chain atoms excluding all hydrogens), Prot-Masses (protein atoms excluding dummy masses), non-Protein (all non-protein atoms), Water (water molecules), SOL (water molecules), non-Water (anything not covered by the Water group), Ion (any name matching an Ion entry in residuetypes.dat), NA (all NA atoms), CL (all CL atoms), Water_and_ions (combination of the Water and Ions groups), DNA (all DNA atoms), RNA (all RNA atoms), Protein_DNA (all Protein-DNA complex atoms), Protein_RNA (all Protein-RNA complex atoms), Protein_DNA_RNA (all Protein-DNA-RNA complex atoms), DNA_RNA (all DNA-RNA complex atoms).
+            * **backend** (*str*) - ("gromacs") Engine used to compute the Rgyr. Values: gromacs (Run the GROMACS executable binary), native (Compute the mass-weighted Rgyr in-process with NumPy; only for gro or pdb structures and gro; pdb; xtc or trr trajectories of whole molecules).
+            * **batch_workers** (*int*) - (4) [1~256|1] Number of inputs processed at the same time when a list or a glob pattern of trajectories is given.
             * **binary_path** (*str*) - ("gmx") Path to the GROMACS executable binary.
             * **remove_tmp** (*bool*) - (True) [WF property] Remove temporal files.
             * **restart** (*bool*) - (False) [WF property] Do not execute if output files exist.
+            * **cache_path** (*str*) - (None) [WF property] Path to the result cache directory; outputs already computed from the same input files; properties and software are restored from it instead of recomputed. Disabled if None.
+            * **cache_size** (*int*) - (1024) [1~1000000|1] [WF property] Maximum size in MB of the result cache; the least recently used results are evicted.
+            * **staging** (*str*) - ("copy") [WF property] How the files are staged into the temporary directory. Values: copy (Inputs and outputs are copied), link (Inputs are hard-linked; symlinked across file systems and bind-mounted read-only in docker or singularity executions; outputs are moved to their host paths and copied only across file systems).
+            * **profile_path** (*str*) - (None) [WF property] Path to the JSON lines file where a record of the launch is appended: the time and the bytes read and written of each of its phases (checks; staging; instructions; run; copy to host and removal of temporary files). Disabled if None.
+            * **prometheus_path** (*str*) - (None) [WF property] Path to the Prometheus textfile collector file (.prom) where the resource usage of the child processes of the launch (CPU user and system time; peak RSS; context switches and block I/O) is written; by block and step. Disabled if None.
             * **container_path** (*str*) - (None) Container path definition.
             * **container_image** (*str*) - ('gromacs/gromacs:2022.2') Container image definition.
             * **container_volume_path** (*str*) - ('/tmp') Container volume path definition.
             * **container_working_dir** (*str*) - (None) Container working directory definition.
             * **container_user_id** (*str*) - (None) Container user_id definition.
             * **container_shell_path** (*str*) - ('/bin/bash') Path to default shell inside the container.
+            * **container_session** (*bool*) - (False) Run the command through exec in a long-lived container started once per container image; volume path and user id and reused by later blocks; instead of a new container. Only for docker and singularity.
 
     Examples:
         This is a use example of how to use the building block from Python::
@@ -74,7 +89,15 @@ class GMXRgyr(BiobbObject):
         # Properties specific for BB
         self.xvg = properties.get('xvg', "none")
         self.selection = properties.get('selection', "System")
+        self.backend = properties.get('backend', "gromacs")
         self.properties = properties
+        self.cache_path = properties.get('cache_path')
+        self.cache_size = properties.get('cache_size', 1024)
+        self.staging = properties.get('staging', 'copy')
+        self.profile_path = properties.get('profile_path')
+        self.prometheus_path = properties.get('prometheus_path')
+        self.container_session = properties.get('container_session', False)
+        self.batch_workers = properties.get('batch_workers', 4)
 
         # Properties common in all GROMACS BB
         self.binary_path = get_binary_path(properties, 'binary_path')
@@ -94,20 +117,37 @@ class GMXRgyr(BiobbObject):
             self.selection = get_selection(self.properties, out_log, self.__class__.__name__)
         else:
             self.selection = get_selection_index_file(self.properties, self.io_dict["in"]["input_index_path"], 'selection', out_log, self.__class__.__name__)
+        self.backend = get_backend(self.properties, out_log, self.__class__.__name__)
 
     @launchlogger
+    @profile_launch
     def launch(self) -> int:
         """Execute the :class:`GMXRgyr <gromacs.gmx_rgyr.GMXRgyr>` gromacs.gmx_rgyr.GMXRgyr object."""
 
-        # standard input
-        self.io_dict['in']['stdin_file_path'] = fu.create_stdin_file(f'{self.selection}')
-
         # check input/output paths and parameters
         self.check_data_params(self.out_log, self.err_log)
 
         # Setup Biobb
         if self.check_restart(): return 0
-        self.stage_files()
+        if restore_cache(self, self.out_log): return 0
+
+        # binary columnar output: written by the native backend, or the text output of the executable converted
+        begin_columnar_output(self, "output_xvg_path", 'xvg', self.out_log)
+
+        # native backend: no staging, no binary
+        if self.backend == 'native':
+            with profile_phase(self, 'compute_native'):
+                self.return_code = compute_gmx_rgyr(self.io_dict["in"]["input_structure_path"], self.io_dict["in"]["input_traj_path"],
+                                                    self.io_dict["out"]["output_xvg_path"], self.io_dict["in"]["input_index_path"],
+                                                    self.selection, self.xvg, self.out_log, self.__class__.__name__)
+            end_columnar_output(self, self.out_log)
+            self.check_arguments(output_files_created=True, raise_exception=False)
+            store_cache(self, self.out_log)
+            return self.return_code
+
+        # standard input
+        self.io_dict['in']['stdin_file_path'] = create_stdin_file(self, f'{self.selection}')
+        stage_files(self, self.out_log)
 
         self.cmd = [self.binary_path, 'gyrate',
                '-s', self.stage_io_dict["in"]["input_structure_path"],
@@ -123,10 +163,13 @@ class GMXRgyr(BiobbObject):
         self.cmd.append(self.stage_io_dict["in"]["stdin_file_path"])
 
         # Run Biobb block
-        self.run_biobb()
+        run_biobb(self, self.out_log, self.err_log)
 
         # Copy files to host
-        self.copy_to_host()
+        copy_to_host(self, self.out_log)
+
+        # Convert the text output into the binary columnar one
+        end_columnar_output(self, self.out_log)
 
         self.tmp_files.extend([
             self.stage_io_dict.get("unique_dir"),
@@ -136,11 +179,19 @@ class GMXRgyr(BiobbObject):
 
         self.check_arguments(output_files_created=True, raise_exception=False)
 
+        # Store the outputs in the result cache
+        store_cache(self, self.out_log)
+
         return self.return_code
 
 def gmx_rgyr(input_structure_path: str, input_traj_path: str, output_xvg_path: str, input_index_path: str = None, properties: dict = None, **kwargs) -> int:
     """Execute the :class:`GMXRgyr <gromacs.gmx_rgyr.GMXRgyr>` class and
-    execute the :meth:`launch() <gromacs.gmx_rgyr.GMXRgyr.launch>` method."""
+    execute the :meth:`launch() <gromacs.gmx_rgyr.GMXRgyr.launch>` method.
+    input_traj_path can also be a list or a glob pattern of trajectories, each one processed by
+    :func:`run_batch() <batch.runner.run_batch>` with its own outputs."""
+
+    if is_batch(input_traj_path):
+        return run_batch(GMXRgyr, 'input_traj_path', properties=properties, input_structure_path=input_structure_path, input_traj_path=input_traj_path, output_xvg_path=output_xvg_path, input_index_path=input_index_path, **kwargs)
 
     return GMXRgyr(input_structure_path=input_structure_path, 
                     input_traj_path = input_traj_path,
@@ -156,9 +207,11 @@ def main():
     #Specific args of each building block
     required_args = parser.add_argument_group('required arguments')
     required_args.add_argument('--input_structure_path', required=True, help='Path to the input structure file. Accepted formats: tpr, gro, g96, pdb, brk, ent.')
-    required_args.add_argument('--input_traj_path', required=True, help='Path to the GROMACS trajectory file. Accepted formats: xtc, trr, cpt, gro, g96, pdb, tng.')
+    batch_args = required_args.add_mutually_exclusive_group(required=True)
+    batch_args.add_argument('--input_traj_path', help='Path to the GROMACS trajectory file. Accepted formats: xtc, trr, cpt, gro, g96, pdb, tng.')
+    batch_args.add_argument('--input_traj_glob', help='Glob pattern of the trajectories to be processed in batch; every one gets its own outputs; named after them; and a manifest.')
     parser.add_argument('--input_index_path', required=False, help="Path to the GROMACS index file. Accepted formats: ndx.")
-    required_args.add_argument('--output_xvg_path', required=True, help='Path to the XVG output file. Accepted formats: xvg.')
+    required_args.add_argument('--output_xvg_path', required=True, help='Path to the XVG output file. Accepted formats: xvg, npy, npz, parquet, hdf5.')
 
     args = parser.parse_args()
     args.config = args.config or "{}"
@@ -166,7 +219,7 @@ def main():
 
     #Specific call of each building block
     gmx_rgyr(input_structure_path=args.input_structure_path, 
-            input_traj_path=args.input_traj_path, 
+            input_traj_path=args.input_traj_path or args.input_traj_glob, 
             output_xvg_path=args.output_xvg_path, 
             input_index_path=args.input_index_path, 
             properties=properties)
@@ -4,9 +4,13 @@
 import argparse
 from biobb_common.generic.biobb_object import BiobbObject
 from biobb_common.configuration import settings
-from biobb_common.tools import file_utils as fu
 from biobb_common.tools.file_utils import launchlogger
 from biobb_analysis.gromacs.common import *
+from biobb_analysis.cache.results import restore_cache, store_cache
+from biobb_analysis.staging.files import stage_files, copy_to_host
+from biobb_analysis.container.session import run_biobb
+from biobb_analysis.profiling.phases import profile_launch
+from biobb_analysis.batch.runner import is_batch, run_batch
 
 
 class GMXTrjConvStrEns(BiobbObject):
@@ -26,17 +30,28 @@ class GMXTrjConvStrEns(BiobbObject):
             * **start** (*int*) - (0) [0~10000|1] Time of first frame to read from trajectory (default unit ps).
             * **end** (*int*) - (0) [0~10000|1] Time of last frame to read from trajectory (default unit ps).
             * **dt** (*int*) - (0) [0~10000|1] Only write frame when t MOD dt = first time (ps).
+            * **frame_index** (*bool*) - (False) Copy only the frames between start and end of XTC, TRR, DCD (without fixed atoms) and NetCDF3 trajectories to the temporary directory; found through a frame offset index stored next to the trajectory with an extra .idx suffix; instead of reading all the frames up to them.
             * **output_name** (*str*) - ("output") File name for ensemble of output files.
             * **output_type** (*str*) - ("pdb") File type for ensemble of output files. Values: gro (Contains a molecular structure in Gromos87 format), g96 (Can be a GROMOS-96 initial/final configuration file or a coordinate trajectory file or a combination of both), pdb (Molecular structure files in the protein databank file format).
+            * **streaming** (*bool*) - (False) Add every frame to the zip as soon as trjconv has written it and delete it; the zip being written next to the output path instead of in the temporary directory and copied. The frames and the zip take about the size of the zip in scratch space instead of three times the ensemble size.
+            * **compression** (*str*) - ("stored") Compression of the frames in the zip. Values: stored (Frames are not compressed), deflated (Frames are compressed with deflate).
+            * **compression_level** (*int*) - (6) [0~9|1] Deflate compression level; from 0 (fastest) to 9 (smallest).
+            * **batch_workers** (*int*) - (4) [1~256|1] Number of inputs processed at the same time when a list or a glob pattern of trajectories is given.
             * **binary_path** (*str*) - ("gmx") Path to the GROMACS executable binary.
             * **remove_tmp** (*bool*) - (True) [WF property] Remove temporal files.
             * **restart** (*bool*) - (False) [WF property] Do not execute if output files exist.
+            * **cache_path** (*str*) - (None) [WF property] Path to the result cache directory; outputs already computed from the same input files; properties and software are restored from it instead of recomputed. Disabled if None.
+            * **cache_size** (*int*) - (1024) [1~1000000|1] [WF property] Maximum size in MB of the result cache; the least recently used results are evicted.
+            * **staging** (*str*) - ("copy") [WF property] How the files are staged into the temporary directory. Values: copy (Inputs and outputs are copied), link (Inputs are hard-linked; symlinked across file systems and bind-mounted read-only in docker or singularity executions; outputs are moved to their host paths and copied only across file systems).
+            * **profile_path** (*str*) - (None) [WF property] Path to the JSON lines file where a record of the launch is appended: the time and the bytes read and written of each of its phases (checks; staging; instructions; run; copy to host and removal of temporary files). Disabled if None.
+            * **prometheus_path** (*str*) - (None) [WF property] Path to the Prometheus textfile collector file (.prom) where the resource usage of the child processes of the launch (CPU user and system time; peak RSS; context switches and block I/O) is written; by block and step. Disabled if None.
             * **container_path** (*str*) - (None) Container path definition.
             * **container_image** (*str*) - ('gromacs/gromacs:2022.2') Container image definition.
             * **container_volume_path** (*str*) - ('/tmp') Container volume path definition.
             * **container_working_dir** (*str*) - (None) Container working directory definition.
             * **container_user_id** (*str*) - (None) Container user_id definition.
             * **container_shell_path** (*str*) - ('/bin/bash') Path to default shell inside the container.
+            * **container_session** (*bool*) - (False) Run the command through exec in a long-lived container started once per container image; volume path and user id and reused by later blocks; instead of a new container. Only for docker and singularity.
 
     Examples:
         This is a use example of how to use the building block from Python::
@@ -85,9 +100,20 @@ class GMXTrjConvStrEns(BiobbObject):
         self.start = properties.get('start', 0)
         self.end = properties.get('end', 0)
         self.dt = properties.get('dt', 0)
+        self.frame_index = properties.get('frame_index', False)
         self.output_name = properties.get('output_name', "output")
         self.output_type = properties.get('output_type', "pdb")
+        self.streaming = properties.get('streaming', False)
+        self.compression = properties.get('compression', "stored")
+        self.compression_level = properties.get('compression_level', 6)
         self.properties = properties
+        self.cache_path = properties.get('cache_path')
+        self.cache_size = properties.get('cache_size', 1024)
+        self.staging = properties.get('staging', 'copy')
+        self.profile_path = properties.get('profile_path')
+        self.prometheus_path = properties.get('prometheus_path')
+        self.container_session = properties.get('container_session', False)
+        self.batch_workers = properties.get('batch_workers', 4)
 
         # Properties common in all GROMACS BB
         self.binary_path = get_binary_path(properties, 'binary_path')
@@ -110,22 +136,29 @@ class GMXTrjConvStrEns(BiobbObject):
         self.start = get_start(self.properties, out_log, self.__class__.__name__)
         self.end = get_end(self.properties, out_log, self.__class__.__name__)
         self.dt = get_dt(self.properties, out_log, self.__class__.__name__)
+        self.frame_index = get_frame_index(self.properties, out_log, self.__class__.__name__)
         self.output_name = self.properties.get('output_name', 'output')
         self.output_type = get_ot_str_ens(self.properties, out_log, self.__class__.__name__)
+        self.streaming = get_streaming(self.properties, out_log, self.__class__.__name__)
+        self.compression = get_compression(self.properties, out_log, self.__class__.__name__)
+        self.compression_level = get_compression_level(self.properties, out_log, self.__class__.__name__)
 
     @launchlogger
+    @profile_launch
     def launch(self) -> int:
         """Execute the :class:`GMXTrjConvStrEns <gromacs.gmx_trjconv_str_ens.GMXTrjConvStrEns>` gromacs.gmx_trjconv_str_ens.GMXTrjConvStrEns object."""
 
         # standard input
-        self.io_dict['in']['stdin_file_path'] = fu.create_stdin_file(f'{self.selection}')
+        self.io_dict['in']['stdin_file_path'] = create_stdin_file(self, f'{self.selection}')
 
         # check input/output paths and parameters
         self.check_data_params(self.out_log, self.err_log)
 
         # Setup Biobb
         if self.check_restart(): return 0
-        self.stage_files()
+        if restore_cache(self, self.out_log): return 0
+        trim_traj_path(self, self.out_log)
+        stage_files(self, self.out_log)
 
         # if container execution, output to container_volume_path, else to unique_dir
         if self.container_path:
@@ -154,36 +187,55 @@ class GMXTrjConvStrEns(BiobbObject):
         self.cmd.append('<')
         self.cmd.append(self.stage_io_dict["in"]["stdin_file_path"])
 
-        # Run Biobb block
-        self.run_biobb()
+        # Run Biobb block, archiving every frame into the zip as soon as it is written if streaming
+        if self.streaming:
+            archiver = EnsembleArchiver(self.stage_io_dict.get("unique_dir"), self.output_name, self.output_type,
+                                        self.io_dict["out"]["output_str_ens_path"], self.compression, self.compression_level, self.out_log)
+            archiver.start()
+            run_biobb(self, self.out_log, self.err_log)
+            archiver.finish(self.return_code)
+        else:
+            run_biobb(self, self.out_log, self.err_log)
 
         # Copy files to host
-        self.copy_to_host()
+        copy_to_host(self, self.out_log)
 
-        if self.container_path:
+        # the streamed zip is already in its host path
+        if self.container_path and not self.streaming:
             process_output_trjconv_str_ens(self.stage_io_dict['unique_dir'], 
                                            self.io_dict["out"]["output_str_ens_path"],
                                            self.stage_io_dict.get("unique_dir"), 
-                                           self.output_name + '*', self.out_log)
-        else:
+                                           self.output_name + '*', self.out_log,
+                                           self.compression, self.compression_level)
+        elif not self.streaming:
             process_output_trjconv_str_ens(self.stage_io_dict.get("unique_dir"), 
                                            self.stage_io_dict["out"]["output_str_ens_path"],
                                            self.io_dict["out"]["output_str_ens_path"], 
-                                           'output*.pdb', self.out_log)
+                                           'output*.pdb', self.out_log,
+                                           self.compression, self.compression_level)
 
         self.tmp_files.extend([
             self.stage_io_dict.get("unique_dir"),
             self.io_dict['in'].get("stdin_file_path")
         ])
         self.remove_tmp_files()
+        release_traj_path(self, self.out_log)
 
         self.check_arguments(output_files_created=True, raise_exception=False)
 
+        # Store the outputs in the result cache
+        store_cache(self, self.out_log)
+
         return self.return_code
 
 def gmx_trjconv_str_ens(input_traj_path: str, input_top_path: str, output_str_ens_path: str, input_index_path: str = None, properties: dict = None, **kwargs) -> int:
     """Execute the :class:`GMXTrjConvStrEns <gromacs.gmx_trjconv_str_ens.GMXTrjConvStrEns>` class and
-    execute the :meth:`launch() <gromacs.gmx_trjconv_str_ens.GMXTrjConvStrEns.launch>` method."""
+    execute the :meth:`launch() <gromacs.gmx_trjconv_str_ens.GMXTrjConvStrEns.launch>` method.
+    input_traj_path can also be a list or a glob pattern of trajectories, each one processed by
+    :func:`run_batch() <batch.runner.run_batch>` with its own outputs."""
+
+    if is_batch(input_traj_path):
+        return run_batch(GMXTrjConvStrEns, 'input_traj_path', properties=properties, input_traj_path=input_traj_path, input_top_path=input_top_path, output_str_ens_path=output_str_ens_path, input_index_path=input_index_path, **kwargs)
 
     return GMXTrjConvStrEns(input_traj_path=input_traj_path, 
                     input_top_path = input_top_path,
@@ -198,7 +250,9 @@ def main():
 
     # Specific args of each building block
     required_args = parser.add_argument_group('required arguments')
-    required_args.add_argument('--input_traj_path', required=True, help='Path to the GROMACS trajectory file. Accepted formats: xtc, trr, cpt, gro, g96, pdb, tng.')
+    batch_args = required_args.add_mutually_exclusive_group(required=True)
+    batch_args.add_argument('--input_traj_path', help='Path to the GROMACS trajectory file. Accepted formats: xtc, trr, cpt, gro, g96, pdb, tng.')
+    batch_args.add_argument('--input_traj_glob', help='Glob pattern of the trajectories to be processed in batch; every one gets its own outputs; named after them; and a manifest.')
     required_args.add_argument('--input_top_path', required=True, help='Path to the GROMACS input topology file. Accepted formats: tpr, gro, g96, pdb, brk, ent.')
     parser.add_argument('--input_index_path', required=False, help="Path to the GROMACS index file. Accepted formats: ndx.")
     required_args.add_argument('--output_str_ens_path', required=True, help='Path to the output file. Accepted formats: zip.')
@@ -208,7 +262,7 @@ def main():
     properties = settings.ConfReader(config=args.config).get_prop_dic()
 
     # Specific call of each building block
-    gmx_trjconv_str_ens(input_traj_path=args.input_traj_path, 
+    gmx_trjconv_str_ens(input_traj_path=args.input_traj_path or args.input_traj_glob, 
                         input_top_path=args.input_top_path, 
                         output_str_ens_path=args.output_str_ens_path,
                         input_index_path=args.input_index_path, 
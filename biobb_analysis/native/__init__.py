@@ -0,0 +1,2 @@
+name = "native"
+__all__ = ["common", "topology", "trajectory", "dcd", "xtc", "trr", "netcdf", "edr", "index", "data", "columnar", "superpose", "rms", "rgyr", "fluct", "energy", "cluster", "incremental"]
@@ -0,0 +1,285 @@
+""" Native clustering engine for package biobb_analysis.native
+
+The RMSD between every pair of frames is computed by a pool of processes in square tiles of frames and written to a
+disk-backed matrix (a float32 NumPy memmap in a temporary directory), so the memory used depends on the tile size and
+not on the number of frames. The clusters are then built reading rows of the matrix, and the middle structure of
+every cluster is read from the trajectory by random access.
+"""
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import PurePath
+import numpy as np
+from biobb_common.tools import file_utils as fu
+from biobb_analysis.native.common import native_error
+from biobb_analysis.native.topology import select_gromacs, read_ndx
+from biobb_analysis.native.trajectory import read_trajectory, read_frame, get_frame_offsets
+from biobb_analysis.native.superpose import center, superpose
+from biobb_analysis.native.rms import load_gromacs_group
+
+# memory budget of the arrays of a single tile
+TILE_BYTES = 64 * 1024 * 1024
+# rows of the matrix read at once
+ROW_BLOCK = 256
+# neighbors and common neighbors of the jarvis-patrick method, GROMACS cluster -M and -P defaults
+JP_NEIGHBORS = 10
+JP_COMMON = 3
+NATIVE_METHODS = ('linkage', 'gromos', 'jarvis-patrick')
+
+
+def get_tile_size(frame_values):
+    """ Gives the number of frames of the tiles, so that their two blocks of frames, of frame_values coordinates or distances each, fit in the memory budget """
+    return int(max(16, min(512, TILE_BYTES // (2 * 8 * max(1, frame_values)))))
+
+
+def _pair_distances(xyz):
+    """ Gives the distances between all the pairs of atoms of a block of frames (frames, pairs) """
+    i, j = np.triu_indices(xyz.shape[1], 1)
+    return np.linalg.norm(xyz[:, i] - xyz[:, j], axis=2)
+
+
+def _det3(m):
+    """ Gives the determinants of a block of 3x3 matrices (..., 3, 3) """
+    return (m[..., 0, 0] * (m[..., 1, 1] * m[..., 2, 2] - m[..., 1, 2] * m[..., 2, 1])
+            - m[..., 0, 1] * (m[..., 1, 0] * m[..., 2, 2] - m[..., 1, 2] * m[..., 2, 0])
+            + m[..., 0, 2] * (m[..., 1, 0] * m[..., 2, 1] - m[..., 1, 1] * m[..., 2, 0]))
+
+
+def _eigvalsh3(m):
+    """ Gives the eigenvalues, in decreasing order, of a block of symmetric 3x3 matrices (..., 3, 3) in closed form """
+    q = np.trace(m, axis1=-2, axis2=-1) / 3.0
+    p1 = m[..., 0, 1] ** 2 + m[..., 0, 2] ** 2 + m[..., 1, 2] ** 2
+    p2 = (m[..., 0, 0] - q) ** 2 + (m[..., 1, 1] - q) ** 2 + (m[..., 2, 2] - q) ** 2 + 2.0 * p1
+    p = np.sqrt(p2 / 6.0)
+    safe = np.where(p > 0, p, 1.0)
+    r = np.clip(_det3((m - q[..., None, None] * np.eye(3)) / safe[..., None, None]) / 2.0, -1.0, 1.0)
+    phi = np.arccos(r) / 3.0
+    e1 = q + 2.0 * p * np.cos(phi)
+    e3 = q + 2.0 * p * np.cos(phi + 2.0 * np.pi / 3.0)
+    return np.stack([e1, 3.0 * q - e1 - e3, e3], axis=-1)
+
+
+def _fitted_msd(a, b):
+    """ Gives the mean square deviations after best fit between two blocks of centered frames, scaled by the square root of the normalized weights.
+
+    The covariance matrices of all the pairs come from a single matrix product, and the sum of their signed singular values
+    (Kabsch) from the closed form eigenvalues of their normal matrices, instead of one SVD per pair.
+    """
+    n_a, n_atoms, _ = a.shape
+    n_b = len(b)
+    cov = a.transpose(0, 2, 1).reshape(n_a * 3, n_atoms) @ b.transpose(1, 0, 2).reshape(n_atoms, n_b * 3)
+    cov = cov.reshape(n_a, 3, n_b, 3).transpose(0, 2, 1, 3)
+    s = np.sqrt(np.clip(_eigvalsh3(np.swapaxes(cov, -1, -2) @ cov), 0.0, None))
+    s[..., 2] *= np.sign(_det3(cov))
+    return (a ** 2).sum(axis=(1, 2))[:, None] + (b ** 2).sum(axis=(1, 2))[None, :] - 2.0 * s.sum(axis=2)
+
+
+def _tile_worker(args):
+    """ Computes the RMSD (nm) between two blocks of frames and writes it, and its transpose, to the matrix """
+    frames_path, shape, matrix_path, dista, (i0, i1), (j0, j1) = args
+    frames = np.memmap(frames_path, dtype=np.float32, mode='r', shape=shape)
+    a, b = np.asarray(frames[i0:i1], dtype=np.float64), np.asarray(frames[j0:j1], dtype=np.float64)
+    if dista:
+        # RMSD of the atom pair distances
+        da, db = _pair_distances(a), _pair_distances(b)
+        msd = (da ** 2).sum(axis=1)[:, None] + (db ** 2).sum(axis=1)[None, :] - 2.0 * (da @ db.T)
+        msd /= max(1, da.shape[1])
+    else:
+        msd = _fitted_msd(a, b)
+    values = (np.sqrt(np.clip(msd, 0.0, None)) / 10.0).astype(np.float32)
+    matrix = np.memmap(matrix_path, dtype=np.float32, mode='r+', shape=(shape[0], shape[0]))
+    matrix[i0:i1, j0:j1] = values
+    matrix[j0:j1, i0:i1] = values.T
+    matrix.flush()
+    return (i1 - i0) * (j1 - j0)
+
+
+def store_frames(input_traj_path, n_atoms, atoms, weights, dista, frames_path):
+    """ Writes the atoms of every frame to a float32 file, centered and scaled by the square root of the weights unless dista, and gives their times """
+    time = []
+    with open(frames_path, 'wb') as frames:
+        for chunk in read_trajectory(input_traj_path, n_atoms, atoms):
+            xyz = chunk.xyz
+            if not dista:
+                xyz = (xyz - center(xyz, weights)[:, None, :]) * np.sqrt(weights / weights.sum())[None, :, None]
+            xyz.astype(np.float32).tofile(frames)
+            time.append(chunk.time)
+    return np.concatenate(time) if time else np.empty(0)
+
+
+def rmsd_matrix(frames_path, shape, matrix_path, dista, n_workers):
+    """ Computes the RMSD matrix of the frames in tiles, in a pool of n_workers processes if more than one, and gives it as a read-only memmap """
+    n_frames = shape[0]
+    np.memmap(matrix_path, dtype=np.float32, mode='w+', shape=(n_frames, n_frames)).flush()
+    tile = get_tile_size(shape[1] * (shape[1] - 1) // 2 if dista else shape[1] * 3)
+    bounds = [(i, min(i + tile, n_frames)) for i in range(0, n_frames, tile)]
+    tasks = [(frames_path, shape, matrix_path, dista, bounds[i], bounds[j]) for i in range(len(bounds)) for j in range(i, len(bounds))]
+    if n_workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            _tile_worker(task)
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(tasks))) as executor:
+            list(executor.map(_tile_worker, tasks))
+    matrix = np.memmap(matrix_path, dtype=np.float32, mode='r+', shape=(n_frames, n_frames))
+    np.fill_diagonal(matrix, 0.0)
+    matrix.flush()
+    return np.memmap(matrix_path, dtype=np.float32, mode='r', shape=(n_frames, n_frames))
+
+
+def _rows(matrix, frames):
+    """ Yields the frames and their rows of the matrix, a block of rows at a time """
+    frames = np.asarray(frames)
+    for i in range(0, len(frames), ROW_BLOCK):
+        block = frames[i:i + ROW_BLOCK]
+        yield block, np.asarray(matrix[block])
+
+
+def linkage_clusters(matrix, cutoff):
+    """ Single linkage: the clusters are the groups of frames joined by distances below cutoff """
+    n_frames = len(matrix)
+    labels = np.full(n_frames, -1, dtype=np.int64)
+    cluster = 0
+    for seed in range(n_frames):
+        if labels[seed] >= 0:
+            continue
+        labels[seed] = cluster
+        pending = [seed]
+        while pending:
+            frames, pending = pending, []
+            for _, rows in _rows(matrix, frames):
+                neighbors = np.nonzero(((rows < cutoff).any(axis=0)) & (labels < 0))[0]
+                labels[neighbors] = cluster
+                pending.extend(neighbors.tolist())
+        cluster += 1
+    return labels
+
+
+def gromos_clusters(matrix, cutoff):
+    """ GROMOS: the frame with most neighbors below cutoff and its neighbors form a cluster and are removed, until no frame is left """
+    n_frames = len(matrix)
+    counts = np.zeros(n_frames, dtype=np.int64)
+    for frames, rows in _rows(matrix, np.arange(n_frames)):
+        counts[frames] = (rows < cutoff).sum(axis=1)
+    labels = np.full(n_frames, -1, dtype=np.int64)
+    cluster = 0
+    while (labels < 0).any():
+        remaining = labels < 0
+        seed = int(np.argmax(np.where(remaining, counts, -1)))
+        members = np.nonzero((np.asarray(matrix[seed]) < cutoff) & remaining)[0]
+        labels[members] = cluster
+        # the removed frames are no longer neighbors of the remaining ones
+        for _, rows in _rows(matrix, members):
+            counts -= (rows < cutoff).sum(axis=0)
+        cluster += 1
+    return labels
+
+
+def jarvis_patrick_clusters(matrix, neighbors=JP_NEIGHBORS, common=JP_COMMON):
+    """ Jarvis-Patrick: two frames are in the same cluster when each one is among the nearest neighbors of the other and they share at least common of them """
+    n_frames = len(matrix)
+    k = min(neighbors, n_frames - 1)
+    nearest = np.zeros((n_frames, k), dtype=np.int64)
+    for frames, rows in _rows(matrix, np.arange(n_frames) if k else []):
+        rows = rows.copy()
+        rows[np.arange(len(frames)), frames] = np.inf
+        nearest[frames] = np.argpartition(rows, k - 1, axis=1)[:, :k]
+    parent = np.arange(n_frames)
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i in range(n_frames):
+        for j in nearest[i]:
+            if j > i and i in nearest[j] and len(np.intersect1d(nearest[i], nearest[j])) >= common:
+                parent[root(i)] = root(j)
+    return np.array([root(i) for i in range(n_frames)])
+
+
+def sort_clusters(labels):
+    """ Gives the frames of every cluster, the clusters sorted by decreasing size and then by their first frame """
+    clusters = [np.nonzero(labels == label)[0] for label in np.unique(labels)]
+    return sorted(clusters, key=lambda members: (-len(members), members[0]))
+
+
+def middle_frame(matrix, members):
+    """ Gives the frame of a cluster with the smallest average RMSD to the rest of its frames """
+    if len(members) == 1:
+        return int(members[0])
+    sums = np.empty(len(members))
+    for i in range(0, len(members), ROW_BLOCK):
+        sums[i:i + ROW_BLOCK] = np.asarray(matrix[members[i:i + ROW_BLOCK]])[:, members].sum(axis=1, dtype=np.float64)
+    return int(members[np.argmin(sums)])
+
+
+def pdb_atom_name(name):
+    """ Aligns an atom name in the PDB columns 13-16 """
+    return name if len(name) >= 4 else ' ' + name.ljust(3)
+
+
+def write_cluster_pdb(path, top, atoms, models):
+    """ Writes the middle structure of every cluster as a model of a PDB file, models being (title, coordinates) pairs """
+    with open(path, 'w') as pdb:
+        for number, (title, xyz) in enumerate(models, 1):
+            pdb.write('TITLE     %s\n' % title)
+            pdb.write('MODEL %8d\n' % number)
+            for serial, (atom, (x, y, z)) in enumerate(zip(atoms, xyz), 1):
+                pdb.write('ATOM  %5d %-4s %-4s %4d    %8.3f%8.3f%8.3f  1.00  0.00          %2s\n' % (
+                    serial % 100000, pdb_atom_name(top.names[atom]), top.resnames[atom][:4], top.resids[atom] % 10000, x, y, z, top.elements[atom][:2]))
+            pdb.write('TER\nENDMDL\n')
+
+
+def compute_gmx_cluster(input_structure_path, input_traj_path, output_pdb_path, input_index_path, fit_selection, output_selection, method, cutoff, dista, n_workers, remove_tmp, out_log, classname):
+    """ Clusters the frames of a trajectory in-process, emulating GROMACS cluster: the middle structure of every cluster, fitted onto the structure, is written as a model of the output PDB """
+    if PurePath(output_pdb_path).suffix != '.pdb':
+        native_error(classname, 'Only pdb output files are supported by the native backend', out_log)
+    if method not in NATIVE_METHODS:
+        native_error(classname, 'Method %s is not supported by the native backend, use one of %s' % (method, ', '.join(NATIVE_METHODS)), out_log)
+    tmp_dir = fu.create_unique_dir()
+    try:
+        top, structure, fit_atoms = load_gromacs_group(input_structure_path, input_index_path, fit_selection, out_log, classname)
+        out_atoms = read_ndx(input_index_path)[output_selection] if input_index_path else select_gromacs(top, output_selection)
+        if not len(out_atoms):
+            native_error(classname, 'Group %s does not contain any atom' % output_selection, out_log)
+        weights = top.masses[fit_atoms]
+        if not weights.sum():
+            weights = np.ones(len(fit_atoms))
+
+        frames_path = str(PurePath(tmp_dir).joinpath('frames.f32'))
+        time = store_frames(input_traj_path, len(top.names), fit_atoms, weights, dista, frames_path)
+        if not len(time):
+            native_error(classname, 'No frames found in %s' % input_traj_path, out_log)
+        shape = (len(time), len(fit_atoms), 3)
+        fu.log('Native backend: RMSD matrix of %d frames written to %s' % (len(time), tmp_dir), out_log)
+        matrix = rmsd_matrix(frames_path, shape, str(PurePath(tmp_dir).joinpath('rmsd.f32')), dista, n_workers)
+
+        if method == 'linkage':
+            labels = linkage_clusters(matrix, float(cutoff))
+        elif method == 'gromos':
+            labels = gromos_clusters(matrix, float(cutoff))
+        else:
+            labels = jarvis_patrick_clusters(matrix)
+        clusters = sort_clusters(labels)
+        fu.log('Native backend: %d clusters found with method %s' % (len(clusters), method), out_log)
+
+        # the middle structures are read at their offsets and fitted onto the structure
+        atoms = np.union1d(fit_atoms, out_atoms)
+        fit_indices, out_indices = np.searchsorted(atoms, fit_atoms), np.searchsorted(atoms, out_atoms)
+        offsets = get_frame_offsets(input_traj_path)
+        models = []
+        for number, members in enumerate(clusters, 1):
+            middle = middle_frame(matrix, members)
+            xyz, t = read_frame(input_traj_path, len(top.names), atoms, middle, offsets)
+            xyz = superpose(xyz[None], structure[fit_atoms], fit_indices, weights)[0]
+            models.append(('Cluster %d with %d elements, middle structure at t= %g ps' % (number, len(members), t), xyz[out_indices]))
+        del matrix
+    except ValueError as e:
+        native_error(classname, str(e), out_log)
+    finally:
+        if remove_tmp:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    write_cluster_pdb(output_pdb_path, top, out_atoms, models)
+    fu.log('Native backend: %d cluster middle structures written to %s' % (len(models), output_pdb_path), out_log)
+    return 0
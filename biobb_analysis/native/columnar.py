@@ -0,0 +1,209 @@
+""" Binary columnar outputs for package biobb_analysis.native
+
+The analysis blocks write their per-frame and per-residue results as npy, npz, parquet or hdf5 files when their
+output path has one of these extensions. The native backend hands its arrays straight to :func:`write_columnar`. The
+cpptraj and gmx executables can only write text, so they write their usual output to a temporary file, which is then
+parsed and converted. The columns are named after the text headers, without their comment marks, and keep their
+units: the ones in the xvg labels and the ones of the analysis for cpptraj data files.
+
+* npy: structured array with one field per column, named ``name [unit]``.
+* npz: one array per column, named after it, and the ``_names`` and ``_units`` arrays.
+* parquet: one column per column, with its unit in the ``unit`` field metadata; needs the pyarrow package.
+* hdf5: one dataset per column, with its unit in the ``unit`` attribute; needs the h5py package.
+"""
+import importlib.util
+import json
+import re
+import shutil
+from pathlib import Path, PurePath
+import numpy as np
+from biobb_common.tools import file_utils as fu
+from biobb_analysis.native.common import native_error
+from biobb_analysis.native.data import DataSets, parse_xvg, parse_dat
+
+COLUMNAR_FORMATS = ('npy', 'npz', 'parquet', 'hdf5')
+# optional packages needed by some formats
+COLUMNAR_PACKAGES = {'parquet': 'pyarrow', 'hdf5': 'h5py'}
+# label with its unit in brackets, like the xvg axis labels
+LABEL_UNIT = re.compile(r'^(.*?)\s*\(([^()]*)\)\s*$')
+# field of a npy output with its unit in square brackets
+FIELD_UNIT = re.compile(r'^(.*?)\s*\[([^\[\]]*)\]\s*$')
+
+
+def is_columnar(ext):
+    """ Checks if an output extension is a binary columnar format """
+    return ext.lower() in COLUMNAR_FORMATS
+
+
+def split_unit(label, regex=LABEL_UNIT):
+    """ Splits a label like Time (ps) into its name and unit, the unit being empty if there is none """
+    match = regex.match(label)
+    if match and match.group(1):
+        return match.group(1), match.group(2)
+    return label, ''
+
+
+def get_columns(data, units=None):
+    """ Gives the names and units of the columns of parsed data sets.
+
+    units gives the units of the columns by name, its None key being the unit of all the data columns. Otherwise the
+    units are the ones in the axis labels of xvg files, the y axis one being either a single unit or one per data
+    column.
+    """
+    units = units or {}
+    names, column_units = [], []
+    for i, name in enumerate(data.names):
+        name = name.lstrip('#').strip()
+        # legends are names, like LJ (SR), only axis labels hold units
+        name, unit = split_unit(name) if not i or not data.metadata.get('legends') else (name, '')
+        names.append(name)
+        column_units.append(unit)
+    yaxis_units = re.findall(r'\(([^()]*)\)', data.metadata.get('yaxis', ''))
+    for i, name in enumerate(names):
+        if name in units:
+            column_units[i] = units[name]
+        elif i and None in units:
+            column_units[i] = units[None]
+        elif i and not column_units[i] and len(yaxis_units) == 1:
+            column_units[i] = yaxis_units[0]
+        elif i and not column_units[i] and len(yaxis_units) == len(names) - 1:
+            column_units[i] = yaxis_units[i - 1]
+    return names, column_units
+
+
+def get_column_values(data):
+    """ Gives the values of every column, the index column of cpptraj data files (frames, residues) as integers """
+    columns = [data.values[:, i] for i in range(data.values.shape[1])]
+    if data.names and data.names[0].startswith('#') and len(columns[0]) and np.all(np.mod(columns[0], 1) == 0):
+        columns[0] = columns[0].astype(np.int64)
+    return columns
+
+
+def write_columnar(path, data, units=None):
+    """ Writes parsed data sets as a npy, npz, parquet or hdf5 file, given by the extension of path """
+    names, column_units = get_columns(data, units)
+    columns = get_column_values(data)
+    ext = PurePath(path).suffix[1:].lower()
+    if ext == 'npy':
+        fields = ['%s [%s]' % (name, unit) if unit else name for name, unit in zip(names, column_units)]
+        array = np.empty(len(data.values), dtype=[(field, column.dtype) for field, column in zip(fields, columns)])
+        for field, column in zip(fields, columns):
+            array[field] = column
+        np.save(path, array, allow_pickle=False)
+    elif ext == 'npz':
+        # written through a file object, so that no .npz suffix is appended to path
+        with open(path, 'wb') as npz:
+            np.savez(npz, _names=np.array(names, dtype=str), _units=np.array(column_units, dtype=str), **dict(zip(names, columns)))
+    elif ext == 'parquet':
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError('The pyarrow package is needed to write %s' % path)
+        fields = [pyarrow.field(name, pyarrow.from_numpy_dtype(column.dtype), metadata={'unit': unit})
+                  for name, unit, column in zip(names, column_units, columns)]
+        schema = pyarrow.schema(fields, metadata={'biobb_analysis': json.dumps(data.metadata)})
+        pyarrow.parquet.write_table(pyarrow.Table.from_arrays(columns, schema=schema), path)
+    elif ext == 'hdf5':
+        try:
+            import h5py
+        except ImportError:
+            raise ValueError('The h5py package is needed to write %s' % path)
+        with h5py.File(path, 'w') as hdf5:
+            hdf5.attrs['columns'] = names
+            for label, value in data.metadata.items():
+                if label != 'legends':
+                    hdf5.attrs[label] = value
+            for name, unit, column in zip(names, column_units, columns):
+                dataset = hdf5.create_dataset(name, data=column)
+                dataset.attrs['unit'] = unit
+    else:
+        raise ValueError('Format %s is not a binary columnar format' % ext)
+
+
+def read_columnar(path):
+    """ Reads a npy, npz, parquet or hdf5 file written by write_columnar.
+
+    Gives a DataSets with the names of the columns, their values as a float64 array (rows, columns) and the units of
+    the columns in its metadata.
+    """
+    ext = PurePath(path).suffix[1:].lower()
+    if ext == 'npy':
+        array = np.load(path, allow_pickle=False)
+        names, units = zip(*[split_unit(field, FIELD_UNIT) for field in array.dtype.names])
+        columns = [array[field] for field in array.dtype.names]
+        metadata = {}
+    elif ext == 'npz':
+        with np.load(path, allow_pickle=False) as npz:
+            names, units = npz['_names'].tolist(), npz['_units'].tolist()
+            columns = [npz[name] for name in names]
+        metadata = {}
+    elif ext == 'parquet':
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError('The pyarrow package is needed to read %s' % path)
+        table = pyarrow.parquet.read_table(path)
+        names = table.schema.names
+        units = [(field.metadata or {}).get(b'unit', b'').decode() for field in table.schema]
+        columns = [table.column(name).to_numpy() for name in names]
+        metadata = json.loads((table.schema.metadata or {}).get(b'biobb_analysis', b'{}'))
+    elif ext == 'hdf5':
+        try:
+            import h5py
+        except ImportError:
+            raise ValueError('The h5py package is needed to read %s' % path)
+        with h5py.File(path, 'r') as hdf5:
+            names = [str(name) for name in hdf5.attrs['columns']]
+            units = [str(hdf5[name].attrs['unit']) for name in names]
+            columns = [hdf5[name][()] for name in names]
+            metadata = {label: str(value) for label, value in hdf5.attrs.items() if label != 'columns'}
+    else:
+        raise ValueError('Format %s is not a binary columnar format' % ext)
+    metadata['units'] = list(units)
+    values = np.column_stack(columns).astype(np.float64) if columns else np.empty((0, 0))
+    return DataSets(list(names), values, metadata)
+
+
+def begin_columnar_output(biobb, file_ref, text_ext, out_log):
+    """ Makes a block with a binary columnar output write its text output, with text_ext extension, to a temporary file.
+
+    Only the executables write text outputs: with the native backend the output path is kept, and written directly.
+    """
+    biobb.columnar_output = None
+    path = biobb.io_dict["out"].get(file_ref)
+    if not path or not is_columnar(PurePath(path).suffix[1:]):
+        return
+    package = COLUMNAR_PACKAGES.get(PurePath(path).suffix[1:].lower())
+    if package and not importlib.util.find_spec(package):
+        native_error(biobb.__class__.__name__, 'The %s package is needed to write %s' % (package, path), out_log)
+    if getattr(biobb, 'backend', None) == 'native':
+        return
+    text_path = str(PurePath(fu.create_unique_dir()).joinpath(PurePath(path).stem + '.' + text_ext))
+    fu.log('Binary %s output: text output written to %s' % (PurePath(path).suffix[1:], text_path), out_log)
+    biobb.columnar_output = (file_ref, path)
+    biobb.io_dict["out"][file_ref] = text_path
+    # the names and units of the columns of xvg files are in their xmgrace headers
+    if getattr(biobb, 'xvg', None):
+        biobb.xvg = 'xmgrace'
+
+
+def end_columnar_output(biobb, out_log, units=None):
+    """ Converts the temporary text output of the executable of a block into its binary columnar output, see :func:`write_columnar` """
+    if not getattr(biobb, 'columnar_output', None):
+        return
+    file_ref, path = biobb.columnar_output
+    biobb.columnar_output = None
+    text_path = biobb.io_dict["out"][file_ref]
+    biobb.io_dict["out"][file_ref] = path
+    try:
+        if Path(text_path).exists():
+            try:
+                data = parse_xvg(text_path) if PurePath(text_path).suffix == '.xvg' else parse_dat(text_path)
+                write_columnar(path, data, units)
+            except (ValueError, OSError) as e:
+                native_error(biobb.__class__.__name__, str(e), out_log)
+            fu.log('Binary output: %d columns of %d rows written to %s' % (data.values.shape[1], len(data.values), path), out_log)
+    finally:
+        if biobb.remove_tmp:
+            shutil.rmtree(PurePath(text_path).parent, ignore_errors=True)
@@ -0,0 +1,77 @@
+""" Common functions for package biobb_analysis.native """
+from collections import namedtuple
+from pathlib import PurePath
+import numpy as np
+from biobb_common.tools import file_utils as fu
+from biobb_analysis.native.data import DataSets
+
+
+# block of consecutive frames: coordinates (frames, atoms, 3) in Angstroms, time (frames) in ps, box (frames, 3) in Angstroms or None
+Chunk = namedtuple('Chunk', ['xyz', 'time', 'box'])
+
+
+def make_chunk(xyz, time, box):
+    """ Stacks lists of frames, times and boxes into a chunk """
+    return Chunk(np.stack(xyz), np.array(time, dtype=np.float64), None if box[0] is None else np.stack(box))
+
+
+def native_error(classname, msg, out_log):
+    """ Logs an error raised by the native backend and exits """
+    fu.log(classname + ': %s, exiting' % msg, out_log)
+    raise SystemExit(classname + ': %s' % msg)
+
+
+def write_binary_columnar(path, data, units):
+    """ Writes parsed data sets as a binary columnar output if path has the extension of one, see :func:`native.columnar.write_columnar` """
+    # the columnar module uses this one, so it is imported here
+    from biobb_analysis.native.columnar import is_columnar, write_columnar
+    if not is_columnar(PurePath(path).suffix[1:]):
+        return False
+    write_columnar(path, data, units)
+    return True
+
+
+def write_dat(path, names, columns, x=None, x_name='#Frame', x_fmt='%8i', append=False, units=None):
+    """ Writes data sets as a cpptraj data file, one row per frame unless other x values are given; only the rows are appended to an existing file if append.
+
+    A path with a binary columnar extension is written straight from the values, with the units of the columns given
+    as in :func:`native.columnar.get_columns`.
+    """
+    if x is None:
+        x = np.arange(1, len(columns[0]) + 1)
+    data = np.column_stack([x] + list(columns))
+    if write_binary_columnar(path, DataSets([x_name] + list(names), data, {}), units):
+        return
+    # columns are as wide as their names, as in cpptraj
+    widths = [max(12, len(name)) for name in names]
+    header = '' if append else ('%-8s' + ''.join(' %%%ds' % width for width in widths)) % ((x_name,) + tuple(names))
+    with open(path, 'ab' if append else 'wb') as dat:
+        np.savetxt(dat, data, fmt=[x_fmt] + ['%%%d.4f' % width for width in widths], delimiter=' ', header=header, comments='')
+
+
+def write_xvg(path, x, columns, xvg, title, xaxis, yaxis, subtitle=None, legends=None, fmt='%12.7f', delimiter=' ', append=False, units=None):
+    """ Writes data sets as a GROMACS xvg file, with xmgr/xmgrace headers unless xvg is none; only the rows are appended to an existing file if append.
+
+    A path with a binary columnar extension is written straight from the values, the columns being named and their
+    units taken as if the xmgrace file was parsed, the units given overriding them.
+    """
+    metadata = {'title': title, 'xaxis': xaxis, 'yaxis': yaxis, 'legends': list(legends or [])}
+    if subtitle:
+        metadata['subtitle'] = subtitle
+    names = [xaxis] + (list(legends) if legends else [yaxis] if len(columns) == 1 else ['y%d' % i for i in range(len(columns))])
+    if write_binary_columnar(path, DataSets(names, np.column_stack([x] + list(columns)), metadata), units):
+        return
+    header = []
+    if xvg != 'none' and not append:
+        header.append('# This file was created by biobb_analysis')
+        header.append('@    title "%s"' % title)
+        header.append('@    xaxis  label "%s"' % xaxis)
+        header.append('@    yaxis  label "%s"' % yaxis)
+        header.append('@TYPE xy')
+        if subtitle:
+            header.append('@ subtitle "%s"' % subtitle)
+        for i, legend in enumerate(legends or []):
+            header.append(('@ s%d legend "%s"' if xvg == 'xmgrace' else '@ legend string %d "%s"') % (i, legend))
+    data = np.column_stack([x] + list(columns))
+    with open(path, 'ab' if append else 'wb') as xvg_file:
+        np.savetxt(xvg_file, data, fmt=fmt, delimiter=delimiter, header='\n'.join(header), comments='')
@@ -0,0 +1,152 @@
+""" Loader of the text outputs of the blocks for package biobb_analysis.native
+
+Parses GROMACS xvg and xmgrace agr files, with their title, axis labels and legends, and cpptraj data files into
+NumPy arrays. The numbers are parsed at once by NumPy instead of line by line. The first load of a file writes a
+binary sidecar next to it (the file path with an extra .npz suffix), read instead of the text file by later loads
+while the modification time and size of the text file are unchanged.
+"""
+import json
+import os
+import re
+from collections import namedtuple
+from pathlib import Path
+import numpy as np
+
+# data sets of a text file: names of the columns, values (rows, columns) and metadata of the file
+DataSets = namedtuple('DataSets', ['names', 'values', 'metadata'])
+
+SIDECAR_SUFFIX = '.npz'
+# lines of xvg and agr files that are not data: comments, xmgrace commands and ends of sets
+XVG_COMMENTS = (b'#', b'@', b'&')
+XVG_LABELS = {'title': re.compile(r'^@\s+title\s+"(.*)"'),
+              'subtitle': re.compile(r'^@\s+subtitle\s+"(.*)"'),
+              'xaxis': re.compile(r'^@\s+xaxis\s+label\s+"(.*)"'),
+              'yaxis': re.compile(r'^@\s+yaxis\s+label\s+"(.*)"')}
+# legends of the xmgrace (@ s0 legend) and xmgr (@ legend string 0) formats
+XVG_LEGEND = re.compile(r'^@\s+(?:s(\d+)\s+legend|legend\s+string\s+(\d+))\s+"(.*)"')
+
+
+def _split_header(text, comments):
+    """ Gives the header lines of a text file and the offset of its first data line """
+    offset = 0
+    header = []
+    while offset < len(text):
+        end = text.find(b'\n', offset)
+        end = len(text) if end < 0 else end + 1
+        line = text[offset:end]
+        if line.strip() and not line.lstrip().startswith(comments):
+            break
+        header.append(line.decode(errors='replace').rstrip())
+        offset = end
+    return header, offset
+
+
+def _parse_values(text, offset, comments, path):
+    """ Parses the data lines of a text file into a (rows, columns) array, skipping the comments found between them """
+    body = text[offset:]
+    if any(b'\n' + comment in body for comment in comments):
+        body = b'\n'.join(line for line in body.split(b'\n') if not line.lstrip().startswith(comments))
+    first_line = body.split(b'\n', 1)[0].split()
+    if not first_line:
+        return np.empty((0, 0), dtype=np.float64)
+    try:
+        # every whitespace, newlines included, separates values
+        values = np.fromstring(body, dtype=np.float64, sep=' ')
+    except ValueError:
+        values = np.empty(1)
+    if values.size % len(first_line):
+        raise ValueError('%s has rows of different lengths or non numeric values' % path)
+    return values.reshape(-1, len(first_line))
+
+
+def parse_xvg(path):
+    """ Parses a GROMACS xvg or xmgrace agr file; the names of the columns are the x axis label and the legends, or the y axis label of a single data set """
+    text = Path(path).read_bytes()
+    header, offset = _split_header(text, XVG_COMMENTS)
+    values = _parse_values(text, offset, XVG_COMMENTS, path)
+    metadata = {}
+    legends = {}
+    for line in header:
+        for label, regex in XVG_LABELS.items():
+            match = regex.match(line)
+            if match:
+                metadata[label] = match.group(1)
+        match = XVG_LEGEND.match(line)
+        if match:
+            legends[int(match.group(1) or match.group(2))] = match.group(3)
+    metadata['legends'] = [legends[i] for i in sorted(legends)]
+    names = [metadata.get('xaxis', 'x')]
+    if values.shape[1] == 2 and not legends and 'yaxis' in metadata:
+        names.append(metadata['yaxis'])
+    else:
+        names += [legends.get(i, 'y%d' % i) for i in range(values.shape[1] - 1)]
+    return DataSets(names, values, metadata)
+
+
+def parse_dat(path):
+    """ Parses a cpptraj data file; the names of the columns are the ones in its header line """
+    text = Path(path).read_bytes()
+    header, offset = _split_header(text, (b'#',))
+    values = _parse_values(text, offset, (b'#',), path)
+    names = header[-1].lstrip('#').split() if header else []
+    if header and len(names) == values.shape[1]:
+        names[0] = '#' + names[0]
+    else:
+        names = ['#Frame'] + ['y%d' % i for i in range(values.shape[1] - 1)]
+    return DataSets(names, values, {})
+
+
+def get_sidecar_path(path):
+    """ Gives the path of the binary sidecar of a text file """
+    return str(path) + SIDECAR_SUFFIX
+
+
+def read_sidecar(path):
+    """ Gives the data sets stored in the sidecar of a text file if it is up to date, None otherwise """
+    sidecar = get_sidecar_path(path)
+    if not Path(sidecar).exists():
+        return None
+    stat = os.stat(path)
+    try:
+        with np.load(sidecar, allow_pickle=False) as stored:
+            if int(stored['mtime_ns']) != stat.st_mtime_ns or int(stored['size']) != stat.st_size:
+                return None
+            return DataSets(stored['names'].tolist(), stored['values'], json.loads(str(stored['metadata'])))
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def write_sidecar(path, data):
+    """ Writes the sidecar of a text file; it is replaced at once and skipped if its directory is not writable """
+    sidecar = get_sidecar_path(path)
+    stat = os.stat(path)
+    tmp = '%s.%d.tmp' % (sidecar, os.getpid())
+    try:
+        with open(tmp, 'wb') as npz:
+            np.savez(npz, names=np.array(data.names, dtype=str), values=data.values, metadata=json.dumps(data.metadata),
+                     mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        os.replace(tmp, sidecar)
+    except OSError:
+        if Path(tmp).exists():
+            os.remove(tmp)
+
+
+def load_data(path, sidecar=True):
+    """ Loads the data sets of a xvg, agr or dat file.
+
+    Gives a DataSets with the names of the columns, the values as a float64 array (rows, columns), the first column
+    being the x values, and the metadata of the file: title, subtitle, xaxis, yaxis and legends for xvg and agr files.
+    If sidecar is True the values are read from the binary sidecar of the file when it is up to date, and the sidecar
+    is written otherwise.
+    """
+    if sidecar:
+        data = read_sidecar(path)
+        if data is not None:
+            return data
+    if Path(path).suffix.lower() in ('.xvg', '.agr'):
+        data = parse_xvg(path)
+    else:
+        data = parse_dat(path)
+    if sidecar:
+        write_sidecar(path, data)
+    return data
@@ -0,0 +1,146 @@
+""" Memory-mapped DCD reader for package biobb_analysis.native """
+import numpy as np
+from biobb_analysis.native.common import Chunk
+
+# CHARMM time unit (AKMA) in ps
+AKMA_PS = 0.04888821
+
+
+class DCDFile:
+    """ CHARMM/NAMD/X-PLOR DCD trajectory mapped in memory.
+
+    The header is parsed once and the frames are exposed as zero-copy float32 views of the file:
+    **xyz** (frames, atoms, 3) and **cell** (frames, 6; A, gamma, B, beta, alpha, C as stored in the file).
+    When the file has fixed atoms, only the first frame stores all of them and **xyz** holds the free
+    atoms of the following frames, use :meth:`read` to get full frames.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.mm = np.memmap(path, dtype=np.uint8, mode='r')
+        self.endian, self.marker = self._detect_format()
+        m, e = self.marker, self.endian
+
+        # first record: CORD and the 20 control integers
+        icntrl = self._array(m + 4, 'i4', 20)
+        self.charmm = icntrl[19] != 0
+        self.n_set, self.istart, self.nsavc = int(icntrl[0]), int(icntrl[1]), int(icntrl[2])
+        self.n_fixed = int(icntrl[8])
+        if self.charmm:
+            self.delta = float(self._array(m + 4 + 9 * 4, 'f4', 1)[0])
+            self.has_cell = icntrl[10] != 0
+            self.four_dims = icntrl[11] != 0
+        else:
+            self.delta = float(self._array(m + 4 + 9 * 4, 'f8', 1)[0])
+            self.has_cell = False
+            self.four_dims = False
+        offset = self._skip_record(0)
+
+        # title record
+        n_title = int(self._array(offset + m, 'i4', 1)[0])
+        self.title = [bytes(self.mm[offset + m + 4 + i * 80:offset + m + 4 + (i + 1) * 80]).decode(errors='replace').rstrip() for i in range(n_title)]
+        offset = self._skip_record(offset)
+
+        # number of atoms record
+        self.n_atoms = int(self._array(offset + m, 'i4', 1)[0])
+        offset = self._skip_record(offset)
+
+        # free atoms record
+        self.free = None
+        if self.n_fixed:
+            self.free = self._array(offset + m, 'i4', self.n_atoms - self.n_fixed).astype(np.int64) - 1
+            offset = self._skip_record(offset)
+
+        n_free = self.n_atoms - self.n_fixed
+        cell_bytes = (48 + 2 * m) if self.has_cell else 0
+        self.first_offset = offset
+        self.first_bytes = cell_bytes + (4 if self.four_dims else 3) * (4 * self.n_atoms + 2 * m)
+        self.frame_bytes = cell_bytes + (4 if self.four_dims else 3) * (4 * n_free + 2 * m)
+
+        # the number of frames is given by the file size, the header count is not reliable on unfinished files
+        remaining = len(self.mm) - offset - self.first_bytes
+        self.n_frames = 0 if remaining < 0 else 1 + remaining // self.frame_bytes
+        frames_offset = offset + self.first_bytes if self.n_fixed else offset
+        n_mapped = self.n_frames - 1 if self.n_fixed else self.n_frames
+        self.xyz = self._frames_view(frames_offset, n_mapped, n_free, cell_bytes, self.frame_bytes)
+        self.first_xyz = self._frames_view(offset, min(1, self.n_frames), self.n_atoms, cell_bytes, self.first_bytes)
+        self.cell = None
+        if self.has_cell:
+            self.cell = np.ndarray((self.n_frames, 6), dtype=e + 'f8', buffer=self.mm, offset=offset + m,
+                                   strides=(self.frame_bytes, 8)) if not self.n_fixed else self._fixed_cell(m)
+
+    def _detect_format(self):
+        """ Gives the byte order and the size of the Fortran record markers """
+        for marker, dtype in ((4, 'i4'), (8, 'i8')):
+            if bytes(self.mm[marker:marker + 4]) != b'CORD':
+                continue
+            for endian in ('<', '>'):
+                if np.frombuffer(self.mm[:marker].tobytes(), endian + dtype)[0] == 84:
+                    return endian, marker
+        raise ValueError('%s is not a DCD file' % self.path)
+
+    def _array(self, offset, dtype, count):
+        """ Gives a view of count values of the given type starting at offset """
+        return np.ndarray((count,), dtype=self.endian + dtype, buffer=self.mm, offset=offset)
+
+    def _skip_record(self, offset):
+        """ Gives the offset of the record following the one starting at offset """
+        dtype = 'i4' if self.marker == 4 else 'i8'
+        size = int(self._array(offset, dtype, 1)[0])
+        return offset + size + 2 * self.marker
+
+    def _frames_view(self, offset, n_frames, n_atoms, cell_bytes, frame_bytes):
+        """ Gives a zero-copy (frames, atoms, 3) view of the X, Y and Z records of consecutive frames """
+        return np.ndarray((n_frames, n_atoms, 3), dtype=self.endian + 'f4', buffer=self.mm,
+                          offset=offset + cell_bytes + self.marker,
+                          strides=(frame_bytes, 4, 4 * n_atoms + 2 * self.marker))
+
+    def _fixed_cell(self, m):
+        """ Gives the unit cells of a file with fixed atoms, where the first frame is longer """
+        first = np.ndarray((1, 6), dtype=self.endian + 'f8', buffer=self.mm, offset=self.first_offset + m)
+        if self.n_frames < 2:
+            return first
+        rest = np.ndarray((self.n_frames - 1, 6), dtype=self.endian + 'f8', buffer=self.mm,
+                          offset=self.first_offset + self.first_bytes + m, strides=(self.frame_bytes, 8))
+        return np.concatenate([first, rest])
+
+    def box(self, frames):
+        """ Gives the box lengths (frames, 3) of the given frames, None if the file has no unit cell """
+        if self.cell is None:
+            return None
+        return np.array(self.cell[frames][:, [0, 2, 5]], dtype=np.float64)
+
+    def time(self, frames):
+        """ Gives the time in ps of the given frames, their index if the time step is unknown """
+        frames = np.asarray(frames, dtype=np.float64)
+        if self.delta <= 0 or self.nsavc <= 0:
+            return frames
+        return (self.istart + frames * self.nsavc) * self.delta * AKMA_PS
+
+    def read(self, frames, atom_indices=None):
+        """ Gives a float64 copy (frames, atoms, 3) of the given frames (0-based) and atoms, touching only their pages """
+        frames = np.asarray(frames, dtype=np.int64)
+        if not self.n_fixed:
+            if atom_indices is None:
+                return self.xyz[frames].astype(np.float64)
+            return self.xyz[frames[:, None], np.asarray(atom_indices)].astype(np.float64)
+        atoms = np.arange(self.n_atoms) if atom_indices is None else np.asarray(atom_indices)
+        # fixed atoms keep the coordinates of the first frame, free ones are read from the following frames
+        xyz = np.repeat(self.first_xyz[:1, atoms].astype(np.float64), len(frames), axis=0)
+        position = np.full(self.n_atoms, -1, dtype=np.int64)
+        position[self.free] = np.arange(len(self.free))
+        free = position[atoms]
+        moving, later = free >= 0, frames > 0
+        xyz[np.ix_(later, moving)] = self.xyz[(frames[later] - 1)[:, None], free[moving]]
+        return xyz
+
+
+def read_dcd(path, n_atoms, atom_indices, start, stop, step, chunk_size):
+    """ Yields chunks of the selected frames and atoms of a DCD file, reading only those frames """
+    dcd = DCDFile(path)
+    if dcd.n_atoms != n_atoms:
+        raise ValueError('%s has %d atoms, topology has %d' % (path, dcd.n_atoms, n_atoms))
+    frames = np.arange(dcd.n_frames)[start:stop:step]
+    for first in range(0, len(frames), chunk_size):
+        block = frames[first:first + chunk_size]
+        yield Chunk(dcd.read(block, atom_indices), dcd.time(block), dcd.box(block))
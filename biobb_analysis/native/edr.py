@@ -0,0 +1,191 @@
+""" EDR reader for package biobb_analysis.native
+
+Reads GROMACS energy files (file versions 2 to 5, single or double precision) without the GROMACS binaries: the
+catalog of energy terms and units in the file header, an index of the byte offset, time and layout of every frame,
+and the values of any set of terms for a time window as NumPy arrays, reading only the selected frames.
+"""
+import os
+import struct
+from collections import namedtuple
+import numpy as np
+
+ENX_MAGIC = -55555
+FRAME_MAGIC = -7777777
+# size in bytes of every item of the subblocks, by xdr data type: int, float, double, int64, char; strings have variable size
+SUBBLOCK_SIZES = {0: 4, 1: 4, 2: 8, 3: 8, 4: 4}
+XDR_STRING = 5
+
+# energy term of an EDR file
+Term = namedtuple('Term', ['name', 'unit'])
+# frames of an EDR file: byte offset of their energies, time (ps), step, number of energies and whether averages and sums follow every energy,
+# and byte offset of the end of the last frame
+EdrIndex = namedtuple('EdrIndex', ['offsets', 'time', 'step', 'nre', 'has_sums', 'real', 'end'])
+
+
+def _read_int(edr):
+    return struct.unpack('>i', edr.read(4))[0]
+
+
+def _read_int64(edr):
+    return struct.unpack('>q', edr.read(8))[0]
+
+
+def _read_double(edr):
+    return struct.unpack('>d', edr.read(8))[0]
+
+
+def _read_string(edr):
+    """ Reads a xdr string """
+    length = _read_int(edr)
+    value = edr.read(length)
+    edr.seek((4 - length % 4) % 4, 1)
+    return value.rstrip(b'\0').decode()
+
+
+def read_edr_terms(path):
+    """ Gives the energy terms of an EDR file, their units, the file version and the byte offset of the first frame """
+    with open(path, 'rb') as edr:
+        magic = _read_int(edr)
+        if magic > 0:
+            # old format, the magic number is the number of terms
+            version, nre = 1, magic
+        elif magic == ENX_MAGIC:
+            version, nre = _read_int(edr), _read_int(edr)
+        else:
+            raise ValueError('%s is not an EDR file or is corrupted' % path)
+        terms = []
+        for _ in range(nre):
+            name = _read_string(edr)
+            terms.append(Term(name, _read_string(edr) if version >= 2 else 'kJ/mol'))
+        return terms, version, edr.tell()
+
+
+def _get_real(edr):
+    """ Gives the type of the reals of an EDR file, given by the first real of its first frame """
+    first = edr.read(8)
+    edr.seek(-len(first), 1)
+    if len(first) == 8 and struct.unpack('>f', first[:4])[0] > -1e10 and struct.unpack('>d', first)[0] < -1e10:
+        return '>f8'
+    return '>f4'
+
+
+def _skip_subblocks(edr, subblocks):
+    """ Skips the data of the blocks of a frame """
+    for nr, data_type in subblocks:
+        if data_type == XDR_STRING:
+            for _ in range(nr):
+                _read_int(edr)
+                _read_string(edr)
+        else:
+            edr.seek(nr * SUBBLOCK_SIZES[data_type], 1)
+
+
+def _read_frame_header(edr, real):
+    """ Reads the header of a frame, gives its time (ps), step, number of energies, whether sums follow the energies and its subblocks; None at the end of the file """
+    size = 8 if real == '>f8' else 4
+    data = edr.read(size)
+    if len(data) < size:
+        return None
+    if np.frombuffer(data, dtype=real)[0] > -1e10:
+        raise ValueError('%s has frames in the old EDR format, which is not supported' % edr.name)
+    if _read_int(edr) != FRAME_MAGIC:
+        raise ValueError('%s is not an EDR file or is corrupted' % edr.name)
+    version = _read_int(edr)
+    time, step, nsum = _read_double(edr), _read_int64(edr), _read_int(edr)
+    if version >= 3:
+        _read_int64(edr)
+    if version >= 5:
+        _read_double(edr)
+    nre = _read_int(edr)
+    # number of distance restraints in old versions, reserved in the current one
+    ndisre = _read_int(edr)
+    nblock = _read_int(edr)
+    subblocks = []
+    if version < 4:
+        # old blocks: distance restraints in two subblocks of reals, then one subblock of reals per block
+        if ndisre:
+            subblocks += [(ndisre, 1 if real == '>f4' else 2)] * 2
+        for _ in range(nblock):
+            subblocks.append((_read_int(edr), 1 if real == '>f4' else 2))
+    else:
+        for _ in range(nblock):
+            _read_int(edr)
+            for _ in range(_read_int(edr)):
+                subblocks.append((_read_int(edr), _read_int(edr)))
+    # e_size and two reserved ints
+    edr.seek(12, 1)
+    return time, step, nre, nsum > 0, subblocks
+
+
+def edr_index(path, offset=None):
+    """ Builds the index of the frames of an EDR file, reading only their headers from the first frame or from the byte offset of any frame.
+
+    A frame still being written at the end of the file is left out.
+    """
+    if offset is None:
+        _, _, offset = read_edr_terms(path)
+    size = os.path.getsize(path)
+    offsets, time, step, nre, has_sums = [], [], [], [], []
+    with open(path, 'rb') as edr:
+        edr.seek(offset)
+        real = _get_real(edr)
+        real_size = 8 if real == '>f8' else 4
+        end = offset
+        while True:
+            try:
+                header = _read_frame_header(edr, real)
+                if header is None:
+                    break
+                t, s, n, sums, subblocks = header
+                energies = edr.tell()
+                edr.seek(n * real_size * (3 if sums else 1), 1)
+                _skip_subblocks(edr, subblocks)
+            except struct.error:
+                break
+            if edr.tell() > size:
+                break
+            offsets.append(energies)
+            time.append(t)
+            step.append(s)
+            nre.append(n)
+            has_sums.append(sums)
+            end = edr.tell()
+    return EdrIndex(np.array(offsets, dtype=np.int64), np.array(time, dtype=np.float64), np.array(step, dtype=np.int64),
+                    np.array(nre, dtype=np.int64), np.array(has_sums, dtype=bool), real, end)
+
+
+def get_term_indices(path, terms):
+    """ Gives the position of every term in an EDR file, the names of the file and of the terms being compared with '-' instead of spaces """
+    catalog, _, _ = read_edr_terms(path)
+    names = [term.name.replace(' ', '-') for term in catalog]
+    indices = []
+    for term in terms:
+        name = term.strip().replace(' ', '-')
+        if name not in names:
+            raise ValueError('Term %s not found in %s, available terms: %s' % (term, path, ', '.join(names)))
+        indices.append(names.index(name))
+    return indices, [catalog[i] for i in indices]
+
+
+def read_edr(path, terms, start_time=None, end_time=None, index=None):
+    """ Gives the time (ps) of the frames of an EDR file in the [start_time, end_time] window and the values of the given terms in them (frames, terms).
+
+    Only the frames in the window are read, found with the index of the file (see :func:`edr_index`) given or built once.
+    Frames without energies are ignored.
+    """
+    indices, _ = get_term_indices(path, terms)
+    index = edr_index(path) if index is None else index
+    selected = index.nre > 0
+    if start_time is not None:
+        selected &= index.time >= start_time
+    if end_time is not None:
+        selected &= index.time <= end_time
+    size = 8 if index.real == '>f8' else 4
+    values = np.empty((int(selected.sum()), len(indices)), dtype=np.float64)
+    with open(path, 'rb') as edr:
+        for row, frame in enumerate(np.flatnonzero(selected)):
+            stride = 3 if index.has_sums[frame] else 1
+            edr.seek(index.offsets[frame])
+            energies = np.frombuffer(edr.read(int(index.nre[frame]) * size * stride), dtype=index.real)
+            values[row] = energies[np.array(indices) * stride]
+    return index.time[selected], values
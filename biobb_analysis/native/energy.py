@@ -0,0 +1,57 @@
+""" Native energy extraction engine for package biobb_analysis.native """
+import struct
+from biobb_common.tools import file_utils as fu
+from biobb_analysis.native.common import native_error, write_xvg
+from biobb_analysis.native.edr import edr_index, get_term_indices, read_edr, read_edr_terms
+from biobb_analysis.native.incremental import load_state, save_state, begin_segment, end_segment, get_new_times, accumulate, log_running
+
+
+def compute_gmx_energy(input_energy_path, output_xvg_path, terms, start, end, xvg, out_log, classname, incremental=False):
+    """ Extracts energy terms of an EDR file in-process for the frames between start and end (ps, 0 meaning the last frame), emulating GROMACS energy.
+
+    In incremental mode only the frames added since the last launch and after its last time are read, from the byte
+    offset of the first of them, their rows being appended to the output (see :mod:`native.incremental`).
+    """
+    state = load_state(output_xvg_path, {'terms': list(terms), 'start': float(start), 'end': float(end), 'xvg': xvg}, out_log, classname) if incremental else None
+    try:
+        _, catalog = get_term_indices(input_energy_path, terms)
+        index = None
+        if state is not None:
+            offset = begin_segment(input_energy_path, state)
+            index = edr_index(input_energy_path, offset or None)
+        time, values = read_edr(input_energy_path, terms, float(start), float(end) if float(end) else None, index)
+    except (ValueError, OSError) as e:
+        native_error(classname, str(e), out_log)
+    if state is not None:
+        end_segment(input_energy_path, state, index.end)
+        new = get_new_times(state, time)
+        time, values = time[new], values[new]
+        if state['frames'] and not len(time):
+            save_state(output_xvg_path, state)
+            fu.log('Incremental mode: no new frames in %s' % input_energy_path, out_log)
+            return 0
+    if not len(time):
+        native_error(classname, 'No frames found in %s' % input_energy_path, out_log)
+
+    units = []
+    for term in catalog:
+        if '(%s)' % term.unit not in units:
+            units.append('(%s)' % term.unit)
+    write_xvg(output_xvg_path, time, values.T, xvg, 'GROMACS Energies', 'Time (ps)', ', '.join(units),
+              legends=[term.name for term in catalog], fmt=['%12.6f'] + ['%10.6f'] * len(catalog), delimiter='  ',
+              append=bool(state is not None and state['frames']), units={term.name: term.unit for term in catalog})
+    if state is not None:
+        accumulate(state, values.T, time)
+        save_state(output_xvg_path, state)
+        log_running(state, [term.name for term in catalog], out_log)
+    fu.log('Native backend: %d energy terms of %d frames written to %s' % (len(catalog), len(time), output_xvg_path), out_log)
+    return 0
+
+
+def get_term_units(input_energy_path):
+    """ Gives the units of the energy terms of an EDR file by name, none if it can not be read """
+    try:
+        terms, _, _ = read_edr_terms(input_energy_path)
+    except (ValueError, OSError, struct.error):
+        return {}
+    return {term.name: term.unit for term in terms}
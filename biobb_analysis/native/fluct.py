@@ -0,0 +1,120 @@
+""" Native atomic fluctuation engines for package biobb_analysis.native """
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import PurePath
+import numpy as np
+from biobb_common.tools import file_utils as fu
+from biobb_analysis.native.columnar import is_columnar
+from biobb_analysis.native.common import native_error, write_dat
+from biobb_analysis.native.topology import load_topology
+from biobb_analysis.native.trajectory import frame_range, split_frames, count_frames
+from biobb_analysis.native.superpose import superpose
+from biobb_analysis.native.rms import select_cpptraj_mask, prefit_reference, cpptraj_blocks
+
+# cpptraj data set names given by atomicfluct
+CPPTRAJ_FLUCT_NAMES = {'rmsf': 'AtomicFlx', 'bfactor': 'B-factors'}
+
+
+def block_moments(xyz):
+    """ Gives the number of frames, mean and sum of squared deviations (atoms, 3) of a block of frames """
+    mean = xyz.mean(axis=0)
+    return len(xyz), mean, ((xyz - mean) ** 2).sum(axis=0)
+
+
+def combine_moments(a, b):
+    """ Combines the moments of two sets of frames with the parallel Welford (Chan et al.) formula """
+    n_a, mean_a, m2_a = a
+    n_b, mean_b, m2_b = b
+    if not n_a:
+        return b
+    if not n_b:
+        return a
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    return n, mean_a + delta * (n_b / n), m2_a + m2_b + delta ** 2 * (n_a * n_b / n)
+
+
+def _sum_worker(args):
+    """ Gives the number of frames and the sum of the coordinates of a chunk of frames, prefitted as done by setup_structure """
+    input_traj_path, top, selection, start, stop, step, first = args
+    n, total = 0, np.zeros((len(selection), 3))
+    for xyz in cpptraj_blocks(input_traj_path, top, selection, start, stop, step, first):
+        n += len(xyz)
+        total += xyz.sum(axis=0)
+    return n, total
+
+
+def _moments_worker(args):
+    """ Gives the moments of the coordinates of a chunk of frames, once fitted onto the common reference """
+    input_traj_path, top, selection, start, stop, step, first, ref = args
+    moments = (0, 0.0, 0.0)
+    for xyz in cpptraj_blocks(input_traj_path, top, selection, start, stop, step, first):
+        moments = combine_moments(moments, block_moments(superpose(xyz, ref)))
+    return moments
+
+
+def _map(worker, tasks, n_workers):
+    """ Runs the worker on every task, in a pool of n_workers processes if more than one """
+    if n_workers <= 1 or len(tasks) <= 1:
+        return [worker(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=min(n_workers, len(tasks))) as executor:
+        return list(executor.map(worker, tasks))
+
+
+def by_residue(values, masses, resids):
+    """ Gives the mass-weighted average of the atom values of every residue, residues being numbered from 1 """
+    residues, index = np.unique(resids, return_inverse=True)
+    masses = np.where(masses > 0, masses, 1.0)
+    weighted = np.bincount(index, weights=values * masses, minlength=len(residues))
+    return np.arange(1, len(residues) + 1), weighted / np.bincount(index, weights=masses, minlength=len(residues))
+
+
+def compute_cpptraj_fluct(input_top_path, input_traj_path, output_cpptraj_path, input_exp_path, mask, reference, start, end, step, bfactor, n_workers, out_log, classname):
+    """ Computes the atomic fluctuations by residue of a trajectory in-process, emulating the CpptrajRmsf and CpptrajBfactor instructions.
+
+    The frames are split in n_workers contiguous chunks, every worker accumulates the moments of its frames fitted onto the common
+    reference and the moments are combined with the parallel Welford formula, so the chunks can be processed in parallel.
+    """
+    if PurePath(output_cpptraj_path).suffix != '.dat' and not is_columnar(PurePath(output_cpptraj_path).suffix[1:]):
+        native_error(classname, 'Only dat and binary columnar output files are supported by the native backend', out_log)
+    try:
+        top, _ = load_topology(input_top_path)
+        selection = select_cpptraj_mask(top, mask)
+        if not len(selection):
+            native_error(classname, 'Mask %s does not select any atom' % mask, out_log)
+        fu.log('Native backend: %d atoms selected with mask %s' % (len(selection), mask), out_log)
+
+        start, stop, step = frame_range(start, end, step)
+        chunks = split_frames(start, stop, step, count_frames(input_traj_path, len(top.names)), n_workers)
+        if not chunks:
+            native_error(classname, 'No frames selected in %s' % input_traj_path, out_log)
+        fu.log('Native backend: frames split in %d chunks' % len(chunks), out_log)
+
+        # all the chunks are fitted onto the same reference
+        first = None
+        if reference == 'average':
+            first = prefit_reference(input_traj_path, top, chunks[0][0])
+            sums = _map(_sum_worker, [(input_traj_path, top, selection, a, b, step, first) for a, b in chunks], n_workers)
+            ref = sum(total for _, total in sums) / sum(n for n, _ in sums)
+        elif reference == 'experimental':
+            exp_top, exp_xyz = load_topology(input_exp_path)
+            exp_selection = select_cpptraj_mask(exp_top, mask)
+            if len(exp_selection) != len(selection):
+                native_error(classname, 'Mask %s selects %d atoms in the experimental structure and %d in the topology' % (mask, len(exp_selection), len(selection)), out_log)
+            ref = exp_xyz[exp_selection]
+        else:
+            ref = next(cpptraj_blocks(input_traj_path, top, selection, chunks[0][0], chunks[0][0] + 1, 1))[0]
+
+        moments = (0, 0.0, 0.0)
+        for chunk_moments in _map(_moments_worker, [(input_traj_path, top, selection, a, b, step, first, ref) for a, b in chunks], n_workers):
+            moments = combine_moments(moments, chunk_moments)
+    except ValueError as e:
+        native_error(classname, str(e), out_log)
+
+    n, _, m2 = moments
+    fluct = (m2 / n).sum(axis=1)
+    fluct = fluct * (8.0 / 3.0) * np.pi ** 2 if bfactor else np.sqrt(fluct)
+    residues, values = by_residue(fluct, top.masses[selection], top.resids[selection])
+    name = CPPTRAJ_FLUCT_NAMES['bfactor' if bfactor else 'rmsf']
+    write_dat(output_cpptraj_path, [name], [values], x=residues, x_name='#Res', x_fmt='%8.3f', units={None: 'Å²' if bfactor else 'Å'})
+    fu.log('Native backend: %s of %d residues over %d frames written to %s' % (name, len(values), n, output_cpptraj_path), out_log)
+    return 0
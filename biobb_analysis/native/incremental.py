@@ -0,0 +1,139 @@
+""" Incremental analyses of growing trajectories for package biobb_analysis.native
+
+A block in incremental mode keeps a state next to its output (the output path with an extra .state.npz suffix): the
+trajectory segment being read, the frames already read from it and the byte offset of the next one, the number of
+rows and the last time written to the output, the reference coordinates and the running sums of the output columns.
+Every launch reads only the frames added since the previous one and appends their rows to the output, so its cost
+scales with the new frames. A trajectory other than the one in the state, or one whose first bytes changed, is taken
+as the next segment of the same simulation and read from its first frame.
+
+XTC, TRR and EDR files are read from the byte offset of their first new frame, a frame still being written at their
+end being left for the next launch; other formats skip the frames already read.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path, PurePath
+import numpy as np
+from biobb_common.tools import file_utils as fu
+from biobb_analysis.native.common import native_error
+from biobb_analysis.native.index import HASH_BYTES, is_trimmable, scan_frames, get_format
+from biobb_analysis.native.trajectory import READERS, read_trajectory, get_chunk_size
+
+STATE_SUFFIX = '.state.npz'
+# output formats whose rows can be appended
+INCREMENTAL_FORMATS = ('dat', 'xvg')
+
+
+def get_state_path(output_path):
+    """ Gives the path of the incremental state of an output """
+    return str(output_path) + STATE_SUFFIX
+
+
+def head_hash(path, size):
+    """ Hashes the first size bytes of a file, which identify a trajectory while it grows """
+    with open(path, 'rb') as traj:
+        return hashlib.blake2b(traj.read(size), digest_size=16).hexdigest()
+
+
+def new_state(params):
+    """ Gives the state of an output with no rows yet, params being the properties its rows depend on """
+    return {'params': json.dumps(params, sort_keys=True), 'segment': '', 'head': '', 'head_bytes': 0, 'segment_frames': 0, 'offset': 0,
+            'frames': 0, 'time': -np.inf, 'reference': np.empty((0, 3)), 'prefit': np.empty((0, 3)), 'sums': np.empty(0), 'squares': np.empty(0)}
+
+
+def check_incremental(biobb, file_ref, out_log):
+    """ Checks that a block in incremental mode uses the native backend and a text output, and disables its result cache """
+    if not biobb.incremental:
+        return
+    classname = biobb.__class__.__name__
+    if biobb.backend != 'native':
+        native_error(classname, 'The incremental mode is only available for the native backend', out_log)
+    ext = PurePath(biobb.io_dict["out"][file_ref]).suffix[1:].lower()
+    if ext not in INCREMENTAL_FORMATS:
+        native_error(classname, 'The incremental mode is only available for %s outputs' % ', '.join(INCREMENTAL_FORMATS), out_log)
+    if getattr(biobb, 'cache_path', None):
+        fu.log('Incremental mode: result cache disabled', out_log)
+        biobb.cache_path = None
+
+
+def load_state(output_path, params, out_log, classname):
+    """ Gives the state of an incremental output, a new one if the output or its state do not exist; exits if it was saved with other params """
+    state = new_state(params)
+    state_path = get_state_path(output_path)
+    if not Path(output_path).exists() or not Path(state_path).exists():
+        return state
+    try:
+        with open(state_path, 'rb') as npz, np.load(npz, allow_pickle=False) as stored:
+            stored = {key: stored[key] for key in state}
+    except (OSError, KeyError, ValueError) as e:
+        native_error(classname, 'Incremental state %s can not be read: %s' % (state_path, e), out_log)
+    if str(stored['params']) != state['params']:
+        native_error(classname, '%s was computed with other properties, remove it and %s to start again' % (output_path, state_path), out_log)
+    state.update({key: value.item() if not value.ndim else value for key, value in stored.items()})
+    fu.log('Incremental mode: %d rows already in %s, last segment %s' % (state['frames'], output_path, state['segment']), out_log)
+    return state
+
+
+def save_state(output_path, state):
+    """ Writes the incremental state of an output, replaced at once """
+    state_path = get_state_path(output_path)
+    tmp = '%s.%d.tmp' % (state_path, os.getpid())
+    with open(tmp, 'wb') as npz:
+        np.savez(npz, **state)
+    os.replace(tmp, state_path)
+
+
+def begin_segment(path, state):
+    """ Gives the byte offset of the first new frame of a trajectory, starting a new segment in the state if the trajectory is not the one in it """
+    segment = str(Path(path).resolve())
+    if state['segment'] != segment or os.path.getsize(path) < state['offset'] or head_hash(path, state['head_bytes']) != state['head']:
+        state.update(segment=segment, head=head_hash(path, 0), head_bytes=0, segment_frames=0, offset=0)
+    return int(state['offset'])
+
+
+def end_segment(path, state, offset):
+    """ Records in the state the byte offset after the last frame read from a trajectory and the hash of its first bytes """
+    head_bytes = min(os.path.getsize(path), HASH_BYTES)
+    state.update(offset=int(offset), head=head_hash(path, head_bytes), head_bytes=head_bytes)
+
+
+def read_new_frames(path, n_atoms, atom_indices, state):
+    """ Yields chunks of the frames of a trajectory not read yet, the segment of the state being updated once they are all read """
+    offset = begin_segment(path, state)
+    atom_indices = None if atom_indices is None else np.asarray(atom_indices)
+    if is_trimmable(path):
+        index = scan_frames(path, offset)
+        chunk_size = get_chunk_size(n_atoms if atom_indices is None else len(atom_indices))
+        chunks = READERS[get_format(path)](path, n_atoms, atom_indices, 0, len(index.time), 1, chunk_size, offset=offset)
+        offset = int(index.offsets[-1])
+    else:
+        chunks = read_trajectory(path, n_atoms, atom_indices, int(state['segment_frames']))
+    for chunk in chunks:
+        state['segment_frames'] += len(chunk.xyz)
+        yield chunk
+    end_segment(path, state, offset)
+
+
+def get_new_times(state, time):
+    """ Gives which frames are after the last time written, leaving out the first frame of a segment repeating the last one of the previous segment """
+    return np.asarray(time) > state['time']
+
+
+def accumulate(state, columns, time=None):
+    """ Adds the rows of the output columns to the running sums of the state """
+    values = np.column_stack(columns)
+    if not len(state['sums']):
+        state['sums'], state['squares'] = np.zeros(values.shape[1]), np.zeros(values.shape[1])
+    state['sums'] = state['sums'] + values.sum(axis=0)
+    state['squares'] = state['squares'] + (values ** 2).sum(axis=0)
+    state['frames'] += len(values)
+    if time is not None and len(time):
+        state['time'] = float(time[-1])
+
+
+def log_running(state, names, out_log):
+    """ Logs the mean and standard deviation of every output column over all the rows written """
+    mean = state['sums'] / state['frames']
+    std = np.sqrt(np.maximum(state['squares'] / state['frames'] - mean ** 2, 0.0))
+    fu.log('Incremental mode: %d rows, %s' % (state['frames'], ', '.join('%s %g +/- %g' % column for column in zip(names, mean, std))), out_log)
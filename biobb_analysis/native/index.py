@@ -0,0 +1,280 @@
+""" Frame index of trajectories for package biobb_analysis.native
+
+The frame index of a XTC, TRR, DCD or NetCDF trajectory holds the byte offset and the time (ps) of every frame.
+XTC and TRR frames have variable sizes, so reaching a frame needs reading the headers of all the previous ones; the
+index is built once and kept in a sidecar next to the trajectory (the trajectory path with an extra .idx suffix),
+valid while the size, modification time and the hash of the first and last MB of the trajectory are unchanged.
+
+Every frame of a XTC or TRR file is self-contained, so any range of consecutive frames copied from their byte
+offsets is a valid trajectory: :func:`trim_trajectory` writes it for the executables that can not seek. DCD and
+NetCDF3 frames have a fixed size after a header holding the number of frames, so a range of them is copied after the
+header with that number updated; DCD files with fixed atoms, whose first frame is the only full one, and NetCDF4 (HDF5)
+files can not be trimmed.
+"""
+import hashlib
+import os
+import struct
+from collections import namedtuple
+from pathlib import Path, PurePath
+import numpy as np
+from biobb_analysis.native import xtc as _xtc
+from biobb_analysis.native import trr as _trr
+from biobb_analysis.native.dcd import DCDFile
+from biobb_analysis.native.netcdf import NetCDFFile
+
+INDEX_SUFFIX = '.idx'
+# bytes of the start and end of a trajectory hashed to validate its index
+HASH_BYTES = 1024 * 1024
+NETCDF_FORMATS = ('netcdf', 'nc', 'ncdf', 'cdf')
+INDEXED_FORMATS = ('xtc', 'trr', 'dcd') + NETCDF_FORMATS
+# formats whose frames can be copied as a trajectory
+TRIMMABLE_FORMATS = ('xtc', 'trr')
+
+# byte offset of every frame and of the end of the last one (frames + 1), -1 if unknown, and time (ps) of every frame
+FrameIndex = namedtuple('FrameIndex', ['offsets', 'time'])
+
+
+def get_format(path):
+    """ Gives the lowercase extension of a trajectory """
+    return PurePath(path).suffix[1:].lower()
+
+
+def is_indexable(path):
+    """ Checks if the frames of a trajectory can be indexed """
+    return get_format(path) in INDEXED_FORMATS
+
+
+def is_trimmable(path):
+    """ Checks if a range of frames of a trajectory can be copied as a trajectory from their byte offsets alone """
+    return get_format(path) in TRIMMABLE_FORMATS
+
+
+def can_trim(path):
+    """ Checks if a range of frames of a trajectory can be copied as a trajectory by :func:`trim_trajectory` """
+    try:
+        _trim_header(path, 0, 0)
+    except (ValueError, OSError, struct.error):
+        return False
+    return True
+
+
+def get_index_path(path):
+    """ Gives the path of the frame index sidecar of a trajectory """
+    return str(path) + INDEX_SUFFIX
+
+
+def quick_hash(path):
+    """ Hashes the size and the first and last MB of a file """
+    size = os.path.getsize(path)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, 'rb') as traj:
+        digest.update(traj.read(HASH_BYTES))
+        if size > HASH_BYTES:
+            traj.seek(max(HASH_BYTES, size - HASH_BYTES))
+            digest.update(traj.read(HASH_BYTES))
+    return digest.hexdigest()
+
+
+def _xtc_index(path, offset=0):
+    """ Indexes a XTC file from a byte offset reading only the frame headers; a frame still being written at its end is left out """
+    size = os.path.getsize(path)
+    offsets, time = [], []
+    with open(path, 'rb') as xtc:
+        xtc.seek(offset)
+        end = offset
+        while True:
+            try:
+                header = _xtc._read_header(xtc)
+                if header is None:
+                    break
+                _xtc._skip_coordinates(xtc)
+            except struct.error:
+                break
+            if xtc.tell() > size:
+                break
+            offsets.append(end)
+            time.append(header[2])
+            end = xtc.tell()
+        offsets.append(end)
+    return offsets, time
+
+
+def _trr_index(path, offset=0):
+    """ Indexes a TRR file from a byte offset reading only the frame headers; frames without coordinates are not indexed, as in the native reader, and a frame still being written at its end is left out """
+    file_size = os.path.getsize(path)
+    offsets, time = [], []
+    with open(path, 'rb') as trr:
+        trr.seek(offset)
+        end = offset
+        while True:
+            try:
+                header = _trr._read_header(trr)
+                if header is None:
+                    break
+            except struct.error:
+                break
+            trr.seek(sum(header[size] for size in _trr.HEADER_FIELDS[:10]), 1)
+            if trr.tell() > file_size:
+                break
+            if header['x_size']:
+                offsets.append(end)
+                time.append(header['time'])
+            end = trr.tell()
+        offsets.append(end)
+    return offsets, time
+
+
+def _dcd_index(path):
+    """ Indexes a DCD file from its header, its frames having a fixed size """
+    dcd = DCDFile(path)
+    frames = np.arange(dcd.n_frames, dtype=np.int64)
+    offsets = dcd.first_offset + frames * dcd.frame_bytes
+    if dcd.n_fixed and dcd.n_frames:
+        offsets[1:] += dcd.first_bytes - dcd.frame_bytes
+    end = offsets[-1] + (dcd.first_bytes if dcd.n_frames == 1 and dcd.n_fixed else dcd.frame_bytes) if dcd.n_frames else dcd.first_offset
+    return list(offsets) + [end], list(dcd.time(frames))
+
+
+def _netcdf_index(path):
+    """ Indexes an AMBER NetCDF file from its header, the offsets being the ones of the coordinates of every frame """
+    nc = NetCDFFile(path)
+    try:
+        frames = np.arange(nc.n_frames, dtype=np.int64)
+        time = list(nc.time(frames))
+        if nc.mm is None:
+            # NetCDF4 (HDF5) chunks have no fixed offsets
+            return [-1] * (nc.n_frames + 1), time
+        begin = nc.xyz.ctypes.data - nc.mm.ctypes.data
+        offsets = begin + np.arange(nc.n_frames + 1, dtype=np.int64) * nc.xyz.strides[0]
+        return list(offsets), time
+    finally:
+        nc.close()
+
+
+INDEXERS = {'xtc': _xtc_index, 'trr': _trr_index, 'dcd': _dcd_index}
+INDEXERS.update({ext: _netcdf_index for ext in NETCDF_FORMATS})
+
+
+def build_frame_index(path):
+    """ Builds the frame index of a trajectory """
+    ext = get_format(path)
+    if ext not in INDEXERS:
+        raise ValueError('Trajectory format %s can not be indexed' % ext)
+    offsets, time = INDEXERS[ext](path)
+    return FrameIndex(np.array(offsets, dtype=np.int64), np.array(time, dtype=np.float64))
+
+
+def scan_frames(path, offset=0):
+    """ Indexes the frames of a XTC or TRR file from the byte offset of one of them, as the frames appended to a trajectory still being written """
+    if not is_trimmable(path):
+        raise ValueError('Trajectory format %s can not be scanned from an offset' % get_format(path))
+    offsets, time = INDEXERS[get_format(path)](path, offset)
+    return FrameIndex(np.array(offsets, dtype=np.int64), np.array(time, dtype=np.float64))
+
+
+def read_frame_index(path):
+    """ Gives the frame index in the sidecar of a trajectory if it is up to date, None otherwise """
+    index_path = get_index_path(path)
+    if not Path(index_path).exists():
+        return None
+    stat = os.stat(path)
+    try:
+        with open(index_path, 'rb') as idx, np.load(idx, allow_pickle=False) as stored:
+            if int(stored['size']) != stat.st_size or int(stored['mtime_ns']) != stat.st_mtime_ns:
+                return None
+            if str(stored['hash']) != quick_hash(path):
+                return None
+            return FrameIndex(stored['offsets'], stored['time'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def write_frame_index(path, index):
+    """ Writes the frame index sidecar of a trajectory; it is replaced at once and skipped if its directory is not writable """
+    index_path = get_index_path(path)
+    stat = os.stat(path)
+    tmp = '%s.%d.tmp' % (index_path, os.getpid())
+    try:
+        with open(tmp, 'wb') as idx:
+            np.savez(idx, offsets=index.offsets, time=index.time, size=stat.st_size, mtime_ns=stat.st_mtime_ns, hash=quick_hash(path))
+        os.replace(tmp, index_path)
+    except OSError:
+        if Path(tmp).exists():
+            os.remove(tmp)
+
+
+def load_frame_index(path):
+    """ Gives the frame index of a trajectory, read from its sidecar or built and stored in it """
+    index = read_frame_index(path)
+    if index is None:
+        index = build_frame_index(path)
+        write_frame_index(path, index)
+    return index
+
+
+def get_time_range(index, begin=None, end=None):
+    """ Gives the (first, stop) frames holding the frames with times between begin and end (ps), with one more frame at every side """
+    first = 0 if begin is None else max(0, int(np.searchsorted(index.time, begin, side='left')) - 1)
+    stop = len(index.time) if end is None else min(len(index.time), int(np.searchsorted(index.time, end, side='right')) + 1)
+    return first, max(first, stop)
+
+
+def _trim_header(path, first, stop):
+    """ Gives the header of the trajectory holding the frames first to stop (0-based, exclusive) of a trajectory, and the byte range of those frames, None for XTC and TRR files """
+    ext = get_format(path)
+    if ext in TRIMMABLE_FORMATS:
+        return None
+    if ext == 'dcd':
+        dcd = DCDFile(path)
+        if dcd.n_fixed:
+            raise ValueError('%s has fixed atoms, it can not be trimmed' % path)
+        header = bytearray(dcd.mm[:dcd.first_offset])
+        # number of frames and first step of the control integers, so that the frames keep their times
+        np.ndarray((2,), dtype=dcd.endian + 'i4', buffer=header, offset=dcd.marker + 4)[:] = [stop - first, dcd.istart + first * dcd.nsavc]
+        return bytes(header), dcd.first_offset + first * dcd.frame_bytes, (stop - first) * dcd.frame_bytes
+    if ext in NETCDF_FORMATS:
+        nc = NetCDFFile(path)
+        try:
+            if nc.mm is None:
+                raise ValueError('%s is a NetCDF4 file, it can not be trimmed' % path)
+            header = bytearray(nc.mm[:nc.record_begin])
+            np.ndarray((1,), dtype='>u8' if nc.version == 5 else '>u4', buffer=header, offset=4)[0] = stop - first
+            return bytes(header), nc.record_begin + first * nc.record_bytes, (stop - first) * nc.record_bytes
+        finally:
+            nc.close()
+    raise ValueError('Trajectory format %s can not be trimmed' % ext)
+
+
+def trim_trajectory(path, first, stop, output_path, index=None):
+    """ Copies the frames first to stop (0-based, exclusive) of a XTC, TRR, DCD or NetCDF3 file as a new trajectory, reading only them and the header """
+    index = load_frame_index(path) if index is None else index
+    stop = min(stop, len(index.time))
+    trim = _trim_header(path, first, stop)
+    if trim is None:
+        header, begin, length = b'', int(index.offsets[first]), int(index.offsets[stop] - index.offsets[first])
+    else:
+        header, begin, length = trim
+    with open(path, 'rb') as src, open(output_path, 'wb') as dst:
+        dst.write(header)
+        dst.flush()
+        src.seek(begin)
+        # the frames are copied in kernel space when possible
+        try:
+            copied = 0
+            while copied < length:
+                sent = os.sendfile(dst.fileno(), src.fileno(), begin + copied, length - copied)
+                if not sent:
+                    break
+                copied += sent
+        except (AttributeError, OSError):
+            dst.seek(len(header))
+            dst.truncate()
+            src.seek(begin)
+            remaining = length
+            while remaining:
+                block = src.read(min(remaining, 16 * 1024 * 1024))
+                if not block:
+                    break
+                dst.write(block)
+                remaining -= len(block)
+    return output_path
@@ -0,0 +1,199 @@
+""" Memory-mapped AMBER NetCDF reader for package biobb_analysis.native """
+import numpy as np
+from biobb_analysis.native.common import Chunk
+
+# NetCDF3 header tags and types
+NC_DIMENSION = 10
+NC_VARIABLE = 11
+NC_ATTRIBUTE = 12
+NC_TYPES = {1: 'i1', 2: 'S1', 3: '>i2', 4: '>i4', 5: '>f4', 6: '>f8', 7: 'u1', 8: '>u2', 9: '>u4', 10: '>i8', 11: '>u8'}
+STREAMING = 0xFFFFFFFF
+
+
+def atom_runs(atom_indices):
+    """ Groups sorted unique atom indices into [start, stop) runs of consecutive atoms """
+    breaks = np.flatnonzero(np.diff(atom_indices) != 1) + 1
+    starts = np.concatenate([[0], breaks])
+    stops = np.concatenate([breaks, [len(atom_indices)]])
+    return [(int(atom_indices[a]), int(atom_indices[b - 1]) + 1) for a, b in zip(starts, stops)]
+
+
+class NetCDFFile:
+    """ AMBER NetCDF trajectory following the AMBER convention.
+
+    NetCDF3 (classic, 64-bit offset and CDF5) files are mapped in memory and the coordinates are exposed as a
+    zero-copy float32 view **xyz** (frames, atoms, 3) of the file. NetCDF4 (HDF5) files are read through the optional
+    netCDF4 package. In both cases :meth:`read` only reads the hyperslabs holding the selected atoms.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as nc:
+            magic = nc.read(4)
+        if magic[:3] == b'CDF':
+            self.dataset = None
+            self._map(magic[3])
+        elif magic == b'\x89HDF':
+            self._open_hdf5()
+        else:
+            raise ValueError('%s is not a NetCDF file' % path)
+
+    def _open_hdf5(self):
+        """ Opens a NetCDF4 file, whose chunked and compressed variables cannot be mapped in memory """
+        try:
+            import netCDF4
+        except ImportError:
+            raise ValueError('%s is a NetCDF4 file, the netCDF4 package is needed to read it' % self.path)
+        self.mm = None
+        self.dataset = netCDF4.Dataset(self.path, 'r')
+        self.dataset.set_auto_mask(False)
+        variables = self.dataset.variables
+        if 'coordinates' not in variables:
+            raise ValueError('%s has no coordinates variable' % self.path)
+        self.xyz = variables['coordinates']
+        self.n_frames, self.n_atoms = self.xyz.shape[0], self.xyz.shape[1]
+        self.times = variables['time'] if 'time' in variables else None
+        self.cell_lengths = variables['cell_lengths'] if 'cell_lengths' in variables else None
+
+    def _map(self, version):
+        """ Maps a NetCDF3 file in memory and builds views of its AMBER variables """
+        if version not in (1, 2, 5):
+            raise ValueError('%s has an unknown NetCDF version %d' % (self.path, version))
+        self.mm = np.memmap(self.path, dtype=np.uint8, mode='r')
+        # CDF5 uses 64-bit counts, 64-bit offset and CDF5 use 64-bit variable offsets
+        self._count = '>u8' if version == 5 else '>u4'
+        self._offset = '>u4' if version == 1 else '>u8'
+        self._position = 4
+        n_records = self._read(self._count)
+        dimensions = self._dimensions()
+        self._attributes()
+        variables = self._variables(dimensions)
+
+        # record variables are interleaved, a single one is not padded
+        record = [v for v in variables.values() if v['dimensions'] and dimensions[v['dimensions'][0]][1] == 0]
+        if len(record) == 1:
+            record_bytes = int(np.prod(record[0]['shape'][1:], dtype=np.int64)) * np.dtype(record[0]['dtype']).itemsize
+        else:
+            record_bytes = sum(v['size'] for v in record)
+        if record and (n_records == STREAMING or version == 5 and n_records == 2 ** 64 - 1):
+            n_records = (len(self.mm) - min(v['begin'] for v in record)) // max(1, record_bytes)
+        self.n_records = n_records
+        self.record_bytes = record_bytes
+        # the records follow the header and the non-record variables
+        self.record_begin = min(v['begin'] for v in record) if record else len(self.mm)
+        self.version = version
+
+        if 'coordinates' not in variables:
+            raise ValueError('%s has no coordinates variable' % self.path)
+        self.xyz = self._view(variables['coordinates'], dimensions)
+        self.n_frames, self.n_atoms = self.xyz.shape[0], self.xyz.shape[1]
+        self.times = self._view(variables['time'], dimensions) if 'time' in variables else None
+        self.cell_lengths = self._view(variables['cell_lengths'], dimensions) if 'cell_lengths' in variables else None
+
+    def _read(self, dtype):
+        """ Reads a value of the header and moves past it """
+        value = int(np.ndarray((1,), dtype=dtype, buffer=self.mm, offset=self._position)[0])
+        self._position += np.dtype(dtype).itemsize
+        return value
+
+    def _name(self):
+        """ Reads a padded name of the header """
+        length = self._read(self._count)
+        name = bytes(self.mm[self._position:self._position + length]).decode()
+        self._position += length + (4 - length % 4) % 4
+        return name
+
+    def _list(self, tag):
+        """ Reads the tag of a header list, gives its number of elements """
+        found, count = self._read('>u4'), self._read(self._count)
+        if found not in (0, tag):
+            raise ValueError('%s has a corrupted NetCDF header' % self.path)
+        return count
+
+    def _dimensions(self):
+        """ Reads the list of dimensions as (name, length) tuples, length 0 being the record dimension """
+        return [(self._name(), self._read(self._count)) for _ in range(self._list(NC_DIMENSION))]
+
+    def _attributes(self):
+        """ Reads a list of attributes """
+        attributes = {}
+        for _ in range(self._list(NC_ATTRIBUTE)):
+            name = self._name()
+            dtype = NC_TYPES[self._read('>u4')]
+            count = self._read(self._count)
+            size = count * np.dtype(dtype).itemsize
+            attributes[name] = np.ndarray((count,), dtype=dtype, buffer=self.mm, offset=self._position).copy()
+            self._position += size + (4 - size % 4) % 4
+        return attributes
+
+    def _variables(self, dimensions):
+        """ Reads the list of variables """
+        variables = {}
+        for _ in range(self._list(NC_VARIABLE)):
+            name = self._name()
+            ids = [self._read(self._count) for _ in range(self._read(self._count))]
+            attributes = self._attributes()
+            dtype = NC_TYPES[self._read('>u4')]
+            size = self._read(self._count)
+            begin = self._read(self._offset)
+            variables[name] = {'dimensions': ids, 'shape': [dimensions[i][1] for i in ids], 'dtype': dtype,
+                               'size': size, 'begin': begin, 'attributes': attributes}
+        return variables
+
+    def _view(self, variable, dimensions):
+        """ Gives a zero-copy view of a variable, records being strided by the size of a record """
+        shape = list(variable['shape'])
+        itemsize = np.dtype(variable['dtype']).itemsize
+        strides = [int(np.prod(shape[i + 1:], dtype=np.int64)) * itemsize for i in range(len(shape))]
+        if shape and dimensions[variable['dimensions'][0]][1] == 0:
+            shape[0], strides[0] = self.n_records, self.record_bytes
+        return np.ndarray(shape, dtype=variable['dtype'], buffer=self.mm, offset=variable['begin'], strides=strides)
+
+    def close(self):
+        """ Closes the NetCDF4 dataset, mapped files are released with their views """
+        if self.dataset is not None:
+            self.dataset.close()
+
+    def box(self, frames):
+        """ Gives the box lengths (frames, 3) of the given frames, None if the file has no unit cell """
+        if self.cell_lengths is None:
+            return None
+        return np.asarray(self.cell_lengths[frames], dtype=np.float64)
+
+    def time(self, frames):
+        """ Gives the time in ps of the given frames, their index if the file has no time """
+        if self.times is None:
+            return np.asarray(frames, dtype=np.float64)
+        return np.asarray(self.times[frames], dtype=np.float64)
+
+    def read(self, frames, atom_indices=None):
+        """ Gives a float64 copy (frames, atoms, 3) of the given frames (0-based) and atoms, reading one hyperslab per run of consecutive atoms """
+        frames = np.asarray(frames, dtype=np.int64)
+        if atom_indices is None:
+            runs, order = [(0, self.n_atoms)], None
+        else:
+            atoms, order = np.unique(np.asarray(atom_indices), return_inverse=True)
+            runs = atom_runs(atoms)
+        # evenly spaced frames are read as a single strided hyperslab
+        steps = np.unique(np.diff(frames))
+        if len(steps) <= 1:
+            frame_slices = [slice(int(frames[0]), int(frames[-1]) + 1, int(steps[0]) if len(steps) else 1)]
+        else:
+            frame_slices = [slice(int(f), int(f) + 1) for f in frames]
+        xyz = np.concatenate([np.concatenate([np.asarray(self.xyz[s, a:b], dtype=np.float64) for a, b in runs], axis=1)
+                              for s in frame_slices])
+        return xyz if order is None else xyz[:, order.ravel()]
+
+
+def read_netcdf(path, n_atoms, atom_indices, start, stop, step, chunk_size):
+    """ Yields chunks of the selected frames and atoms of an AMBER NetCDF file, reading only their hyperslabs """
+    nc = NetCDFFile(path)
+    try:
+        if nc.n_atoms != n_atoms:
+            raise ValueError('%s has %d atoms, topology has %d' % (path, nc.n_atoms, n_atoms))
+        frames = np.arange(nc.n_frames)[start:stop:step]
+        for first in range(0, len(frames), chunk_size):
+            block = frames[first:first + chunk_size]
+            yield Chunk(nc.read(block, atom_indices), nc.time(block), nc.box(block))
+    finally:
+        nc.close()
@@ -0,0 +1,100 @@
+""" Native radius of gyration engines for package biobb_analysis.native """
+from pathlib import PurePath
+import numpy as np
+from biobb_common.tools import file_utils as fu
+from biobb_analysis.native.columnar import is_columnar
+from biobb_analysis.native.common import native_error, write_dat, write_xvg
+from biobb_analysis.native.topology import load_topology
+from biobb_analysis.native.rms import load_gromacs_group, select_cpptraj_mask, cpptraj_blocks, check_incremental_range
+from biobb_analysis.native.trajectory import read_trajectory, frame_range
+from biobb_analysis.native.incremental import load_state, save_state, accumulate, log_running
+
+# cpptraj data set names given by the CpptrajRgyr instructions
+CPPTRAJ_RGYR_NAMES = ['RoG_00002', 'RoG_00002[Max]']
+
+
+def radius_of_gyration(xyz, weights):
+    """ Gives the radius of gyration and the radii of gyration about the x-, y- and z-axes of every frame """
+    weights = weights / weights.sum()
+    centered = xyz - np.einsum('fij,i->fj', xyz, weights)[:, None, :]
+    # weighted second moment along every axis
+    moments = np.einsum('fij,i->fj', centered ** 2, weights)
+    total = moments.sum(axis=1)
+    return np.column_stack([np.sqrt(total), np.sqrt(total[:, None] - moments)])
+
+
+def max_distance(xyz):
+    """ Gives the maximum distance of the atoms of every frame to their geometric center """
+    centered = xyz - xyz.mean(axis=1)[:, None, :]
+    return np.sqrt((centered ** 2).sum(axis=2).max(axis=1))
+
+
+def compute_cpptraj_rgyr(input_top_path, input_traj_path, output_cpptraj_path, mask, start, end, step, out_log, classname, incremental=False):
+    """ Computes the radius of gyration and the maximum distance to the center of a trajectory in-process, emulating the CpptrajRgyr instructions (not mass-weighted).
+
+    In incremental mode only the frames added since the last launch are read, their rows being appended to the output
+    (see :mod:`native.incremental`).
+    """
+    if PurePath(output_cpptraj_path).suffix != '.dat' and not is_columnar(PurePath(output_cpptraj_path).suffix[1:]):
+        native_error(classname, 'Only dat and binary columnar output files are supported by the native backend', out_log)
+    state = None
+    if incremental:
+        check_incremental_range(start, end, step, out_log, classname)
+        state = load_state(output_cpptraj_path, {'mask': mask}, out_log, classname)
+    try:
+        top, _ = load_topology(input_top_path)
+        selection = select_cpptraj_mask(top, mask)
+        if not len(selection):
+            native_error(classname, 'Mask %s does not select any atom' % mask, out_log)
+        fu.log('Native backend: %d atoms selected with mask %s' % (len(selection), mask), out_log)
+
+        # the radius of gyration does not change when the frames are fitted, so they are read as they are
+        start, stop, step = frame_range(start, end, step)
+        weights = np.ones(len(selection))
+        values = []
+        for xyz in cpptraj_blocks(input_traj_path, top, selection, start, stop, step, state=state):
+            values.append(np.column_stack([radius_of_gyration(xyz, weights)[:, 0], max_distance(xyz)]))
+    except ValueError as e:
+        native_error(classname, str(e), out_log)
+    if state is not None and state['frames'] and not values:
+        save_state(output_cpptraj_path, state)
+        fu.log('Incremental mode: no new frames in %s' % input_traj_path, out_log)
+        return 0
+    if not values:
+        native_error(classname, 'No frames selected in %s' % input_traj_path, out_log)
+
+    values = np.concatenate(values)
+    if state is None:
+        write_dat(output_cpptraj_path, CPPTRAJ_RGYR_NAMES, values.T, units={None: 'Å'})
+    else:
+        write_dat(output_cpptraj_path, CPPTRAJ_RGYR_NAMES, values.T, x=state['frames'] + np.arange(1, len(values) + 1), append=bool(state['frames']))
+        accumulate(state, values.T)
+        save_state(output_cpptraj_path, state)
+        log_running(state, CPPTRAJ_RGYR_NAMES, out_log)
+    fu.log('Native backend: radius of gyration of %d frames written to %s' % (len(values), output_cpptraj_path), out_log)
+    return 0
+
+
+def compute_gmx_rgyr(input_structure_path, input_traj_path, output_xvg_path, input_index_path, selection, xvg, out_log, classname):
+    """ Computes the mass-weighted radius of gyration of a trajectory in-process, emulating GROMACS gyrate """
+    try:
+        top, _, atoms = load_gromacs_group(input_structure_path, input_index_path, selection, out_log, classname)
+        weights = top.masses[atoms]
+        if not weights.sum():
+            weights = np.ones(len(atoms))
+
+        time, values = [], []
+        for chunk in read_trajectory(input_traj_path, len(top.names), atoms):
+            time.append(chunk.time)
+            values.append(radius_of_gyration(chunk.xyz, weights))
+    except ValueError as e:
+        native_error(classname, str(e), out_log)
+    if not values:
+        native_error(classname, 'No frames found in %s' % input_traj_path, out_log)
+
+    # GROMACS units: ps and nm
+    values = np.concatenate(values) / 10.0
+    write_xvg(output_xvg_path, np.concatenate(time), values.T, xvg, 'Radius of gyration (total and around axes)', 'Time (ps)', 'Rg (nm)',
+              legends=['Rg', 'Rg\\sX\\N', 'Rg\\sY\\N', 'Rg\\sZ\\N'], fmt='%10g', delimiter='  ')
+    fu.log('Native backend: radius of gyration of %d frames written to %s' % (len(values), output_xvg_path), out_log)
+    return 0
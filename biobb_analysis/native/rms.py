@@ -0,0 +1,189 @@
+""" Native RMSD engines for package biobb_analysis.native """
+from pathlib import PurePath
+import numpy as np
+from biobb_common.tools import file_utils as fu
+from biobb_analysis.ambertools.common import get_mask_atoms
+from biobb_analysis.native.columnar import is_columnar
+from biobb_analysis.native.common import native_error, write_dat, write_xvg
+from biobb_analysis.native.topology import load_topology, select_amber, select_gromacs, read_ndx
+from biobb_analysis.native.trajectory import read_trajectory, frame_range
+from biobb_analysis.native.superpose import rmsd, superpose, center
+from biobb_analysis.native.incremental import load_state, save_state, read_new_frames, get_new_times, accumulate, log_running
+
+# cpptraj data set names given by the CpptrajRms instructions for every reference
+CPPTRAJ_RMS_NAMES = {'first': 'RMSD_00002', 'average': 'RMSD_00003', 'experimental': 'RMSD_00004'}
+
+
+def select_cpptraj_mask(top, mask):
+    """ Gives the atoms of a mask once solvent and ions are stripped, as done by setup_structure """
+    solute = select_amber(top, get_mask_atoms('solute')[0])
+    return np.intersect1d(select_amber(top, mask), solute)
+
+
+def load_gromacs_group(input_structure_path, input_index_path, selection, out_log, classname):
+    """ Gives the topology, coordinates and atoms of a GROMACS group of a gro or pdb structure """
+    if PurePath(input_structure_path).suffix == '.tpr':
+        native_error(classname, 'tpr structures are not supported by the native backend, use gro or pdb', out_log)
+    top, structure = load_topology(input_structure_path)
+    if input_index_path:
+        atoms = read_ndx(input_index_path)[selection]
+    else:
+        atoms = select_gromacs(top, selection)
+    if not len(atoms):
+        native_error(classname, 'Group %s does not contain any atom' % selection, out_log)
+    fu.log('Native backend: %d atoms selected in group %s' % (len(atoms), selection), out_log)
+    return top, structure, atoms
+
+
+def prefit_reference(input_traj_path, top, start):
+    """ Gives the centered heavy atoms of the first selected frame (0-based start), onto which setup_structure fits all the frames """
+    heavy = select_amber(top, get_mask_atoms('heavy-atoms')[0])
+    for chunk in read_trajectory(input_traj_path, len(top.names), heavy, start, start + 1, 1):
+        return chunk.xyz[0] - center(chunk.xyz[0])
+    raise ValueError('No frames selected in %s' % input_traj_path)
+
+
+def cpptraj_blocks(input_traj_path, top, selection, start, stop, step, first=None, state=None):
+    """ Yields blocks of the selected atoms and frames (0-based start, exclusive stop), fitted onto the heavy atoms of the first frame if given, as done by setup_structure.
+
+    Only the frames not read yet are yielded if an incremental state is given, see :func:`read_new_frames() <native.incremental.read_new_frames>`.
+    """
+    def read(atoms):
+        if state is not None:
+            return read_new_frames(input_traj_path, len(top.names), atoms, state)
+        return read_trajectory(input_traj_path, len(top.names), atoms, start, stop, step)
+
+    if first is None:
+        for chunk in read(selection):
+            yield chunk.xyz
+        return
+    heavy = select_amber(top, get_mask_atoms('heavy-atoms')[0])
+    atoms = np.union1d(heavy, selection)
+    fit_indices, sel_indices = np.searchsorted(atoms, heavy), np.searchsorted(atoms, selection)
+    for chunk in read(atoms):
+        yield superpose(chunk.xyz, first, fit_indices)[:, sel_indices]
+
+
+def check_incremental_range(start, end, step, out_log, classname):
+    """ Checks that all the frames are selected, as the incremental mode reads every frame added to the trajectory """
+    if (start, end, step) != (1, -1, 1):
+        native_error(classname, 'start, end and steps can not be set in incremental mode', out_log)
+
+
+def compute_cpptraj_rms(input_top_path, input_traj_path, output_cpptraj_path, input_exp_path, mask, reference, start, end, step, nofit, out_log, classname, incremental=False):
+    """ Computes the RMSD of a trajectory in-process, emulating the CpptrajRms instructions.
+
+    In incremental mode only the frames added since the last launch are read, their rows being appended to the output,
+    the first frame reference and the prefit coordinates being kept in the state (see :mod:`native.incremental`).
+    """
+    if PurePath(output_cpptraj_path).suffix != '.dat' and not is_columnar(PurePath(output_cpptraj_path).suffix[1:]):
+        native_error(classname, 'Only dat and binary columnar output files are supported by the native backend', out_log)
+    state = None
+    if incremental:
+        check_incremental_range(start, end, step, out_log, classname)
+        if reference == 'average':
+            native_error(classname, 'The average reference can not be used in incremental mode', out_log)
+        state = load_state(output_cpptraj_path, {'mask': mask, 'reference': reference, 'nofit': nofit}, out_log, classname)
+    try:
+        top, _ = load_topology(input_top_path)
+        selection = select_cpptraj_mask(top, mask)
+        if not len(selection):
+            native_error(classname, 'Mask %s does not select any atom' % mask, out_log)
+        fu.log('Native backend: %d atoms selected with mask %s' % (len(selection), mask), out_log)
+
+        # the coordinates are only fitted beforehand when they are compared without fitting or averaged
+        start, stop, step = frame_range(start, end, step)
+        first = None
+        if state is not None and len(state['prefit']):
+            first = state['prefit']
+        elif nofit or reference == 'average':
+            first = prefit_reference(input_traj_path, top, start)
+            if state is not None:
+                state['prefit'] = first
+        blocks = lambda: cpptraj_blocks(input_traj_path, top, selection, start, stop, step, first, state)
+
+        ref = None
+        if reference == 'average':
+            total, frames = 0.0, 0
+            for xyz in blocks():
+                total = total + xyz.sum(axis=0)
+                frames += len(xyz)
+            ref = total / frames
+        elif reference == 'experimental':
+            exp_top, exp_xyz = load_topology(input_exp_path)
+            exp_selection = select_cpptraj_mask(exp_top, mask)
+            if len(exp_selection) != len(selection):
+                native_error(classname, 'Mask %s selects %d atoms in the experimental structure and %d in the topology' % (mask, len(exp_selection), len(selection)), out_log)
+            ref = exp_xyz[exp_selection]
+        elif state is not None and len(state['reference']):
+            ref = state['reference']
+
+        values = []
+        for xyz in blocks():
+            if ref is None:
+                ref = xyz[0]
+            values.append(rmsd(xyz, ref, fit=not nofit))
+    except ValueError as e:
+        native_error(classname, str(e), out_log)
+    if state is not None and state['frames'] and not values:
+        save_state(output_cpptraj_path, state)
+        fu.log('Incremental mode: no new frames in %s' % input_traj_path, out_log)
+        return 0
+    if not values:
+        native_error(classname, 'No frames selected in %s' % input_traj_path, out_log)
+
+    values = np.concatenate(values)
+    if state is None:
+        write_dat(output_cpptraj_path, [CPPTRAJ_RMS_NAMES[reference]], [values], units={None: 'Å'})
+    else:
+        write_dat(output_cpptraj_path, [CPPTRAJ_RMS_NAMES[reference]], [values], x=state['frames'] + np.arange(1, len(values) + 1), append=bool(state['frames']))
+        if reference == 'first':
+            state['reference'] = ref
+        accumulate(state, [values])
+        save_state(output_cpptraj_path, state)
+        log_running(state, [CPPTRAJ_RMS_NAMES[reference]], out_log)
+    fu.log('Native backend: RMSD of %d frames written to %s' % (len(values), output_cpptraj_path), out_log)
+    return 0
+
+
+def compute_gmx_rms(input_structure_path, input_traj_path, output_xvg_path, input_index_path, selection, xvg, out_log, classname, incremental=False):
+    """ Computes the mass-weighted RMSD of a trajectory to a structure in-process, emulating GROMACS rms.
+
+    In incremental mode only the frames added since the last launch and after its last time are read, their rows
+    being appended to the output (see :mod:`native.incremental`).
+    """
+    state = load_state(output_xvg_path, {'selection': selection, 'xvg': xvg}, out_log, classname) if incremental else None
+    try:
+        top, structure, atoms = load_gromacs_group(input_structure_path, input_index_path, selection, out_log, classname)
+        weights = top.masses[atoms]
+        if not weights.sum():
+            weights = None
+
+        time, values = [], []
+        chunks = read_trajectory(input_traj_path, len(top.names), atoms) if state is None else read_new_frames(input_traj_path, len(top.names), atoms, state)
+        for chunk in chunks:
+            time.append(chunk.time)
+            values.append(rmsd(chunk.xyz, structure[atoms], weights))
+    except ValueError as e:
+        native_error(classname, str(e), out_log)
+    if state is not None and values:
+        time, values = np.concatenate(time), np.concatenate(values)
+        new = get_new_times(state, time)
+        time, values = [time[new]], ([values[new]] if new.any() else [])
+    if state is not None and state['frames'] and not values:
+        save_state(output_xvg_path, state)
+        fu.log('Incremental mode: no new frames in %s' % input_traj_path, out_log)
+        return 0
+    if not values:
+        native_error(classname, 'No frames found in %s' % input_traj_path, out_log)
+
+    # GROMACS units: ps and nm
+    time, values = np.concatenate(time), np.concatenate(values) / 10.0
+    write_xvg(output_xvg_path, time, [values], xvg, 'RMSD', 'Time (ps)', 'RMSD (nm)',
+              subtitle='%s after LSQ fit to %s' % (selection, selection), append=bool(state is not None and state['frames']))
+    if state is not None:
+        accumulate(state, [values], time)
+        save_state(output_xvg_path, state)
+        log_running(state, ['RMSD'], out_log)
+    fu.log('Native backend: RMSD of %d frames written to %s' % (len(values), output_xvg_path), out_log)
+    return 0
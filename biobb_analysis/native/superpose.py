@@ -0,0 +1,54 @@
+""" Batched least-squares superposition for package biobb_analysis.native """
+import numpy as np
+
+
+def _weights(n_atoms, weights):
+    """ Gives the normalized atom weights """
+    if weights is None:
+        return np.full(n_atoms, 1.0 / n_atoms)
+    weights = np.asarray(weights, dtype=np.float64)
+    return weights / weights.sum()
+
+
+def center(xyz, weights=None):
+    """ Gives the weighted centers of a block of frames (frames, atoms, 3) or of a single frame (atoms, 3) """
+    return np.einsum('...ij,i->...j', xyz, _weights(xyz.shape[-2], weights))
+
+
+def _covariance(xyz, ref, weights):
+    """ Centers a block of frames and a reference and gives their weighted covariance matrices """
+    xyz = xyz - center(xyz, weights)[:, None, :]
+    ref = ref - center(ref, weights)
+    return xyz, ref, np.einsum('fni,n,nj->fij', xyz, weights, ref)
+
+
+def kabsch(cov):
+    """ Gives the rotation matrices (frames, 3, 3) that best fit centered frames onto a centered reference from their covariance matrices, along with the signed singular values """
+    u, s, vt = np.linalg.svd(cov)
+    d = np.sign(np.linalg.det(u) * np.linalg.det(vt))
+    s[:, 2] *= d
+    u[:, :, 2] *= d[:, None]
+    return u @ vt, s
+
+
+def rmsd(xyz, ref, weights=None, fit=True):
+    """ Gives the RMSD of every frame of a block (frames, atoms, 3) to a reference (atoms, 3), after best fit unless fit is False """
+    weights = _weights(xyz.shape[1], weights)
+    if not fit:
+        msd = np.einsum('fn,n->f', ((xyz - ref) ** 2).sum(axis=2), weights)
+        return np.sqrt(msd)
+    xyz, ref, cov = _covariance(xyz, ref, weights)
+    _, s = kabsch(cov)
+    e0 = np.einsum('fn,n->f', (xyz ** 2).sum(axis=2), weights) + np.dot((ref ** 2).sum(axis=1), weights)
+    return np.sqrt(np.clip(e0 - 2.0 * s.sum(axis=1), 0.0, None))
+
+
+def superpose(xyz, ref, fit_indices=None, weights=None):
+    """ Superposes a block of frames (frames, atoms, 3) onto a reference, fitting the fit_indices atoms of the frames to the reference ones """
+    fit_xyz = xyz if fit_indices is None else xyz[:, fit_indices]
+    weights = _weights(fit_xyz.shape[1], weights)
+    xyz_center = center(fit_xyz, weights)
+    ref_center = center(ref, weights)
+    _, _, cov = _covariance(fit_xyz, ref, weights)
+    rotation, _ = kabsch(cov)
+    return np.einsum('fni,fij->fnj', xyz - xyz_center[:, None, :], rotation) + ref_center
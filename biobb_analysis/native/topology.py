@@ -0,0 +1,339 @@
+""" Topology readers and atom selections for package biobb_analysis.native """
+import os
+import re
+import threading
+from collections import namedtuple, OrderedDict
+from fnmatch import fnmatchcase
+from pathlib import PurePath
+import numpy as np
+
+
+Topology = namedtuple('Topology', ['names', 'resnames', 'resids', 'elements', 'masses'])
+# number of parsed topologies kept by load_topology
+PARSED_TOPOLOGIES = 8
+
+# parsed topologies of this process, by path, size and modification time
+_parsed = OrderedDict()
+_parsed_lock = threading.Lock()
+
+ELEMENT_MASSES = {
+    'H': 1.008, 'LI': 6.94, 'C': 12.011, 'N': 14.007, 'O': 15.999, 'F': 18.998, 'NA': 22.990,
+    'MG': 24.305, 'P': 30.974, 'S': 32.06, 'CL': 35.45, 'K': 39.098, 'CA': 40.078, 'MN': 54.938,
+    'FE': 55.845, 'CU': 63.546, 'ZN': 65.38, 'SE': 78.971, 'BR': 79.904, 'I': 126.904, 'CS': 132.905
+}
+
+# residue types, as listed in the GROMACS residuetypes.dat file
+AMINO_ACIDS = ['ALA', 'ARG', 'ASN', 'ASP', 'CYS', 'GLN', 'GLU', 'GLY', 'HIS', 'ILE',
+               'LEU', 'LYS', 'MET', 'PHE', 'PRO', 'SER', 'THR', 'TRP', 'TYR', 'VAL']
+PROTEIN_RESIDUES = set(AMINO_ACIDS + ['N' + r for r in AMINO_ACIDS] + ['C' + r for r in AMINO_ACIDS] + [
+    'ABU', 'ACE', 'AIB', 'ARGN', 'ASN1', 'ASH', 'ASPH', 'ASPP', 'CT3', 'CYS1', 'CYS2', 'CYSH', 'CYX', 'CYM',
+    'DALA', 'GLH', 'GLUH', 'GLUP', 'HID', 'HIE', 'HIP', 'HIS1', 'HISA', 'HISB', 'HISD', 'HISE', 'HISH',
+    'HISP', 'HSD', 'HSE', 'HSP', 'HYP', 'LSN', 'LYN', 'LYP', 'LYSH', 'LYSN', 'MELEU', 'MEVAL', 'NAC', 'NHE',
+    'NH2', 'NME', 'PGLU', 'PHEH', 'PHEU', 'PHL', 'TRPH', 'TRPU', 'TYRH', 'TYRU', 'NHIE', 'CHIE', 'NHID',
+    'CHID', 'NHIP', 'CHIP', 'NCYX', 'CCYX'])
+DNA_RESIDUES = set([p + b + s for p in ('D',) for b in 'AGCT' for s in ('', '5', '3', 'N')])
+RNA_RESIDUES = set(['A', 'U', 'C', 'G'] + [p + b + s for p in ('R',) for b in 'AUCGT' for s in ('', '5', '3', 'N')])
+WATER_RESIDUES = set(['SOL', 'WAT', 'HOH', 'OHH', 'TIP', 'T3P', 'T4P', 'T5P', 'T3H', 'TIP3', 'TP3'])
+ION_RESIDUES = set(['K', 'NA', 'CA', 'MG', 'CL', 'ZN', 'CU1', 'CU', 'LI', 'NA+', 'K+', 'CL-', 'CA2+',
+                    'MG2+', 'ZN2+', 'CU2+', 'Na+', 'Cl-', 'SOD', 'CLA', 'POT', 'CAL', 'CES'])
+
+MAIN_CHAIN = ['N', 'CA', 'C', 'O', 'O1', 'O2', 'OC1', 'OC2', 'OT', 'OXT']
+MAIN_CHAIN_H = ['H1', 'H2', 'H3', 'H', 'HN']
+
+
+def guess_element(name, resname):
+    """ Guesses the element of an atom from its name """
+    name = name.strip().lstrip('0123456789').upper()
+    if resname.strip().upper() in {r.upper() for r in ION_RESIDUES}:
+        symbol = re.sub(r'[^A-Z]', '', name)
+        if symbol[:2] in ELEMENT_MASSES:
+            return symbol[:2]
+    return name[:1]
+
+
+def get_masses(elements):
+    """ Gives the masses of the given elements, 0 if unknown """
+    return np.array([ELEMENT_MASSES.get(e.upper(), 0.0) for e in elements], dtype=np.float64)
+
+
+def _residue_numbers(keys):
+    """ Gives sequential 1-based residue numbers, starting a new residue whenever the key changes """
+    resids = np.empty(len(keys), dtype=np.int64)
+    resid, previous = 0, None
+    for i, key in enumerate(keys):
+        if key != previous:
+            resid += 1
+            previous = key
+        resids[i] = resid
+    return resids
+
+
+def read_prmtop(path):
+    """ Reads an Amber parameter/topology file """
+    sections, flag, fmt = {}, None, None
+    with open(path) as top:
+        for line in top:
+            if line.startswith('%FLAG'):
+                flag = line.split()[1]
+                sections[flag] = []
+            elif line.startswith('%FORMAT'):
+                fmt = line
+            elif flag and not line.startswith('%'):
+                line = line.rstrip('\n')
+                if re.search(r'\d+a(\d+)', fmt, re.IGNORECASE):
+                    width = int(re.search(r'\d+a(\d+)', fmt, re.IGNORECASE).group(1))
+                    sections[flag].extend(line[i:i + width] for i in range(0, len(line), width))
+                else:
+                    sections[flag].extend(line.split())
+    if 'ATOM_NAME' not in sections or 'RESIDUE_POINTER' not in sections:
+        raise ValueError('%s is not an Amber parameter/topology file' % path)
+
+    names = np.array([n.strip() for n in sections['ATOM_NAME']])
+    labels = [r.strip() for r in sections['RESIDUE_LABEL']]
+    pointers = [int(p) for p in sections['RESIDUE_POINTER']] + [len(names) + 1]
+    resids = np.empty(len(names), dtype=np.int64)
+    resnames = np.empty(len(names), dtype=object)
+    for i, label in enumerate(labels):
+        resids[pointers[i] - 1:pointers[i + 1] - 1] = i + 1
+        resnames[pointers[i] - 1:pointers[i + 1] - 1] = label
+    resnames = resnames.astype(str)
+    elements = np.array([guess_element(n, r) for n, r in zip(names, resnames)])
+    if 'MASS' in sections:
+        masses = np.array(sections['MASS'], dtype=np.float64)
+    else:
+        masses = get_masses(elements)
+    return Topology(names, resnames, resids, elements, masses), None
+
+
+def read_pdb(path):
+    """ Reads the first model of a PDB file """
+    names, resnames, keys, elements, xyz = [], [], [], [], []
+    with open(path) as pdb:
+        for line in pdb:
+            if line.startswith(('ATOM', 'HETATM')):
+                names.append(line[12:16].strip())
+                resnames.append(line[17:21].strip())
+                keys.append((line[21], line[22:27], line[17:21]))
+                elements.append(line[76:78].strip() or guess_element(line[12:16], line[17:21]))
+                xyz.append((float(line[30:38]), float(line[38:46]), float(line[46:54])))
+            elif line.startswith(('ENDMDL', 'END')) and names:
+                break
+    if not names:
+        raise ValueError('%s does not contain any atom' % path)
+    names, resnames, elements = np.array(names), np.array(resnames), np.array(elements)
+    return Topology(names, resnames, _residue_numbers(keys), elements, get_masses(elements)), np.array(xyz, dtype=np.float64)
+
+
+def read_gro(path):
+    """ Reads the first frame of a GROMACS structure file """
+    with open(path) as gro:
+        gro.readline()
+        natoms = int(gro.readline())
+        lines = [gro.readline() for _ in range(natoms)]
+    names = np.array([line[10:15].strip() for line in lines])
+    resnames = np.array([line[5:10].strip() for line in lines])
+    elements = np.array([guess_element(n, r) for n, r in zip(names, resnames)])
+    keys = [line[0:10] for line in lines]
+    xyz = np.array([_gro_coordinates(line, _gro_width(lines[0])) for line in lines], dtype=np.float64) * 10.0
+    return Topology(names, resnames, _residue_numbers(keys), elements, get_masses(elements)), xyz
+
+
+def _gro_width(line):
+    """ Gives the width of the coordinate fields of a GROMACS structure line """
+    first = line.index('.', 20)
+    return line.index('.', first + 1) - first
+
+
+def _gro_coordinates(line, width):
+    """ Gives the coordinates of a GROMACS structure line """
+    return [float(line[20 + i * width:20 + (i + 1) * width]) for i in range(3)]
+
+
+def load_topology(path):
+    """ Reads a topology or structure file, returns the topology and the coordinates if available.
+
+    A file is parsed once while it is unchanged, the blocks of a batch sharing it; its arrays are read-only.
+    """
+    stat = os.stat(path)
+    key = (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+    with _parsed_lock:
+        if key in _parsed:
+            _parsed.move_to_end(key)
+            return _parsed[key]
+    parsed = _read_topology(path)
+    for array in list(parsed[0]) + [parsed[1]]:
+        if array is not None:
+            array.flags.writeable = False
+    with _parsed_lock:
+        _parsed[key] = parsed
+        while len(_parsed) > PARSED_TOPOLOGIES:
+            _parsed.popitem(last=False)
+    return parsed
+
+
+def _read_topology(path):
+    """ Reads a topology or structure file according to its extension """
+    ext = PurePath(path).suffix[1:].lower()
+    if ext in ('pdb', 'ent', 'brk'):
+        return read_pdb(path)
+    if ext == 'gro':
+        return read_gro(path)
+    if ext in ('top', 'prmtop', 'parmtop'):
+        with open(path) as top:
+            if top.readline().startswith('%VERSION') or '%FLAG' in top.read(4096):
+                return read_prmtop(path)
+        raise ValueError('Only Amber parameter/topology files are supported as top files by the native backend')
+    raise ValueError('Format %s is not supported by the native backend' % ext)
+
+
+def is_hydrogen(name):
+    """ Checks if an atom name is a hydrogen name, as GROMACS does """
+    return name[:1] == 'H' or (name[:1].isdigit() and name[1:2] == 'H')
+
+
+def _residue_mask(top, residues):
+    """ Gives the atoms belonging to any of the given residue names """
+    return np.isin(top.resnames, list(residues))
+
+
+def select_gromacs(top, group):
+    """ Gives the atom indices of a GROMACS default group """
+    protein = _residue_mask(top, PROTEIN_RESIDUES)
+    dna = _residue_mask(top, DNA_RESIDUES)
+    rna = _residue_mask(top, RNA_RESIDUES)
+    water = _residue_mask(top, WATER_RESIDUES)
+    ion = _residue_mask(top, ION_RESIDUES)
+    hydrogen = np.array([is_hydrogen(n) for n in top.names], dtype=bool)
+    main_chain = protein & np.isin(top.names, MAIN_CHAIN)
+    main_chain_h = protein & np.isin(top.names, MAIN_CHAIN + MAIN_CHAIN_H)
+    groups = {
+        'System': np.ones(len(top.names), dtype=bool),
+        'Protein': protein,
+        'Protein-H': protein & ~hydrogen,
+        'C-alpha': protein & (top.names == 'CA'),
+        'Backbone': protein & np.isin(top.names, ['N', 'CA', 'C']),
+        'MainChain': main_chain,
+        'MainChain+Cb': main_chain | (protein & (top.names == 'CB')),
+        'MainChain+H': main_chain_h,
+        'SideChain': protein & ~main_chain_h,
+        'SideChain-H': protein & ~main_chain_h & ~hydrogen,
+        'Prot-Masses': protein & (top.masses > 0),
+        'non-Protein': ~protein,
+        'Water': water,
+        'SOL': top.resnames == 'SOL',
+        'non-Water': ~water,
+        'Ion': ion,
+        'NA': top.resnames == 'NA',
+        'CL': top.resnames == 'CL',
+        'Water_and_ions': water | ion,
+        'DNA': dna,
+        'RNA': rna,
+        'Protein_DNA': protein | dna,
+        'Protein_RNA': protein | rna,
+        'Protein_DNA_RNA': protein | dna | rna,
+        'DNA_RNA': dna | rna
+    }
+    if group not in groups:
+        raise ValueError('Group %s is not available' % group)
+    return np.flatnonzero(groups[group])
+
+
+def read_ndx(path):
+    """ Reads a GROMACS index file, returns the 0-based atom indices of every group """
+    groups, name = OrderedDict(), None
+    with open(path) as ndx:
+        for line in ndx:
+            match = re.match(r'\s*\[(.*)\]', line)
+            if match:
+                name = re.sub(r'\s', '', match.group(1))
+                groups[name] = []
+            elif name is not None:
+                groups[name].extend(int(i) - 1 for i in line.split())
+    return OrderedDict((k, np.array(v, dtype=np.int64)) for k, v in groups.items())
+
+
+def _tokenize_mask(mask):
+    """ Splits an Amber mask into operators and selections """
+    if re.search(r'[<>%/^]', mask) or '::' in mask:
+        raise ValueError('Mask %s is not supported by the native backend' % mask)
+    return re.findall(r'[!&|()]|[^!&|()\s]+', mask)
+
+
+def _match_items(spec, values, numbers):
+    """ Gives the atoms matching a comma separated list of names, numbers and ranges """
+    selected = np.zeros(len(values), dtype=bool)
+    for item in spec.split(','):
+        if not item:
+            continue
+        match = re.match(r'^(\d+)(?:-(\d+))?$', item)
+        if match:
+            first = int(match.group(1))
+            last = int(match.group(2) or first)
+            selected |= (numbers >= first) & (numbers <= last)
+        else:
+            pattern = item.replace('=', '*')
+            selected |= np.array([fnmatchcase(v, pattern) for v in values], dtype=bool)
+    return selected
+
+
+def _select_term(top, term):
+    """ Gives the atoms selected by a single :residue@atom Amber mask term """
+    if term == '*':
+        return np.ones(len(top.names), dtype=bool)
+    match = re.match(r'^(?::([^@]*))?(?:@(.*))?$', term)
+    if not term or not match or (match.group(1) is None and match.group(2) is None):
+        raise ValueError('Mask term %s is not supported by the native backend' % term)
+    selected = np.ones(len(top.names), dtype=bool)
+    if match.group(1) is not None:
+        selected &= _match_items(match.group(1), top.resnames, top.resids)
+    if match.group(2) is not None:
+        selected &= _match_items(match.group(2), top.names, np.arange(1, len(top.names) + 1))
+    return selected
+
+
+def select_amber(top, mask):
+    """ Gives the atom indices selected by an Amber mask (residue and atom names, numbers, ranges and wildcards combined with !, &, | and parentheses) """
+    tokens = _tokenize_mask(mask)
+    position = [0]
+
+    def peek():
+        return tokens[position[0]] if position[0] < len(tokens) else None
+
+    def take():
+        position[0] += 1
+        return tokens[position[0] - 1]
+
+    def expression():
+        selected = conjunction()
+        while peek() == '|':
+            take()
+            selected = selected | conjunction()
+        return selected
+
+    def conjunction():
+        selected = factor()
+        while peek() == '&':
+            take()
+            selected = selected & factor()
+        return selected
+
+    def factor():
+        token = take() if peek() is not None else None
+        if token == '!':
+            return ~factor()
+        if token == '(':
+            selected = expression()
+            if take() != ')':
+                raise ValueError('Unbalanced parentheses in mask %s' % mask)
+            return selected
+        if token is None or token in '&|)':
+            raise ValueError('Mask %s is not a valid Amber mask' % mask)
+        return _select_term(top, token)
+
+    try:
+        selected = expression()
+    except IndexError:
+        raise ValueError('Mask %s is not a valid Amber mask' % mask)
+    if peek() is not None:
+        raise ValueError('Mask %s is not a valid Amber mask' % mask)
+    return np.flatnonzero(selected)
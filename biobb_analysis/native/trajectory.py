@@ -0,0 +1,192 @@
+""" Trajectory readers for package biobb_analysis.native """
+import re
+from pathlib import PurePath
+import numpy as np
+from biobb_analysis.native.common import make_chunk
+from biobb_analysis.native.dcd import DCDFile, read_dcd
+from biobb_analysis.native.xtc import read_xtc, frame_offsets
+from biobb_analysis.native.trr import read_trr
+from biobb_analysis.native.netcdf import NetCDFFile, read_netcdf
+from biobb_analysis.native.index import read_frame_index, build_frame_index, is_trimmable
+
+# memory budget for the coordinates of a single chunk
+CHUNK_BYTES = 64 * 1024 * 1024
+
+
+def get_chunk_size(n_atoms):
+    """ Gives the number of frames fitting in a chunk """
+    return max(1, CHUNK_BYTES // (max(1, n_atoms) * 3 * 8))
+
+
+def frame_range(start, end, step):
+    """ Converts the cpptraj-like 1-based inclusive start/end/step (end -1 meaning last frame) to a 0-based start/stop/step """
+    return start - 1, (None if end == -1 else end), step
+
+
+def split_frames(start, stop, step, n_frames, n_chunks):
+    """ Splits the selected frames (0-based start, exclusive stop) of a trajectory into at most n_chunks contiguous (start, stop) ranges """
+    frames = range(n_frames)[start:stop:step]
+    n_chunks = max(1, min(n_chunks, len(frames)))
+    bounds = np.linspace(0, len(frames), n_chunks + 1).round().astype(int)
+    return [(frames[a], frames[b - 1] + 1) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def _mdcrd_frames(path, n_atoms):
+    """ Yields the frames of an Amber ASCII trajectory """
+    values_per_frame = 3 * n_atoms
+    lines_per_frame = -(-values_per_frame // 10)
+    with open(path) as crd:
+        crd.readline()
+        lines = crd.readlines()
+    # a box line follows every frame if the line after the first frame is not a full coordinates line
+    has_box = len(lines) > lines_per_frame and n_atoms > 1 and len(lines[lines_per_frame].rstrip('\n')) <= 24
+    frame_lines = lines_per_frame + (1 if has_box else 0)
+    for first in range(0, len(lines) - lines_per_frame + 1, frame_lines):
+        block = lines[first:first + lines_per_frame]
+        values = [float(line[i:i + 8]) for line in block for i in range(0, len(line.rstrip('\n')), 8)]
+        if len(values) != values_per_frame:
+            raise ValueError('%s does not match the %d atoms of the topology' % (path, n_atoms))
+        box = None
+        if has_box:
+            box = np.array(lines[first + lines_per_frame].split()[:3], dtype=np.float64)
+        yield np.array(values, dtype=np.float64).reshape(n_atoms, 3), None, box
+
+
+def _pdb_frames(path, n_atoms):
+    """ Yields the models of a multi-model PDB file """
+    xyz, box = [], None
+    with open(path) as pdb:
+        for line in pdb:
+            if line.startswith(('ATOM', 'HETATM')):
+                xyz.append((float(line[30:38]), float(line[38:46]), float(line[46:54])))
+            elif line.startswith('CRYST1'):
+                box = np.array([line[6:15], line[15:24], line[24:33]], dtype=np.float64)
+            elif line.startswith(('ENDMDL', 'END')) and xyz:
+                yield _check_atoms(np.array(xyz, dtype=np.float64), n_atoms, path), None, box
+                xyz = []
+    if xyz:
+        yield _check_atoms(np.array(xyz, dtype=np.float64), n_atoms, path), None, box
+
+
+def _gro_frames(path, n_atoms):
+    """ Yields the frames of a GROMACS structure/trajectory file """
+    with open(path) as gro:
+        while True:
+            title = gro.readline()
+            if not title.strip():
+                return
+            natoms = int(gro.readline())
+            lines = [gro.readline() for _ in range(natoms)]
+            box = np.array(gro.readline().split()[:3], dtype=np.float64) * 10.0
+            first = lines[0].index('.', 20)
+            width = lines[0].index('.', first + 1) - first
+            xyz = np.array([[line[20 + i * width:20 + (i + 1) * width] for i in range(3)] for line in lines], dtype=np.float64) * 10.0
+            match = re.search(r't=\s*([-+0-9.eE]+)', title)
+            yield _check_atoms(xyz, n_atoms, path), (float(match.group(1)) if match else None), box
+
+
+def _check_atoms(xyz, n_atoms, path):
+    """ Checks the number of atoms of a frame against the topology """
+    if len(xyz) != n_atoms:
+        raise ValueError('%s has %d atoms, topology has %d' % (path, len(xyz), n_atoms))
+    return xyz
+
+
+def chunk_frames(frames, atom_indices, start, stop, step, chunk_size):
+    """ Groups the selected frames of a frame iterator into chunks of selected atoms """
+    xyz, time, box = [], [], []
+    for index, (coordinates, t, b) in enumerate(frames):
+        if stop is not None and index >= stop:
+            break
+        if index < start or (index - start) % step:
+            continue
+        xyz.append(coordinates if atom_indices is None else coordinates[atom_indices])
+        time.append(index if t is None else t)
+        box.append(b)
+        if len(xyz) == chunk_size:
+            yield make_chunk(xyz, time, box)
+            xyz, time, box = [], [], []
+    if xyz:
+        yield make_chunk(xyz, time, box)
+
+
+def _ascii_reader(frames):
+    """ Builds a chunked reader from a frame iterator """
+    def reader(path, n_atoms, atom_indices, start, stop, step, chunk_size):
+        return chunk_frames(frames(path, n_atoms), atom_indices, start, stop, step, chunk_size)
+    return reader
+
+
+READERS = {
+    'mdcrd': _ascii_reader(_mdcrd_frames),
+    'crd': _ascii_reader(_mdcrd_frames),
+    'pdb': _ascii_reader(_pdb_frames),
+    'gro': _ascii_reader(_gro_frames),
+    'dcd': read_dcd,
+    'xtc': read_xtc,
+    'trr': read_trr,
+    'netcdf': read_netcdf,
+    'nc': read_netcdf,
+    'ncdf': read_netcdf,
+    'cdf': read_netcdf
+}
+
+
+def is_supported(path):
+    """ Checks if the trajectory format can be read by the native backend """
+    return PurePath(path).suffix[1:].lower() in READERS
+
+
+def read_trajectory(path, n_atoms, atom_indices=None, start=0, stop=None, step=1, chunk_size=None):
+    """ Yields chunks of the selected frames (0-based start, exclusive stop) and atoms of a trajectory """
+    ext = PurePath(path).suffix[1:].lower()
+    if ext not in READERS:
+        raise ValueError('Trajectory format %s is not supported by the native backend' % ext)
+    if atom_indices is not None:
+        atom_indices = np.asarray(atom_indices)
+    if not chunk_size:
+        chunk_size = get_chunk_size(n_atoms if atom_indices is None else len(atom_indices))
+    if start and ext in ('xtc', 'trr'):
+        # an up to date frame index lets the reading start at the first selected frame
+        index = read_frame_index(path)
+        if index is not None and start < len(index.time):
+            return READERS[ext](path, n_atoms, atom_indices, 0, None if stop is None else stop - start, step, chunk_size, offset=int(index.offsets[start]))
+    return READERS[ext](path, n_atoms, atom_indices, start, stop, step, chunk_size)
+
+
+def get_frame_offsets(path):
+    """ Gives the byte offsets of the frames of a XTC or TRR file, from its up to date frame index or reading its frame headers, None for other formats """
+    if not is_trimmable(path):
+        return None
+    index = read_frame_index(path)
+    return (index if index is not None else build_frame_index(path)).offsets
+
+
+def read_frame(path, n_atoms, atom_indices, frame, offsets=None):
+    """ Gives the coordinates (atoms, 3) and time of a single frame (0-based) of a trajectory, read at its byte offset if offsets are given """
+    ext = PurePath(path).suffix[1:].lower()
+    if offsets is not None:
+        chunks = READERS[ext](path, n_atoms, None if atom_indices is None else np.asarray(atom_indices), 0, 1, 1, 1, offset=int(offsets[frame]))
+    else:
+        chunks = read_trajectory(path, n_atoms, atom_indices, frame, frame + 1, 1, 1)
+    for chunk in chunks:
+        return chunk.xyz[0], chunk.time[0]
+    raise ValueError('Frame %d not found in %s' % (frame + 1, path))
+
+
+def count_frames(path, n_atoms):
+    """ Gives the number of frames of a trajectory, from its header when the format has one """
+    ext = PurePath(path).suffix[1:].lower()
+    if ext == 'dcd':
+        return DCDFile(path).n_frames
+    if READERS.get(ext) is read_netcdf:
+        nc = NetCDFFile(path)
+        nc.close()
+        return nc.n_frames
+    if ext in ('xtc', 'trr'):
+        index = read_frame_index(path)
+        if index is not None:
+            return len(index.time)
+    if ext == 'xtc':
+        return len(frame_offsets(path))
+    return sum(len(chunk.xyz) for chunk in read_trajectory(path, n_atoms, [0]))
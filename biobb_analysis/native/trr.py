@@ -0,0 +1,80 @@
+""" TRR reader for package biobb_analysis.native """
+import struct
+import numpy as np
+from biobb_analysis.native.common import make_chunk
+
+TRR_MAGIC = 1993
+
+# sizes of the frame header: ir, e, box, vir, pres, top, sym, x, v, f, natoms, step, nre
+HEADER_FIELDS = ('ir_size', 'e_size', 'box_size', 'vir_size', 'pres_size', 'top_size', 'sym_size',
+                 'x_size', 'v_size', 'f_size', 'natoms', 'step', 'nre')
+
+
+def _read_header(trr):
+    """ Reads the header of a frame, gives its fields and time (ps), None at the end of the file """
+    start = trr.read(8)
+    if len(start) < 8:
+        return None
+    magic, _ = struct.unpack('>ii', start)
+    if magic != TRR_MAGIC:
+        raise ValueError('%s is not a TRR file or is corrupted' % trr.name)
+    (length,) = struct.unpack('>i', trr.read(4))
+    trr.seek(length + (4 - length % 4) % 4, 1)
+    header = dict(zip(HEADER_FIELDS, struct.unpack('>13i', trr.read(52))))
+    # single or double precision, given by the size of any of the blocks
+    if header['box_size']:
+        real = header['box_size'] // 9
+    elif header['x_size']:
+        real = header['x_size'] // (header['natoms'] * 3)
+    elif header['v_size']:
+        real = header['v_size'] // (header['natoms'] * 3)
+    else:
+        real = header['f_size'] // (header['natoms'] * 3)
+    header['real'] = '>f8' if real == 8 else '>f4'
+    header['time'], _ = struct.unpack('>dd' if real == 8 else '>ff', trr.read(2 * real))
+    return header
+
+
+def _read_block(trr, size, dtype):
+    """ Reads a block of reals """
+    return np.frombuffer(trr.read(size), dtype=dtype).astype(np.float64)
+
+
+def read_trr(path, n_atoms, atom_indices, start, stop, step, chunk_size, offset=0):
+    """ Yields chunks of the selected frames and atoms of a TRR file, frames without coordinates are ignored.
+
+    Decoding can start at any frame given its byte offset (see :mod:`biobb_analysis.native.index`).
+    """
+    xyz, time, box = [], [], []
+    with open(path, 'rb') as trr:
+        trr.seek(offset)
+        index = 0
+        while stop is None or index < stop:
+            header = _read_header(trr)
+            if header is None:
+                break
+            if header['natoms'] != n_atoms:
+                raise ValueError('%s has %d atoms, topology has %d' % (path, header['natoms'], n_atoms))
+            trr.seek(header['ir_size'] + header['e_size'], 1)
+            b = _read_block(trr, header['box_size'], header['real']).reshape(3, 3) if header['box_size'] else None
+            trr.seek(header['vir_size'] + header['pres_size'] + header['top_size'] + header['sym_size'], 1)
+            if not header['x_size']:
+                trr.seek(header['v_size'] + header['f_size'], 1)
+                continue
+            if index < start or (index - start) % step:
+                trr.seek(header['x_size'], 1)
+            else:
+                # only the selected atoms are converted
+                coordinates = np.frombuffer(trr.read(header['x_size']), dtype=header['real']).reshape(n_atoms, 3)
+                if atom_indices is not None:
+                    coordinates = coordinates[atom_indices]
+                xyz.append(coordinates.astype(np.float64) * 10.0)
+                time.append(header['time'])
+                box.append(None if b is None else np.linalg.norm(b, axis=1) * 10.0)
+                if len(xyz) == chunk_size:
+                    yield make_chunk(xyz, time, box)
+                    xyz, time, box = [], [], []
+            trr.seek(header['v_size'] + header['f_size'], 1)
+            index += 1
+    if xyz:
+        yield make_chunk(xyz, time, box)
@@ -0,0 +1,184 @@
+""" Streaming XTC reader for package biobb_analysis.native """
+import struct
+import numpy as np
+from biobb_analysis.native.common import make_chunk
+
+XTC_MAGIC = 1995
+
+# from the GROMACS xdrfile library
+MAGICINTS = [0, 0, 0, 0, 0, 0, 0, 0, 0, 8, 10, 12, 16, 20, 25, 32, 40, 50, 64,
+             80, 101, 128, 161, 203, 256, 322, 406, 512, 645, 812, 1024, 1290,
+             1625, 2048, 2580, 3250, 4096, 5060, 6501, 8192, 10321, 13003,
+             16384, 20642, 26007, 32768, 41285, 52015, 65536, 82570, 104031,
+             131072, 165140, 208063, 262144, 330280, 416127, 524287, 660561,
+             832255, 1048576, 1321122, 1664510, 2097152, 2642245, 3329021,
+             4194304, 5284491, 6658042, 8388607, 10568983, 13316085, 16777216]
+FIRSTIDX = 9
+
+
+class _BitReader:
+    """ Reads big-endian bit fields from the compressed coordinates of a frame """
+
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+
+    def bits(self, n):
+        """ Gives the next n bits as an unsigned integer """
+        first = self.position >> 3
+        last = (self.position + n + 7) >> 3
+        value = int.from_bytes(self.data[first:last], 'big')
+        value >>= (last << 3) - self.position - n
+        self.position += n
+        return value & ((1 << n) - 1)
+
+    def ints(self, n_bits, sizes):
+        """ Gives three integers packed in n_bits bits as a mixed radix number of the given sizes """
+        # the packed number is stored as little-endian bytes, the last one holding the remaining 1 to 8 bits
+        full, rest = divmod(n_bits, 8)
+        if not rest:
+            full, rest = full - 1, 8
+        packed = self.bits(n_bits)
+        value = int.from_bytes((packed >> rest).to_bytes(full, 'big'), 'little') | ((packed & ((1 << rest) - 1)) << (8 * full))
+        value, z = divmod(value, sizes[2])
+        x, y = divmod(value, sizes[1])
+        return x, y, z
+
+
+def _decompress(data, n_atoms, precision, minint, maxint, smallidx, last_atom):
+    """ Decompresses the coordinates of a frame up to the last_atom (0-based) atom, gives them in nm """
+    sizeint = [maxint[i] - minint[i] + 1 for i in range(3)]
+    if (sizeint[0] | sizeint[1] | sizeint[2]) > 0xffffff:
+        bitsizeint = [s.bit_length() for s in sizeint]
+        bitsize = 0
+    else:
+        bitsize = (sizeint[0] * sizeint[1] * sizeint[2]).bit_length()
+    smaller = MAGICINTS[max(FIRSTIDX, smallidx - 1)] // 2
+    smallnum = MAGICINTS[smallidx] // 2
+    sizesmall = [MAGICINTS[smallidx]] * 3
+
+    reader = _BitReader(data)
+    coords = []
+    i, run = 0, 0
+    while i < n_atoms and i <= last_atom:
+        if bitsize == 0:
+            x, y, z = reader.bits(bitsizeint[0]), reader.bits(bitsizeint[1]), reader.bits(bitsizeint[2])
+        else:
+            x, y, z = reader.ints(bitsize, sizeint)
+        i += 1
+        x, y, z = x + minint[0], y + minint[1], z + minint[2]
+        prev = (x, y, z)
+
+        is_smaller = 0
+        if reader.bits(1):
+            run = reader.bits(5)
+            is_smaller = run % 3
+            run -= is_smaller
+            is_smaller -= 1
+        if run > 0:
+            for k in range(0, run, 3):
+                dx, dy, dz = reader.ints(smallidx, sizesmall)
+                i += 1
+                current = (dx + prev[0] - smallnum, dy + prev[1] - smallnum, dz + prev[2] - smallnum)
+                if k == 0:
+                    # the first two atoms of a run are swapped, for better compression of water molecules
+                    current, prev = prev, current
+                    coords.append(prev)
+                else:
+                    prev = current
+                coords.append(current)
+        else:
+            coords.append(prev)
+
+        smallidx += is_smaller
+        if is_smaller < 0:
+            smallnum = smaller
+            smaller = MAGICINTS[smallidx - 1] // 2 if smallidx > FIRSTIDX else 0
+        elif is_smaller > 0:
+            smaller = smallnum
+            smallnum = MAGICINTS[smallidx] // 2
+        sizesmall = [MAGICINTS[smallidx]] * 3
+    return np.array(coords, dtype=np.float64) / precision
+
+
+def _read_header(xtc):
+    """ Reads the header of a frame, gives its number of atoms, step, time (ps) and box (nm), None at the end of the file """
+    header = xtc.read(52)
+    if len(header) < 52:
+        return None
+    magic, n_atoms, step, time = struct.unpack('>iiif', header[:16])
+    if magic != XTC_MAGIC:
+        raise ValueError('%s is not a XTC file or is corrupted' % xtc.name)
+    box = np.array(struct.unpack('>9f', header[16:52]), dtype=np.float64).reshape(3, 3)
+    return n_atoms, step, time, box
+
+
+def _read_coordinates(xtc, n_atoms, last_atom):
+    """ Reads the coordinates (nm) of the current frame, decompressing only up to last_atom """
+    (n,) = struct.unpack('>i', xtc.read(4))
+    if n <= 9:
+        return np.array(struct.unpack('>%df' % (3 * n), xtc.read(12 * n)), dtype=np.float64).reshape(n, 3)
+    precision, = struct.unpack('>f', xtc.read(4))
+    values = struct.unpack('>7i', xtc.read(28))
+    minint, maxint, smallidx = values[0:3], values[3:6], values[6]
+    (length,) = struct.unpack('>i', xtc.read(4))
+    data = xtc.read(length)
+    xtc.seek((4 - length % 4) % 4, 1)
+    return _decompress(data, n, precision, minint, maxint, smallidx, last_atom)
+
+
+def _skip_coordinates(xtc):
+    """ Skips the coordinates of the current frame without decompressing them """
+    (n,) = struct.unpack('>i', xtc.read(4))
+    if n <= 9:
+        xtc.seek(12 * n, 1)
+        return
+    xtc.seek(32, 1)
+    (length,) = struct.unpack('>i', xtc.read(4))
+    xtc.seek(length + (4 - length % 4) % 4, 1)
+
+
+def frame_offsets(path):
+    """ Gives the byte offset of every frame of a XTC file, reading only the frame headers """
+    offsets = []
+    with open(path, 'rb') as xtc:
+        while True:
+            offset = xtc.tell()
+            if _read_header(xtc) is None:
+                break
+            offsets.append(offset)
+            _skip_coordinates(xtc)
+    return offsets
+
+
+def read_xtc(path, n_atoms, atom_indices, start, stop, step, chunk_size, offset=0):
+    """ Yields chunks of the selected frames and atoms of a XTC file.
+
+    Skipped frames are not decompressed, and selected frames are only decompressed up to the last selected atom.
+    Decoding can start at any frame given its byte offset (see :func:`frame_offsets`), so independent blocks of frames can be read in parallel.
+    """
+    last_atom = n_atoms - 1 if atom_indices is None else int(np.max(atom_indices))
+    xyz, time, box = [], [], []
+    with open(path, 'rb') as xtc:
+        xtc.seek(offset)
+        index = 0
+        while stop is None or index < stop:
+            header = _read_header(xtc)
+            if header is None:
+                break
+            natoms, _, t, b = header
+            if natoms != n_atoms:
+                raise ValueError('%s has %d atoms, topology has %d' % (path, natoms, n_atoms))
+            if index < start or (index - start) % step:
+                _skip_coordinates(xtc)
+            else:
+                coordinates = _read_coordinates(xtc, natoms, last_atom) * 10.0
+                xyz.append(coordinates if atom_indices is None else coordinates[atom_indices])
+                time.append(t)
+                box.append(np.linalg.norm(b, axis=1) * 10.0)
+                if len(xyz) == chunk_size:
+                    yield make_chunk(xyz, time, box)
+                    xyz, time, box = [], [], []
+            index += 1
+    if xyz:
+        yield make_chunk(xyz, time, box)
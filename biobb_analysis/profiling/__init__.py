@@ -0,0 +1,2 @@
+name = "profiling"
+__all__ = ["phases", "report", "resources"]
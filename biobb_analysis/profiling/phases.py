@@ -0,0 +1,195 @@
+""" Per-phase profiling of the launch of the blocks for package biobb_analysis.profiling
+
+With a profile_path, the launch of a block records the monotonic time and the bytes read and written (by the process
+and its waited children, through read/write system calls) of each of its phases: checking its paths and parameters,
+checking the restart, staging its files, creating its instructions or standard input file, running its executable or
+its native engine, copying its outputs to the host and removing its temporary files. A phase run within another phase
+is part of it, and the time spent out of the phases (result cache, columnar outputs...) is recorded as other.
+
+A JSON record of every launch, with the resource usage of its child processes (see
+:mod:`biobb_analysis.profiling.resources`), is appended as a line to profile_path, so that the launches of a whole
+pipeline, run in the same or in parallel processes, can be aggregated (see :mod:`biobb_analysis.profiling.report`).
+"""
+import datetime
+import functools
+import json
+import os
+import platform
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from biobb_common.tools import file_utils as fu
+from biobb_analysis.profiling.resources import ChildAccounting, account_children, is_accounted, log_child_usage, write_prometheus
+
+# methods of the blocks timed as a phase, with the name of their phase
+PHASE_METHODS = {
+    'check_data_params': 'check_data_params',
+    'check_restart': 'check_restart',
+    'stage_files': 'stage_files',
+    'create_instructions_file': 'instructions',
+    'create_instrucions_file': 'instructions',
+    'compute_native': 'compute_native',
+    'run_biobb': 'run_biobb',
+    'copy_to_host': 'copy_to_host',
+    'remove_tmp_files': 'remove_tmp_files'
+}
+
+
+def read_io():
+    """ Gives the bytes read and written by this process and its waited children, None if /proc/self/io is not available """
+    try:
+        with open('/proc/self/io') as io:
+            fields = dict(line.split(':', 1) for line in io if ':' in line)
+        return int(fields['rchar']), int(fields['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def io_delta(before, after):
+    """ Gives the bytes read and written between two read_io, None if not available """
+    if before is None or after is None:
+        return None, None
+    return after[0] - before[0], after[1] - before[1]
+
+
+class LaunchProfile:
+    """ Phases of a launch of a block, with their start and duration (s) from the start of the launch and the bytes they read and wrote """
+
+    def __init__(self):
+        self.phases = []
+        self.depth = 0
+        self.lock = threading.Lock()
+        self.timestamp = datetime.datetime.now().isoformat()
+        self.start = time.monotonic()
+        self.io = read_io()
+
+    @contextmanager
+    def phase(self, name):
+        """ Times a phase, unless run within another phase """
+        with self.lock:
+            outer = not self.depth
+            self.depth += 1
+        start, io = time.monotonic(), read_io()
+        try:
+            yield
+        finally:
+            end, read_write = time.monotonic(), io_delta(io, read_io())
+            with self.lock:
+                self.depth -= 1
+                if outer:
+                    self.phases.append({'name': name, 'start': start - self.start, 'duration': end - start,
+                                        'read_bytes': read_write[0], 'write_bytes': read_write[1]})
+
+    def timed(self, name, method):
+        """ Gives method timed as a phase """
+        @functools.wraps(method)
+        def timed_method(*args, **kwargs):
+            with self.phase(name):
+                return method(*args, **kwargs)
+        return timed_method
+
+    def get_record(self, biobb, return_code=None, error=None):
+        """ Gives the JSON record of the launch of a block """
+        wall_time = time.monotonic() - self.start
+        read_bytes, write_bytes = io_delta(self.io, read_io())
+        other = {'duration': wall_time - sum(phase['duration'] for phase in self.phases)}
+        for key, total in (('read_bytes', read_bytes), ('write_bytes', write_bytes)):
+            other[key] = None if total is None else total - sum(phase[key] for phase in self.phases)
+        return {
+            'block': biobb.__class__.__name__,
+            'step': biobb.step,
+            'prefix': biobb.prefix,
+            'backend': getattr(biobb, 'backend', None),
+            'timestamp': self.timestamp,
+            'host': platform.node(),
+            'pid': os.getpid(),
+            'return_code': return_code,
+            'error': error,
+            'wall_time': wall_time,
+            'read_bytes': read_bytes,
+            'write_bytes': write_bytes,
+            'phases': self.phases,
+            'other': other
+        }
+
+
+@contextmanager
+def profile_phase(biobb, name):
+    """ Times a phase of the launch of a block if it is profiled """
+    profile = getattr(biobb, 'profile', None)
+    if profile is None:
+        yield
+        return
+    with profile.phase(name):
+        yield
+
+
+def profiled(name):
+    """ Decorates a function taking the block as first argument, timing it as a phase of its launch if profiled """
+    def decorator(func):
+        @functools.wraps(func)
+        def profiled_func(biobb, *args, **kwargs):
+            with profile_phase(biobb, name):
+                return func(biobb, *args, **kwargs)
+        return profiled_func
+    return decorator
+
+
+def format_bytes(n_bytes):
+    """ Gives a number of bytes in MB """
+    return '-' if n_bytes is None else '%.1f MB' % (n_bytes / 1024 ** 2)
+
+
+def log_profile(record, out_log):
+    """ Logs the duration and bytes read and written of every phase of a launch """
+    phases = record['phases'] + [dict(record['other'], name='other')]
+    fu.log('Profile: %.3f s, %s read, %s written' % (record['wall_time'], format_bytes(record['read_bytes']), format_bytes(record['write_bytes'])), out_log)
+    for phase in phases:
+        fu.log('Profile: %-18s %10.3f s %12s read %12s written' % (phase['name'], phase['duration'], format_bytes(phase['read_bytes']),
+                                                                 format_bytes(phase['write_bytes'])), out_log)
+
+
+def write_profile(profile_path, record):
+    """ Appends the record of a launch to the JSON lines profile file """
+    Path(profile_path).parent.mkdir(parents=True, exist_ok=True)
+    # a single write, so that the records of parallel launches are not interleaved
+    with open(profile_path, 'a') as profile:
+        profile.write(json.dumps(record) + '\n')
+
+
+def profile_launch(launch):
+    """ Decorates the launch method of a block, profiling its phases if the block has a profile_path and accounting the resources of its child processes if it has a profile_path or a prometheus_path """
+    @functools.wraps(launch)
+    def profiled_launch(biobb, *args, **kwargs):
+        profile_path = getattr(biobb, 'profile_path', None)
+        if profile_path:
+            biobb.profile = LaunchProfile()
+            # the methods of the instance are replaced by their timed version during the launch
+            for method, name in PHASE_METHODS.items():
+                if callable(getattr(biobb, method, None)):
+                    setattr(biobb, method, biobb.profile.timed(name, getattr(biobb, method)))
+        accounting = ChildAccounting() if is_accounted(biobb) else None
+        return_code, error = None, None
+        try:
+            with account_children(accounting):
+                return_code = launch(biobb, *args, **kwargs)
+            return return_code
+        except BaseException as e:
+            error = '%s: %s' % (e.__class__.__name__, e)
+            raise
+        finally:
+            biobb.child_usage = accounting.get_usage() if accounting is not None else None
+            log_child_usage(biobb.child_usage, biobb.out_log)
+            if getattr(biobb, 'prometheus_path', None):
+                write_prometheus(biobb.prometheus_path, biobb, biobb.child_usage)
+            if profile_path:
+                for method in PHASE_METHODS:
+                    biobb.__dict__.pop(method, None)
+                biobb.profile_record = biobb.profile.get_record(biobb, return_code, error)
+                biobb.profile_record['children'] = biobb.child_usage
+                biobb.profile = None
+                write_profile(profile_path, biobb.profile_record)
+                log_profile(biobb.profile_record, biobb.out_log)
+                fu.log('Profile record appended to %s' % profile_path, biobb.out_log)
+    return profiled_launch
@@ -0,0 +1,90 @@
+""" Aggregated profile of the launches of a pipeline for package biobb_analysis.profiling
+
+Reads the JSON lines profile files written by the launches with a profile_path (see
+:mod:`biobb_analysis.profiling.phases`) and aggregates them by block, or by block and backend: number of launches,
+total time, and total time, share of the time and bytes read and written of every phase, so that the phases dominating
+a pipeline (staging or cleanup rather than cpptraj or gmx) stand out.
+
+Usage:
+    python -m biobb_analysis.profiling.report profile.jsonl [profile2.jsonl ...] [--by block backend] [--output report.json]
+"""
+import argparse
+import json
+import sys
+from collections import OrderedDict
+from biobb_analysis.profiling.phases import format_bytes
+
+# record fields the launches can be grouped by
+GROUP_FIELDS = ['block', 'backend', 'step', 'host']
+
+
+def read_profiles(paths):
+    """ Gives the launch records of the JSON lines profile files, skipping incomplete lines """
+    records = []
+    for path in paths:
+        with open(path) as profile:
+            for line in profile:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    return records
+
+
+def add_bytes(total, n_bytes):
+    """ Adds a number of bytes to a total, None if any of them is not available """
+    return None if total is None or n_bytes is None else total + n_bytes
+
+
+def aggregate(records, by=('block',)):
+    """ Gives the totals of the launches and of their phases by group, the groups sorted by total time """
+    groups = OrderedDict()
+    for record in records:
+        key = ' '.join(str(record.get(field)) for field in by)
+        group = groups.setdefault(key, {'group': key, 'launches': 0, 'failed': 0, 'wall_time': 0.0, 'phases': OrderedDict()})
+        group['launches'] += 1
+        group['failed'] += bool(record.get('return_code') or record.get('error'))
+        group['wall_time'] += record['wall_time']
+        for phase in record['phases'] + [dict(record['other'], name='other')]:
+            total = group['phases'].setdefault(phase['name'], {'name': phase['name'], 'count': 0, 'duration': 0.0, 'read_bytes': 0, 'write_bytes': 0})
+            total['count'] += 1
+            total['duration'] += phase['duration']
+            total['read_bytes'] = add_bytes(total['read_bytes'], phase['read_bytes'])
+            total['write_bytes'] = add_bytes(total['write_bytes'], phase['write_bytes'])
+    summary = sorted(groups.values(), key=lambda group: -group['wall_time'])
+    for group in summary:
+        group['phases'] = sorted(group['phases'].values(), key=lambda phase: -phase['duration'])
+        for phase in group['phases']:
+            phase['share'] = phase['duration'] / group['wall_time'] if group['wall_time'] else 0.0
+    return summary
+
+
+def format_report(summary):
+    """ Gives the aggregated profile as text """
+    lines = []
+    for group in summary:
+        lines.append('%s: %d launches (%d failed), %.3f s' % (group['group'], group['launches'], group['failed'], group['wall_time']))
+        for phase in group['phases']:
+            lines.append('    %-18s %6d %12.3f s %6.1f %% %12s read %12s written' % (phase['name'], phase['count'], phase['duration'], 100 * phase['share'],
+                                                                               format_bytes(phase['read_bytes']), format_bytes(phase['write_bytes'])))
+    return '\n'.join(lines)
+
+
+def main():
+    """Command line execution of the aggregated profile report."""
+    parser = argparse.ArgumentParser(description="Aggregates the phase profiles of the launches of the blocks.", formatter_class=lambda prog: argparse.RawTextHelpFormatter(prog, width=99999))
+    parser.add_argument('profiles', nargs='+', help='JSON lines profile files written by the blocks with a profile_path')
+    parser.add_argument('--by', nargs='+', choices=GROUP_FIELDS, default=['block'], help='Record fields the launches are grouped by')
+    parser.add_argument('--output', help='JSON file where the aggregated profile is written')
+    args = parser.parse_args()
+
+    summary = aggregate(read_profiles(args.profiles), by=args.by)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(summary, output, indent=4)
+    print(format_report(summary))
+    return 0 if summary else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
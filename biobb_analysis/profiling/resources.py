@@ -0,0 +1,226 @@
+""" Resource accounting of the child processes of the blocks for package biobb_analysis.profiling
+
+The child processes started by a block (cpptraj, gmx, the shell running them or the container client) are reaped
+with wait4 instead of waitpid, so that the resource usage of every one of them, including the processes it waited
+for itself, is added to the block: user and system CPU time, peak resident memory, voluntary and involuntary context
+switches and bytes read from and written to the block devices. The children started by the threads a block runs in
+parallel are accounted to it with bind_accounting. The warm cpptraj processes serving several blocks are never reaped
+by a block, so the usage of every block is read from /proc as the difference between before and after its run, its
+peak resident memory being the one of the process since it was started.
+
+The children are only accounted for the launches with a prometheus_path or a profile_path (see :func:`is_accounted`):
+the creation and the reaping of subprocesses are wrapped the first time one of them runs, and the children of other
+launches and of other code are reaped by waitpid as usual. The usage is logged, attached to the block as child_usage
+(None without accounting) and, with a prometheus_path, written to a Prometheus textfile collector file, by block and
+step.
+"""
+import fcntl
+import os
+import re
+import subprocess
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from biobb_common.tools import file_utils as fu
+
+# usage fields, all of them added but the peak resident memory
+USAGE_FIELDS = ['processes', 'user_time', 'system_time', 'peak_rss', 'voluntary_switches', 'involuntary_switches', 'read_bytes', 'write_bytes']
+# Prometheus metric name, help and usage field
+PROMETHEUS_METRICS = [
+    ('biobb_child_processes', 'Child processes started by the last launch of a block.', 'processes'),
+    ('biobb_child_cpu_user_seconds', 'User CPU time of the child processes of the last launch of a block.', 'user_time'),
+    ('biobb_child_cpu_system_seconds', 'System CPU time of the child processes of the last launch of a block.', 'system_time'),
+    ('biobb_child_peak_rss_bytes', 'Peak resident memory of the child processes of the last launch of a block.', 'peak_rss'),
+    ('biobb_child_voluntary_context_switches', 'Voluntary context switches of the child processes of the last launch of a block.', 'voluntary_switches'),
+    ('biobb_child_involuntary_context_switches', 'Involuntary context switches of the child processes of the last launch of a block.', 'involuntary_switches'),
+    ('biobb_child_block_read_bytes', 'Bytes read from block devices by the child processes of the last launch of a block.', 'read_bytes'),
+    ('biobb_child_block_write_bytes', 'Bytes written to block devices by the child processes of the last launch of a block.', 'write_bytes')
+]
+# sample line of a Prometheus text file: metric name, labels and value
+PROMETHEUS_SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{.*\})?\s+(\S+)$')
+
+_local = threading.local()
+_installed = False
+_prometheus_lock = threading.Lock()
+
+
+class ChildAccounting:
+    """ Resource usage of the child processes of a block """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.usage = dict.fromkeys(USAGE_FIELDS, 0)
+
+    def add(self, usage):
+        """ Adds the usage of a child process """
+        with self.lock:
+            for field in USAGE_FIELDS:
+                if field == 'peak_rss':
+                    self.usage[field] = max(self.usage[field], usage[field])
+                else:
+                    self.usage[field] += usage[field]
+
+    def add_rusage(self, rusage):
+        """ Adds the resource usage of a reaped child process """
+        self.add({
+            'processes': 1,
+            'user_time': rusage.ru_utime,
+            'system_time': rusage.ru_stime,
+            # kilobytes and blocks of 512 bytes on Linux
+            'peak_rss': rusage.ru_maxrss * 1024,
+            'voluntary_switches': rusage.ru_nvcsw,
+            'involuntary_switches': rusage.ru_nivcsw,
+            'read_bytes': rusage.ru_inblock * 512,
+            'write_bytes': rusage.ru_oublock * 512
+        })
+
+    def get_usage(self):
+        """ Gives the usage of the child processes accounted so far """
+        with self.lock:
+            return dict(self.usage)
+
+
+def install():
+    """ Wraps the creation and the reaping of subprocesses, so that the children of the accounted threads are reaped with wait4; installed once per process """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    # the reaping of subprocesses is only wrapped where it is done by waitpid
+    if not hasattr(os, 'wait4') or not hasattr(subprocess.Popen, '_try_wait'):
+        return
+    popen_init, popen_try_wait = subprocess.Popen.__init__, subprocess.Popen._try_wait
+
+    def accounted_init(popen, *args, **kwargs):
+        popen._child_accounting = getattr(_local, 'accounting', None)
+        popen_init(popen, *args, **kwargs)
+
+    def accounted_try_wait(popen, wait_flags):
+        accounting = getattr(popen, '_child_accounting', None)
+        if accounting is None:
+            return popen_try_wait(popen, wait_flags)
+        try:
+            pid, sts, rusage = os.wait4(popen.pid, wait_flags)
+        except ChildProcessError:
+            # as in Popen, the child is dead but its status is lost
+            return popen.pid, 0
+        if pid == popen.pid:
+            accounting.add_rusage(rusage)
+        return pid, sts
+
+    subprocess.Popen.__init__ = accounted_init
+    subprocess.Popen._try_wait = accounted_try_wait
+
+
+def is_accounted(biobb):
+    """ Checks if the child processes of a block are accounted: only if their usage is written somewhere """
+    return bool(getattr(biobb, 'prometheus_path', None) or getattr(biobb, 'profile_path', None))
+
+
+def get_accounting():
+    """ Gives the accounting of the block run by this thread, None if there is none """
+    return getattr(_local, 'accounting', None)
+
+
+@contextmanager
+def account_children(accounting):
+    """ Accounts the children started by this thread to the given accounting, none if it is None """
+    if accounting is not None:
+        install()
+    previous = get_accounting()
+    _local.accounting = accounting
+    try:
+        yield accounting
+    finally:
+        _local.accounting = previous
+
+
+def bind_accounting(func):
+    """ Gives func accounting the children it starts, in any thread, to the accounting of this thread, func itself if there is none """
+    accounting = get_accounting()
+    if accounting is None:
+        return func
+
+    def accounted_func(*args, **kwargs):
+        with account_children(accounting):
+            return func(*args, **kwargs)
+    return accounted_func
+
+
+def read_process_usage(pid):
+    """ Gives the usage of a running process read from /proc, None if it is not available """
+    try:
+        with open('/proc/%d/stat' % pid) as stat:
+            # the fields after the command name, which may hold spaces
+            fields = stat.read().rsplit(')', 1)[1].split()
+        with open('/proc/%d/status' % pid) as status:
+            values = dict(line.split(':', 1) for line in status if ':' in line)
+        with open('/proc/%d/io' % pid) as io:
+            values.update(line.split(':', 1) for line in io if ':' in line)
+        ticks = os.sysconf('SC_CLK_TCK')
+        return {
+            'processes': 1,
+            'user_time': int(fields[11]) / ticks,
+            'system_time': int(fields[12]) / ticks,
+            'peak_rss': int(values['VmHWM'].split()[0]) * 1024,
+            'voluntary_switches': int(values['voluntary_ctxt_switches']),
+            'involuntary_switches': int(values['nonvoluntary_ctxt_switches']),
+            'read_bytes': int(values['read_bytes']),
+            'write_bytes': int(values['write_bytes'])
+        }
+    except (OSError, IndexError, KeyError, ValueError):
+        return None
+
+
+def add_process_usage(before, after):
+    """ Accounts the usage of a process serving the block run by this thread between two read_process_usage """
+    accounting = get_accounting()
+    if accounting is None or before is None or after is None:
+        return
+    accounting.add({field: after[field] if field in ('processes', 'peak_rss') else after[field] - before[field] for field in USAGE_FIELDS})
+
+
+def log_child_usage(usage, out_log):
+    """ Logs the usage of the child processes of a block """
+    if not usage or not usage['processes']:
+        return
+    fu.log('Child processes: %d, %.3f s user, %.3f s system, %.1f MB peak RSS, %d voluntary and %d involuntary context switches, '
+           '%.1f MB read and %.1f MB written to block devices' % (usage['processes'], usage['user_time'], usage['system_time'],
+                                                                   usage['peak_rss'] / 1024 ** 2, usage['voluntary_switches'],
+                                                                   usage['involuntary_switches'], usage['read_bytes'] / 1024 ** 2,
+                                                                   usage['write_bytes'] / 1024 ** 2), out_log)
+
+
+def prometheus_labels(labels):
+    """ Gives the labels of a Prometheus sample """
+    escaped = ((name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for name, value in labels.items())
+    return '{%s}' % ','.join('%s="%s"' % (name, value) for name, value in escaped)
+
+
+def write_prometheus(prometheus_path, biobb, usage):
+    """ Writes the usage of the child processes of a block to a Prometheus textfile collector file, replacing the samples of its previous launches """
+    labels = prometheus_labels({'block': biobb.__class__.__name__, 'step': biobb.step or '', 'prefix': biobb.prefix or ''})
+    path = Path(prometheus_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # the file is shared by the blocks of the pipeline, also run by other processes
+    with _prometheus_lock, open(str(path) + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        samples = {}
+        if path.exists():
+            for line in path.read_text().splitlines():
+                match = PROMETHEUS_SAMPLE.match(line.strip())
+                if match:
+                    samples[(match.group(1), match.group(2) or '')] = match.group(3)
+        for name, _, field in PROMETHEUS_METRICS:
+            samples[(name, labels)] = repr(float(usage[field])) if isinstance(usage[field], float) else str(usage[field])
+        lines = []
+        names = [name for name, _, _ in PROMETHEUS_METRICS] + sorted({name for name, _ in samples} - {name for name, _, _ in PROMETHEUS_METRICS})
+        helps = {name: text for name, text, _ in PROMETHEUS_METRICS}
+        for name in names:
+            if name in helps:
+                lines += ['# HELP %s %s' % (name, helps[name]), '# TYPE %s gauge' % name]
+            lines += ['%s%s %s' % (name, sample_labels, value) for (sample_name, sample_labels), value in sorted(samples.items()) if sample_name == name]
+        # the collector reads the file at any time, it is replaced at once
+        tmp = path.with_name('.%s.%d' % (path.name, os.getpid()))
+        tmp.write_text('\n'.join(lines) + '\n')
+        os.replace(str(tmp), str(path))
@@ -0,0 +1,2 @@
+name = "staging"
+__all__ = ["files"]
@@ -0,0 +1,121 @@
+""" Staging of the input and output files of the blocks for package biobb_analysis.staging
+
+By default the blocks copy their inputs into a unique temporary directory and their outputs back to their host
+paths. With the link staging, inputs are hard-linked into the temporary directory, or symlinked if they are in
+another file system. Docker and singularity containers can not follow symlinks out of the mounted temporary
+directory, so their inputs are bind-mounted read-only into another container directory instead. Outputs are
+moved to their host paths, and only copied if they are in another file system.
+"""
+import os
+import shlex
+import shutil
+from pathlib import Path
+from biobb_common.tools import file_utils as fu
+from biobb_analysis.profiling.phases import profiled
+
+# ways of staging the files of a block
+STAGING_MODES = ('copy', 'link')
+# option binding a host path into the container, by container engine
+BIND_OPTIONS = {'docker': '-v', 'singularity': '--bind'}
+# container directory where the inputs are bind-mounted, not nested in the mounted temporary directory
+BIND_INPUTS_PATH = '/biobb_inputs'
+
+
+def get_staging(biobb, out_log):
+    """ Gets the way the files of a block are staged """
+    staging = getattr(biobb, 'staging', 'copy')
+    if staging not in STAGING_MODES:
+        fu.log(biobb.__class__.__name__ + ': Incorrect staging provided, exiting', out_log)
+        raise SystemExit(biobb.__class__.__name__ + ': Incorrect staging provided')
+    return staging
+
+
+def link_file(src, dst, symlink=True):
+    """ Hard-links src into dst, symlinks it if both are not in the same file system and symlink is True, copies it otherwise. Gives the way it was staged """
+    try:
+        os.link(src, dst)
+        return 'Hard-link'
+    except OSError:
+        pass
+    if symlink:
+        os.symlink(os.path.realpath(src), dst)
+        return 'Symlink'
+    shutil.copy2(src, dst)
+    return 'Copy'
+
+
+def get_bind_option(container_path):
+    """ Gives the option binding a host path into the container, None if the container engine has none """
+    engine = Path(str(container_path)).name
+    return next((option for name, option in BIND_OPTIONS.items() if engine.endswith(name)), None)
+
+
+@profiled('stage_files')
+def stage_files(biobb, out_log):
+    """ Stages the inputs of a block into a unique temporary directory and assigns the paths of its inputs and outputs in the stage_io_dict """
+    if get_staging(biobb, out_log) == 'copy' or biobb.disable_sandbox:
+        biobb.stage_files()
+        return
+
+    unique_dir = str(Path(fu.create_unique_dir()).resolve())
+    biobb.stage_io_dict = {"in": {}, "out": {}, "unique_dir": unique_dir}
+    # container sessions are started once, without the mounts of every block
+    bind_option = get_bind_option(biobb.container_path) if biobb.container_path and not getattr(biobb, 'container_session', False) else None
+    mounts = []
+    for file_ref, file_path in biobb.io_dict["in"].items():
+        if not file_path:
+            continue
+        if not Path(file_path).exists():
+            # default files of the executable
+            biobb.stage_io_dict["in"][file_ref] = file_path
+            continue
+        name = Path(file_path).name
+        if bind_option:
+            container_file_path = str(Path(BIND_INPUTS_PATH).joinpath(name))
+            mounts += [bind_option, shlex.quote('%s:%s:ro' % (Path(file_path).resolve(), container_file_path))]
+            fu.log('Bind-mount: %s to %s' % (file_path, container_file_path), out_log)
+            biobb.stage_io_dict["in"][file_ref] = container_file_path
+            continue
+        staged = link_file(file_path, str(Path(unique_dir).joinpath(name)), symlink=not biobb.container_path)
+        fu.log('%s: %s to %s' % (staged, file_path, unique_dir), out_log)
+        biobb.stage_io_dict["in"][file_ref] = get_stage_path(biobb, unique_dir, file_path)
+
+    for file_ref, file_path in biobb.io_dict["out"].items():
+        if file_path:
+            biobb.stage_io_dict["out"][file_ref] = get_stage_path(biobb, unique_dir, file_path)
+
+    # the container engine command line is built at run time, right after the generic command
+    if mounts:
+        biobb.container_generic_command = ' '.join([biobb.container_generic_command] + mounts)
+
+
+def get_stage_path(biobb, unique_dir, file_path):
+    """ Gives the path of a staged file as seen by the executable """
+    if biobb.container_path:
+        return str(Path(biobb.container_volume_path).joinpath(Path(file_path).name))
+    if biobb.chdir_sandbox:
+        return str(Path(file_path).name)
+    return str(Path(unique_dir).joinpath(Path(file_path).name))
+
+
+@profiled('copy_to_host')
+def copy_to_host(biobb, out_log):
+    """ Copies the outputs of a block from its temporary directory to their host paths, moving them unless staging is copy """
+    if get_staging(biobb, out_log) == 'copy' or biobb.disable_sandbox:
+        biobb.copy_to_host()
+        return
+
+    for file_ref, file_path in biobb.stage_io_dict["out"].items():
+        if not file_path:
+            continue
+        sandbox_file_path = Path(biobb.stage_io_dict["unique_dir"]).joinpath(Path(file_path).name)
+        host_file_path = biobb.io_dict["out"][file_ref]
+        if not sandbox_file_path.exists() or (Path(host_file_path).exists() and sandbox_file_path.samefile(host_file_path)):
+            continue
+        # the output appears at once in its host path, replacing the previous one instead of writing into it
+        try:
+            os.replace(sandbox_file_path, host_file_path)
+            fu.log('Move: %s to %s' % (sandbox_file_path, host_file_path), out_log)
+        except OSError:
+            shutil.copy2(sandbox_file_path, host_file_path)
+            fu.log('Copy: %s to %s' % (sandbox_file_path, host_file_path), out_log)
@@ -0,0 +1,2 @@
+name = "synthetic"
+__all__ = ["system", "writers", "generate"]
@@ -0,0 +1,62 @@
+""" Synthetic fixture generator for package biobb_analysis.synthetic
+
+Generates the structure, topology, index, trajectory and energy files of a synthetic system (see
+:mod:`biobb_analysis.synthetic.system`), the format of every file given by its extension. The trajectory files are
+written chunk by chunk, so trajectories larger than the memory can be generated.
+
+Usage:
+    python -m biobb_analysis.synthetic.generate --atoms 100000 --frames 1000 --box_type dodecahedron --output system.gro index.ndx trajectory.xtc energy.edr
+    python -m biobb_analysis.synthetic.generate --atoms 100000 --frames 1000 --naming amber --output system.prmtop trajectory.nc
+"""
+import argparse
+from pathlib import PurePath
+from biobb_analysis.synthetic.system import BOX_TYPES, NAMINGS, DEFAULT_AMPLITUDE, DEFAULT_DENSITY, build_system
+from biobb_analysis.synthetic.writers import STRUCTURE_WRITERS, TRAJECTORY_WRITERS, write_structure, write_trajectory, write_ndx, write_edr
+
+
+def generate(paths, n_atoms, n_frames=0, density=DEFAULT_DENSITY, box_type='cubic', naming='gromacs', time_step=1.0,
+             amplitude=DEFAULT_AMPLITUDE, drift=0.0, energy_drift=0.0, terms=None, seed=0):
+    """ Writes the files of a synthetic system of n_atoms and n_frames, gives their paths """
+    exts = [PurePath(path).suffix[1:].lower() for path in paths]
+    unknown = [path for path, ext in zip(paths, exts) if ext not in ('ndx', 'edr') and ext not in STRUCTURE_WRITERS and ext not in TRAJECTORY_WRITERS]
+    if unknown:
+        raise ValueError('Format of %s can not be written for synthetic systems' % ', '.join(unknown))
+    system = build_system(n_atoms, density=density, box_type=box_type, naming=naming, seed=seed)
+    for path, ext in zip(paths, exts):
+        if ext == 'ndx':
+            write_ndx(path, system)
+        elif ext == 'edr':
+            write_edr(path, system, n_frames, terms=terms, time_step=time_step, drift=energy_drift, seed=seed)
+        elif ext in STRUCTURE_WRITERS:
+            write_structure(path, system)
+        else:
+            write_trajectory(path, system, n_frames, time_step=time_step, amplitude=amplitude, drift=drift, seed=seed)
+    return paths
+
+
+def main():
+    """Command line execution of the synthetic fixture generator."""
+    parser = argparse.ArgumentParser(description="Generates the files of a synthetic solvated system.", formatter_class=lambda prog: argparse.RawTextHelpFormatter(prog, width=99999))
+    parser.add_argument('--output', nargs='+', required=True, help='Output files, the format given by the extension: %s, ndx and edr' % ', '.join(list(STRUCTURE_WRITERS) + list(TRAJECTORY_WRITERS)))
+    parser.add_argument('--atoms', type=int, required=True, help='Number of atoms of the system')
+    parser.add_argument('--frames', type=int, default=100, help='Number of frames of the trajectory and energy files')
+    parser.add_argument('--box_type', choices=list(BOX_TYPES), default='cubic', help='Type of the periodic box')
+    parser.add_argument('--naming', choices=list(NAMINGS), default='gromacs', help='Residue and atom names of the water and ions')
+    parser.add_argument('--density', type=float, default=DEFAULT_DENSITY, help='Atoms per cubic Angstrom')
+    parser.add_argument('--time_step', type=float, default=1.0, help='Time between frames in ps')
+    parser.add_argument('--amplitude', type=float, default=DEFAULT_AMPLITUDE, help='Standard deviation of the thermal motion in Angstroms')
+    parser.add_argument('--drift', type=float, nargs='+', default=[0.0], help='Drift of the system in Angstroms/ps, along x or as a vector')
+    parser.add_argument('--energy_drift', type=float, default=0.0, help='Drift of the total energy in kJ/mol/ps')
+    parser.add_argument('--terms', nargs='+', help='Energy terms of the energy files')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random generators')
+    args = parser.parse_args()
+
+    if len(args.drift) not in (1, 3):
+        parser.error('--drift takes a single value or a vector of 3 values')
+    drift = args.drift[0] if len(args.drift) == 1 else args.drift
+    generate(args.output, args.atoms, n_frames=args.frames, density=args.density, box_type=args.box_type, naming=args.naming,
+             time_step=args.time_step, amplitude=args.amplitude, drift=drift, energy_drift=args.energy_drift, terms=args.terms, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+""" Synthetic molecular systems for package biobb_analysis.synthetic
+
+A synthetic system of any number of atoms is a chain of protein-like residues (N, H, CA, HA, CB, C and O atoms) in a
+box of water molecules with sodium and chloride ions, so that the default GROMACS groups and the cpptraj mask presets
+select the same kind of atoms as in a solvated protein. The water and ions are named as in GROMACS (SOL, NA and CL) or
+as in Amber (WAT, Na+ and Cl-). Every molecule sits on a site of a lattice filling the box, the residues of the chain
+on consecutive neighbouring sites.
+
+Its trajectory is a thermal motion of every atom around its initial position, every frame being drawn from its own
+random generator, so any frame is the same whatever the chunks the trajectory is generated in, plus an optional drift
+of the whole system.
+"""
+from collections import namedtuple
+import numpy as np
+from biobb_analysis.native.common import Chunk
+from biobb_analysis.native.topology import Topology, AMINO_ACIDS, get_masses
+
+# names, residue names, 1-based residue numbers and elements (atoms); coordinates (atoms, 3), box lengths (3) in Angstroms
+# and box angles (3; alpha, beta and gamma) in degrees, the box being None for systems without periodic box
+SyntheticSystem = namedtuple('SyntheticSystem', ['names', 'resnames', 'resids', 'elements', 'xyz', 'box', 'angles'])
+
+# atoms of a residue of the chain, with their element and position (Angstroms) in the residue
+RESIDUE_ATOMS = [('N', 'N', (-1.2, 0.3, 0.0)), ('H', 'H', (-1.9, 1.0, 0.0)), ('CA', 'C', (0.0, 0.0, 0.0)), ('HA', 'H', (0.0, -0.6, 0.9)),
+                 ('CB', 'C', (0.3, -0.9, -1.2)), ('C', 'C', (1.2, 0.5, 0.0)), ('O', 'O', (1.4, 1.7, 0.0))]
+# elements and positions (Angstroms) of the atoms of a water molecule
+WATER_ATOMS = [('O', (0.0, 0.0, 0.0)), ('H', (0.96, 0.0, 0.0)), ('H', (-0.24, 0.93, 0.0))]
+# residue names of the chain, glycine having no CB
+RESIDUE_NAMES = [name for name in AMINO_ACIDS if name != 'GLY']
+# water residue name and atom names, sodium and chloride residue and atom names
+NAMINGS = {
+    'gromacs': {'water': ('SOL', ['OW', 'HW1', 'HW2']), 'sodium': ('NA', 'NA'), 'chloride': ('CL', 'CL')},
+    'amber': {'water': ('WAT', ['O', 'H1', 'H2']), 'sodium': ('Na+', 'Na+'), 'chloride': ('Cl-', 'Cl-')}
+}
+# box lengths relative to the first one and box angles (alpha, beta, gamma) in degrees
+BOX_TYPES = {
+    'cubic': ((1.0, 1.0, 1.0), (90.0, 90.0, 90.0)),
+    'orthorhombic': ((1.0, 1.25, 1.5), (90.0, 90.0, 90.0)),
+    'dodecahedron': ((1.0, 1.0, 1.0), (60.0, 60.0, 90.0)),
+    'octahedron': ((1.0, 1.0, 1.0), (109.4712206, 109.4712206, 109.4712206)),
+    'none': None
+}
+
+# atoms per cubic Angstrom, as in liquid water
+DEFAULT_DENSITY = 0.1
+# fractions of the atoms in the chain and of the ions
+PROTEIN_FRACTION = 0.1
+ION_FRACTION = 0.002
+# standard deviation of the thermal motion in Angstroms
+DEFAULT_AMPLITUDE = 0.5
+# memory budget for the coordinates of a single chunk of frames
+CHUNK_BYTES = 64 * 1024 * 1024
+
+
+def get_composition(n_atoms):
+    """ Gives the number of residues of the chain, water molecules, sodium and chloride ions of a system of n_atoms """
+    n_residues = max(1, int(round(n_atoms * PROTEIN_FRACTION / len(RESIDUE_ATOMS))))
+    n_cl = max(1, int(round(n_atoms * ION_FRACTION / 2)))
+    n_waters = (n_atoms - n_residues * len(RESIDUE_ATOMS) - 2 * n_cl) // len(WATER_ATOMS)
+    if n_waters < 1:
+        raise ValueError('A synthetic system needs at least %d atoms' % (len(RESIDUE_ATOMS) + len(WATER_ATOMS) + 2))
+    # the atoms left are sodium ions
+    n_na = n_atoms - n_residues * len(RESIDUE_ATOMS) - n_waters * len(WATER_ATOMS) - n_cl
+    return n_residues, n_waters, n_na, n_cl
+
+
+def get_box(volume, box_type):
+    """ Gives the box lengths (Angstroms) and angles (degrees) of a box type of the given volume, None for no box """
+    if box_type not in BOX_TYPES:
+        raise ValueError('Unknown box type %s, available types: %s' % (box_type, ', '.join(BOX_TYPES)))
+    if BOX_TYPES[box_type] is None:
+        return None, None
+    ratios, angles = (np.array(values, dtype=np.float64) for values in BOX_TYPES[box_type])
+    return ratios * (volume / box_volume(ratios, angles)) ** (1.0 / 3.0), angles
+
+
+def box_volume(box, angles):
+    """ Gives the volume of a box of the given lengths and angles (degrees) """
+    cos = np.cos(np.radians(angles))
+    return float(np.prod(box) * np.sqrt(1.0 - np.sum(cos ** 2) + 2.0 * np.prod(cos)))
+
+
+def box_vectors(box, angles):
+    """ Gives the box vectors (3, 3) of box lengths and angles, the first one along x and the second one in the xy plane, as in GROMACS """
+    a, b, c = box
+    cos_alpha, cos_beta, cos_gamma = np.cos(np.radians(angles))
+    sin_gamma = np.sin(np.radians(angles[2]))
+    cy = c * (cos_alpha - cos_beta * cos_gamma) / sin_gamma
+    vectors = np.array([[a, 0.0, 0.0], [b * cos_gamma, b * sin_gamma, 0.0], [c * cos_beta, cy, np.sqrt(max(c ** 2 - (c * cos_beta) ** 2 - cy ** 2, 0.0))]])
+    # values below the precision of the files are zero
+    vectors[np.abs(vectors) < 1e-6] = 0.0
+    return vectors
+
+
+def lattice_sites(n_sites, vectors):
+    """ Gives the centres (n_sites, 3) of the sites of a lattice filling the cell of the given vectors, consecutive sites being neighbours """
+    side = int(np.ceil(n_sites ** (1.0 / 3.0) - 1e-9))
+    i = np.arange(n_sites)
+    ix, iy, iz = i % side, (i // side) % side, i // (side * side)
+    # rows and layers are run back and forth
+    ix = np.where(iy % 2 == 1, side - 1 - ix, ix)
+    iy = np.where(iz % 2 == 1, side - 1 - iy, iy)
+    return ((np.stack([ix, iy, iz], axis=1) + 0.5) / side) @ vectors
+
+
+def build_system(n_atoms, density=DEFAULT_DENSITY, box_type='cubic', naming='gromacs', seed=0):
+    """ Builds a synthetic system of n_atoms: the chain, the water molecules, the sodium and the chloride ions, in this order """
+    if naming not in NAMINGS:
+        raise ValueError('Unknown naming %s, available namings: %s' % (naming, ', '.join(NAMINGS)))
+    n_residues, n_waters, n_na, n_cl = get_composition(n_atoms)
+    volume = n_atoms / density
+    box, angles = get_box(volume, box_type)
+    # systems without box fill a cube
+    vectors = np.eye(3) * volume ** (1.0 / 3.0) if box is None else box_vectors(box, angles)
+    sites = lattice_sites(n_residues + n_waters + n_na + n_cl, vectors)
+    # the chain takes the first sites, the solvent molecules are scattered on the others
+    rng = np.random.default_rng(seed)
+    solvent = n_residues + rng.permutation(len(sites) - n_residues)
+    centres = np.concatenate([sites[:n_residues], sites[solvent]])
+
+    water, water_names = NAMINGS[naming]['water']
+    sodium, sodium_name = NAMINGS[naming]['sodium']
+    chloride, chloride_name = NAMINGS[naming]['chloride']
+    molecules = [([a[0] for a in RESIDUE_ATOMS], [a[1] for a in RESIDUE_ATOMS], [a[2] for a in RESIDUE_ATOMS], n_residues),
+                 (water_names, [a[0] for a in WATER_ATOMS], [a[1] for a in WATER_ATOMS], n_waters),
+                 ([sodium_name], ['NA'], [(0.0, 0.0, 0.0)], n_na),
+                 ([chloride_name], ['CL'], [(0.0, 0.0, 0.0)], n_cl)]
+    names = np.concatenate([np.tile(atom_names, count) for atom_names, _, _, count in molecules])
+    elements = np.concatenate([np.tile(atom_elements, count) for _, atom_elements, _, count in molecules])
+    offsets = np.concatenate([np.tile(atom_offsets, (count, 1)) for _, _, atom_offsets, count in molecules])
+    sizes = np.repeat([len(atom_names) for atom_names, _, _, _ in molecules], [count for _, _, _, count in molecules])
+    resnames = np.concatenate([np.array(RESIDUE_NAMES)[np.arange(n_residues) % len(RESIDUE_NAMES)],
+                               np.repeat([water, sodium, chloride], [n_waters, n_na, n_cl])])
+    xyz = np.repeat(centres, sizes, axis=0) + offsets
+    return SyntheticSystem(names, np.repeat(resnames, sizes), np.repeat(np.arange(1, len(sizes) + 1), sizes), elements, xyz, box, angles)
+
+
+def get_topology(system):
+    """ Gives the topology of a synthetic system, as read by the native backend """
+    return Topology(system.names, system.resnames, system.resids, system.elements, get_masses(system.elements))
+
+
+def get_chunk_size(n_atoms):
+    """ Gives the number of single precision frames fitting in a chunk """
+    return max(1, CHUNK_BYTES // (max(1, n_atoms) * 3 * 4))
+
+
+def generate_frames(system, n_frames, time_step=1.0, amplitude=DEFAULT_AMPLITUDE, drift=0.0, seed=0, chunk_size=None):
+    """ Yields chunks of the frames of the trajectory of a synthetic system: single precision coordinates, time (ps) and box.
+
+    The drift is the velocity (Angstroms/ps, a single value along x or a vector) of the whole system.
+    """
+    chunk_size = chunk_size or get_chunk_size(len(system.xyz))
+    drift = np.broadcast_to(np.asarray(drift, dtype=np.float64), (3,)) if np.ndim(drift) else np.array([drift, 0.0, 0.0])
+    xyz = system.xyz.astype(np.float32)
+    for first in range(0, n_frames, chunk_size):
+        frames = np.arange(first, min(n_frames, first + chunk_size))
+        time = frames * time_step
+        chunk = np.empty((len(frames),) + xyz.shape, dtype=np.float32)
+        for i, frame in enumerate(frames):
+            noise = np.random.default_rng((seed, int(frame))).standard_normal(xyz.shape, dtype=np.float32)
+            np.multiply(noise, amplitude, out=chunk[i])
+            chunk[i] += xyz
+            chunk[i] += (drift * time[i]).astype(np.float32)
+        yield Chunk(chunk, time, None if system.box is None else np.tile(system.box, (len(frames), 1)))
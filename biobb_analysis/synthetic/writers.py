@@ -0,0 +1,484 @@
+""" Writers of synthetic systems for package biobb_analysis.synthetic
+
+Structures and topologies are written in blocks of lines and trajectories chunk by chunk (see
+:func:`biobb_analysis.synthetic.system.generate_frames`), so that files of any size are written with bounded memory.
+Every file can be read back by the native backend and by the cpptraj and GROMACS executables.
+
+XTC coordinates are written with the XTC compression of the GROMACS xdrfile library but without its runs of small
+differences between consecutive atoms: every atom is stored as a full triplet of integers, which any XTC reader
+decodes, in files about 30% larger than the ones written by GROMACS.
+"""
+import struct
+from pathlib import PurePath
+import numpy as np
+from biobb_analysis import __version__
+from biobb_analysis.native.dcd import AKMA_PS
+from biobb_analysis.native.edr import ENX_MAGIC, FRAME_MAGIC
+from biobb_analysis.native.netcdf import NC_DIMENSION, NC_VARIABLE, NC_ATTRIBUTE
+from biobb_analysis.native.topology import WATER_RESIDUES, ION_RESIDUES, select_gromacs, get_masses
+from biobb_analysis.native.trr import TRR_MAGIC
+from biobb_analysis.native.xtc import XTC_MAGIC, FIRSTIDX
+from biobb_analysis.synthetic.system import RESIDUE_ATOMS, WATER_ATOMS, DEFAULT_DENSITY, get_topology, generate_frames, box_vectors, box_volume
+
+# lines written at once
+BLOCK_LINES = 100000
+# atom indices per line of an index file
+NDX_COLUMNS = 15
+# default GROMACS groups written in index files
+NDX_GROUPS = ['System', 'Protein', 'Protein-H', 'C-alpha', 'Backbone', 'MainChain', 'SideChain', 'non-Protein',
+              'Water', 'SOL', 'non-Water', 'Ion', 'NA', 'CL', 'Water_and_ions']
+TITLE = 'Synthetic system generated by biobb_analysis'
+
+# Amber atom types of the atoms of the chain, the water molecules (by element) and the ions (by element)
+AMBER_TYPES = {'N': 'N', 'H': 'H', 'CA': 'CT', 'HA': 'H1', 'CB': 'CT', 'C': 'C', 'O': 'O'}
+AMBER_WATER_TYPES = {'O': 'OW', 'H': 'HW'}
+AMBER_ION_TYPES = {'NA': 'Na+', 'CL': 'Cl-'}
+ATOMIC_NUMBERS = {'H': 1, 'C': 6, 'N': 7, 'O': 8, 'NA': 11, 'CL': 17}
+# partial charges (e) of the TIP3P water atoms and of the ions, the chain being neutral
+CHARGES = {'O': -0.834, 'H': 0.417, 'NA': 1.0, 'CL': -1.0}
+# Amber charge unit
+AMBER_CHARGE = 18.2223
+# force constants (kcal/mol/A^2) and lengths (A) of the bonds with and without hydrogen
+BOND_TYPES = [(553.0, 1.0), (317.0, 1.5)]
+# number, values per line and format of the values of the Fortran formats of a parameter/topology file
+PRMTOP_FORMATS = {'10I8': (10, '%8d'), '5E16.8': (5, '%16.8E'), '20a4': (20, '%-4s'), '3I8': (3, '%8d'), '1a80': (1, '%-80s')}
+
+# mean and standard deviation of the synthetic energy terms, the energies being per atom, and their units
+EDR_TERMS = {
+    'Bond': (0.12, 0.002, 'kJ/mol'), 'Angle': (0.3, 0.003, 'kJ/mol'), 'Proper Dih.': (0.4, 0.002, 'kJ/mol'),
+    'LJ (SR)': (0.6, 0.004, 'kJ/mol'), 'Coulomb (SR)': (-6.0, 0.01, 'kJ/mol'), 'Potential': (-5.0, 0.012, 'kJ/mol'),
+    'Kinetic En.': (0.9, 0.005, 'kJ/mol'), 'Total Energy': (-4.1, 0.013, 'kJ/mol'), 'Conserved En.': (-4.1, 0.001, 'kJ/mol'),
+    'Temperature': (300.0, 1.5, 'K'), 'Pressure': (1.0, 150.0, 'bar'), 'Density': (1000.0, 2.0, 'kg/m^3')
+}
+DEFAULT_EDR_TERMS = ['Bond', 'Angle', 'Proper Dih.', 'LJ (SR)', 'Coulomb (SR)', 'Potential', 'Kinetic En.', 'Total Energy',
+                     'Conserved En.', 'Temperature', 'Pressure', 'Volume', 'Density', 'Box-X', 'Box-Y', 'Box-Z']
+# integration time step (ps) giving the step of the energy frames
+MD_TIME_STEP = 0.002
+
+# NetCDF types and absent list
+NC_CHAR, NC_FLOAT, NC_DOUBLE = 2, 5, 6
+NC_ABSENT = struct.pack('>II', 0, 0)
+# atoms per block of the compressed coordinates of a XTC frame, a multiple of 8 so that every block fills whole bytes
+XTC_BLOCK_ATOMS = 65536
+XTC_PRECISION = 1000.0
+
+
+def _write_lines(handle, n_lines, line):
+    """ Writes n_lines lines given by line(i), in blocks """
+    for first in range(0, n_lines, BLOCK_LINES):
+        handle.write(''.join(line(i) for i in range(first, min(n_lines, first + BLOCK_LINES))))
+
+
+def is_triclinic(system):
+    """ Checks if the box of a synthetic system has angles other than 90 degrees """
+    return system.box is not None and not np.allclose(system.angles, 90.0)
+
+
+def is_solvent(system):
+    """ Gives which atoms of a synthetic system are water or ions """
+    return np.isin(system.resnames, list(WATER_RESIDUES | ION_RESIDUES))
+
+
+def get_vectors(system, box=None):
+    """ Gives the box vectors (3, 3) in Angstroms of a synthetic system or of box lengths of a frame, zero if it has no box """
+    if system.box is None:
+        return np.zeros((3, 3))
+    return box_vectors(system.box if box is None else box, system.angles)
+
+
+def write_pdb(path, system, xyz=None):
+    """ Writes a synthetic system as a PDB file, atom and residue numbers wrapping at their field widths """
+    xyz = system.xyz if xyz is None else xyz
+    names = [n if len(n) == 4 else ' ' + n for n in system.names.tolist()]
+    resnames, resids, elements = system.resnames.tolist(), system.resids.tolist(), system.elements.tolist()
+    records = np.where(is_solvent(system), 'HETATM', 'ATOM').tolist()
+    with open(path, 'w') as pdb:
+        pdb.write('REMARK    %s\n' % TITLE)
+        if system.box is not None:
+            pdb.write('CRYST1%9.3f%9.3f%9.3f%7.2f%7.2f%7.2f P 1           1\n' % (tuple(system.box) + tuple(system.angles)))
+        _write_lines(pdb, len(names), lambda i: '%-6s%5d %-4s %-4s%1s%4d    %8.3f%8.3f%8.3f%6.2f%6.2f          %2s\n' % (
+            records[i], (i + 1) % 100000, names[i], resnames[i], 'A',
+            resids[i] % 10000, xyz[i, 0], xyz[i, 1], xyz[i, 2], 1.0, 0.0, elements[i]))
+        pdb.write('END\n')
+    return path
+
+
+def write_gro(path, system, xyz=None):
+    """ Writes a synthetic system as a GROMACS structure file, atom and residue numbers wrapping at their field widths """
+    xyz = (system.xyz if xyz is None else xyz) / 10.0
+    names, resnames, resids = system.names.tolist(), system.resnames.tolist(), system.resids.tolist()
+    with open(path, 'w') as gro:
+        gro.write('%s\n%5d\n' % (TITLE, len(names)))
+        _write_lines(gro, len(names), lambda i: '%5d%-5s%5s%5d%8.3f%8.3f%8.3f\n' % (
+            resids[i] % 100000, resnames[i], names[i], (i + 1) % 100000, xyz[i, 0], xyz[i, 1], xyz[i, 2]))
+        v = get_vectors(system) / 10.0
+        # diagonal, then the off-diagonal values of triclinic boxes
+        values = [v[0, 0], v[1, 1], v[2, 2]] + ([v[0, 1], v[0, 2], v[1, 0], v[1, 2], v[2, 0], v[2, 1]] if is_triclinic(system) else [])
+        gro.write(''.join('%10.5f' % value for value in values) + '\n')
+    return path
+
+
+def write_ndx(path, system, groups=None):
+    """ Writes the default GROMACS groups of a synthetic system as an index file """
+    top = get_topology(system)
+    with open(path, 'w') as ndx:
+        for group in groups or NDX_GROUPS:
+            atoms = (select_gromacs(top, group) + 1).tolist()
+            ndx.write('[ %s ]\n' % group)
+            _write_lines(ndx, (len(atoms) + NDX_COLUMNS - 1) // NDX_COLUMNS,
+                         lambda i: ' '.join('%4d' % a for a in atoms[i * NDX_COLUMNS:(i + 1) * NDX_COLUMNS]) + '\n')
+            ndx.write('\n')
+    return path
+
+
+def _prmtop_section(prmtop, flag, fmt, values):
+    """ Writes a section of a parameter/topology file """
+    per_line, spec = PRMTOP_FORMATS[fmt]
+    prmtop.write('%-80s\n%-80s\n' % ('%FLAG ' + flag, '%FORMAT(' + fmt + ')'))
+    values = list(values)
+    if not values:
+        prmtop.write('\n')
+        return
+    _write_lines(prmtop, (len(values) + per_line - 1) // per_line,
+                 lambda i: ''.join(spec % value for value in values[i * per_line:(i + 1) * per_line]) + '\n')
+
+
+def get_bonds(system):
+    """ Gives the bonds with hydrogen and without hydrogen (bonds, 2) of a synthetic system, 0-based atom indices """
+    chain = np.flatnonzero((system.names == RESIDUE_ATOMS[0][0]) & ~is_solvent(system))
+    water = np.flatnonzero(np.isin(system.resnames, list(WATER_RESIDUES)))[::len(WATER_ATOMS)]
+    position = {atom[0]: i for i, atom in enumerate(RESIDUE_ATOMS)}
+    pairs_h = [('N', 'H'), ('CA', 'HA')]
+    pairs = [('N', 'CA'), ('CA', 'CB'), ('CA', 'C'), ('C', 'O')]
+    with_h = [np.stack([chain + position[a], chain + position[b]], axis=1) for a, b in pairs_h]
+    with_h += [np.stack([water, water + 1], axis=1), np.stack([water, water + 2], axis=1)]
+    without_h = [np.stack([chain + position[a], chain + position[b]], axis=1) for a, b in pairs]
+    # peptide bonds
+    without_h.append(np.stack([chain[:-1] + position['C'], chain[1:] + position['N']], axis=1))
+    return np.concatenate(with_h), np.concatenate(without_h)
+
+
+def write_prmtop(path, system):
+    """ Writes a synthetic system as an Amber parameter/topology file with its atoms, residues, bonds and box; angles and dihedrals are left out """
+    n_atoms = len(system.names)
+    water = np.isin(system.resnames, list(WATER_RESIDUES))
+    chain = ~is_solvent(system)
+    types = np.where(chain, [AMBER_TYPES.get(n, 'CT') for n in system.names.tolist()],
+                     np.where(water, [AMBER_WATER_TYPES.get(e, 'HW') for e in system.elements.tolist()],
+                              [AMBER_ION_TYPES.get(e, e) for e in system.elements.tolist()]))
+    type_names, type_index = np.unique(types, return_inverse=True)
+    n_types = len(type_names)
+    charges = np.where(chain, 0.0, [CHARGES.get(e, 0.0) for e in system.elements.tolist()]) * AMBER_CHARGE
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(system.resids)) + 1])
+    bonds_h, bonds = get_bonds(system)
+    # the chain is a single molecule, every water molecule and ion another one
+    n_solute = int(chain.sum())
+    molecules = [n_solute] + np.diff(starts[np.searchsorted(starts, n_solute):].tolist() + [n_atoms]).tolist()
+    box_type = 0 if system.box is None else (2 if np.allclose(system.angles, 109.4712206) else 1)
+    pointers = [n_atoms, n_types, len(bonds_h), len(bonds), 0, 0, 0, 0, 0, 0, n_atoms, len(starts), len(bonds), 0, 0,
+                len(BOND_TYPES), 0, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0, box_type, int(np.diff(np.append(starts, n_atoms)).max()), 0, 0]
+    # index of the Lennard-Jones parameters of every pair of types
+    i, j = np.meshgrid(np.arange(1, n_types + 1), np.arange(1, n_types + 1), indexing='ij')
+    high, low = np.maximum(i, j), np.minimum(i, j)
+
+    with open(path, 'w') as prmtop:
+        prmtop.write('%-80s\n' % '%VERSION  VERSION_STAMP = V0001.000  DATE = 01/01/00  00:00:00')
+        _prmtop_section(prmtop, 'TITLE', '20a4', [TITLE[i:i + 4] for i in range(0, len(TITLE), 4)])
+        _prmtop_section(prmtop, 'POINTERS', '10I8', pointers)
+        _prmtop_section(prmtop, 'ATOM_NAME', '20a4', system.names.tolist())
+        _prmtop_section(prmtop, 'CHARGE', '5E16.8', charges.tolist())
+        _prmtop_section(prmtop, 'ATOMIC_NUMBER', '10I8', [ATOMIC_NUMBERS.get(e, 0) for e in system.elements.tolist()])
+        _prmtop_section(prmtop, 'MASS', '5E16.8', get_masses(system.elements).tolist())
+        _prmtop_section(prmtop, 'ATOM_TYPE_INDEX', '10I8', (type_index + 1).tolist())
+        _prmtop_section(prmtop, 'NUMBER_EXCLUDED_ATOMS', '10I8', [1] * n_atoms)
+        _prmtop_section(prmtop, 'NONBONDED_PARM_INDEX', '10I8', (high * (high - 1) // 2 + low).ravel().tolist())
+        _prmtop_section(prmtop, 'RESIDUE_LABEL', '20a4', system.resnames[starts].tolist())
+        _prmtop_section(prmtop, 'RESIDUE_POINTER', '10I8', (starts + 1).tolist())
+        _prmtop_section(prmtop, 'BOND_FORCE_CONSTANT', '5E16.8', [k for k, _ in BOND_TYPES])
+        _prmtop_section(prmtop, 'BOND_EQUIL_VALUE', '5E16.8', [r for _, r in BOND_TYPES])
+        for flag in ('ANGLE_FORCE_CONSTANT', 'ANGLE_EQUIL_VALUE', 'DIHEDRAL_FORCE_CONSTANT', 'DIHEDRAL_PERIODICITY', 'DIHEDRAL_PHASE',
+                     'SCEE_SCALE_FACTOR', 'SCNB_SCALE_FACTOR'):
+            _prmtop_section(prmtop, flag, '5E16.8', [])
+        _prmtop_section(prmtop, 'SOLTY', '5E16.8', [0.0])
+        _prmtop_section(prmtop, 'LENNARD_JONES_ACOEF', '5E16.8', [0.0] * (n_types * (n_types + 1) // 2))
+        _prmtop_section(prmtop, 'LENNARD_JONES_BCOEF', '5E16.8', [0.0] * (n_types * (n_types + 1) // 2))
+        # bonds as coordinate array indices (3 * atom index) and 1-based bond type
+        _prmtop_section(prmtop, 'BONDS_INC_HYDROGEN', '10I8', np.column_stack([bonds_h * 3, np.full(len(bonds_h), 1)]).ravel().tolist())
+        _prmtop_section(prmtop, 'BONDS_WITHOUT_HYDROGEN', '10I8', np.column_stack([bonds * 3, np.full(len(bonds), 2)]).ravel().tolist())
+        for flag in ('ANGLES_INC_HYDROGEN', 'ANGLES_WITHOUT_HYDROGEN', 'DIHEDRALS_INC_HYDROGEN', 'DIHEDRALS_WITHOUT_HYDROGEN'):
+            _prmtop_section(prmtop, flag, '10I8', [])
+        _prmtop_section(prmtop, 'EXCLUDED_ATOMS_LIST', '10I8', [0] * n_atoms)
+        for flag in ('HBOND_ACOEF', 'HBOND_BCOEF', 'HBCUT'):
+            _prmtop_section(prmtop, flag, '5E16.8', [])
+        _prmtop_section(prmtop, 'AMBER_ATOM_TYPE', '20a4', types.tolist())
+        _prmtop_section(prmtop, 'TREE_CHAIN_CLASSIFICATION', '20a4', ['BLA'] * n_atoms)
+        _prmtop_section(prmtop, 'JOIN_ARRAY', '10I8', [0] * n_atoms)
+        _prmtop_section(prmtop, 'IROTAT', '10I8', [0] * n_atoms)
+        if box_type:
+            # last solute residue, number of molecules and first solvent molecule
+            _prmtop_section(prmtop, 'SOLVENT_POINTERS', '3I8', [int(np.searchsorted(starts, n_solute)), len(molecules), 2])
+            _prmtop_section(prmtop, 'ATOMS_PER_MOLECULE', '10I8', molecules)
+            _prmtop_section(prmtop, 'BOX_DIMENSIONS', '5E16.8', [system.angles[1]] + list(system.box))
+        _prmtop_section(prmtop, 'RADIUS_SET', '1a80', ['modified Bondi radii (mbondi)'])
+    return path
+
+
+def _record(data):
+    """ Gives a Fortran unformatted record: the data between two markers holding its size """
+    marker = struct.pack('<i', len(data))
+    return marker + data + marker
+
+
+def write_dcd(path, system, chunks):
+    """ Writes the frames of a synthetic system as a little-endian CHARMM DCD file, with unit cell if it has a box; the frame count and time step are set at the end """
+    n_atoms = len(system.xyz)
+    icntrl = [0] * 20
+    icntrl[2], icntrl[10], icntrl[19] = 1, int(system.box is not None), 24
+    n_frames, time = 0, []
+    with open(path, 'wb') as dcd:
+        dcd.write(_record(b'CORD' + struct.pack('<20i', *icntrl)))
+        dcd.write(_record(struct.pack('<i', 1) + TITLE.ljust(80).encode()))
+        dcd.write(_record(struct.pack('<i', n_atoms)))
+        coordinate_marker = struct.pack('<i', 4 * n_atoms)
+        for chunk in chunks:
+            for frame, xyz in enumerate(chunk.xyz):
+                if chunk.box is not None:
+                    alpha, beta, gamma = system.angles
+                    box = chunk.box[frame]
+                    dcd.write(_record(np.array([box[0], gamma, box[1], beta, alpha, box[2]], dtype='<f8').tobytes()))
+                for axis in range(3):
+                    dcd.write(coordinate_marker + np.ascontiguousarray(xyz[:, axis], dtype='<f4').tobytes() + coordinate_marker)
+            n_frames += len(chunk.xyz)
+            time.extend(chunk.time[:2 - len(time)])
+        # number of frames and of steps, and time step in AKMA units
+        dcd.seek(4 + 4)
+        dcd.write(struct.pack('<i', n_frames))
+        dcd.seek(4 + 4 + 3 * 4)
+        dcd.write(struct.pack('<i', n_frames))
+        dcd.seek(4 + 4 + 9 * 4)
+        dcd.write(struct.pack('<f', (time[1] - time[0] if len(time) > 1 else 1.0) / AKMA_PS))
+    return path
+
+
+def _nc_name(name):
+    """ Gives a NetCDF name: its length and its padded bytes """
+    data = name.encode()
+    return struct.pack('>I', len(data)) + data + b'\0' * ((4 - len(data) % 4) % 4)
+
+
+def _nc_attributes(attributes):
+    """ Gives a NetCDF list of text attributes """
+    if not attributes:
+        return NC_ABSENT
+    data = struct.pack('>II', NC_ATTRIBUTE, len(attributes))
+    for name, value in attributes:
+        data += _nc_name(name) + struct.pack('>I', NC_CHAR) + _nc_name(value)
+    return data
+
+
+def _nc_header(dimensions, attributes, variables, offsets):
+    """ Gives the header of a 64-bit offset NetCDF file with no records yet; variables are (name, dimension ids, attributes, type, size) """
+    data = b'CDF\x02' + struct.pack('>I', 0)
+    data += struct.pack('>II', NC_DIMENSION, len(dimensions)) + b''.join(_nc_name(name) + struct.pack('>I', length) for name, length in dimensions)
+    data += _nc_attributes(attributes)
+    data += struct.pack('>II', NC_VARIABLE, len(variables))
+    for (name, ids, var_attributes, nc_type, size), offset in zip(variables, offsets):
+        data += _nc_name(name) + struct.pack('>I', len(ids)) + b''.join(struct.pack('>I', i) for i in ids)
+        data += _nc_attributes(var_attributes) + struct.pack('>IIQ', nc_type, size, offset)
+    return data
+
+
+def write_netcdf(path, system, chunks):
+    """ Writes the frames of a synthetic system as an AMBER NetCDF (64-bit offset) trajectory, with unit cell if it has a box; the frame count is set at the end """
+    n_atoms = len(system.xyz)
+    if n_atoms * 12 > 2 ** 32 - 4:
+        raise ValueError('Too many atoms for a 64-bit offset NetCDF file')
+    has_cell = system.box is not None
+    dimensions = [('frame', 0), ('spatial', 3), ('atom', n_atoms)] + ([('cell_spatial', 3), ('cell_angular', 3), ('label', 5)] if has_cell else [])
+    attributes = [('title', TITLE), ('application', 'AMBER'), ('program', 'biobb_analysis'), ('programVersion', __version__),
+                  ('Conventions', 'AMBER'), ('ConventionVersion', '1.0')]
+    # fixed variables and their data, then record variables
+    fixed = [(('spatial', [1], [], NC_CHAR, 4), b'xyz\0')]
+    if has_cell:
+        fixed += [(('cell_spatial', [3], [], NC_CHAR, 4), b'abc\0'), (('cell_angular', [4, 5], [], NC_CHAR, 16), b'alphabeta gamma\0')]
+    records = [('time', [0], [('units', 'picosecond')], NC_FLOAT, 4), ('coordinates', [0, 2, 1], [('units', 'angstrom')], NC_FLOAT, n_atoms * 12)]
+    if has_cell:
+        records += [('cell_lengths', [0, 3], [('units', 'angstrom')], NC_DOUBLE, 24), ('cell_angles', [0, 4], [('units', 'degree')], NC_DOUBLE, 24)]
+    variables = [variable for variable, _ in fixed] + records
+    # the offsets have a fixed size, so the header size is known before them
+    offset = len(_nc_header(dimensions, attributes, variables, [0] * len(variables)))
+    offsets = []
+    for _, _, _, _, size in [variable for variable, _ in fixed]:
+        offsets.append(offset)
+        offset += size
+    for _, _, _, _, size in records:
+        offsets.append(offset)
+        offset += size
+
+    n_frames = 0
+    with open(path, 'wb') as nc:
+        nc.write(_nc_header(dimensions, attributes, variables, offsets))
+        for _, data in fixed:
+            nc.write(data)
+        for chunk in chunks:
+            for frame, xyz in enumerate(chunk.xyz):
+                nc.write(struct.pack('>f', chunk.time[frame]) + np.asarray(xyz, dtype='>f4').tobytes())
+                if has_cell:
+                    nc.write(np.asarray(chunk.box[frame], dtype='>f8').tobytes() + np.asarray(system.angles, dtype='>f8').tobytes())
+            n_frames += len(chunk.xyz)
+        nc.seek(4)
+        nc.write(struct.pack('>I', n_frames))
+    return path
+
+
+def write_trr(path, system, chunks):
+    """ Writes the frames of a synthetic system as a single precision GROMACS TRR file with coordinates, and box if it has one """
+    n_atoms = len(system.xyz)
+    version = b'GMX_trn_file'
+    box_size = 0 if system.box is None else 9 * 4
+    with open(path, 'wb') as trr:
+        step = 0
+        for chunk in chunks:
+            for frame, xyz in enumerate(chunk.xyz):
+                trr.write(struct.pack('>iii', TRR_MAGIC, len(version) + 1, len(version)) + version)
+                trr.write(struct.pack('>13i', 0, 0, box_size, 0, 0, 0, 0, n_atoms * 3 * 4, 0, 0, n_atoms, step, 0))
+                trr.write(struct.pack('>ff', chunk.time[frame], 0.0))
+                if box_size:
+                    trr.write((get_vectors(system, chunk.box[frame]) / 10.0).astype('>f4').tobytes())
+                trr.write((xyz / np.float32(10.0)).astype('>f4').tobytes())
+                step += 1
+    return path
+
+
+def _xtc_coordinates(xyz, precision):
+    """ Gives the compressed coordinates (nm) of a XTC frame: minimum and maximum integers, smallidx and the bytes of the packed integers """
+    scaled = xyz.astype(np.float64) * precision
+    ints = np.trunc(scaled + np.copysign(0.5, scaled)).astype(np.int64)
+    if np.abs(ints).max() > 2 ** 31 - 3:
+        raise ValueError('Coordinates too large to be written in a XTC file with precision %g' % precision)
+    minint, maxint = ints.min(axis=0), ints.max(axis=0)
+    sizes = [int(s) for s in maxint - minint + 1]
+    if max(sizes) > 0xffffff:
+        widths = [s.bit_length() for s in sizes]
+        n_bits = sum(widths)
+    else:
+        n_bits = (sizes[0] * sizes[1] * sizes[2]).bit_length()
+    # every atom is the packed integers followed by a 0 bit: no run of small differences follows it
+    width = n_bits + 1
+    if width > 64:
+        raise ValueError('Coordinates range too large to be written in a XTC file with precision %g' % precision)
+
+    shifts = np.arange(width - 1, -1, -1, dtype=np.uint64)
+    blocks = []
+    for first in range(0, len(ints), XTC_BLOCK_ATOMS):
+        values = (ints[first:first + XTC_BLOCK_ATOMS] - minint).astype(np.uint64)
+        if max(sizes) > 0xffffff:
+            packed = (values[:, 0] << np.uint64(widths[1] + widths[2])) | (values[:, 1] << np.uint64(widths[2])) | values[:, 2]
+        else:
+            number = (values[:, 0] * np.uint64(sizes[1]) + values[:, 1]) * np.uint64(sizes[2]) + values[:, 2]
+            # the mixed radix number is stored as its little-endian bytes, the last one holding the remaining 1 to 8 bits
+            full, rest = divmod(n_bits, 8)
+            if not rest:
+                full, rest = full - 1, 8
+            packed = np.zeros(len(number), dtype=np.uint64)
+            for byte in range(full):
+                packed = (packed << np.uint64(8)) | ((number >> np.uint64(8 * byte)) & np.uint64(0xff))
+            packed = (packed << np.uint64(rest)) | (number >> np.uint64(8 * full))
+        codes = packed << np.uint64(1)
+        bits = ((codes[:, None] >> shifts) & np.uint64(1)).astype(np.uint8)
+        blocks.append(np.packbits(bits.ravel()).tobytes())
+    return minint, maxint, FIRSTIDX, b''.join(blocks)
+
+
+def write_xtc(path, system, chunks, precision=XTC_PRECISION):
+    """ Writes the frames of a synthetic system as a GROMACS XTC file, with box if it has one """
+    n_atoms = len(system.xyz)
+    with open(path, 'wb') as xtc:
+        step = 0
+        for chunk in chunks:
+            for frame, xyz in enumerate(chunk.xyz):
+                box = get_vectors(system, None if chunk.box is None else chunk.box[frame]) / 10.0
+                xtc.write(struct.pack('>iiif', XTC_MAGIC, n_atoms, step, chunk.time[frame]) + box.astype('>f4').tobytes())
+                xtc.write(struct.pack('>i', n_atoms))
+                if n_atoms <= 9:
+                    xtc.write((xyz / np.float32(10.0)).astype('>f4').tobytes())
+                else:
+                    minint, maxint, smallidx, data = _xtc_coordinates(xyz / np.float32(10.0), precision)
+                    xtc.write(struct.pack('>f3i3iii', precision, *minint.tolist(), *maxint.tolist(), smallidx, len(data)))
+                    xtc.write(data + b'\0' * ((4 - len(data) % 4) % 4))
+                step += 1
+    return path
+
+
+def get_edr_terms(terms=None):
+    """ Gives the names and units of the given energy terms, the default ones if None """
+    units = {'Volume': 'nm^3', 'Box-X': 'nm', 'Box-Y': 'nm', 'Box-Z': 'nm'}
+    return [(term, EDR_TERMS[term][2] if term in EDR_TERMS else units.get(term, 'kJ/mol')) for term in (terms or DEFAULT_EDR_TERMS)]
+
+
+def _edr_string(value):
+    """ Gives a xdr string """
+    data = value.encode()
+    return struct.pack('>i', len(data)) + data + b'\0' * ((4 - len(data) % 4) % 4)
+
+
+def write_edr(path, system, n_frames, terms=None, time_step=1.0, drift=0.0, seed=0):
+    """ Writes a single precision GROMACS energy file (version 5) of n_frames with the given energy terms of a synthetic system.
+
+    The energies are fluctuations around values proportional to the number of atoms, the total energy drifting by
+    drift kJ/mol/ps; the volume and box terms are the ones of the box of the system. Unknown terms fluctuate around 0.
+    """
+    terms = get_edr_terms(terms)
+    n_atoms = len(system.xyz)
+    volume = box_volume(system.box, system.angles) if system.box is not None else n_atoms / DEFAULT_DENSITY
+    box = system.box if system.box is not None else np.zeros(3)
+    means, deviations = [], []
+    for name, _ in terms:
+        if name == 'Volume':
+            mean, deviation = volume / 1000.0, 0.001 * volume / 1000.0
+        elif name.startswith('Box-') and name[-1] in 'XYZ':
+            mean, deviation = box['XYZ'.index(name[-1])] / 10.0, 0.0003 * box['XYZ'.index(name[-1])] / 10.0
+        elif name in EDR_TERMS:
+            mean, deviation, _ = EDR_TERMS[name]
+            if EDR_TERMS[name][2] == 'kJ/mol':
+                mean, deviation = mean * n_atoms, deviation * n_atoms
+        else:
+            mean, deviation = 0.0, 100.0
+        means.append(mean)
+        deviations.append(deviation)
+    means, deviations = np.array(means), np.array(deviations)
+    drifting = np.array([name == 'Total Energy' for name, _ in terms])
+    steps_per_frame = max(1, int(round(time_step / MD_TIME_STEP)))
+
+    with open(path, 'wb') as edr:
+        edr.write(struct.pack('>iii', ENX_MAGIC, 5, len(terms)))
+        edr.write(b''.join(_edr_string(name) + _edr_string(unit) for name, unit in terms))
+        for frame in range(n_frames):
+            time = frame * time_step
+            values = means + deviations * np.random.default_rng((seed, frame)).standard_normal(len(terms)) + drifting * drift * time
+            # first real, magic and version, time, step, nsum, nsteps and dt, nre, ndisre and nblock, e_size and two reserved ints
+            edr.write(struct.pack('>fii', -2e10, FRAME_MAGIC, 5) + struct.pack('>dqiqd', time, frame * steps_per_frame, 0, 0, MD_TIME_STEP))
+            edr.write(struct.pack('>iiiiii', len(terms), 0, 0, len(terms) * 4 * 4, 0, 0))
+            edr.write(values.astype('>f4').tobytes())
+    return path
+
+
+STRUCTURE_WRITERS = {'pdb': write_pdb, 'gro': write_gro, 'prmtop': write_prmtop, 'top': write_prmtop, 'parmtop': write_prmtop}
+TRAJECTORY_WRITERS = {'dcd': write_dcd, 'trr': write_trr, 'xtc': write_xtc, 'nc': write_netcdf, 'netcdf': write_netcdf, 'ncdf': write_netcdf, 'cdf': write_netcdf}
+
+
+def write_structure(path, system):
+    """ Writes a synthetic system as a structure or topology file of the format given by its extension """
+    ext = PurePath(path).suffix[1:].lower()
+    if ext not in STRUCTURE_WRITERS:
+        raise ValueError('Format %s can not be written for synthetic systems' % ext)
+    return STRUCTURE_WRITERS[ext](path, system)
+
+
+def write_trajectory(path, system, n_frames, time_step=1.0, amplitude=None, drift=0.0, seed=0):
+    """ Generates and writes n_frames of the trajectory of a synthetic system in the format given by the extension of path """
+    ext = PurePath(path).suffix[1:].lower()
+    if ext not in TRAJECTORY_WRITERS:
+        raise ValueError('Format %s can not be written for synthetic trajectories' % ext)
+    options = {} if amplitude is None else {'amplitude': amplitude}
+    return TRAJECTORY_WRITERS[ext](path, system, generate_frames(system, n_frames, time_step=time_step, drift=drift, seed=seed, **options))
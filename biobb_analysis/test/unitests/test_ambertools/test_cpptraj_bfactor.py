@@ -1,5 +1,9 @@
 from biobb_common.tools import test_fixtures as fx
 from biobb_analysis.ambertools.cpptraj_bfactor import cpptraj_bfactor
+import numpy as np
+
+# B-factor difference (Å²) allowed between the native backend and cpptraj, which writes 4 decimals
+NATIVE_TOLERANCE = 1e-2
 
 
 class TestCpptrajBfactorFirst():
@@ -40,3 +44,34 @@ class TestCpptrajBfactorExperimental():
         cpptraj_bfactor(properties=self.properties, **self.paths)
         assert fx.not_empty(self.paths['output_cpptraj_path'])
         assert fx.equal(self.paths['output_cpptraj_path'], self.paths['ref_output_cpptraj_path'])
+
+class TestCpptrajBfactorFirstNative():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_bfactor_first_native')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_bfactor_first_native(self):
+        cpptraj_bfactor(properties=self.properties, **self.paths)
+        assert fx.not_empty(self.paths['output_cpptraj_path'])
+        assert fx.equal(self.paths['output_cpptraj_path'], self.paths['ref_output_cpptraj_path'])
+
+class TestCpptrajBfactorNativeCpptraj():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_bfactor_native_cpptraj')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_bfactor_native_cpptraj(self):
+        # the moments merged from the chunks of the native workers against a single cpptraj pass, on the same inputs
+        properties = {k: v for k, v in self.properties.items() if k not in ('backend', 'n_workers')}
+        for reference in ('first', 'average'):
+            cpptraj_bfactor(properties=dict(self.properties, reference=reference), **self.paths)
+            cpptraj_bfactor(properties=dict(properties, reference=reference), **dict(self.paths, output_cpptraj_path='cpptraj.dat'))
+            native, cpptraj = np.loadtxt(self.paths['output_cpptraj_path']), np.loadtxt('cpptraj.dat')
+            assert native.shape == cpptraj.shape
+            assert np.allclose(native, cpptraj, rtol=0, atol=NATIVE_TOLERANCE)
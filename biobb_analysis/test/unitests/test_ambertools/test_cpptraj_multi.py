@@ -0,0 +1,24 @@
+from biobb_common.tools import test_fixtures as fx
+from biobb_analysis.ambertools.cpptraj_multi import cpptraj_multi
+
+
+class TestCpptrajMulti():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_multi')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_multi(self):
+        cpptraj_multi(properties=self.properties, **self.paths)
+        # a single pass gives the outputs of the single analysis blocks
+        for analysis in self.properties['analyses']:
+            assert fx.not_empty(analysis['output'])
+            if analysis['type'] == 'rgyr':
+                ref_output_path = self.paths['ref_output_rgyr_path']
+            else:
+                ref_output_path = self.paths['ref_output_%s_%s_path' % (analysis['type'], analysis['reference'])]
+            # rms and radgyr data sets are named after their position in the cpptraj session
+            ignore_list = [0] if analysis['type'] in ('rms', 'rgyr') else None
+            assert fx.equal(analysis['output'], ref_output_path, ignore_list=ignore_list)
@@ -14,3 +14,29 @@ class TestCpptrajRgyr():
         cpptraj_rgyr(properties=self.properties, **self.paths)
         assert fx.not_empty(self.paths['output_cpptraj_path'])
         assert fx.equal(self.paths['output_cpptraj_path'], self.paths['ref_output_cpptraj_path'])
+
+class TestCpptrajRgyrNative():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_rgyr_native')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rgyr_native(self):
+        cpptraj_rgyr(properties=self.properties, **self.paths)
+        assert fx.not_empty(self.paths['output_cpptraj_path'])
+        assert fx.equal(self.paths['output_cpptraj_path'], self.paths['ref_output_cpptraj_path'])
+
+class TestCpptrajRgyrWorkers():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_rgyr_workers')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rgyr_workers(self):
+        cpptraj_rgyr(properties=self.properties, **self.paths)
+        assert fx.not_empty(self.paths['output_cpptraj_path'])
+        assert fx.equal(self.paths['output_cpptraj_path'], self.paths['ref_output_cpptraj_path'])
@@ -1,5 +1,19 @@
+import json
+import os
+import sys
+from pathlib import Path
+import numpy as np
+import pytest
 from biobb_common.tools import test_fixtures as fx
-from biobb_analysis.ambertools.cpptraj_rms import cpptraj_rms
+from biobb_analysis.ambertools.cpptraj_rms import cpptraj_rms, main
+from biobb_analysis.native.columnar import read_columnar
+from biobb_analysis.native.index import build_frame_index, trim_trajectory
+
+# RMSd difference (Å) allowed between an analysis of a set up trajectory read from the structure cache, stored in
+# single precision, and the same analysis without cache: the coordinates are rounded to about 1e-5 Å
+STRUCTURE_CACHE_TOLERANCE = 1e-3
+# RMSd difference (Å) allowed between the native backend and cpptraj, which writes 4 decimals
+NATIVE_TOLERANCE = 1e-3
 
 
 class TestCpptrajRmsFirst():
@@ -15,6 +29,34 @@ class TestCpptrajRmsFirst():
         assert fx.not_empty(self.paths['output_cpptraj_path'])
         assert fx.equal(self.paths['output_cpptraj_path'], self.paths['ref_output_cpptraj_path'])
 
+class TestCpptrajRmsFirstWorkers():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_rms_first_workers')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_first_workers(self):
+        cpptraj_rms(properties=self.properties, **self.paths)
+        assert fx.not_empty(self.paths['output_cpptraj_path'])
+        assert fx.equal(self.paths['output_cpptraj_path'], self.paths['ref_output_cpptraj_path'])
+
+class TestCpptrajRmsFirstWarm():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_rms_first_warm')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_first_warm(self):
+        # twice, the second run reuses the warm cpptraj process
+        for _ in range(2):
+            cpptraj_rms(properties=self.properties, **self.paths)
+            assert fx.not_empty(self.paths['output_cpptraj_path'])
+            assert fx.equal(self.paths['output_cpptraj_path'], self.paths['ref_output_cpptraj_path'])
+
 class TestCpptrajRmsAverage():
     def setup_class(self):
         fx.test_setup(self,'cpptraj_rms_average')
@@ -40,3 +82,294 @@ class TestCpptrajRmsExperimental():
         cpptraj_rms(properties=self.properties, **self.paths)
         assert fx.not_empty(self.paths['output_cpptraj_path'])
         assert fx.equal(self.paths['output_cpptraj_path'], self.paths['ref_output_cpptraj_path'])
+
+class TestCpptrajRmsFirstNative():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_rms_first_native')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_first_native(self):
+        cpptraj_rms(properties=self.properties, **self.paths)
+        assert fx.not_empty(self.paths['output_cpptraj_path'])
+        assert fx.equal(self.paths['output_cpptraj_path'], self.paths['ref_output_cpptraj_path'])
+
+class TestCpptrajRmsFirstNativeParquet():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_rms_first_native_parquet')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_first_native_parquet(self):
+        pytest.importorskip('pyarrow')
+        cpptraj_rms(properties=self.properties, **self.paths)
+        assert fx.not_empty(self.paths['output_cpptraj_path'])
+        data = read_columnar(self.paths['output_cpptraj_path'])
+        assert data.names == ['Frame', 'RMSD_00002']
+        assert data.metadata['units'] == ['', 'Å']
+        # written from the RMSD values, not rounded as in the dat output
+        assert np.allclose(data.values, np.loadtxt(self.paths['ref_output_cpptraj_path']), rtol=0, atol=5e-5)
+
+class TestCpptrajRmsFirstNativeDcd():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_rms_first_native_dcd')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_first_native_dcd(self):
+        cpptraj_rms(properties=self.properties, **self.paths)
+        assert fx.not_empty(self.paths['output_cpptraj_path'])
+        assert fx.equal(self.paths['output_cpptraj_path'], self.paths['ref_output_cpptraj_path'])
+
+class TestCpptrajRmsFirstNativeNetcdf():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_rms_first_native_netcdf')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_first_native_netcdf(self):
+        cpptraj_rms(properties=self.properties, **self.paths)
+        assert fx.not_empty(self.paths['output_cpptraj_path'])
+        assert fx.equal(self.paths['output_cpptraj_path'], self.paths['ref_output_cpptraj_path'])
+
+class TestCpptrajRmsFirstNativeBatch():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_rms_first_native_batch')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_first_native_batch(self):
+        assert cpptraj_rms(properties=self.properties, **self.paths) == 0
+        with open('output.manifest.json') as manifest:
+            runs = json.load(manifest)['runs']
+        assert len(runs) == 2
+        for run in runs:
+            assert fx.not_empty(run['outputs']['output_cpptraj_path'])
+            assert fx.equal(run['outputs']['output_cpptraj_path'], self.paths['ref_output_cpptraj_path'])
+
+    def test_rms_first_native_batch_cli(self, monkeypatch):
+        config = json.dumps({k: v for k, v in self.properties.items() if k in ('start', 'end', 'steps', 'mask', 'reference', 'backend', 'batch_workers')})
+        monkeypatch.setattr(sys, 'argv', ['cpptraj_rms', '--config', config, '--input_top_path', self.paths['input_top_path'],
+                                          '--input_traj_glob', self.paths['input_traj_path'], '--output_cpptraj_path', 'cli.dat'])
+        main()
+        with open('cli.manifest.json') as manifest:
+            runs = json.load(manifest)['runs']
+        assert sorted(Path(run['input']).name for run in runs) == ['cpptraj.ca.dcd', 'cpptraj.ca.netcdf']
+        for run in runs:
+            assert fx.equal(run['outputs']['output_cpptraj_path'], self.paths['ref_output_cpptraj_path'])
+
+# stand-in of cpptraj -i: writes the out file of the rms command after a while, so that the runs overlap
+FAKE_CPPTRAJ = """#!/bin/sh
+out=$(sed -n 's/^rms .* out \\([^ ]*\\).*/\\1/p' "$2")
+sleep 1
+printf '#Frame     RMSD_00002\\n       1       0.0000\\n' > "$out"
+"""
+
+class TestCpptrajRmsFirstBatch():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_rms_first_batch')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_first_batch(self):
+        with open('fake_cpptraj.sh', 'w') as fake:
+            fake.write(FAKE_CPPTRAJ)
+        os.chmod('fake_cpptraj.sh', 0o755)
+        self.properties['binary_path'] = os.path.abspath('fake_cpptraj.sh')
+        assert cpptraj_rms(properties=self.properties, **self.paths) == 0
+        with open('output.manifest.json') as manifest:
+            runs = json.load(manifest)['runs']
+        # the inputs share their stem, the runs are named after their index
+        names = [Path(run['outputs']['output_cpptraj_path']).stem[len('output.'):] for run in runs]
+        assert len(runs) == 3
+        for name, run in zip(names, runs):
+            assert run['return_code'] == 0
+            assert fx.not_empty(run['outputs']['output_cpptraj_path'])
+            # the runs overlap, every one accounted its own cpptraj process only
+            assert run['child_usage']['processes'] == 1
+            # and logged to its own log file, naming its own input only
+            logs = list(Path('.').glob(name + '_*log*.out'))
+            assert len(logs) == 1
+            log = logs[0].read_text()
+            assert run['input'] in log
+            assert not any(other['input'] in log for other in runs if other is not run)
+        # and written to the Prometheus file, by prefix
+        prometheus = Path(self.properties['prometheus_path']).read_text()
+        assert all('biobb_child_processes{block="CpptrajRms",step="%s",prefix="%s"} 1' % (self.properties['step'], name) in prometheus for name in names)
+        # the topology was copied once, by the batch, and hard-linked by the runs
+        log = '\n'.join(path.read_text() for path in Path('.').glob('*_log*.out'))
+        assert log.count('Copy: ') == 0 and log.count('Hard-link: ') == 6
+
+class TestCpptrajRmsAverageNative():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_rms_average_native')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_average_native(self):
+        cpptraj_rms(properties=self.properties, **self.paths)
+        assert fx.not_empty(self.paths['output_cpptraj_path'])
+        assert fx.equal(self.paths['output_cpptraj_path'], self.paths['ref_output_cpptraj_path'])
+
+class TestCpptrajRmsFirstNativeNorotate():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_rms_first_native_norotate')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_first_native_norotate(self):
+        cpptraj_rms(properties=self.properties, **self.paths)
+        assert fx.not_empty(self.paths['output_cpptraj_path'])
+        assert fx.equal(self.paths['output_cpptraj_path'], self.paths['ref_output_cpptraj_path'])
+        # norotate does not rotate the frames, the RMSd written is still the best-fit one
+        properties = {k: v for k, v in self.properties.items() if k != 'norotate'}
+        cpptraj_rms(properties=properties, **dict(self.paths, output_cpptraj_path='fit.dat'))
+        assert fx.equal(self.paths['output_cpptraj_path'], 'fit.dat')
+
+class TestCpptrajRmsNativeCpptraj():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_rms_native_cpptraj')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_native_cpptraj(self):
+        # the native backend against the cpptraj executable, on the same inputs
+        properties = {k: v for k, v in self.properties.items() if k != 'backend'}
+        for reference, flags in (('first', {}), ('average', {}), ('experimental', {}), ('first', {'nofit': True}), ('first', {'norotate': True})):
+            cpptraj_rms(properties=dict(self.properties, reference=reference, **flags), **self.paths)
+            cpptraj_rms(properties=dict(properties, reference=reference, **flags), **dict(self.paths, output_cpptraj_path='cpptraj.dat'))
+            native, cpptraj = np.loadtxt(self.paths['output_cpptraj_path']), np.loadtxt('cpptraj.dat')
+            assert native.shape == cpptraj.shape
+            assert np.allclose(native, cpptraj, rtol=0, atol=NATIVE_TOLERANCE)
+
+class TestCpptrajRmsNativeIncrementalCpptraj():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_rms_native_incremental_cpptraj')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_native_incremental_cpptraj(self):
+        # the trajectory split in two segments, appended by two incremental launches
+        index = build_frame_index(self.paths['input_traj_path'])
+        half = len(index.time) // 2
+        for segment, (first, stop) in enumerate(((0, half), (half, len(index.time)))):
+            segment_path = str(Path('segment.%d.dcd' % segment).resolve())
+            trim_trajectory(self.paths['input_traj_path'], first, stop, segment_path, index)
+            cpptraj_rms(properties=self.properties, **dict(self.paths, input_traj_path=segment_path))
+            assert len(np.loadtxt(self.paths['output_cpptraj_path'])) == stop
+        # against a single cpptraj pass over the whole trajectory
+        properties = {k: v for k, v in self.properties.items() if k not in ('backend', 'incremental')}
+        cpptraj_rms(properties=properties, **dict(self.paths, output_cpptraj_path='cpptraj.dat'))
+        native, cpptraj = np.loadtxt(self.paths['output_cpptraj_path']), np.loadtxt('cpptraj.dat')
+        assert native.shape == cpptraj.shape
+        assert np.allclose(native, cpptraj, rtol=0, atol=NATIVE_TOLERANCE)
+
+class TestCpptrajRmsExperimentalNative():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_rms_experimental_native')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_experimental_native(self):
+        cpptraj_rms(properties=self.properties, **self.paths)
+        assert fx.not_empty(self.paths['output_cpptraj_path'])
+        assert fx.equal(self.paths['output_cpptraj_path'], self.paths['ref_output_cpptraj_path'])
+
+class TestCpptrajRmsFirstNativeCache():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_rms_first_native_cache')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_first_native_cache(self):
+        cpptraj_rms(properties=self.properties, **self.paths)
+        Path(self.paths['output_cpptraj_path']).unlink()
+        # second run: outputs restored from the result cache
+        cpptraj_rms(properties=self.properties, **self.paths)
+        assert len(list(Path(self.properties['cache_path']).joinpath('results').iterdir())) == 1
+        assert fx.not_empty(self.paths['output_cpptraj_path'])
+        assert fx.equal(self.paths['output_cpptraj_path'], self.paths['ref_output_cpptraj_path'])
+
+class TestCpptrajRmsFirstNativeProfile():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_rms_first_native_profile')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_first_native_profile(self):
+        # twice, a record appended by every launch
+        for _ in range(2):
+            cpptraj_rms(properties=self.properties, **self.paths)
+        assert fx.equal(self.paths['output_cpptraj_path'], self.paths['ref_output_cpptraj_path'])
+        with open(self.properties['profile_path']) as profile:
+            records = [json.loads(line) for line in profile]
+        assert len(records) == 2
+        for record in records:
+            assert record['block'] == 'CpptrajRms' and record['return_code'] == 0
+            assert [phase['name'] for phase in record['phases']] == ['check_data_params', 'check_restart', 'compute_native']
+            assert record['wall_time'] >= sum(phase['duration'] for phase in record['phases'])
+            # the native backend runs no child process
+            assert record['children']['processes'] == 0
+
+class TestCpptrajRmsFirstStructureCache():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_rms_first_structure_cache')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_first_structure_cache(self):
+        cpptraj_rms(properties=self.properties, **self.paths)
+        assert fx.equal(self.paths['output_cpptraj_path'], self.paths['ref_output_cpptraj_path'])
+        structures = Path(self.properties['cache_path']).joinpath('structures')
+        assert len([entry for entry in structures.iterdir() if not entry.name.startswith('.')]) == 1
+        # second run: set up trajectory read from the structure cache, stored in single precision
+        cpptraj_rms(properties=self.properties, **self.paths)
+        assert len([entry for entry in structures.iterdir() if not entry.name.startswith('.')]) == 1
+        assert np.allclose(np.loadtxt(self.paths['output_cpptraj_path']), np.loadtxt(self.paths['ref_output_cpptraj_path']), rtol=0, atol=STRUCTURE_CACHE_TOLERANCE)
+        # another mask, compared to the same analysis without cache
+        properties = {k: v for k, v in self.properties.items() if k != 'cache_path'}
+        cpptraj_rms(properties=dict(properties, mask='backbone'), **dict(self.paths, output_cpptraj_path='uncached.dat'))
+        cpptraj_rms(properties=dict(self.properties, mask='backbone'), **self.paths)
+        assert len([entry for entry in structures.iterdir() if not entry.name.startswith('.')]) == 1
+        assert np.allclose(np.loadtxt(self.paths['output_cpptraj_path']), np.loadtxt('uncached.dat'), rtol=0, atol=STRUCTURE_CACHE_TOLERANCE)
+
+class TestCpptrajRmsFirstLink():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_rms_first_link')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_first_link(self):
+        cpptraj_rms(properties=self.properties, **self.paths)
+        assert fx.not_empty(self.paths['output_cpptraj_path'])
+        assert fx.equal(self.paths['output_cpptraj_path'], self.paths['ref_output_cpptraj_path'])
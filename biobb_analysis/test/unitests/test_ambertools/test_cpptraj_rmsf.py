@@ -1,5 +1,9 @@
 from biobb_common.tools import test_fixtures as fx
 from biobb_analysis.ambertools.cpptraj_rmsf import cpptraj_rmsf
+import numpy as np
+
+# fluctuation difference (Å) allowed between the native backend and cpptraj, which writes 4 decimals
+NATIVE_TOLERANCE = 1e-3
 
 
 class TestCpptrajRmsfFirst():
@@ -41,3 +45,33 @@ class TestCpptrajRmsfExperimental():
         assert fx.not_empty(self.paths['output_cpptraj_path'])
         assert fx.equal(self.paths['output_cpptraj_path'], self.paths['ref_output_cpptraj_path'])
 
+class TestCpptrajRmsfFirstNative():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_rmsf_first_native')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rmsf_first_native(self):
+        cpptraj_rmsf(properties=self.properties, **self.paths)
+        assert fx.not_empty(self.paths['output_cpptraj_path'])
+        assert fx.equal(self.paths['output_cpptraj_path'], self.paths['ref_output_cpptraj_path'])
+
+class TestCpptrajRmsfNativeCpptraj():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_rmsf_native_cpptraj')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rmsf_native_cpptraj(self):
+        # the moments merged from the chunks of the native workers against a single cpptraj pass, on the same inputs
+        properties = {k: v for k, v in self.properties.items() if k not in ('backend', 'n_workers')}
+        for reference in ('first', 'average'):
+            cpptraj_rmsf(properties=dict(self.properties, reference=reference), **self.paths)
+            cpptraj_rmsf(properties=dict(properties, reference=reference), **dict(self.paths, output_cpptraj_path='cpptraj.dat'))
+            native, cpptraj = np.loadtxt(self.paths['output_cpptraj_path']), np.loadtxt('cpptraj.dat')
+            assert native.shape == cpptraj.shape
+            assert np.allclose(native, cpptraj, rtol=0, atol=NATIVE_TOLERANCE)
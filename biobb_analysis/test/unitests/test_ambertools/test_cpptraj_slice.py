@@ -1,5 +1,11 @@
+from pathlib import Path
+import numpy as np
 from biobb_common.tools import test_fixtures as fx
-from biobb_analysis.ambertools.cpptraj_slice import cpptraj_slice
+from biobb_analysis.ambertools.common import trim_traj_path, release_traj_path
+from biobb_analysis.ambertools.cpptraj_slice import cpptraj_slice, CpptrajSlice
+from biobb_analysis.native.index import get_index_path
+from biobb_analysis.native.topology import load_topology
+from biobb_analysis.native.trajectory import read_trajectory
 
 
 class TestCpptrajSlice():
@@ -14,3 +20,34 @@ class TestCpptrajSlice():
         cpptraj_slice(properties=self.properties, **self.paths)
         assert fx.not_empty(self.paths['output_cpptraj_path'])
         assert fx.equal(self.paths['output_cpptraj_path'], self.paths['ref_output_cpptraj_path'])
+
+class TestCpptrajSliceFrameIndex():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_slice_frame_index')
+        self.trajectories = [self.paths['input_traj_path'], str(Path(self.paths['input_traj_path']).with_suffix('.netcdf'))]
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        for path in self.trajectories:
+            try:
+                Path(get_index_path(path)).unlink()
+            except FileNotFoundError:
+                pass
+
+    def test_slice_frame_index(self):
+        for path in self.trajectories:
+            block = CpptrajSlice(properties=self.properties, **dict(self.paths, input_traj_path=path))
+            block.check_data_params(block.out_log, block.err_log)
+            trim_traj_path(block, block.out_log)
+            trim_path = block.io_dict["in"]["input_traj_path"]
+            assert trim_path != path and Path(trim_path).suffix == Path(path).suffix
+            # the selected frames are renumbered
+            assert (block.in_parameters['start'], block.in_parameters['end']) == (1, -1)
+            n_atoms = len(load_topology(self.paths['input_top_path'])[0].names)
+            trimmed, frames = next(read_trajectory(trim_path, n_atoms, None)), next(read_trajectory(path, n_atoms, None, 2, 7))
+            assert len(trimmed.xyz) == 5
+            assert np.array_equal(trimmed.xyz, frames.xyz)
+            # the DCD frames keep their times, this NetCDF file has none, its times being the frame numbers
+            assert np.array_equal(trimmed.time, frames.time if Path(path).suffix == '.dcd' else np.arange(5))
+            release_traj_path(block, block.out_log)
+            assert block.io_dict["in"]["input_traj_path"] == path and not Path(trim_path).exists()
@@ -0,0 +1,98 @@
+import os
+import subprocess
+import sys
+import time
+from biobb_common.tools import test_fixtures as fx
+from biobb_analysis.ambertools.common import CpptrajWorker
+from biobb_analysis.ambertools.cpptraj_rms import cpptraj_rms
+
+# stand-in of cpptraj: in interactive mode it prompts before the output of every command, reports an error for bogus
+# commands, echoes back the unknown ones and never finishes run; with -i it writes the out file of the rms command
+FAKE_CPPTRAJ = '''#!%s
+import sys, time
+if '--interactive' in sys.argv:
+    for line in sys.stdin:
+        command = line.strip()
+        if command == 'run':
+            time.sleep(3600)
+        elif command.startswith('bogus'):
+            print('> Error: %%s is not a command.' %% command, flush=True)
+        elif command == 'quit':
+            break
+        elif command.startswith('biobb_done_'):
+            print("> '%%s': Command not found." %% command, flush=True)
+        else:
+            print('> ', flush=True)
+else:
+    for line in open(sys.argv[sys.argv.index('-i') + 1]):
+        if line.startswith('rms ') and ' out ' in line:
+            words = line.split()
+            with open(words[words.index('out') + 1], 'w') as out:
+                out.write('#Frame     RMSD_00001\\n       1       0.0000\\n')
+''' % sys.executable
+
+
+def write_fake_cpptraj(path):
+    with open(path, 'w') as fake:
+        fake.write(FAKE_CPPTRAJ)
+    os.chmod(path, 0o755)
+    return os.path.abspath(path)
+
+
+class TestCpptrajWorker():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_warm_worker')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_worker(self):
+        # the real cpptraj, its output line-buffered and its prompts stripped
+        worker = CpptrajWorker('cpptraj', self.paths['input_top_path'], self.properties['warm_timeout'] * 30)
+        try:
+            output, error = worker.send(['trajin ' + self.paths['input_traj_path'], 'list trajin'])
+            assert not error
+            assert any(os.path.basename(self.paths['input_traj_path']) in line for line in output)
+            _, error = worker.send(['trajin missing.nc'])
+            assert error
+        finally:
+            worker.close()
+        assert not worker.alive()
+
+    def test_worker_prompt_error(self):
+        worker = CpptrajWorker(write_fake_cpptraj('fake_cpptraj.py'), self.paths['input_top_path'], self.properties['warm_timeout'])
+        try:
+            output, error = worker.send(['bogus'])
+            assert error
+            assert output == ['Error: bogus is not a command.']
+        finally:
+            worker.close()
+
+    def test_worker_timeout(self):
+        worker = CpptrajWorker(write_fake_cpptraj('fake_cpptraj.py'), self.paths['input_top_path'], self.properties['warm_timeout'])
+        start = time.monotonic()
+        try:
+            worker.send(['run'])
+            assert False, 'send did not time out'
+        except subprocess.TimeoutExpired:
+            pass
+        finally:
+            worker.kill()
+        assert time.monotonic() - start < self.properties['warm_timeout'] + 5
+        assert not worker.alive()
+
+class TestCpptrajRmsFirstWarmTimeout():
+    def setup_class(self):
+        fx.test_setup(self,'cpptraj_rms_first_warm_timeout')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_first_warm_timeout(self):
+        # the warm process never finishes run, the instructions are run again by cpptraj -i
+        self.properties['binary_path'] = write_fake_cpptraj('fake_cpptraj.py')
+        assert cpptraj_rms(properties=self.properties, **self.paths) == 0
+        with open(self.paths['output_cpptraj_path']) as output:
+            assert output.read().split() == ['#Frame', 'RMSD_00001', '1', '0.0000']
@@ -0,0 +1,42 @@
+import json
+from pathlib import Path
+from biobb_common.tools import test_fixtures as fx
+from biobb_analysis.benchmark import suite
+from biobb_analysis.benchmark.suite import run_suite, compare, read_history, METRICS
+
+BASE, HEAD = 'a' * 40, 'b' * 40
+
+
+class TestBenchmarkSuite():
+    def setup_class(self):
+        fx.test_setup(self,'benchmark_suite')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def run(self, monkeypatch, commit):
+        monkeypatch.setattr(suite, 'get_commit', lambda: (commit, False))
+        return run_suite(self.properties['atoms'], self.properties['frames'], self.properties['blocks'], self.properties['backends'],
+                         'history.jsonl', 'data')
+
+    def test_run_and_compare(self, monkeypatch):
+        # smallest native case, run twice on the same synthetic inputs
+        for commit in (BASE, HEAD):
+            records = self.run(monkeypatch, commit)
+            assert len(records) == 1
+            record = records[0]
+            assert record['return_code'] == 0, record['error']
+            assert (record['block'], record['backend'], record['commit']) == ('cpptraj_rms', 'native', commit)
+            assert all(metric in record for metric in METRICS)
+        assert len(list(Path('data').rglob('trajectory.dcd'))) == 1
+        assert [record['commit'] for record in read_history('history.jsonl')] == [BASE, HEAD]
+        # the timings of two runs differ, only a large increase is a regression
+        assert compare('history.jsonl', BASE, HEAD, threshold=1e6) == []
+        # a slower commit
+        slower = dict(read_history('history.jsonl')[-1], commit='c' * 40)
+        slower['wall_time'] = slower['wall_time'] * 10 + 1
+        with open('history.jsonl', 'a') as history:
+            history.write(json.dumps(slower) + '\n')
+        regressions = compare('history.jsonl', HEAD, 'c' * 8)
+        assert [(key, metric) for key, metric, _, _ in regressions] == [(('cpptraj_rms', 'native', 1000, 10), 'wall_time')]
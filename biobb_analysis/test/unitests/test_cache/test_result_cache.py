@@ -0,0 +1,24 @@
+from biobb_common.tools import test_fixtures as fx
+from biobb_analysis.ambertools.cpptraj_multi import CpptrajMulti
+from biobb_analysis.cache.results import get_cache_key
+
+
+class TestResultCache():
+    def setup_class(self):
+        fx.test_setup(self,'result_cache_multi')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def cache_key(self, **analysis):
+        analyses = [dict(self.properties['analyses'][0], **analysis)] + self.properties['analyses'][1:]
+        return get_cache_key(CpptrajMulti(properties=dict(self.properties, analyses=analyses), **self.paths))
+
+    def test_nested_output_paths(self):
+        # the output of every analysis is named by its position, its path does not change the result
+        key = self.cache_key()
+        assert self.cache_key(output='renamed/other.rms.dat') == key
+        # its format and the rest of the analysis do
+        assert self.cache_key(output='output.rms.agr') != key
+        assert self.cache_key(mask='backbone') != key
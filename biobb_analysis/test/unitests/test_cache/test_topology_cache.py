@@ -0,0 +1,76 @@
+import os
+import subprocess
+import zipfile
+from pathlib import Path
+import pytest
+from biobb_common.tools import test_fixtures as fx
+from biobb_analysis.ambertools.cpptraj_rms import cpptraj_rms
+from biobb_analysis.cache import topology
+from biobb_analysis.cache.topology import extract_topology, release_topology, remove_topologies
+
+
+class TestTopologyCache():
+    def setup_class(self):
+        fx.test_setup(self,'topology_cache')
+        self.cache_dir = topology.TOPOLOGY_CACHE_DIR
+        topology.TOPOLOGY_CACHE_DIR = Path('topologies').resolve()
+        with zipfile.ZipFile('topology.zip', 'w') as zip_file:
+            zip_file.write(self.paths['input_top_path'], 'cpptraj.top')
+
+    def teardown_class(self):
+        topology.TOPOLOGY_CACHE_DIR = self.cache_dir
+        fx.test_teardown(self)
+        pass
+
+    def test_hit_and_release(self):
+        top_path = extract_topology('topology.zip', None)
+        # the second block reuses the extraction of the first one
+        assert extract_topology('topology.zip', None) == top_path
+        assert Path(top_path).read_text() == Path(self.paths['input_top_path']).read_text()
+        assert len([d for d in topology.TOPOLOGY_CACHE_DIR.iterdir() if d.is_dir()]) == 1
+        release_topology(top_path, True, None)
+        assert Path(top_path).exists()
+        # removed once the last block releases it
+        release_topology(top_path, True, None)
+        assert not Path(top_path).parent.exists()
+        release_topology(top_path, True, None)
+
+    def test_kept(self):
+        top_path = extract_topology('topology.zip', None)
+        release_topology(top_path, False, None)
+        assert Path(top_path).exists()
+        remove_topologies()
+        assert Path(top_path).exists()
+        topology._kept.clear()
+
+    def test_other_processes(self):
+        top_path = extract_topology('topology.zip', None)
+        directory = Path(top_path).parent
+        # a live process still references the extraction
+        live = directory.joinpath('.ref.%d' % os.getppid())
+        live.touch()
+        release_topology(top_path, True, None)
+        assert Path(top_path).exists()
+        live.unlink()
+        # the reference of a dead process is dropped
+        dead = subprocess.Popen(['true'])
+        dead.wait()
+        top_path = extract_topology('topology.zip', None)
+        directory.joinpath('.ref.%d' % dead.pid).touch()
+        release_topology(top_path, True, None)
+        assert not directory.exists()
+
+    def test_remove_at_exit(self):
+        top_path = extract_topology('topology.zip', None)
+        remove_topologies()
+        assert not Path(top_path).parent.exists()
+        assert not topology._references
+
+    def test_native_release(self):
+        # zipped topologies can not be read by the native backend, which exits after their extraction
+        paths = dict(input_top_path='topology.zip', input_traj_path=self.paths['input_traj_path'], output_cpptraj_path='output.dat')
+        with pytest.raises(SystemExit):
+            cpptraj_rms(properties=dict(self.properties, mask='c-alpha', backend='native'), **paths)
+        # the extraction is released all the same
+        assert not topology._references
+        assert not [d for d in topology.TOPOLOGY_CACHE_DIR.iterdir() if d.is_dir()]
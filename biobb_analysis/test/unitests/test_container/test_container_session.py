@@ -0,0 +1,100 @@
+import json
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from biobb_common.tools import test_fixtures as fx
+from biobb_analysis.ambertools.cpptraj_rms import cpptraj_rms
+from biobb_analysis.container.session import ContainerSession, close_sessions
+
+# stand-in of the docker and singularity clients: every call is logged next to it, and the commands run in a session
+# write the output of the block into the session directory, mounted in the container volume path
+FAKE_CONTAINER = '''#!%s
+import json, os, sys
+from pathlib import Path
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'container.log'), 'a') as log:
+    log.write(json.dumps(sys.argv[1:]) + '\\n')
+if sys.argv[1] == 'exec':
+    name = next(arg for arg in sys.argv if 'biobb_session_' in arg).replace('instance://', '')
+    Path('.' + name).joinpath('output.dat').write_text('#Frame     RMSD_00002\\n       1       0.0000\\n')
+''' % sys.executable
+
+
+def write_fake_container(name):
+    with open(name, 'w') as fake:
+        fake.write(FAKE_CONTAINER)
+    os.chmod(name, 0o755)
+    return os.path.abspath(name)
+
+
+def read_calls():
+    with open('container.log') as log:
+        calls = [json.loads(line) for line in log]
+    os.remove('container.log')
+    return calls
+
+
+class TestContainerSession():
+    def setup_class(self):
+        fx.test_setup(self,'container_session')
+
+    def teardown_class(self):
+        close_sessions()
+        fx.test_teardown(self)
+        pass
+
+    def setup_method(self):
+        close_sessions()
+        if os.path.exists('container.log'):
+            os.remove('container.log')
+
+    def session_properties(self, container_path):
+        # the blocks write the instructions file in the container volume path of the host and remove it afterwards
+        volume = Path('volume').resolve()
+        volume.mkdir(exist_ok=True)
+        return dict(self.properties, container_path=write_fake_container(container_path), container_volume_path=str(volume))
+
+    def test_session_reuse(self):
+        # the second block reuses the container started by the first one
+        for _ in range(2):
+            properties = self.session_properties('docker')
+            assert cpptraj_rms(properties=properties, **self.paths) == 0
+            assert Path(self.paths['output_cpptraj_path']).read_text().split() == ['#Frame', 'RMSD_00002', '1', '0.0000']
+            os.remove(self.paths['output_cpptraj_path'])
+        calls = read_calls()
+        assert [call[0] for call in calls] == ['run', 'exec', 'exec']
+        name = calls[0][calls[0].index('--name') + 1]
+        assert calls[0][-3:] == ['sleep', self.properties['container_image'], 'infinity']
+        volume = calls[0][calls[0].index('-v') + 1]
+        assert volume == '%s:%s' % (Path('.' + name).resolve(), properties['container_volume_path'])
+        assert all(name in call for call in calls[1:])
+        # the session directory is emptied after every command
+        assert not list(Path('.' + name).iterdir())
+        close_sessions()
+        assert read_calls() == [['stop', '-t', '0', name]]
+        assert not Path('.' + name).exists()
+
+    def test_session_singularity(self):
+        properties = self.session_properties('singularity')
+        assert cpptraj_rms(properties=properties, **self.paths) == 0
+        assert Path(self.paths['output_cpptraj_path']).exists()
+        close_sessions()
+        start, run, stop = read_calls()
+        name = start[-1]
+        assert start[:2] == ['instance', 'start'] and start[-2] == self.properties['container_image']
+        assert run[:2] == ['exec', '-e'] and 'instance://' + name in run
+        assert stop == ['instance', 'stop', name]
+
+    def test_exec_command(self):
+        biobb = SimpleNamespace(env_vars_dict={'OMP_NUM_THREADS': '1'}, container_working_dir='/tmp', container_user_id='1000',
+                                container_shell_path='/bin/bash -c')
+        session = ContainerSession.__new__(ContainerSession)
+        session.container_path, session.name = 'docker', 'biobb_session_test'
+        session.engine = 'docker'
+        assert session.exec_command(biobb, ['cpptraj', '-i', 'instructions.in']) == [
+            'docker', 'exec', '-e', "OMP_NUM_THREADS='1'", '-w', '/tmp', '--user', '1000', 'biobb_session_test',
+            '/bin/bash -c', '"cpptraj -i instructions.in"']
+        session.container_path, session.engine = 'singularity', 'singularity'
+        assert session.exec_command(biobb, ['cpptraj', '-i', 'instructions.in']) == [
+            'singularity', 'exec', '-e', '--env', "OMP_NUM_THREADS='1'", 'instance://biobb_session_test',
+            '/bin/bash -c', '"cpptraj -i instructions.in"']
@@ -14,3 +14,20 @@ class TestGMXCluster():
         gmx_cluster(properties=self.properties, **self.paths)
         assert fx.not_empty(self.paths['output_pdb_path'])
         assert fx.equal(self.paths['output_pdb_path'], self.paths['ref_output_pdb_path'])
+
+
+class TestGMXClusterNative():
+    def setup_class(self):
+        fx.test_setup(self,'gmx_cluster_native')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_cluster_native(self):
+        gmx_cluster(properties=self.properties, **self.paths)
+        assert fx.not_empty(self.paths['output_pdb_path'])
+        with open(self.paths['output_pdb_path']) as pdb:
+            titles = [line for line in pdb if line.startswith('TITLE')]
+        assert len(titles) == 2
+        assert titles[0].startswith('TITLE     Cluster 1 with 9 elements')
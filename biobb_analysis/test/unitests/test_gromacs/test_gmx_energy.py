@@ -1,5 +1,8 @@
 from biobb_common.tools import test_fixtures as fx
 from biobb_analysis.gromacs.gmx_energy import gmx_energy
+from biobb_analysis.native.columnar import read_columnar
+import numpy as np
+import pytest
 
 
 class TestGMXEnergy():
@@ -14,3 +17,51 @@ class TestGMXEnergy():
         gmx_energy(properties=self.properties, **self.paths)
         assert fx.not_empty(self.paths['output_xvg_path'])
         assert fx.equal(self.paths['output_xvg_path'], self.paths['ref_output_xvg_path'])
+
+class TestGMXEnergyNative():
+    def setup_class(self):
+        fx.test_setup(self,'gmx_energy_native')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_energy_native(self):
+        gmx_energy(properties=self.properties, **self.paths)
+        assert fx.not_empty(self.paths['output_xvg_path'])
+        assert fx.equal(self.paths['output_xvg_path'], self.paths['ref_output_xvg_path'])
+
+class TestGMXEnergyNativeNpz():
+    def setup_class(self):
+        fx.test_setup(self,'gmx_energy_native_npz')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_energy_native_npz(self):
+        gmx_energy(properties=self.properties, **self.paths)
+        assert fx.not_empty(self.paths['output_xvg_path'])
+        data = read_columnar(self.paths['output_xvg_path'])
+        assert data.names == ['Time', 'Potential', 'Pressure']
+        assert data.metadata['units'] == ['ps', 'kJ/mol', 'bar']
+        # written from the energies, not rounded as in the text output
+        assert np.allclose(data.values, np.loadtxt(self.paths['ref_output_xvg_path']), rtol=0, atol=1e-6)
+
+class TestGMXEnergyNativeHdf5():
+    def setup_class(self):
+        fx.test_setup(self,'gmx_energy_native_hdf5')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_energy_native_hdf5(self):
+        pytest.importorskip('h5py')
+        gmx_energy(properties=self.properties, **self.paths)
+        assert fx.not_empty(self.paths['output_xvg_path'])
+        data = read_columnar(self.paths['output_xvg_path'])
+        assert data.names == ['Time', 'Potential', 'Pressure']
+        assert data.metadata['units'] == ['ps', 'kJ/mol', 'bar']
+        assert data.metadata['title'] == 'GROMACS Energies'
+        assert np.allclose(data.values, np.loadtxt(self.paths['ref_output_xvg_path']), rtol=0, atol=1e-6)
@@ -1,5 +1,9 @@
 from biobb_common.tools import test_fixtures as fx
 from biobb_analysis.gromacs.gmx_rgyr import gmx_rgyr
+import numpy as np
+
+# radius of gyration difference (nm) allowed between the native backend and gmx gyrate, which writes 6 significant digits
+NATIVE_TOLERANCE = 1e-4
 
 
 class TestGMXRgyr():
@@ -14,3 +18,33 @@ class TestGMXRgyr():
         gmx_rgyr(properties=self.properties, **self.paths)
         assert fx.not_empty(self.paths['output_xvg_path'])
         assert fx.equal(self.paths['output_xvg_path'], self.paths['ref_output_xvg_path'])
+
+class TestGMXRgyrNative():
+    def setup_class(self):
+        fx.test_setup(self,'gmx_rgyr_native')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rgyr_native(self):
+        gmx_rgyr(properties=self.properties, **self.paths)
+        assert fx.not_empty(self.paths['output_xvg_path'])
+        assert fx.equal(self.paths['output_xvg_path'], self.paths['ref_output_xvg_path'])
+
+class TestGMXRgyrNativeGromacs():
+    def setup_class(self):
+        fx.test_setup(self,'gmx_rgyr_native_gromacs')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rgyr_native_gromacs(self):
+        # the frames decoded by the native XTC reader against the ones read by gmx gyrate
+        gmx_rgyr(properties=self.properties, **self.paths)
+        properties = {k: v for k, v in self.properties.items() if k != 'backend'}
+        gmx_rgyr(properties=properties, **dict(self.paths, output_xvg_path='gromacs.xvg'))
+        native, gromacs = (np.loadtxt(path, comments=['#', '@']) for path in (self.paths['output_xvg_path'], 'gromacs.xvg'))
+        assert native.shape == gromacs.shape
+        assert np.allclose(native, gromacs, rtol=0, atol=NATIVE_TOLERANCE)
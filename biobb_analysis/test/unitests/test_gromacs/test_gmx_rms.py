@@ -1,7 +1,18 @@
 from biobb_common.tools import test_fixtures as fx
 from biobb_analysis.gromacs.gmx_rms import gmx_rms
+from biobb_analysis.native.data import load_data, get_sidecar_path
+from biobb_analysis.native.index import build_frame_index, trim_trajectory
+from biobb_analysis.native.incremental import get_state_path
+from pathlib import Path
+import numpy as np
 import platform
 
+# RMSd difference (nm) allowed between the native backend and gmx rms, computed in single precision
+NATIVE_TOLERANCE = 1e-4
+
+def load_xvg(path):
+    return np.loadtxt(path, comments=['#', '@'])
+
 class TestGMXRms():
     def setup_class(self):
         fx.test_setup(self,'gmx_rms')
@@ -15,3 +26,125 @@ class TestGMXRms():
         assert fx.not_empty(self.paths['output_xvg_path'])
         if platform.system() == 'Darwin':
             assert fx.equal(self.paths['output_xvg_path'], self.paths['ref_output_xvg_path'])
+
+class TestGMXRmsNative():
+    def setup_class(self):
+        fx.test_setup(self,'gmx_rms_native')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_native(self):
+        gmx_rms(properties=self.properties, **self.paths)
+        assert fx.not_empty(self.paths['output_xvg_path'])
+        assert fx.equal(self.paths['output_xvg_path'], self.paths['ref_output_xvg_path'])
+
+class TestGMXRmsNativeXtc():
+    def setup_class(self):
+        fx.test_setup(self,'gmx_rms_native_xtc')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_native_xtc(self):
+        gmx_rms(properties=self.properties, **self.paths)
+        assert fx.not_empty(self.paths['output_xvg_path'])
+        assert fx.equal(self.paths['output_xvg_path'], self.paths['ref_output_xvg_path'])
+
+class TestGMXRmsNativeLoad():
+    def setup_class(self):
+        fx.test_setup(self,'gmx_rms_native_load')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_native_load(self):
+        gmx_rms(properties=self.properties, **self.paths)
+        data = load_data(self.paths['output_xvg_path'])
+        assert data.names == ['Time (ps)', 'RMSD (nm)']
+        assert data.metadata['title'] == 'RMSD'
+        assert np.array_equal(data.values, np.loadtxt(self.paths['output_xvg_path'], comments=['#', '@']))
+        assert fx.not_empty(get_sidecar_path(self.paths['output_xvg_path']))
+        assert np.array_equal(load_data(self.paths['output_xvg_path']).values, data.values)
+
+class TestGMXRmsNativeIncremental():
+    def setup_class(self):
+        fx.test_setup(self,'gmx_rms_native_incremental')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_native_incremental(self):
+        traj = Path(self.paths['input_traj_path']).read_bytes()
+        offsets = build_frame_index(self.paths['input_traj_path']).offsets
+        paths = dict(self.paths, input_traj_path=str(Path('trajectory.xtc').resolve()))
+        # a trajectory still being written: four frames and the start of the fifth one
+        Path(paths['input_traj_path']).write_bytes(traj[:offsets[4] + 100])
+        gmx_rms(properties=self.properties, **paths)
+        assert len(np.loadtxt(paths['output_xvg_path'], comments=['#', '@'])) == 4
+        Path(paths['input_traj_path']).write_bytes(traj)
+        gmx_rms(properties=self.properties, **paths)
+        assert fx.equal(paths['output_xvg_path'], paths['ref_output_xvg_path'])
+        assert Path(get_state_path(paths['output_xvg_path'])).exists()
+
+class TestGMXRmsNativeGromacs():
+    def setup_class(self):
+        fx.test_setup(self,'gmx_rms_native_gromacs')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_native_gromacs(self):
+        # the native backend against gmx rms, on the same inputs
+        gmx_rms(properties=self.properties, **self.paths)
+        properties = {k: v for k, v in self.properties.items() if k != 'backend'}
+        gmx_rms(properties=properties, **dict(self.paths, output_xvg_path='gromacs.xvg'))
+        native, gromacs = load_xvg(self.paths['output_xvg_path']), load_xvg('gromacs.xvg')
+        assert native.shape == gromacs.shape
+        assert np.allclose(native, gromacs, rtol=0, atol=NATIVE_TOLERANCE)
+
+class TestGMXRmsNativeXtcGromacs():
+    def setup_class(self):
+        fx.test_setup(self,'gmx_rms_native_xtc_gromacs')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_native_xtc_gromacs(self):
+        # the frames decoded by the native XTC reader against the ones read by gmx rms
+        gmx_rms(properties=self.properties, **self.paths)
+        properties = {k: v for k, v in self.properties.items() if k != 'backend'}
+        gmx_rms(properties=properties, **dict(self.paths, output_xvg_path='gromacs.xvg'))
+        native, gromacs = load_xvg(self.paths['output_xvg_path']), load_xvg('gromacs.xvg')
+        assert native.shape == gromacs.shape
+        assert np.allclose(native, gromacs, rtol=0, atol=NATIVE_TOLERANCE)
+
+class TestGMXRmsNativeIncrementalGromacs():
+    def setup_class(self):
+        fx.test_setup(self,'gmx_rms_native_incremental_gromacs')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_rms_native_incremental_gromacs(self):
+        # the trajectory split in two segments, appended by two incremental launches
+        index = build_frame_index(self.paths['input_traj_path'])
+        half = len(index.time) // 2
+        for segment, (first, stop) in enumerate(((0, half), (half, len(index.time)))):
+            segment_path = str(Path('segment.%d.xtc' % segment).resolve())
+            trim_trajectory(self.paths['input_traj_path'], first, stop, segment_path, index)
+            gmx_rms(properties=self.properties, **dict(self.paths, input_traj_path=segment_path))
+            assert len(load_xvg(self.paths['output_xvg_path'])) == stop
+        # against a single gmx rms pass over the whole trajectory
+        properties = {k: v for k, v in self.properties.items() if k not in ('backend', 'incremental')}
+        gmx_rms(properties=properties, **dict(self.paths, output_xvg_path='gromacs.xvg'))
+        native, gromacs = load_xvg(self.paths['output_xvg_path']), load_xvg('gromacs.xvg')
+        assert native.shape == gromacs.shape
+        assert np.allclose(native, gromacs, rtol=0, atol=NATIVE_TOLERANCE)
@@ -14,3 +14,16 @@ class TestGMXTrjConvStrEns():
         gmx_trjconv_str_ens(properties=self.properties, **self.paths)
         assert fx.not_empty(self.paths['output_str_ens_path'])
         assert fx.equal(self.paths['output_str_ens_path'], self.paths['ref_output_str_ens_path'])
+
+class TestGMXTrjConvStrEnsStreaming():
+    def setup_class(self):
+        fx.test_setup(self,'gmx_trjconv_str_ens_streaming')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_trjconv_str_ens_streaming(self):
+        gmx_trjconv_str_ens(properties=self.properties, **self.paths)
+        assert fx.not_empty(self.paths['output_str_ens_path'])
+        assert fx.equal(self.paths['output_str_ens_path'], self.paths['ref_output_str_ens_path'])
@@ -1,5 +1,7 @@
+from pathlib import Path
 from biobb_common.tools import test_fixtures as fx
 from biobb_analysis.gromacs.gmx_trjconv_trj import gmx_trjconv_trj
+from biobb_analysis.native.index import build_frame_index, get_index_path, read_frame_index
 
 
 class TestGMXTrjConvTrj():
@@ -14,3 +16,21 @@ class TestGMXTrjConvTrj():
         gmx_trjconv_trj(properties=self.properties, **self.paths)
         assert fx.not_empty(self.paths['output_traj_path'])
         assert fx.equal(self.paths['output_traj_path'], self.paths['ref_output_traj_path'])
+
+
+class TestGMXTrjConvTrjFrameIndex():
+    def setup_class(self):
+        fx.test_setup(self,'gmx_trjconv_trj_frame_index')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        try:
+            Path(get_index_path(self.paths['input_traj_path'])).unlink()
+        except FileNotFoundError:
+            pass
+
+    def test_trjconv_trj_frame_index(self):
+        gmx_trjconv_trj(properties=self.properties, **self.paths)
+        assert fx.not_empty(self.paths['output_traj_path'])
+        assert list(build_frame_index(self.paths['output_traj_path']).time) == [20.0, 30.0, 40.0, 50.0]
+        assert read_frame_index(self.paths['input_traj_path']) is not None
@@ -0,0 +1,98 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from biobb_common.tools import test_fixtures as fx
+from biobb_analysis.ambertools.cpptraj_rms import CpptrajRms
+from biobb_analysis.profiling.resources import (ChildAccounting, account_children, add_process_usage, read_process_usage,
+                                                write_prometheus, PROMETHEUS_METRICS, USAGE_FIELDS)
+
+# stand-in of cpptraj -i: writes the out file of the rms command
+FAKE_CPPTRAJ = """#!/bin/sh
+out=$(sed -n 's/^rms .* out \\([^ ]*\\).*/\\1/p' "$2")
+printf '#Frame     RMSD_00002\\n       1       0.0000\\n' > "$out"
+"""
+# process spending some CPU time for every line read, until its input is closed
+BUSY_LOOP = "import sys\nfor line in sys.stdin:\n    sum(range(2000000))\n    print(line, end='', flush=True)\n"
+
+
+class Step:
+    """ Stand-in of a block, as labelled in the Prometheus file """
+
+    def __init__(self, step, prefix=None):
+        self.step, self.prefix = step, prefix
+
+
+class TestResources():
+    def setup_class(self):
+        fx.test_setup(self,'profiling_resources')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_write_prometheus(self):
+        path = 'metrics/steps.prom'
+        usage = dict.fromkeys(USAGE_FIELDS, 0)
+        write_prometheus(path, Step('rms'), dict(usage, processes=1, user_time=0.5))
+        write_prometheus(path, Step('rgyr', 'run"1'), dict(usage, processes=2, peak_rss=1024))
+        Path(path).write_text(Path(path).read_text() + 'other_metric{job="x"} 3\n')
+        # the samples of a new launch of a block replace the ones of its previous launch
+        write_prometheus(path, Step('rms'), dict(usage, processes=3, user_time=1.5))
+        lines = Path(path).read_text().splitlines()
+        for name, _, _ in PROMETHEUS_METRICS:
+            assert lines.count('# TYPE %s gauge' % name) == 1
+        assert 'biobb_child_processes{block="Step",step="rms",prefix=""} 3' in lines
+        assert 'biobb_child_cpu_user_seconds{block="Step",step="rms",prefix=""} 1.5' in lines
+        assert 'biobb_child_processes{block="Step",step="rgyr",prefix="run\\"1"} 2' in lines
+        assert 'biobb_child_peak_rss_bytes{block="Step",step="rgyr",prefix="run\\"1"} 1024' in lines
+        assert len([line for line in lines if line.startswith('biobb_child_processes{')]) == 2
+        # samples of other metrics are kept
+        assert 'other_metric{job="x"} 3' in lines
+        assert not list(Path('metrics').glob('.steps.prom.*'))
+
+    def test_process_usage(self):
+        process = subprocess.Popen([sys.executable, '-c', BUSY_LOOP], stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True)
+        try:
+            process.stdin.write('warm up\n')
+            process.stdin.flush()
+            process.stdout.readline()
+            before = read_process_usage(process.pid)
+            assert before is not None and before['peak_rss'] > 0
+            accounting = ChildAccounting()
+            with account_children(accounting):
+                for line in ('first\n', 'second\n'):
+                    process.stdin.write(line)
+                    process.stdin.flush()
+                    process.stdout.readline()
+                after = read_process_usage(process.pid)
+                add_process_usage(before, after)
+            # only the usage between the two reads is accounted, and the peak RSS of the process
+            usage = accounting.get_usage()
+            assert usage['processes'] == 1
+            assert usage['user_time'] == after['user_time'] - before['user_time'] and usage['user_time'] > 0
+            assert usage['voluntary_switches'] == after['voluntary_switches'] - before['voluntary_switches']
+            assert usage['peak_rss'] == after['peak_rss']
+            # without accounting nothing is added
+            add_process_usage(before, after)
+            assert accounting.get_usage() == usage
+        finally:
+            process.stdin.close()
+            process.wait()
+        assert read_process_usage(process.pid) is None
+
+    def test_accounting_opt_in(self):
+        with open('fake_cpptraj.sh', 'w') as fake:
+            fake.write(FAKE_CPPTRAJ)
+        os.chmod('fake_cpptraj.sh', 0o755)
+        properties = dict(self.properties, binary_path=os.path.abspath('fake_cpptraj.sh'))
+        # the child processes are only accounted when their usage is written
+        block_properties = dict(properties)
+        block_properties.pop('prometheus_path')
+        block = CpptrajRms(properties=block_properties, **self.paths)
+        assert block.launch() == 0
+        assert block.child_usage is None
+        block = CpptrajRms(properties=properties, **self.paths)
+        assert block.launch() == 0
+        assert block.child_usage['processes'] == 1
+        assert 'biobb_child_processes{block="CpptrajRms",step="%s",prefix=""} 1' % block.step in Path(properties['prometheus_path']).read_text().splitlines()
@@ -0,0 +1,89 @@
+import errno
+import os
+from pathlib import Path
+from biobb_common.tools import test_fixtures as fx
+from biobb_analysis.ambertools.cpptraj_rms import CpptrajRms
+from biobb_analysis.staging import files
+from biobb_analysis.staging.files import link_file, stage_files, copy_to_host, BIND_INPUTS_PATH
+
+
+def cross_device(*args, **kwargs):
+    """ Stand-in of os.link and os.replace for paths in different file systems """
+    raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+
+class TestStagingFiles():
+    def setup_class(self):
+        fx.test_setup(self,'staging_files')
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def block(self, **properties):
+        return CpptrajRms(properties=dict(self.properties, **properties), **self.paths)
+
+    def test_link_file(self, monkeypatch):
+        assert link_file(self.paths['input_top_path'], 'hard.pdb') == 'Hard-link'
+        assert Path('hard.pdb').samefile(self.paths['input_top_path'])
+        # across file systems
+        monkeypatch.setattr(files.os, 'link', cross_device)
+        assert link_file(self.paths['input_top_path'], 'sym.pdb') == 'Symlink'
+        assert Path('sym.pdb').is_symlink() and Path('sym.pdb').samefile(self.paths['input_top_path'])
+        assert link_file(self.paths['input_top_path'], 'copy.pdb', symlink=False) == 'Copy'
+        assert not Path('copy.pdb').is_symlink() and not Path('copy.pdb').samefile(self.paths['input_top_path'])
+        assert Path('copy.pdb').read_bytes() == Path(self.paths['input_top_path']).read_bytes()
+
+    def test_stage_files_link(self):
+        block = self.block()
+        stage_files(block, block.out_log)
+        unique_dir = Path(block.stage_io_dict['unique_dir'])
+        for key in ('input_top_path', 'input_traj_path'):
+            staged = Path(block.stage_io_dict['in'][key])
+            assert staged.parent == unique_dir
+            assert not staged.is_symlink() and staged.samefile(self.paths[key])
+        assert block.stage_io_dict['out']['output_cpptraj_path'] == str(unique_dir.joinpath('output.dat'))
+
+    def test_stage_files_copy_across_file_systems(self, monkeypatch):
+        monkeypatch.setattr(files.os, 'link', cross_device)
+        # local executions symlink the inputs
+        block = self.block()
+        stage_files(block, block.out_log)
+        assert all(Path(block.stage_io_dict['in'][key]).is_symlink() for key in ('input_top_path', 'input_traj_path'))
+        # containers without bind-mounts can not follow symlinks, the inputs are copied
+        block = self.block(container_path='pcocc', container_image='afandiadib/ambertools:serial', container_volume_path='/tmp')
+        stage_files(block, block.out_log)
+        staged = Path(block.stage_io_dict['unique_dir']).joinpath(Path(self.paths['input_traj_path']).name)
+        assert not staged.is_symlink() and staged.read_bytes() == Path(self.paths['input_traj_path']).read_bytes()
+        assert block.stage_io_dict['in']['input_traj_path'] == '/tmp/' + staged.name
+
+    def test_stage_files_bind_mounts(self):
+        for container_path, option in (('docker', '-v'), ('/usr/bin/singularity', '--bind')):
+            block = self.block(container_path=container_path, container_image='afandiadib/ambertools:serial', container_volume_path='/tmp')
+            stage_files(block, block.out_log)
+            mounts = block.container_generic_command.split()
+            assert mounts[0] == 'run'
+            for key in ('input_top_path', 'input_traj_path'):
+                name = Path(self.paths[key]).name
+                assert block.stage_io_dict['in'][key] == '%s/%s' % (BIND_INPUTS_PATH, name)
+                assert mounts[mounts.index('%s:%s/%s:ro' % (Path(self.paths[key]).resolve(), BIND_INPUTS_PATH, name)) - 1] == option
+            # the inputs are not in the mounted temporary directory
+            assert not list(Path(block.stage_io_dict['unique_dir']).iterdir())
+            # no mounts for the container sessions, started once
+            block = self.block(container_path=container_path, container_image='afandiadib/ambertools:serial', container_volume_path='/tmp', container_session=True)
+            stage_files(block, block.out_log)
+            assert block.stage_io_dict['in']['input_traj_path'] == '/tmp/' + Path(self.paths['input_traj_path']).name
+
+    def test_copy_to_host(self, monkeypatch):
+        block = self.block(path=os.getcwd())
+        block.io_dict['out']['output_cpptraj_path'] = str(Path('moved.dat').resolve())
+        stage_files(block, block.out_log)
+        sandbox = Path(block.stage_io_dict['unique_dir']).joinpath('moved.dat')
+        sandbox.write_text('moved')
+        copy_to_host(block, block.out_log)
+        assert Path('moved.dat').read_text() == 'moved' and not sandbox.exists()
+        # across file systems the output is copied
+        monkeypatch.setattr(files.os, 'replace', cross_device)
+        sandbox.write_text('copied')
+        copy_to_host(block, block.out_log)
+        assert Path('moved.dat').read_text() == 'copied' and sandbox.exists()
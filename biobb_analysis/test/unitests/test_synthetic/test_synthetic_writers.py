@@ -0,0 +1,64 @@
+import numpy as np
+from biobb_common.tools import test_fixtures as fx
+from biobb_analysis.native.edr import read_edr, read_edr_terms
+from biobb_analysis.native.topology import load_topology, read_ndx, select_gromacs
+from biobb_analysis.native.trajectory import read_trajectory
+from biobb_analysis.synthetic.generate import generate
+from biobb_analysis.synthetic.system import build_system, box_vectors, generate_frames, get_topology
+from biobb_analysis.synthetic.writers import NDX_GROUPS, get_edr_terms, write_structure, write_trajectory
+
+# coordinate error (Angstroms) of every format read back: gro and pdb keep 3 decimals (of nm for gro), xtc rounds to
+# its precision (1/1000 nm) in single precision and the other trajectories are single precision
+STRUCTURE_TOLERANCE = {'gro': 0.0051, 'pdb': 0.0005}
+TRAJECTORY_TOLERANCE = {'xtc': 0.0051, 'trr': 1e-4, 'dcd': 1e-4, 'netcdf': 1e-4}
+
+
+class TestSyntheticWriters():
+    def setup_class(self):
+        fx.test_setup(self,'synthetic_writers')
+        self.system = build_system(self.properties['atoms'], box_type=self.properties['box_type'])
+
+    def teardown_class(self):
+        fx.test_teardown(self)
+        pass
+
+    def test_structures(self):
+        top = get_topology(self.system)
+        for ext in ('gro', 'pdb', 'prmtop'):
+            path = write_structure('system.' + ext, self.system)
+            read_top, xyz = load_topology(path)
+            assert list(read_top.names) == list(top.names)
+            assert list(read_top.resnames) == list(top.resnames)
+            assert list(read_top.resids) == list(top.resids)
+            if ext in STRUCTURE_TOLERANCE:
+                assert np.allclose(xyz, self.system.xyz, rtol=0, atol=STRUCTURE_TOLERANCE[ext])
+
+    def test_trajectories(self):
+        n_frames, time_step = self.properties['frames'], self.properties['time_step']
+        frames = list(generate_frames(self.system, n_frames, time_step=time_step))
+        xyz, time = np.concatenate([chunk.xyz for chunk in frames]), np.concatenate([chunk.time for chunk in frames])
+        for ext, tolerance in TRAJECTORY_TOLERANCE.items():
+            path = write_trajectory('trajectory.' + ext, self.system, n_frames, time_step=time_step)
+            chunks = list(read_trajectory(path, len(self.system.xyz)))
+            read_xyz, read_time = np.concatenate([chunk.xyz for chunk in chunks]), np.concatenate([chunk.time for chunk in chunks])
+            assert read_xyz.shape == xyz.shape
+            assert np.allclose(read_xyz, xyz, rtol=0, atol=tolerance)
+            # DCD times are stored in AKMA units
+            assert np.allclose(read_time, time, rtol=0, atol=1e-4)
+
+    def test_generate(self):
+        paths = [self.paths['output_structure_path'], self.paths['output_index_path'], self.paths['output_energy_path']]
+        generate(paths, self.properties['atoms'], n_frames=self.properties['frames'], box_type=self.properties['box_type'],
+                 time_step=self.properties['time_step'])
+        top, _ = load_topology(self.paths['output_structure_path'])
+        groups = read_ndx(self.paths['output_index_path'])
+        assert list(groups) == [group for group in NDX_GROUPS if len(select_gromacs(top, group))]
+        for name, atoms in groups.items():
+            assert np.array_equal(atoms, select_gromacs(top, name))
+        terms, _, _ = read_edr_terms(self.paths['output_energy_path'])
+        assert [(term.name, term.unit) for term in terms] == get_edr_terms()
+        time, values = read_edr(self.paths['output_energy_path'], [term.name for term in terms])
+        assert np.array_equal(time, np.arange(self.properties['frames']) * self.properties['time_step'])
+        assert values.shape == (self.properties['frames'], len(terms))
+        # the volume term is the one of the box of the structure, in nm^3
+        assert np.allclose(values[:, [term.name for term in terms].index('Volume')], abs(np.linalg.det(box_vectors(self.system.box, self.system.angles))) / 1000.0, rtol=0.01)
@@ -18,7 +18,7 @@ setuptools.setup(
         "Bioexcel": "https://bioexcel.eu/"
     },
     packages=setuptools.find_packages(exclude=['docs', 'test']),
-    install_requires=['biobb_common==3.9.0'],
+    install_requires=['biobb_common==3.9.0', 'numpy'],
     python_requires='>=3.7,<3.10',
     entry_points={
         "console_scripts": [
@@ -28,6 +28,7 @@ setuptools.setup(
             "cpptraj_dry = biobb_analysis.ambertools.cpptraj_dry:main",
             "cpptraj_image = biobb_analysis.ambertools.cpptraj_image:main",
             "cpptraj_mask = biobb_analysis.ambertools.cpptraj_mask:main",
+            "cpptraj_multi = biobb_analysis.ambertools.cpptraj_multi:main",
             "cpptraj_rgyr = biobb_analysis.ambertools.cpptraj_rgyr:main",
             "cpptraj_rms = biobb_analysis.ambertools.cpptraj_rms:main",
             "cpptraj_rmsf = biobb_analysis.ambertools.cpptraj_rmsf:main",